@@ -1,12 +1,33 @@
 import os
+import sys
+from pathlib import Path
 
 from aws_cdk import App, Environment
 from rich import print
 
+from cdk_clearml.artifact_storage import ArtifactStorageConfig
+from cdk_clearml.autoscaler_service import AutoscalerServiceConfig
+from cdk_clearml.backups import BackupsConfig
 from cdk_clearml.stack import ClearMLStack
-from cdk_clearml.utils.aws_account_info import get_aws_account_id
+from cdk_clearml.utils.aws_account_info import resolve_aws_account_id
+from cdk_clearml.utils.synth_cache import (
+    SYNTH_CACHE_FNAME,
+    SynthCache,
+    SynthReport,
+    is_offline_synth,
+)
+from cdk_clearml.worker_cache import WorkerCacheConfig
+
+THIS_DIR = Path(__file__).parent
+CDK_CONTEXT_FPATH = THIS_DIR / "cdk.context.json"
+OFFLINE_SYNTH: bool = is_offline_synth()
+
+REPORT = SynthReport()
+SYNTH_CACHE = SynthCache.load(THIS_DIR / SYNTH_CACHE_FNAME)
+REPORT.expired_keys = SYNTH_CACHE.expired_keys()
 
-AWS_ACCOUNT_ID: str = get_aws_account_id()
+with REPORT.phase("resolve-aws-account-id"):
+    AWS_ACCOUNT_ID, REPORT.account_id_source = resolve_aws_account_id(cache=SYNTH_CACHE, offline=OFFLINE_SYNTH)
 CDK_ENV = Environment(account=AWS_ACCOUNT_ID, region=os.getenv("AWS_REGION", "us-west-2"))
 
 print("App settings")
@@ -17,20 +38,61 @@ print(
         "AWS_PROFILE": os.getenv("AWS_PROFILE", "unset"),
         "AWS_ACCOUNT_ID": AWS_ACCOUNT_ID,
         "AWS_REGION": CDK_ENV.region,
+        "OFFLINE_SYNTH": OFFLINE_SYNTH,
     }
 )
 
-APP = App()
-
-ClearMLStack(
-    APP,
-    "clearml-2",
-    top_level_domain_name="sbox.sbox.ai.muyben.tech",
-    # top_level_domain_name="mlops-tools.ai.muyben.tech",
-    # vpc_name="MlOpsMLFlowCDKStack/fMlOpsMLFlowCDKStack-vpc",
-    # vpc_name="ben-networked-vpc",
-    vpc_name="network-default-vpc",
-    env=CDK_ENV,
-)
+# lookups resolved by the CDK CLI (cdk.context.json) take precedence over these
+CACHED_CONTEXT_LOOKUPS = SYNTH_CACHE.context_lookups(allow_expired=OFFLINE_SYNTH)
+REPORT.context_lookups_from_cache = len(CACHED_CONTEXT_LOOKUPS)
+
+APP = App(context=CACHED_CONTEXT_LOOKUPS)
+
+with REPORT.phase("construct-stacks"):
+    CLEARML_STACK = ClearMLStack(
+        APP,
+        "clearml-2",
+        top_level_domain_name="sbox.sbox.ai.muyben.tech",
+        # top_level_domain_name="mlops-tools.ai.muyben.tech",
+        # vpc_name="MlOpsMLFlowCDKStack/fMlOpsMLFlowCDKStack-vpc",
+        # vpc_name="ben-networked-vpc",
+        vpc_name="network-default-vpc",
+        # agents upload artifacts and debug images straight to S3 instead of through the fileserver
+        artifact_storage=ArtifactStorageConfig(),
+        # autoscaled workers pull images and packages through in-region caches
+        worker_cache=WorkerCacheConfig(),
+        # run the autoscaler as a Fargate service rather than with `just run-aws-autoscaler`; needs the
+        # /clearml/autoscaler_api_credentials secret with the access_key and secret_key of a ClearML user
+        autoscaler_service=AutoscalerServiceConfig(config_fpath=THIS_DIR / "aws_autoscaler.yaml")
+        if (THIS_DIR / "aws_autoscaler.yaml").exists()
+        else None,
+        # run the apiserver, webserver, and fileserver as autoscaled Fargate services, and only the data
+        # stores on the server instance
+        # stateless_services=StatelessServicesConfig(),
+        # daily snapshots of the data volumes, and hourly backups of Mongo and Elasticsearch to S3
+        backups=BackupsConfig(),
+        # run Elasticsearch, Mongo, and Redis as multi-AZ managed services rather than on the server instance
+        # managed_data_stores=ManagedDataStoresConfig(
+        #     elasticsearch=ManagedElasticsearchConfig(), mongo=ManagedMongoConfig(), redis=ManagedRedisConfig()
+        # ),
+        env=CDK_ENV,
+    )
+
+with REPORT.phase("synth"):
+    CLOUD_ASSEMBLY = APP.synth()
+
+REPORT.context_lookups_performed = CLEARML_STACK.imported_resources.context_lookup_count
+REPORT.record_missing_context(CLOUD_ASSEMBLY)
+SYNTH_CACHE.harvest_context_file(CDK_CONTEXT_FPATH)
+SYNTH_CACHE.save()
+
+print("Synth report", file=sys.stderr)
+print(REPORT.as_dict(), file=sys.stderr)
 
-APP.synth()
+if OFFLINE_SYNTH and REPORT.missing_context_keys:
+    print(
+        "Offline synth failed: these context lookups are neither in cdk.context.json nor in the synth cache:",
+        REPORT.missing_context_keys,
+        file=sys.stderr,
+    )
+    sys.exit(1)
@@ -0,0 +1,237 @@
+"""
+Benchmark of ``cdk_clearml.autoscaler.binpacking`` on synthetic queue traces.
+
+Replays the same trace of GPU tasks, each requesting 1, 2, or 4 GPUs and some memory, through two
+scheduling policies and reports GPU utilization, cost, and queue waits:
+
+- ``one-per-instance``: what the autoscaler does by default; every task gets the cheapest instance
+  type that fits it, and the instance runs a single agent.
+- ``bin-packing``: tasks are packed with ``plan_instances``, and every instance runs one
+  GPU-pinned agent per task (plus one per leftover GPU).
+
+    python benchmarks/binpacking.py --hours 24 --seeds 0 1 2
+
+Only the standard library is needed. Prices are us-east-1 on-demand prices of the g4dn family.
+"""
+
+import random
+from argparse import ArgumentParser
+from collections import Counter, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, List, Optional, Tuple
+
+from cdk_clearml.autoscaler.binpacking import InstanceOption, PackedInstance, ResourceRequest, plan_instances
+from cdk_clearml.autoscaler.simulation import HOUR, MINUTE, generate_trace, percentile
+
+INSTANCE_OPTIONS = [
+    InstanceOption(resource_name="g4dn.xlarge", gpus=1, memory_gib=16, hourly_price=0.526, max_instances=16),
+    InstanceOption(resource_name="g4dn.4xlarge", gpus=1, memory_gib=64, hourly_price=1.204, max_instances=16),
+    InstanceOption(resource_name="g4dn.12xlarge", gpus=4, memory_gib=192, hourly_price=3.912, max_instances=8),
+    InstanceOption(resource_name="g4dn.metal", gpus=8, memory_gib=384, hourly_price=7.824, max_instances=4),
+]
+
+
+@dataclass
+class BenchmarkTask:
+    task_id: str
+    enqueued_at: float
+    duration_seconds: float
+    request: ResourceRequest
+    started_at: Optional[float] = None
+
+
+@dataclass
+class Agent:
+    """An agent daemon pinned to ``gpus`` GPUs of its instance."""
+
+    gpus: int
+    task: Optional[BenchmarkTask] = None
+
+
+@dataclass
+class Instance:
+    option: InstanceOption
+    launched_at: float
+    ready_at: float
+    agents: List[Agent]
+    idle_since: Optional[float] = None
+    terminated_at: Optional[float] = None
+
+    @property
+    def free_memory_gib(self) -> float:
+        return self.option.memory_gib - sum(agent.task.request.memory_gib for agent in self.agents if agent.task)
+
+
+@dataclass
+class BenchmarkResult:
+    policy: str
+    tasks_finished: int
+    launches: int
+    gpu_utilization: float
+    cost: float
+    queue_wait_p50_seconds: float
+    queue_wait_p95_seconds: float
+    instances_by_type: Dict[str, int] = field(default_factory=dict)
+
+    def as_row(self) -> str:
+        instances_by_type = ", ".join(f"{name}={count}" for name, count in sorted(self.instances_by_type.items()))
+        return (
+            f"{self.policy:<17} tasks={self.tasks_finished:<5} launches={self.launches:<4} "
+            f"gpu_utilization={self.gpu_utilization:6.1%} cost=${self.cost:8.2f} "
+            f"queue_wait_p50={self.queue_wait_p50_seconds:6.0f}s p95={self.queue_wait_p95_seconds:6.0f}s "
+            f"({instances_by_type})"
+        )
+
+
+def generate_gpu_trace(hours: float, seed: int, tasks_per_hour: float) -> List[BenchmarkTask]:
+    """The arrivals of ``simulation.generate_trace``, with GPU and memory requests drawn per task."""
+    rng = random.Random(seed)
+    trace = []
+    for task in generate_trace(
+        hours, seed=seed, base_tasks_per_hour=tasks_per_hour / 4, burst_tasks_per_hour=tasks_per_hour
+    ):
+        gpus = rng.choices([1, 2, 4], weights=[0.7, 0.2, 0.1])[0]
+        memory_gib = gpus * rng.choice([8, 12, 24, 40])
+        trace.append(
+            BenchmarkTask(
+                task_id=task.task_id,
+                enqueued_at=task.enqueued_at,
+                duration_seconds=task.duration_seconds,
+                request=ResourceRequest(gpus=gpus, memory_gib=memory_gib),
+            )
+        )
+    return trace
+
+
+def agent_takes(policy: str, instance: Instance, agent: Agent, request: ResourceRequest) -> bool:
+    if request.memory_gib > instance.free_memory_gib:
+        return False
+    if policy == "bin-packing":
+        return agent.gpus == request.gpus
+    return agent.gpus >= request.gpus
+
+
+def run(policy: str, trace: List[BenchmarkTask], boot_seconds: float, max_idle_time_min: float) -> BenchmarkResult:
+    """Replay ``trace`` with a supervisor pass every minute."""
+    pending = deque(sorted(trace, key=lambda task: task.enqueued_at))
+    queue: Deque[BenchmarkTask] = deque()
+    instances: List[Instance] = []
+    finished: List[BenchmarkTask] = []
+    now = 0.0
+
+    while pending or queue or any(agent.task for instance in instances for agent in instance.agents):
+        now += MINUTE
+        while pending and pending[0].enqueued_at <= now:
+            queue.append(pending.popleft())
+
+        alive = [instance for instance in instances if instance.terminated_at is None]
+        for instance in alive:
+            for agent in instance.agents:
+                if agent.task and agent.task.started_at + agent.task.duration_seconds <= now:
+                    finished.append(agent.task)
+                    agent.task = None
+            if instance.ready_at > now:
+                continue
+            # idle agents pull the oldest queued task they can run
+            for agent in instance.agents:
+                if agent.task:
+                    continue
+                task = next((task for task in queue if agent_takes(policy, instance, agent, task.request)), None)
+                if task:
+                    queue.remove(task)
+                    task.started_at = now
+                    agent.task = task
+            if any(agent.task for agent in instance.agents):
+                instance.idle_since = None
+            elif instance.idle_since is None:
+                instance.idle_since = now
+            elif now - instance.idle_since > max_idle_time_min * MINUTE:
+                instance.terminated_at = now
+
+        alive = [instance for instance in instances if instance.terminated_at is None]
+        free_agents: List[Tuple[Instance, Agent]] = [
+            (instance, agent) for instance in alive for agent in instance.agents if agent.task is None
+        ]
+        unserved = []
+        for task in queue:
+            match = next((item for item in free_agents if agent_takes(policy, item[0], item[1], task.request)), None)
+            if match:
+                free_agents.remove(match)
+            else:
+                unserved.append(task)
+
+        running_instances = Counter(instance.option.resource_name for instance in alive)
+
+        if policy == "bin-packing":
+            planned, _ = plan_instances(
+                [(task.task_id, task.request) for task in unserved], INSTANCE_OPTIONS, running_instances
+            )
+        else:
+            planned = []
+            for task in unserved:
+                options = [
+                    option
+                    for option in INSTANCE_OPTIONS
+                    if PackedInstance(option).fits(task.request)
+                    and running_instances[option.resource_name] < option.max_instances
+                ]
+                if options:
+                    option = min(options, key=lambda option: option.hourly_price)
+                    running_instances[option.resource_name] += 1
+                    planned.append(PackedInstance(option, tasks=[(task.task_id, task.request)]))
+
+        for packed in planned:
+            if policy == "bin-packing":
+                agents = [Agent(gpus=len(gpus)) for gpus in packed.agent_gpus()]
+            else:
+                agents = [Agent(gpus=packed.option.gpus)]
+            instances.append(Instance(packed.option, launched_at=now, ready_at=now + boot_seconds, agents=agents))
+
+    for instance in instances:
+        if instance.terminated_at is None:
+            instance.terminated_at = now
+
+    instance_gpu_seconds = sum(
+        (instance.terminated_at - instance.launched_at) * instance.option.gpus for instance in instances
+    )
+    task_gpu_seconds = sum(task.duration_seconds * task.request.gpus for task in finished)
+    instances_by_type = Counter(instance.option.resource_name for instance in instances)
+    queue_waits = [task.started_at - task.enqueued_at for task in finished]
+    return BenchmarkResult(
+        policy=policy,
+        tasks_finished=len(finished),
+        launches=len(instances),
+        gpu_utilization=task_gpu_seconds / instance_gpu_seconds if instance_gpu_seconds else 0.0,
+        cost=sum(
+            (instance.terminated_at - instance.launched_at) / HOUR * instance.option.hourly_price
+            for instance in instances
+        ),
+        queue_wait_p50_seconds=percentile(queue_waits, 0.50),
+        queue_wait_p95_seconds=percentile(queue_waits, 0.95),
+        instances_by_type=dict(instances_by_type),
+    )
+
+
+def main():
+    parser = ArgumentParser(description="Compare one task per instance with bin-packing on synthetic GPU traces")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0, 1, 2])
+    parser.add_argument("--tasks-per-hour", type=float, default=24.0, help="Arrival rate during the daily bursts")
+    parser.add_argument("--boot-seconds", type=float, default=300.0)
+    parser.add_argument("--max-idle-time-min", type=float, default=20.0)
+    args = parser.parse_args()
+
+    for seed in args.seeds:
+        print(f"seed={seed}")
+        for policy in ("one-per-instance", "bin-packing"):
+            result = run(
+                policy,
+                generate_gpu_trace(args.hours, seed=seed, tasks_per_hour=args.tasks_per_hour),
+                boot_seconds=args.boot_seconds,
+                max_idle_time_min=args.max_idle_time_min,
+            )
+            print("  " + result.as_row())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+Synthetic load against a ClearML server, reporting throughput and latency percentiles per endpoint.
+
+Four workloads run concurrently, each from its own threads, for ``--duration`` seconds:
+
+- ``experiments``: tasks that report scalars at ``--iterations-per-second``, with a plot and a
+  debug image every ``--plot-every`` iterations, through ``events.add_batch``;
+- ``artifacts``: uploads of ``--artifact-sizes`` to the fileserver, each downloaded back;
+- ``ui``: the queries the web UI makes when browsing projects, experiments, and their results;
+- ``enqueue``: bursts of ``--burst-size`` tasks enqueued at once, dequeued again before the next burst.
+
+It talks to the REST API of the apiserver and to the fileserver directly, so that every call is
+timed on its own; only the standard library is needed. Against a local server
+(see ``run-local-clearml.sh``) with credentials created in its web UI:
+
+    export CLEARML_API_ACCESS_KEY=... CLEARML_API_SECRET_KEY=...
+    python benchmarks/clearml_load.py --duration 300 --experiments 16 --output es-heap-2g.json
+    python benchmarks/clearml_load.py --duration 300 --experiments 16 --baseline es-heap-2g.json
+
+``--baseline`` prints the change of every endpoint's p90 against the results of an earlier run,
+e.g. before a change of heap sizes, volumes, or worker counts. The tasks, queue, and files of the
+run are deleted at the end unless ``--keep``.
+"""
+
+import base64
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from argparse import ArgumentParser, Namespace
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Optional
+
+PROJECT_NAME = "clearml-load-benchmark"
+QUEUE_NAME = "clearml-load-benchmark"
+
+# the pages the web UI asks for
+UI_PAGE_SIZE = 50
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values``, e.g. ``fraction=0.9`` for the p90."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@dataclass
+class EndpointStats:
+    endpoint: str
+    calls: int
+    errors: int
+    calls_per_second: float
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class LatencyRecorder:
+    """Latencies and errors of the calls, by endpoint; shared by all threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._latencies_ms: Dict[str, List[float]] = defaultdict(list)
+        self._errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, endpoint: str, latency_ms: float, failed: bool) -> None:
+        with self._lock:
+            self._latencies_ms[endpoint].append(latency_ms)
+            if failed:
+                self._errors[endpoint] += 1
+
+    def stats(self, duration_seconds: float) -> List[EndpointStats]:
+        with self._lock:
+            return [
+                EndpointStats(
+                    endpoint=endpoint,
+                    calls=len(latencies),
+                    errors=self._errors[endpoint],
+                    calls_per_second=len(latencies) / duration_seconds,
+                    p50_ms=percentile(latencies, 0.5),
+                    p90_ms=percentile(latencies, 0.9),
+                    p99_ms=percentile(latencies, 0.99),
+                    max_ms=max(latencies),
+                )
+                for endpoint, latencies in sorted(self._latencies_ms.items())
+            ]
+
+
+class ClearMLError(Exception):
+    pass
+
+
+class ClearMLClient:
+    """Timed calls to the apiserver and the fileserver."""
+
+    def __init__(self, api_host: str, files_host: str, access_key: str, secret_key: str, recorder: LatencyRecorder):
+        self.api_host = api_host.rstrip("/")
+        self.files_host = files_host.rstrip("/")
+        self.recorder = recorder
+        basic_auth = base64.b64encode(f"{access_key}:{secret_key}".encode("utf-8")).decode("ascii")
+        self.token = self.call("auth.login", {}, authorization=f"Basic {basic_auth}")["token"]
+
+    def timed_request(self, endpoint: str, request: urllib.request.Request) -> bytes:
+        start = time.perf_counter()
+        failed = True
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                body = response.read()
+            failed = False
+            return body
+        except urllib.error.HTTPError as error:
+            raise ClearMLError(f"{endpoint}: HTTP {error.code} {error.read()[:500]!r}") from error
+        finally:
+            self.recorder.record(endpoint, (time.perf_counter() - start) * 1000, failed)
+
+    def call(self, endpoint: str, data, authorization: Optional[str] = None, endpoint_label: Optional[str] = None):
+        """Call ``<service>.<action>``; ``data`` is a dict, or a list of dicts for the batch endpoints."""
+        body = "\n".join(json.dumps(item) for item in data) if isinstance(data, list) else json.dumps(data)
+        request = urllib.request.Request(
+            f"{self.api_host}/{endpoint}",
+            data=body.encode("utf-8"),
+            method="POST",
+            headers={
+                "Content-Type": "application/json",
+                "Authorization": authorization or f"Bearer {self.token}",
+            },
+        )
+        response = json.loads(self.timed_request(endpoint_label or endpoint, request))
+        return response.get("data", {})
+
+    def upload(self, path: str, contents: bytes, endpoint_label: str) -> str:
+        """Upload ``contents`` to ``path`` on the fileserver, as the SDK does; returns its URL."""
+        boundary = uuid.uuid4().hex
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{path}"; filename="{path.split("/")[-1]}"\r\n'
+            "Content-Type: application/octet-stream\r\n\r\n"
+        ).encode("utf-8")
+        body += contents + f"\r\n--{boundary}--\r\n".encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.files_host}/",
+            data=body,
+            method="POST",
+            headers={
+                "Content-Type": f"multipart/form-data; boundary={boundary}",
+                "Authorization": f"Bearer {self.token}",
+            },
+        )
+        self.timed_request(endpoint_label, request)
+        return f"{self.files_host}/{path}"
+
+    def download(self, url: str, endpoint_label: str) -> int:
+        request = urllib.request.Request(url, headers={"Authorization": f"Bearer {self.token}"})
+        return len(self.timed_request(endpoint_label, request))
+
+    def delete_file(self, path: str) -> None:
+        request = urllib.request.Request(
+            f"{self.files_host}/{path}", method="DELETE", headers={"Authorization": f"Bearer {self.token}"}
+        )
+        self.timed_request("fileserver.delete", request)
+
+
+class LoadRun:
+    """The state of one benchmark run: its project, queue, tasks, and files."""
+
+    def __init__(self, client: ClearMLClient, args: Namespace):
+        self.client = client
+        self.args = args
+        self.run_id = uuid.uuid4().hex[:8]
+        self.random = random.Random(args.seed)
+        self.deadline = time.monotonic() + args.duration
+        self.lock = threading.Lock()
+        self.task_ids: List[str] = []
+        self.uploaded_paths: List[str] = []
+        self.project_id = self.get_or_create("projects", PROJECT_NAME)
+        self.queue_id = self.get_or_create("queues", QUEUE_NAME)
+
+    def get_or_create(self, service: str, name: str) -> str:
+        existing = self.client.call(f"{service}.get_all", {"name": f"^{name}$", "only_fields": ["id"]})[service]
+        if existing:
+            return existing[0]["id"]
+        data = {"name": name, "description": name} if service == "projects" else {"name": name}
+        return self.client.call(f"{service}.create", data)["id"]
+
+    def running(self) -> bool:
+        return time.monotonic() < self.deadline
+
+    def create_task(self, name: str) -> str:
+        task_id = self.client.call(
+            "tasks.create", {"name": f"{name} {self.run_id}", "type": "training", "project": self.project_id}
+        )["id"]
+        with self.lock:
+            self.task_ids.append(task_id)
+        return task_id
+
+    def experiment(self, experiment_index: int) -> None:
+        """A training task reporting scalars, plots, and debug images until the end of the run."""
+        task_id = self.create_task(f"experiment {experiment_index}")
+        self.client.call("tasks.started", {"task": task_id, "force": True})
+        image = os.urandom(self.args.debug_image_kib * 1024)
+        interval = 1 / self.args.iterations_per_second
+        iteration = 0
+        while self.running():
+            started_at = time.monotonic()
+            now_ms = int(time.time() * 1000)
+            events = [
+                {
+                    "task": task_id,
+                    "type": "training_stats_scalar",
+                    "timestamp": now_ms,
+                    "iter": iteration,
+                    "metric": f"metric_{scalar // 4}",
+                    "variant": f"variant_{scalar % 4}",
+                    "value": math.sin(iteration / 100 + scalar) + self.random.random() / 10,
+                }
+                for scalar in range(self.args.scalars_per_iteration)
+            ]
+            if iteration % self.args.plot_every == 0:
+                plot = {"data": [{"type": "scatter", "y": [self.random.random() for _ in range(200)]}]}
+                events.append(
+                    {
+                        "task": task_id,
+                        "type": "plot",
+                        "timestamp": now_ms,
+                        "iter": iteration,
+                        "metric": "plots",
+                        "variant": "scatter",
+                        "plot_str": json.dumps(plot),
+                    }
+                )
+                path = f"{PROJECT_NAME}/{task_id}/debug/image_{iteration}.png"
+                url = self.client.upload(path, image, endpoint_label="fileserver.upload[debug image]")
+                with self.lock:
+                    self.uploaded_paths.append(path)
+                events.append(
+                    {
+                        "task": task_id,
+                        "type": "training_debug_image",
+                        "timestamp": now_ms,
+                        "iter": iteration,
+                        "metric": "debug",
+                        "variant": "image",
+                        "url": url,
+                    }
+                )
+            self.client.call("events.add_batch", events)
+            iteration += 1
+            time.sleep(max(0.0, interval - (time.monotonic() - started_at)))
+        self.client.call("tasks.stopped", {"task": task_id, "force": True})
+
+    def artifacts(self, worker_index: int) -> None:
+        """Uploads artifacts of every size in turn, downloading each of them back."""
+        task_id = self.create_task(f"artifacts {worker_index}")
+        upload_index = 0
+        while self.running():
+            for size_kib in self.args.artifact_sizes:
+                label = f"{size_kib} KiB"
+                path = f"{PROJECT_NAME}/{task_id}/artifacts/artifact_{upload_index}_{size_kib}.bin"
+                contents = os.urandom(size_kib * 1024)
+                url = self.client.upload(path, contents, endpoint_label=f"fileserver.upload[{label}]")
+                with self.lock:
+                    self.uploaded_paths.append(path)
+                self.client.download(url, endpoint_label=f"fileserver.download[{label}]")
+                upload_index += 1
+
+    def ui(self, worker_index: int) -> None:
+        """What the web UI asks for when a user browses the projects, experiments, and results."""
+        while self.running():
+            self.client.call(
+                "projects.get_all_ex",
+                {"page": 0, "page_size": UI_PAGE_SIZE, "order_by": ["-last_update"], "include_stats": True},
+            )
+            tasks = self.client.call(
+                "tasks.get_all_ex",
+                {
+                    "project": [self.project_id],
+                    "page": 0,
+                    "page_size": UI_PAGE_SIZE,
+                    "order_by": ["-last_update"],
+                    "only_fields": ["name", "status", "type", "last_update", "last_iteration", "last_metrics"],
+                },
+            )["tasks"]
+            self.client.call("queues.get_all_ex", {"only_fields": ["name", "entries"]})
+            self.client.call("workers.get_all", {})
+            if not tasks:
+                time.sleep(1)
+                continue
+            task_id = self.random.choice(tasks)["id"]
+            self.client.call("events.scalar_metrics_iter_histogram", {"task": task_id, "samples": 5000})
+            self.client.call("events.get_task_plots", {"task": task_id, "iters": 1})
+            self.client.call("events.debug_images", {"metrics": [{"task": task_id}], "iters": 1})
+            # a user reads the page before clicking on
+            time.sleep(self.random.uniform(0, 2 * self.args.ui_think_time))
+
+    def enqueue_bursts(self, worker_index: int) -> None:
+        """Bursts of tasks enqueued at once, as when a sweep is launched; dequeued before the next burst."""
+        task_ids = [self.create_task(f"queued {worker_index}.{index}") for index in range(self.args.burst_size)]
+        while self.running():
+            for task_id in task_ids:
+                self.client.call("tasks.enqueue", {"task": task_id, "queue": self.queue_id})
+            self.client.call("queues.get_by_id", {"queue": self.queue_id})
+            for task_id in task_ids:
+                self.client.call("tasks.dequeue", {"task": task_id})
+            time.sleep(self.args.burst_interval)
+
+    def cleanup(self) -> None:
+        for path in self.uploaded_paths:
+            try:
+                self.client.delete_file(path)
+            except ClearMLError as error:
+                print(f"Could not delete {path}: {error}")
+        for task_id in self.task_ids:
+            try:
+                self.client.call("tasks.delete", {"task": task_id, "force": True})
+            except ClearMLError as error:
+                print(f"Could not delete task {task_id}: {error}")
+
+
+def run_workers(workers: List[Callable[[], None]]) -> None:
+    """Run the workers in their own threads; the first error stops the run."""
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        for future in [executor.submit(worker) for worker in workers]:
+            future.result()
+
+
+def print_stats(stats: List[EndpointStats], baseline: Optional[Dict[str, dict]] = None) -> None:
+    header = f"{'endpoint':<42} {'calls':>7} {'errors':>6} {'calls/s':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}"
+    if baseline:
+        header += f" {'p90 vs baseline':>16}"
+    print(header)
+    for row in stats:
+        line = (
+            f"{row.endpoint:<42} {row.calls:>7} {row.errors:>6} {row.calls_per_second:>8.2f} "
+            f"{row.p50_ms:>8.1f} {row.p90_ms:>8.1f} {row.p99_ms:>8.1f}"
+        )
+        if baseline:
+            baseline_row = baseline.get(row.endpoint)
+            change = f"{100 * (row.p90_ms / baseline_row['p90_ms'] - 1):+.1f}%" if baseline_row else "new"
+            line += f" {change:>16}"
+        print(line)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--api-host", default=os.environ.get("CLEARML_API_HOST", "http://localhost:8008"))
+    parser.add_argument("--files-host", default=os.environ.get("CLEARML_FILES_HOST", "http://localhost:8081"))
+    parser.add_argument("--duration", type=float, default=120, help="Seconds of load")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--experiments", type=int, default=8, help="Concurrent tasks reporting events")
+    parser.add_argument("--iterations-per-second", type=float, default=2, help="Per experiment")
+    parser.add_argument("--scalars-per-iteration", type=int, default=20)
+    parser.add_argument("--plot-every", type=int, default=20, help="Iterations between plots and debug images")
+    parser.add_argument("--debug-image-kib", type=int, default=64)
+    parser.add_argument("--artifact-workers", type=int, default=2)
+    parser.add_argument("--artifact-sizes", type=int, nargs="+", default=[4, 1024, 32 * 1024], help="KiB")
+    parser.add_argument("--ui-users", type=int, default=4, help="Concurrent users browsing the web UI")
+    parser.add_argument("--ui-think-time", type=float, default=1.0, help="Mean seconds between two UI pages")
+    parser.add_argument("--enqueue-workers", type=int, default=1)
+    parser.add_argument("--burst-size", type=int, default=50)
+    parser.add_argument("--burst-interval", type=float, default=10.0, help="Seconds between bursts")
+    parser.add_argument("--output", help="Write the results as JSON, e.g. to compare with --baseline later")
+    parser.add_argument("--baseline", help="Results of an earlier run (--output) to compare the p90s with")
+    parser.add_argument("--keep", action="store_true", help="Do not delete the tasks and files of the run")
+    args = parser.parse_args()
+
+    recorder = LatencyRecorder()
+    client = ClearMLClient(
+        api_host=args.api_host,
+        files_host=args.files_host,
+        access_key=os.environ["CLEARML_API_ACCESS_KEY"],
+        secret_key=os.environ["CLEARML_API_SECRET_KEY"],
+        recorder=recorder,
+    )
+    run = LoadRun(client, args)
+    workers: List[Callable[[], None]] = [
+        *[lambda index=index: run.experiment(index) for index in range(args.experiments)],
+        *[lambda index=index: run.artifacts(index) for index in range(args.artifact_workers)],
+        *[lambda index=index: run.ui(index) for index in range(args.ui_users)],
+        *[lambda index=index: run.enqueue_bursts(index) for index in range(args.enqueue_workers)],
+    ]
+    print(f"Run {run.run_id}: {len(workers)} workers for {args.duration:g} seconds against {args.api_host}")
+    started_at = time.monotonic()
+    try:
+        run_workers(workers)
+    finally:
+        stats = recorder.stats(time.monotonic() - started_at)
+        if not args.keep:
+            run.cleanup()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = {row["endpoint"]: row for row in json.load(baseline_file)["endpoints"]}
+    print_stats(stats, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump({"args": vars(args), "endpoints": [asdict(row) for row in stats]}, output_file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
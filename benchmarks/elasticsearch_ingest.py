@@ -0,0 +1,192 @@
+"""
+Benchmark of the event ingest rate of Elasticsearch with and without the event index template.
+
+ClearML reports scalars and console logs as ``_bulk`` requests to ``events-<type>-<company>`` indices.
+This replays such requests from concurrent reporters against a local Elasticsearch container, of
+the same image as ``docker-compose.yml``, in two setups:
+
+- ``defaults``: the event indices are created with Elasticsearch's defaults, as on a server
+  without the tuning (one shard, one unassignable replica, a 1s refresh interval);
+- ``tuned``: the index template of ``elasticsearch_index_maintenance.py`` is applied first.
+
+Both setups map the event fields like the apiserver's templates (keywords rather than text), and
+report the events per second and the size of the indices once merged:
+
+    python benchmarks/elasticsearch_ingest.py --events 200000 --reporters 8 --batch-size 500
+
+Needs docker; the port must be free. Only the standard library is needed otherwise.
+"""
+
+import json
+import random
+import statistics
+import subprocess
+import time
+import urllib.request
+import uuid
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import List
+
+from cdk_clearml.elasticsearch_index_maintenance import INDEX_TEMPLATE_NAME, Elasticsearch, apply_template
+from cdk_clearml.elasticsearch_tuning import ElasticsearchTuningConfig
+
+ELASTICSEARCH_IMAGE = "docker.elastic.co/elasticsearch/elasticsearch:7.16.2"
+ELASTICSEARCH_CONTAINER_NAME = "clearml-elasticsearch-ingest-benchmark"
+COMPANY_ID = "benchmark"
+
+# a stand-in for the apiserver's event templates, which map the fields as keywords
+APISERVER_LIKE_TEMPLATE = {
+    "index_patterns": ["events-*"],
+    "order": 0,
+    "mappings": {
+        "dynamic": "strict",
+        "properties": {
+            "@timestamp": {"type": "date"},
+            "timestamp": {"type": "date"},
+            "task": {"type": "keyword"},
+            "type": {"type": "keyword"},
+            "worker": {"type": "keyword"},
+            "iter": {"type": "long"},
+            "metric": {"type": "keyword"},
+            "variant": {"type": "keyword"},
+            "value": {"type": "float"},
+            "level": {"type": "keyword"},
+            "msg": {"type": "text", "index": False},
+        },
+    },
+}
+
+
+@dataclass
+class IngestResult:
+    setup: str
+    events_per_second: float
+    store_mib: float
+
+
+def docker(*args: str, check: bool = True) -> None:
+    subprocess.run(["docker", *args], check=check, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def wait_until_healthy(url: str, timeout_seconds: float = 120) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    while True:
+        try:
+            with urllib.request.urlopen(f"{url}/_cluster/health?wait_for_status=yellow&timeout=1s", timeout=5):
+                return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(2)
+
+
+def start_elasticsearch(port: int) -> str:
+    docker("rm", "--force", ELASTICSEARCH_CONTAINER_NAME, check=False)
+    docker(
+        "run",
+        "--detach",
+        "--name",
+        ELASTICSEARCH_CONTAINER_NAME,
+        "--publish",
+        f"{port}:9200",
+        "--env",
+        "discovery.type=single-node",
+        "--env",
+        "xpack.security.enabled=false",
+        "--env",
+        "ES_JAVA_OPTS=-Xms1g -Xmx1g",
+        ELASTICSEARCH_IMAGE,
+    )
+    url = f"http://localhost:{port}"
+    wait_until_healthy(url)
+    return url
+
+
+def event_batch(task_id: str, first_iteration: int, batch_size: int) -> bytes:
+    """A ``_bulk`` body of scalar and log events, like a task's reporter sends them."""
+    lines = []
+    now_ms = int(time.time() * 1000)
+    for i in range(batch_size):
+        iteration = first_iteration + i
+        event = {"@timestamp": now_ms, "timestamp": now_ms, "task": task_id, "worker": "benchmark", "iter": iteration}
+        if i % 4:
+            index = f"events-training_stats_scalar-{COMPANY_ID}"
+            event.update(type="training_stats_scalar", metric="loss", variant=f"v{i % 8}", value=random.random())
+        else:
+            index = f"events-log-{COMPANY_ID}"
+            event.update(type="log", level="info", msg=f"iteration {iteration}: loss={random.random():.6f}")
+        lines += [json.dumps({"index": {"_index": index}}), json.dumps(event)]
+    return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def bulk(url: str, body: bytes) -> None:
+    request = urllib.request.Request(
+        f"{url}/_bulk", method="POST", data=body, headers={"Content-Type": "application/x-ndjson"}
+    )
+    with urllib.request.urlopen(request, timeout=120) as response:
+        if json.loads(response.read())["errors"]:
+            raise RuntimeError("The bulk request had errors")
+
+
+def report(url: str, events: int, batch_size: int) -> None:
+    task_id = uuid.uuid4().hex
+    for first_iteration in range(0, events, batch_size):
+        bulk(url, event_batch(task_id, first_iteration, min(batch_size, events - first_iteration)))
+
+
+def measure(url: str, setup: str, events: int, reporters: int, batch_size: int) -> IngestResult:
+    elasticsearch = Elasticsearch(url=url)
+    elasticsearch.request("DELETE", "/events-*?allow_no_indices=true")
+    elasticsearch.request("PUT", "/_template/apiserver-like-events", APISERVER_LIKE_TEMPLATE)
+    try:
+        elasticsearch.request("DELETE", f"/_template/{INDEX_TEMPLATE_NAME}")
+    except RuntimeError:
+        pass  # not applied yet
+    if setup == "tuned":
+        config = ElasticsearchTuningConfig()
+        apply_template(elasticsearch, config.number_of_shards, config.refresh_interval, config.best_compression)
+    # create the indices up front, so that their creation is not timed
+    bulk(url, event_batch("warmup", 0, 4))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=reporters) as executor:
+        for future in [executor.submit(report, url, events // reporters, batch_size) for _ in range(reporters)]:
+            future.result()
+    elasticsearch.request("POST", "/events-*/_refresh")
+    seconds = time.perf_counter() - start
+
+    elasticsearch.request("POST", "/events-*/_forcemerge?max_num_segments=1")
+    store_bytes = elasticsearch.request("GET", "/events-*/_stats/store")["_all"]["primaries"]["store"]["size_in_bytes"]
+    return IngestResult(setup, (events // reporters) * reporters / seconds, store_bytes / 2**20)
+
+
+def main():
+    parser = ArgumentParser(description="Compare the event ingest rate of Elasticsearch with and without tuning")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--reporters", type=int, default=8, help="Concurrent tasks reporting events")
+    parser.add_argument("--batch-size", type=int, default=500, help="Events per _bulk request")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--port", type=int, default=9201)
+    args = parser.parse_args()
+
+    url = start_elasticsearch(args.port)
+    try:
+        runs: List[List[IngestResult]] = [
+            [measure(url, setup, args.events, args.reporters, args.batch_size) for setup in ("defaults", "tuned")]
+            for _ in range(args.repeats)
+        ]
+    finally:
+        docker("rm", "--force", ELASTICSEARCH_CONTAINER_NAME, check=False)
+
+    print(f"events={args.events} reporters={args.reporters} batch_size={args.batch_size} repeats={args.repeats}")
+    print(f"{'setup':<10} {'events/s (median)':>18} {'store MiB':>10}")
+    for setup_runs in zip(*runs):
+        events_per_second = statistics.median(result.events_per_second for result in setup_runs)
+        store_mib = statistics.median(result.store_mib for result in setup_runs)
+        print(f"{setup_runs[0].setup:<10} {events_per_second:>18,.0f} {store_mib:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/bin/bash
+
+# Run the ClearML server of this repository's docker-compose.yml on this Linux host, for
+# benchmarks/clearml_load.py and benchmarks/update_downtime.py.
+#
+# The .env is rendered from a capacity profile, as on the deployed server; any CLEARML_* variable
+# set in the environment overrides it, which is how tuning changes are compared:
+#
+#     CAPACITY_PROFILE=medium benchmarks/run-local-clearml.sh up
+#     CLEARML_ES_JAVA_OPTS="-Xms4g -Xmx4g" CLEARML_GUNICORN_WORKERS=16 benchmarks/run-local-clearml.sh up
+#     benchmarks/run-local-clearml.sh down     # stops the server and deletes its data
+#
+# Data lives in $CLEARML_LOCAL_DIR (default /tmp/clearml-local), so point it at the disk under
+# test to compare volumes. Elasticsearch needs vm.max_map_count >= 262144 on the host.
+
+set -euo pipefail
+
+THIS_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+REPO_DIR="$(dirname "$THIS_DIR")"
+WORK_DIR="${CLEARML_LOCAL_DIR:-/tmp/clearml-local}"
+CAPACITY_PROFILE="${CAPACITY_PROFILE:-medium}"
+
+function compose() {
+    docker-compose --project-name clearml-local -f "$WORK_DIR/docker-compose.yml" "$@"
+}
+
+function up() {
+    if [ "$(sysctl -n vm.max_map_count)" -lt 262144 ]; then
+        echo "Elasticsearch needs vm.max_map_count >= 262144: sudo sysctl -w vm.max_map_count=262144" >&2
+        exit 1
+    fi
+
+    mkdir -p "$WORK_DIR"
+    cp "$REPO_DIR/src/cdk_clearml/resources/docker-compose.yml" "$WORK_DIR/docker-compose.yml"
+    PYTHONPATH="$REPO_DIR/src" python3 -c "
+from cdk_clearml.capacity import CapacityProfile, render_docker_compose_env
+print(render_docker_compose_env(CapacityProfile.preset('$CAPACITY_PROFILE')), end='')
+" > "$WORK_DIR/.env"
+    echo "ELASTIC_PASSWORD=${ELASTIC_PASSWORD:-clearml-local}" >> "$WORK_DIR/.env"
+
+    # the same directories as prepare_directories in user-data.template.sh
+    install -d -m 0777 \
+        "$WORK_DIR/opt/clearml/logs" \
+        "$WORK_DIR/opt/clearml/config" \
+        "$WORK_DIR/opt/clearml/agent" \
+        "$WORK_DIR/opt/clearml/data/fileserver" \
+        "$WORK_DIR/opt/clearml/data/elastic_7" \
+        "$WORK_DIR/opt/clearml/data/elastic_backup" \
+        "$WORK_DIR/opt/clearml/data/mongo_4/db" \
+        "$WORK_DIR/opt/clearml/data/mongo_4/configdb" \
+        "$WORK_DIR/opt/clearml/data/redis" \
+        "$WORK_DIR/usr/share/elasticsearch/logs"
+
+    compose up -d
+    curl --silent --fail --retry 120 --retry-delay 2 --retry-connrefused --retry-max-time 600 \
+        'http://localhost:8008/debug.ping' > /dev/null
+
+    echo "--- the server is up, sized by $WORK_DIR/.env and the environment: ---"
+    cat "$WORK_DIR/.env"
+    env | grep '^CLEARML_' || true
+    echo "Create credentials in the web UI (http://localhost:8080, Settings > Workspace), then:"
+    echo "    export CLEARML_API_ACCESS_KEY=... CLEARML_API_SECRET_KEY=..."
+    echo "    python benchmarks/clearml_load.py --output results.json"
+}
+
+function down() {
+    compose down --volumes
+    # the data directories are owned by the containers' users
+    docker run --rm -v "$WORK_DIR:/work" alpine rm -rf /work/opt /work/usr
+}
+
+case "${1:-up}" in
+    up) up ;;
+    down) down ;;
+    *) echo "Usage: $0 [up|down]" >&2; exit 1 ;;
+esac
@@ -0,0 +1,83 @@
+"""
+Benchmark of ``s3_batch_delete.py`` against in-memory stand-ins for S3 (moto) and Mongo (mongomock).
+
+Compares objects deleted per second when deleting one object per request (like the fileserver's
+``async_delete`` service) with ``DeleteObjects`` batches of increasing size:
+
+    pip install -e .[benchmarks]
+    python benchmarks/s3_batch_delete.py --objects 5000
+
+The absolute numbers reflect moto's overhead rather than S3 latency; the ratio between the
+batch sizes is what matters, since every request to real S3 costs a round trip.
+"""
+
+import uuid
+from argparse import ArgumentParser
+from typing import List
+
+import boto3
+import mongomock
+from moto import mock_s3
+
+from cdk_clearml.s3_batch_delete import S3BatchDeleter
+
+BUCKET_NAME = "clearml-artifact-storage-benchmark"
+
+
+def populate(s3_client, collection, num_objects: int) -> None:
+    """Upload tiny objects and record a ClearML delete request for each of them."""
+    requests = []
+    for i in range(num_objects):
+        key = f"artifacts/project/task-{i // 100}/artifact-{i}.bin"
+        s3_client.put_object(Bucket=BUCKET_NAME, Key=key, Body=b"x")
+        requests.append({"_id": uuid.uuid4().hex, "url": f"s3://{BUCKET_NAME}/{key}", "type": "artifact"})
+    collection.insert_many(requests)
+
+
+def benchmark(num_objects: int, batch_size: int, concurrency: int) -> float:
+    """Delete ``num_objects`` objects and return the objects deleted per second."""
+    with mock_s3():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=BUCKET_NAME)
+        collection = mongomock.MongoClient()["backend"]["url_to_delete"]
+        populate(s3_client, collection, num_objects)
+
+        deleter = S3BatchDeleter(
+            collection=collection,
+            s3_client=s3_client,
+            bucket_name=BUCKET_NAME,
+            batch_size=batch_size,
+            concurrency=concurrency,
+        )
+        deleted, duration_seconds = 0, 0.0
+        while True:
+            result = deleter.run_once()
+            if not result.deleted:
+                break
+            deleted += result.deleted
+            duration_seconds += result.duration_seconds
+
+        remaining_objects = s3_client.list_objects_v2(Bucket=BUCKET_NAME).get("KeyCount", 0)
+        assert deleted == num_objects and remaining_objects == 0, (deleted, remaining_objects)
+        return deleted / duration_seconds
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objects", type=int, default=5000)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    results: List[str] = []
+    for batch_size in args.batch_sizes:
+        objects_per_second = benchmark(args.objects, batch_size=batch_size, concurrency=args.concurrency)
+        results.append(
+            f"batch_size={batch_size:>5} concurrency={args.concurrency} objects_per_second={objects_per_second:,.0f}"
+        )
+
+    print("\n".join(results))
+
+
+if __name__ == "__main__":
+    main()
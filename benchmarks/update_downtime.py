@@ -0,0 +1,253 @@
+"""
+Downtime of the ClearML server while a configuration change is applied, by change type and update strategy.
+
+Runs against the server of ``benchmarks/run-local-clearml.sh up``. Every change is made to the files in
+``$CLEARML_LOCAL_DIR``, as cfn-init makes it on the instance, and applied with one of:
+
+- ``rolling``: ``update-clearml-server.sh roll``, what cfn-hup runs on the instance: only the containers whose
+  configuration changed are recreated, one service at a time;
+- ``restart``: ``docker-compose down`` and ``up -d``, a lower bound of replacing the instance, which also boots
+  and bootstraps a new one (the ``TimeToFirstPingSeconds`` metric measures that part).
+
+Meanwhile the API server, the webserver, and the fileserver are probed every 50 ms; the downtime of an endpoint
+is its longest run of failed probes. Each change is reverted with a rolling update, untimed, before the next:
+
+    benchmarks/run-local-clearml.sh up
+    python benchmarks/update_downtime.py --repeats 3
+
+Needs docker and docker-compose. Only the standard library is needed otherwise.
+"""
+
+import os
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+REPO_DIR = Path(__file__).parents[1]
+UPDATE_SCRIPT_FPATH = REPO_DIR / "src/cdk_clearml/resources/update-clearml-server.sh"
+COMPOSE_PROJECT_NAME = "clearml-local"
+
+ENDPOINTS = {
+    "apiserver": "http://localhost:8008/debug.ping",
+    "webserver": "http://localhost:8080/",
+    "fileserver": "http://localhost:8081/",
+}
+PROBE_INTERVAL_SECONDS = 0.05
+STRATEGIES = ["rolling", "restart"]
+
+
+@dataclass
+class UpdateResult:
+    change: str
+    strategy: str
+    apply_seconds: float
+    downtime_seconds: Dict[str, float]
+
+
+class Prober:
+    """Requests ``url`` every ``PROBE_INTERVAL_SECONDS`` in a thread; any HTTP response counts as up."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.samples: List[Tuple[float, bool]] = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                with urllib.request.urlopen(self.url, timeout=1):
+                    up = True
+            except urllib.error.HTTPError:
+                up = True
+            except OSError:
+                up = False
+            self.samples.append((started, up))
+            self._stop.wait(max(0.0, PROBE_INTERVAL_SECONDS - (time.monotonic() - started)))
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def longest_outage(self) -> float:
+        """Seconds from the first failed probe of the longest outage to the next successful one."""
+        longest = 0.0
+        outage_start: Optional[float] = None
+        for started, up in self.samples:
+            if not up and outage_start is None:
+                outage_start = started
+            elif up and outage_start is not None:
+                longest = max(longest, started - outage_start)
+                outage_start = None
+        if outage_start is not None:
+            longest = max(longest, self.samples[-1][0] - outage_start)
+        return longest
+
+
+def set_env(work_dir: Path, name: str, value: Optional[str]) -> Optional[str]:
+    """Set (or unset, if ``value`` is None) a variable of the .env file; returns its previous value."""
+    env_fpath = work_dir / ".env"
+    lines = env_fpath.read_text(encoding="utf-8").splitlines()
+    previous = next((line.partition("=")[2] for line in lines if line.startswith(f"{name}=")), None)
+    lines = [line for line in lines if not line.startswith(f"{name}=")]
+    if value is not None:
+        lines.append(f"{name}={value}")
+    env_fpath.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return previous
+
+
+def change_env(work_dir: Path) -> Callable[[], None]:
+    """An apiserver setting: only the apiserver is recreated."""
+    previous = set_env(work_dir, "CLEARML_GUNICORN_WORKERS", "3")
+    return lambda: set_env(work_dir, "CLEARML_GUNICORN_WORKERS", previous)
+
+
+def change_data_store(work_dir: Path) -> Callable[[], None]:
+    """The memory limit of Redis: only Redis is recreated."""
+    previous = set_env(work_dir, "CLEARML_REDIS_MAXMEMORY_MB", "256")
+    return lambda: set_env(work_dir, "CLEARML_REDIS_MAXMEMORY_MB", previous)
+
+
+def change_compose(work_dir: Path) -> Callable[[], None]:
+    """The webserver's service definition: only the webserver is recreated."""
+    compose_fpath = work_dir / "docker-compose.yml"
+    original = compose_fpath.read_text(encoding="utf-8")
+    changed = original.replace("  webserver:\n", '  webserver:\n    labels:\n      clearml.benchmark: "1"\n', 1)
+    if changed == original:
+        raise RuntimeError(f"No webserver service in {compose_fpath}")
+    compose_fpath.write_text(changed, encoding="utf-8")
+    return lambda: compose_fpath.write_text(original, encoding="utf-8")
+
+
+def change_config(work_dir: Path) -> Callable[[], None]:
+    """A file in opt/clearml/config: the apiserver and the fileserver, which mount it, are recreated."""
+    config_fpath = work_dir / "opt/clearml/config/benchmark.conf"
+    config_fpath.write_text(f"# {time.time()}\n", encoding="utf-8")
+    return config_fpath.unlink
+
+
+CHANGES: Dict[str, Optional[Callable[[Path], Callable[[], None]]]] = {
+    "none": None,
+    "env": change_env,
+    "data-store": change_data_store,
+    "compose": change_compose,
+    "config": change_config,
+}
+
+
+def compose_env(work_dir: Path, state_dir: Path) -> Dict[str, str]:
+    """The environment of update-clearml-server.sh and docker-compose for the local server."""
+    return {
+        **os.environ,
+        "WORKDIR": str(work_dir),
+        "DOCKER_COMPOSE_FPATH": str(work_dir / "docker-compose.yml"),
+        "STATE_DIR": str(state_dir),
+        "COMPOSE_PROJECT_NAME": COMPOSE_PROJECT_NAME,
+    }
+
+
+def roll(env: Dict[str, str]) -> None:
+    subprocess.run(["bash", str(UPDATE_SCRIPT_FPATH), "roll"], env=env, check=True, stdout=subprocess.DEVNULL)
+
+
+def restart(env: Dict[str, str]) -> None:
+    compose = ["docker-compose", "-f", env["DOCKER_COMPOSE_FPATH"]]
+    subprocess.run([*compose, "down"], env=env, check=True, stderr=subprocess.DEVNULL)
+    subprocess.run([*compose, "up", "-d"], env=env, check=True, stderr=subprocess.DEVNULL)
+
+
+def wait_until_up(timeout_seconds: float = 600) -> None:
+    deadline = time.monotonic() + timeout_seconds
+    for url in ENDPOINTS.values():
+        while True:
+            try:
+                with urllib.request.urlopen(url, timeout=1):
+                    break
+            except urllib.error.HTTPError:
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+
+def measure(work_dir: Path, env: Dict[str, str], change: str, strategy: str) -> UpdateResult:
+    make_change = CHANGES[change]
+    revert = make_change(work_dir) if make_change else None
+    probers = {endpoint: Prober(url) for endpoint, url in ENDPOINTS.items()}
+    for prober in probers.values():
+        prober.start()
+    start = time.perf_counter()
+    if strategy == "rolling":
+        roll(env)
+    else:
+        restart(env)
+    wait_until_up()
+    apply_seconds = time.perf_counter() - start
+    # outages that only start once the containers run, e.g. while the apiserver loads
+    time.sleep(2)
+    for prober in probers.values():
+        prober.stop()
+
+    if revert:
+        revert()
+        roll(env)
+        wait_until_up()
+    return UpdateResult(
+        change, strategy, apply_seconds, {endpoint: prober.longest_outage() for endpoint, prober in probers.items()}
+    )
+
+
+def main():
+    parser = ArgumentParser(description="Measure the downtime of configuration changes of the local ClearML server")
+    parser.add_argument(
+        "--work-dir", type=Path, default=Path(os.environ.get("CLEARML_LOCAL_DIR", "/tmp/clearml-local"))
+    )
+    parser.add_argument("--changes", nargs="*", choices=list(CHANGES), default=list(CHANGES))
+    parser.add_argument("--strategies", nargs="*", choices=STRATEGIES, default=STRATEGIES)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    if not (args.work_dir / "docker-compose.yml").exists():
+        parser.error(f"No server in {args.work_dir}: run benchmarks/run-local-clearml.sh up first")
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = compose_env(args.work_dir, Path(state_dir))
+        # records the checksum of the configuration files
+        roll(env)
+        wait_until_up()
+        results = [
+            measure(args.work_dir, env, change, strategy)
+            for change in args.changes
+            for strategy in args.strategies
+            for _ in range(args.repeats)
+        ]
+
+    print(f"repeats={args.repeats}; downtime is the longest outage of each endpoint, median over the repeats")
+    print(f"{'change':<11} {'strategy':<8} {'apply s':>8} " + " ".join(f"{endpoint:>11}" for endpoint in ENDPOINTS))
+    for change in args.changes:
+        for strategy in args.strategies:
+            runs = [result for result in results if result.change == change and result.strategy == strategy]
+            apply_seconds = statistics.median(result.apply_seconds for result in runs)
+            downtimes = [
+                statistics.median(result.downtime_seconds[endpoint] for result in runs) for endpoint in ENDPOINTS
+            ]
+            print(
+                f"{change:<11} {strategy:<8} {apply_seconds:>8.1f} "
+                + " ".join(f"{downtime:>10.2f}s" for downtime in downtimes)
+            )
+
+
+if __name__ == "__main__":
+    main()
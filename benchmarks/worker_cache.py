@@ -0,0 +1,149 @@
+"""
+Benchmark of the task start latency of a worker with and without the caches of ``cdk_clearml.worker_cache``.
+
+Starting a task means pulling its docker image and installing its requirements in a container.
+This is timed on the local docker daemon in three setups:
+
+- ``no-cache``: the image comes from its upstream registry and pip downloads from PyPI, as on a
+  fresh worker without the worker cache;
+- ``pull-through``: the image comes from a local ``registry:2`` in pull-through mode and the
+  packages from a local wheelhouse, standing in for the ECR pull-through cache and the
+  CodeArtifact PyPI proxy inside the VPC. Both are primed before timing;
+- ``node-local``: the image is already in the docker store and pip finds the packages in its
+  cache, as on a worker whose cache volume was used before (or restored from a snapshot).
+
+    python benchmarks/worker_cache.py --image python:3.9-slim --packages numpy pandas --repeats 3
+
+Needs docker and network access; the ports of the stand-ins must be free. Only the standard
+library is needed otherwise.
+"""
+
+import statistics
+import subprocess
+import tempfile
+import time
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, List
+
+REGISTRY_CONTAINER_NAME = "clearml-worker-cache-benchmark-registry"
+
+
+@dataclass
+class StartLatency:
+    setup: str
+    pull_seconds: float
+    install_seconds: float
+
+    @property
+    def total_seconds(self) -> float:
+        return self.pull_seconds + self.install_seconds
+
+
+def docker(*args: str, check: bool = True) -> None:
+    subprocess.run(["docker", *args], check=check, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def timed(*args: str) -> float:
+    start = time.perf_counter()
+    docker(*args)
+    return time.perf_counter() - start
+
+
+@contextmanager
+def pull_through_registry(port: int) -> Iterator[str]:
+    """A local ``registry:2`` that caches Docker Hub, like an ECR pull-through cache rule."""
+    docker("rm", "--force", REGISTRY_CONTAINER_NAME, check=False)
+    docker(
+        "run",
+        "--detach",
+        "--name",
+        REGISTRY_CONTAINER_NAME,
+        "--publish",
+        f"{port}:5000",
+        "--env",
+        "REGISTRY_PROXY_REMOTEURL=https://registry-1.docker.io",
+        "registry:2",
+    )
+    try:
+        time.sleep(2)
+        yield f"localhost:{port}"
+    finally:
+        docker("rm", "--force", REGISTRY_CONTAINER_NAME, check=False)
+
+
+@contextmanager
+def wheelhouse_index(image: str, packages: List[str], port: int) -> Iterator[str]:
+    """The wheels of ``packages`` for ``image``, served over HTTP like a PyPI proxy."""
+    with tempfile.TemporaryDirectory() as wheelhouse:
+        volume = f"{wheelhouse}:/wheelhouse"
+        docker("run", "--rm", "--volume", volume, image, "pip", "download", "--dest", "/wheelhouse", *packages)
+        server = subprocess.Popen(
+            ["python", "-m", "http.server", str(port), "--directory", wheelhouse],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            time.sleep(1)
+            yield f"http://localhost:{port}/"
+        finally:
+            server.terminate()
+            server.wait()
+
+
+def pip_install(image: str, packages: List[str], *pip_args: str, docker_args: List[str] = ()) -> float:
+    return timed("run", "--rm", "--network", "host", *docker_args, image, "pip", "install", *pip_args, *packages)
+
+
+def measure(image: str, packages: List[str], registry_port: int, wheelhouse_port: int) -> List[StartLatency]:
+    latencies = []
+
+    docker("rmi", "--force", image, check=False)
+    pull_seconds = timed("pull", image)
+    latencies.append(StartLatency("no-cache", pull_seconds, pip_install(image, packages, "--no-cache-dir")))
+
+    # Docker Hub's official images live under library/ in the registry
+    repository = image if "/" in image.split(":")[0] else f"library/{image}"
+    with pull_through_registry(registry_port) as registry, wheelhouse_index(image, packages, wheelhouse_port) as index:
+        cached_image = f"{registry}/{repository}"
+        docker("pull", cached_image)
+        docker("rmi", "--force", cached_image)
+        pull_seconds = timed("pull", cached_image)
+        install_seconds = pip_install(cached_image, packages, "--no-cache-dir", "--no-index", "--find-links", index)
+        latencies.append(StartLatency("pull-through", pull_seconds, install_seconds))
+        docker("rmi", "--force", cached_image, check=False)
+
+    with tempfile.TemporaryDirectory() as pip_cache:
+        cache_volume = ["--volume", f"{pip_cache}:/root/.cache/pip"]
+        pip_install(image, packages, docker_args=cache_volume)
+        pull_seconds = timed("pull", image)
+        install_seconds = pip_install(image, packages, "--prefer-binary", docker_args=cache_volume)
+        latencies.append(StartLatency("node-local", pull_seconds, install_seconds))
+    return latencies
+
+
+def main():
+    parser = ArgumentParser(description="Compare task start latency with and without the worker caches")
+    parser.add_argument("--image", default="python:3.9-slim")
+    parser.add_argument("--packages", nargs="+", default=["numpy", "pandas", "scikit-learn"])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--registry-port", type=int, default=5000)
+    parser.add_argument("--wheelhouse-port", type=int, default=8000)
+    args = parser.parse_args()
+
+    runs: List[List[StartLatency]] = [
+        measure(args.image, args.packages, args.registry_port, args.wheelhouse_port) for _ in range(args.repeats)
+    ]
+    print(f"image={args.image} packages={' '.join(args.packages)} repeats={args.repeats} (medians)")
+    for setup_runs in zip(*runs):
+        setup = setup_runs[0].setup
+        print(
+            f"  {setup:<13} pull={statistics.median(run.pull_seconds for run in setup_runs):6.1f}s "
+            f"pip_install={statistics.median(run.install_seconds for run in setup_runs):6.1f}s "
+            f"task_start={statistics.median(run.total_seconds for run in setup_runs):6.1f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+S3 artifact storage for ClearML agents and SDK clients.
+
+By default, artifacts, models, and debug images are uploaded to the ClearML fileserver, so
+every upload and download streams through the server instance and the ALB. In S3 artifact
+mode, clients write straight to the artifact bucket instead, using the ``clearml.conf``
+rendered here.
+"""
+
+from typing import Dict, Optional
+
+from pydantic import BaseModel, validator
+
+MIB = 1024 * 1024
+
+
+class ArtifactStorageConfig(BaseModel):
+    """
+    Where in the artifact bucket ClearML writes, and how boto3 transfers large files.
+
+    Transfers larger than ``multipart_threshold_mib`` are split into ``multipart_chunksize_mib``
+    parts, uploaded with up to ``max_multipart_concurrency`` threads per file.
+    """
+
+    artifacts_prefix: str = "artifacts"
+    debug_images_prefix: str = "debug-images"
+    multipart_threshold_mib: int = 64
+    multipart_chunksize_mib: int = 64
+    max_multipart_concurrency: int = 16
+    pool_connections: int = 512
+
+    @validator("artifacts_prefix", "debug_images_prefix")
+    def prefix_must_not_have_slashes_at_the_ends(cls, prefix: str) -> str:  # noqa: N805
+        if not prefix or prefix != prefix.strip("/"):
+            raise ValueError(f"'{prefix}' must be a non-empty prefix without leading or trailing slashes")
+        return prefix
+
+    @validator("multipart_chunksize_mib")
+    def chunksize_must_be_an_s3_part_size(cls, multipart_chunksize_mib: int) -> int:  # noqa: N805
+        # S3 parts (except the last one) must be at least 5 MiB, and at most 5 GiB
+        if not 5 <= multipart_chunksize_mib <= 5 * 1024:
+            raise ValueError(f"S3 parts must be between 5 MiB and 5 GiB, got {multipart_chunksize_mib} MiB")
+        return multipart_chunksize_mib
+
+
+class ArtifactBucketLifecycleConfig(BaseModel):
+    """
+    Lifecycle rules of the artifact bucket.
+
+    :param intelligent_tiering_after_days: Days after which objects move to S3 Intelligent-Tiering,
+        which moves artifacts nobody reads to cheaper tiers on its own. ``None`` disables the transition.
+    :param expire_after_days_by_prefix: Objects under each prefix (e.g. debug samples) are deleted
+        this many days after they were written.
+    :param abort_incomplete_multipart_uploads_after_days: Parts of uploads that never completed,
+        e.g. of an interrupted checkpoint upload, are billed until they are aborted.
+    """
+
+    intelligent_tiering_after_days: Optional[int] = 0
+    expire_after_days_by_prefix: Dict[str, int] = {"debug-images/": 30}
+    abort_incomplete_multipart_uploads_after_days: int = 7
+
+    @validator("expire_after_days_by_prefix")
+    def expiration_must_be_positive(cls, expire_after_days_by_prefix: Dict[str, int]) -> Dict[str, int]:  # noqa: N805
+        for prefix, days in expire_after_days_by_prefix.items():
+            if days < 1:
+                raise ValueError(f"Objects under '{prefix}' must expire after at least 1 day, got {days}")
+        return expire_after_days_by_prefix
+
+
+def render_agent_clearml_conf(bucket_name: str, aws_region: str, config: ArtifactStorageConfig) -> str:
+    """
+    Render the ``clearml.conf`` section that points ClearML at the artifact bucket.
+
+    It is meant for the autoscaler's ``extra_clearml_conf``, so it is merged into the
+    ``clearml.conf`` of every autoscaled agent. The agents authenticate with their instance
+    profile (``AutoscaledEc2InstanceProfile``) through the default credentials chain.
+    """
+    return f"""\
+api {{
+    # debug images and other files the SDK would upload to the fileserver
+    files_server: "s3://{bucket_name}/{config.debug_images_prefix}"
+}}
+sdk {{
+    development {{
+        # models and artifacts of every task
+        default_output_uri: "s3://{bucket_name}/{config.artifacts_prefix}"
+    }}
+    aws {{
+        s3 {{
+            region: "{aws_region}"
+            use_credentials_chain: true
+        }}
+        boto3 {{
+            pool_connections: {config.pool_connections}
+            max_multipart_concurrency: {config.max_multipart_concurrency}
+            multipart_threshold: {config.multipart_threshold_mib * MIB}
+            multipart_chunksize: {config.multipart_chunksize_mib * MIB}
+        }}
+    }}
+}}
+"""
@@ -0,0 +1,3 @@
+from cdk_clearml.autoscaler.cli import main
+
+main()
@@ -0,0 +1,193 @@
+"""
+Bin-packing of queued tasks onto GPU instances.
+
+By default, the autoscaler launches one instance per queued task and runs a single agent on it,
+so a 4-GPU instance runs one task even if it only needs one GPU. Here, every task declares what
+it needs with tags on the task,
+
+    gpus=2          # default: 1
+    memory_gib=48   # default: 0, i.e. any instance with enough GPUs will do
+
+and the tasks are packed onto the cheapest mix of the instance types the queue may use. Each
+packed instance runs one agent daemon per task, pinned to that task's GPUs with ``--gpus``. A
+daemon pinned to ``n`` GPUs serves the ``<queue>-<n>gpu`` queue, so it only pulls tasks that
+fit its GPUs; ``gpu_queue_name`` builds those names.
+
+Memory is only accounted for when packing; the daemons do not limit the memory of their tasks.
+
+This module does not import ``clearml``; ``scaler.py`` plugs it into the real ``AutoScaler``.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# the extra agent daemons of an instance report as "<worker prefix>:<instance id>-gpu<indices>"
+AGENT_WORKER_ID_SEPARATOR = "-gpu"
+GPUS_TAG_PATTERN = re.compile(r"^gpus=(?P<value>\d+)$")
+MEMORY_GIB_TAG_PATTERN = re.compile(r"^memory_gib=(?P<value>\d+(\.\d+)?)$")
+
+
+@dataclass(frozen=True)
+class ResourceRequest:
+    """The GPUs and memory a task needs."""
+
+    gpus: int = 1
+    memory_gib: float = 0.0
+
+
+@dataclass(frozen=True)
+class InstanceOption:
+    """
+    An instance type a queue may scale out to, from ``resource_configurations``.
+
+    :param resource_name: Key of the resource in ``resource_configurations``.
+    :param hourly_price: On-demand (or expected spot) price in USD; only compared between options.
+    :param max_instances: Instances of this resource that may run at once.
+    """
+
+    resource_name: str
+    gpus: int
+    memory_gib: float
+    hourly_price: float
+    max_instances: int
+
+
+@dataclass
+class PackedInstance:
+    """An instance to launch and the queued tasks planned onto it."""
+
+    option: InstanceOption
+    tasks: List[Tuple[str, ResourceRequest]] = field(default_factory=list)
+
+    @property
+    def free_gpus(self) -> int:
+        return self.option.gpus - sum(request.gpus for _, request in self.tasks)
+
+    @property
+    def free_memory_gib(self) -> float:
+        return self.option.memory_gib - sum(request.memory_gib for _, request in self.tasks)
+
+    def fits(self, request: ResourceRequest) -> bool:
+        return request.gpus <= self.free_gpus and request.memory_gib <= self.free_memory_gib
+
+    def agent_gpus(self) -> List[Tuple[int, ...]]:
+        """
+        GPU indices of each agent daemon: one daemon per planned task, then one per leftover GPU.
+
+        The leftover daemons serve single-GPU tasks that are enqueued later.
+        """
+        gpu_counts = [request.gpus for _, request in self.tasks] + [1] * self.free_gpus
+        agent_gpus, first_gpu = [], 0
+        for gpu_count in gpu_counts:
+            agent_gpus.append(tuple(range(first_gpu, first_gpu + gpu_count)))
+            first_gpu += gpu_count
+        return agent_gpus
+
+
+def gpu_queue_name(queue_name: str, gpus: int) -> str:
+    """Queue served by the agent daemons pinned to ``gpus`` GPUs of the instances of ``queue_name``."""
+    return f"{queue_name}-{gpus}gpu"
+
+
+def instance_id_of(cloud_id: str) -> str:
+    """Instance ID of an agent daemon, given the cloud ID part of its worker ID."""
+    return cloud_id.split(AGENT_WORKER_ID_SEPARATOR, 1)[0]
+
+
+def instance_options_from_config(
+    queue_resources: Iterable[Tuple[str, int]], resource_configurations: Dict[str, dict]
+) -> List[InstanceOption]:
+    """
+    Read the instance options of a queue from the autoscaler configuration.
+
+    :param queue_resources: The ``[resource name, max instances]`` pairs of the queue in ``queues``.
+    :raises ValueError: If a resource lacks ``gpus``, ``memory_gib``, or ``hourly_price``.
+    """
+    options = []
+    for resource_name, max_instances in queue_resources:
+        resource_conf = resource_configurations[resource_name]
+        missing_keys = [key for key in ("gpus", "memory_gib", "hourly_price") if key not in resource_conf]
+        if missing_keys:
+            raise ValueError(f"Resource '{resource_name}' needs {missing_keys} to be bin-packed")
+        options.append(
+            InstanceOption(
+                resource_name=resource_name,
+                gpus=int(resource_conf["gpus"]),
+                memory_gib=float(resource_conf["memory_gib"]),
+                hourly_price=float(resource_conf["hourly_price"]),
+                max_instances=int(max_instances),
+            )
+        )
+    return options
+
+
+def parse_resource_request(
+    tags: Optional[Iterable[str]], default: ResourceRequest = ResourceRequest()
+) -> ResourceRequest:
+    """Read the ``gpus=<n>`` and ``memory_gib=<n>`` tags of a task; missing tags keep their default."""
+    gpus, memory_gib = default.gpus, default.memory_gib
+    for tag in tags or []:
+        gpus_match = GPUS_TAG_PATTERN.match(tag.strip())
+        memory_gib_match = MEMORY_GIB_TAG_PATTERN.match(tag.strip())
+        if gpus_match:
+            gpus = int(gpus_match["value"])
+        elif memory_gib_match:
+            memory_gib = float(memory_gib_match["value"])
+    return ResourceRequest(gpus=gpus, memory_gib=memory_gib)
+
+
+def plan_instances(
+    requests: Sequence[Tuple[str, ResourceRequest]],
+    options: Sequence[InstanceOption],
+    running_instances: Optional[Dict[str, int]] = None,
+) -> Tuple[List[PackedInstance], List[str]]:
+    """
+    Pack ``requests`` onto new instances, choosing the instance types with the lowest cost per packed GPU.
+
+    Tasks are placed largest first (first-fit decreasing). A task goes to the planned instance it
+    fills best; if none has room, a new instance is opened. Every option that can take the task
+    and has not reached ``max_instances`` is tried by tentatively packing the remaining tasks onto
+    it, and the one with the lowest ``hourly_price`` per GPU it would put to use wins, so one large
+    instance is preferred to several small ones only when it is actually cheaper.
+
+    :param running_instances: Instances per resource that are already running or booting.
+    :return: The instances to launch, and the IDs of the tasks that no option can take right now.
+    """
+    instance_counts = dict(running_instances or {})
+    pending = sorted(requests, key=lambda item: (item[1].gpus, item[1].memory_gib), reverse=True)
+    planned: List[PackedInstance] = []
+    unplaced: List[str] = []
+
+    for index, (task_id, request) in enumerate(pending):
+        candidates = [instance for instance in planned if instance.fits(request)]
+        if candidates:
+            min(candidates, key=lambda instance: instance.free_gpus - request.gpus).tasks.append((task_id, request))
+            continue
+
+        best_instance: Optional[PackedInstance] = None
+        best_cost_per_gpu = float("inf")
+        for option in options:
+            if instance_counts.get(option.resource_name, 0) >= option.max_instances:
+                continue
+            instance = PackedInstance(option)
+            if not instance.fits(request):
+                continue
+            for remaining_task in [(task_id, request)] + list(pending[index + 1 :]):
+                if instance.fits(remaining_task[1]):
+                    instance.tasks.append(remaining_task)
+            # tasks that need no GPU (gpus=0) only pack onto an instance by their memory
+            cost_per_gpu = option.hourly_price / max(1, option.gpus - instance.free_gpus)
+            if cost_per_gpu < best_cost_per_gpu:
+                best_instance, best_cost_per_gpu = instance, cost_per_gpu
+
+        if best_instance is None:
+            unplaced.append(task_id)
+            continue
+        # only the task itself is placed for now; the rest still compete for the planned instances
+        best_instance.tasks = [(task_id, request)]
+        planned.append(best_instance)
+        resource_name = best_instance.option.resource_name
+        instance_counts[resource_name] = instance_counts.get(resource_name, 0) + 1
+
+    return planned, unplaced
@@ -0,0 +1,104 @@
+"""
+``AWSDriver`` that runs several GPU-pinned agent daemons on the instances ``BinPackingAutoScaler`` packs.
+
+The ClearML bootstrap ends with a single ``clearml_agent daemon --queue <queue>``. For a packed
+instance, that line is replaced by one daemon per entry of its agent layout, e.g. for
+``[(0, 1), (2,), (3,)]``:
+
+    CLEARML_WORKER_ID=$CLEARML_WORKER_ID-gpu2 python -m clearml_agent ... daemon --gpus 2 --queue 'q-1gpu' ... &
+    CLEARML_WORKER_ID=$CLEARML_WORKER_ID-gpu3 python -m clearml_agent ... daemon --gpus 3 --queue 'q-1gpu' ... &
+    python -m clearml_agent ... daemon --gpus 0,1 --queue 'q-2gpu' ...
+
+The first daemon keeps the worker ID the autoscaler waits for after spinning the instance up.
+"""
+
+from typing import List, Tuple
+
+import attr
+
+from cdk_clearml.autoscaler.binpacking import AGENT_WORKER_ID_SEPARATOR, gpu_queue_name, instance_id_of
+from cdk_clearml.autoscaler.warm_pool import WarmPoolAWSDriver
+
+
+def render_pinned_agents(user_data: str, queue_name: str, agent_gpus: List[Tuple[int, ...]]) -> str:
+    """Replace the agent daemon of ``user_data`` with one daemon per entry of ``agent_gpus``."""
+    queue_argument = f" --queue '{queue_name}'"
+    daemon_line = next(
+        (
+            line
+            for line in user_data.splitlines()
+            if line.startswith("python -m clearml_agent ") and f" daemon{queue_argument}" in line
+        ),
+        None,
+    )
+    if daemon_line is None:
+        raise ValueError(f"The user data has no agent daemon for queue '{queue_name}'")
+
+    command, other_arguments = daemon_line.split(queue_argument, 1)
+    daemon_lines = []
+    for index, gpus in enumerate(agent_gpus):
+        gpu_indices = ",".join(str(gpu) for gpu in gpus)
+        daemon = f"{command} --gpus {gpu_indices} --queue '{gpu_queue_name(queue_name, len(gpus))}'{other_arguments}"
+        if index > 0:
+            worker_id_suffix = AGENT_WORKER_ID_SEPARATOR + "-".join(str(gpu) for gpu in gpus)
+            daemon = f"CLEARML_WORKER_ID=$CLEARML_WORKER_ID{worker_id_suffix} {daemon} &"
+        daemon_lines.append(daemon)
+
+    # the foreground daemon goes last, so that the script only reaches "shutdown" once it exits
+    return user_data.replace(daemon_line, "\n".join(daemon_lines[1:] + daemon_lines[:1]))
+
+
+@attr.s
+class BinPackingAWSDriver(WarmPoolAWSDriver):
+    """
+    ``WarmPoolAWSDriver`` that starts the agent layout ``BinPackingAutoScaler`` planned for an instance.
+
+    An instance is only spun down once none of its agent daemons runs a task.
+    """
+
+    agent_gpus = attr.ib(default=None, init=False)
+    spun_down_instance_ids = attr.ib(factory=set, init=False)
+
+    def spin_up_worker(self, resource_conf, worker_prefix, queue_name, task_id):
+        scaler = getattr(self, "scaler", None)
+        pop_agent_gpus = getattr(scaler, "pop_agent_gpus", None)
+        self.agent_gpus = pop_agent_gpus(worker_prefix) if pop_agent_gpus else None
+        try:
+            instance_id = super().spin_up_worker(resource_conf, worker_prefix, queue_name, task_id)
+        finally:
+            agent_gpus, self.agent_gpus = self.agent_gpus, None
+
+        if agent_gpus:
+            agent_queues = [gpu_queue_name(queue_name, len(gpus)) for gpus in agent_gpus]
+            scaler.register_booting_agents(instance_id, worker_prefix, agent_queues)
+        # a warm instance gets the ID it had before it was stopped
+        self.spun_down_instance_ids.discard(instance_id)
+        return instance_id
+
+    def spin_down_worker(self, instance_id):
+        # every idle agent daemon of an instance asks for it to be spun down; return whether this one did
+        instance_id = instance_id_of(instance_id)
+        if instance_id in self.spun_down_instance_ids:
+            return False
+        busy_worker_ids = self.busy_worker_ids(instance_id)
+        if busy_worker_ids:
+            self.logger.info("Keeping %s, its agents %s still run tasks", instance_id, busy_worker_ids)
+            return False
+        self.spun_down_instance_ids.add(instance_id)
+        return super().spin_down_worker(instance_id)
+
+    def gen_user_data(self, worker_prefix, queue_name, task_id, cpu_only=False):
+        user_data = super().gen_user_data(worker_prefix, queue_name, task_id, cpu_only)
+        if not self.agent_gpus:
+            return user_data
+        return render_pinned_agents(user_data, queue_name, self.agent_gpus)
+
+    def busy_worker_ids(self, instance_id: str) -> List[str]:
+        scaler = getattr(self, "scaler", None)
+        if scaler is None:
+            return []
+        return [
+            worker.id
+            for worker in scaler.get_workers()
+            if instance_id_of(worker.id.rsplit(":", 1)[-1]) == instance_id and getattr(worker, "task", None)
+        ]
@@ -0,0 +1,68 @@
+"""
+A second EBS volume on the autoscaled workers for the docker images, pip packages, and datasets of the tasks.
+
+A resource with ``cache_volume_size`` in ``resource_configurations`` gets the volume at launch:
+
+    aws4gpu:
+      cache_volume_size: 200                    # GiB
+      cache_volume_type: gp3                    # default
+      cache_volume_snapshot_id: snap-0123...    # optional: start from a cache primed on another worker
+
+The bootstrap in ``worker-cache.template.sh`` (see ``cdk_clearml/worker_cache.py``) mounts it at
+``CACHE_MOUNT_POINT``. Workers of a warm pool keep their volume while stopped, so their caches
+survive from one run to the next.
+
+This module does not import ``clearml``; the settings are added to ``extra_configurations``, which
+every driver passes on to ``RunInstances`` or the launch template.
+"""
+
+import copy
+
+CACHE_DEVICE_NAME = "/dev/sdf"
+CACHE_MOUNT_POINT = "/clearml-cache"
+
+
+def has_cache_volume(resource_conf: dict) -> bool:
+    return bool(resource_conf.get("cache_volume_size"))
+
+
+def root_volume_mapping(resource_conf: dict) -> dict:
+    """The root volume mapping ``AWSDriver.spin_up_worker`` builds from the ``ebs_*`` settings."""
+    return {
+        "DeviceName": resource_conf["ebs_device_name"],
+        "Ebs": {
+            "VolumeSize": resource_conf["ebs_volume_size"],
+            "VolumeType": resource_conf["ebs_volume_type"],
+        },
+    }
+
+
+def with_cache_volume(resource_conf: dict) -> dict:
+    """
+    The resource with the cache volume added to ``BlockDeviceMappings`` in ``extra_configurations``.
+
+    ``extra_configurations`` replaces the driver's own ``BlockDeviceMappings``, so the root volume is repeated there.
+    """
+    if not has_cache_volume(resource_conf):
+        return resource_conf
+    resource_conf = copy.deepcopy(resource_conf)
+    extra_configurations = resource_conf.setdefault("extra_configurations", {})
+
+    cache_volume = {
+        "VolumeSize": int(resource_conf["cache_volume_size"]),
+        "VolumeType": resource_conf.get("cache_volume_type", "gp3"),
+        "DeleteOnTermination": True,
+    }
+    if resource_conf.get("cache_volume_snapshot_id"):
+        cache_volume["SnapshotId"] = resource_conf["cache_volume_snapshot_id"]
+    for key, setting in (("cache_volume_iops", "Iops"), ("cache_volume_throughput", "Throughput")):
+        if resource_conf.get(key):
+            cache_volume[setting] = int(resource_conf[key])
+
+    mappings = [
+        mapping
+        for mapping in extra_configurations.get("BlockDeviceMappings") or [root_volume_mapping(resource_conf)]
+        if mapping["DeviceName"] != CACHE_DEVICE_NAME
+    ]
+    extra_configurations["BlockDeviceMappings"] = mappings + [{"DeviceName": CACHE_DEVICE_NAME, "Ebs": cache_volume}]
+    return resource_conf
@@ -0,0 +1,489 @@
+"""
+Command line of the ClearML AWS autoscaler.
+
+Run by hand (``aws_autoscaler.py --run`` or ``--remote`` onto the ``services`` queue), or with
+``--service`` by ``ClearMLAutoscalerService``, which passes the SSM parameter holding the
+configuration and gives the container a task role instead of static AWS keys.
+"""
+
+import copy
+import json
+import os
+from argparse import ArgumentParser
+from collections import defaultdict
+from itertools import chain
+from pathlib import Path
+from typing import Tuple
+
+import yaml
+from clearml import Task
+from clearml.automation.auto_scaler import ScalerConfig
+from clearml.config import running_remotely
+from clearml.utilities.wizard.user_input import (
+    get_input,
+    input_bool,
+    input_int,
+    input_list,
+    multiline_input,
+)
+
+from cdk_clearml.autoscaler.binpacking_driver import BinPackingAWSDriver
+from cdk_clearml.autoscaler.cache_volume import with_cache_volume
+from cdk_clearml.autoscaler.config import AutoscalerConfig, load_autoscaler_config, parse_autoscaler_config
+from cdk_clearml.autoscaler.fleet import uses_fleet
+from cdk_clearml.autoscaler.fleet_driver import FleetAWSDriver
+from cdk_clearml.autoscaler.launch_template_driver import LaunchTemplateAWSDriver
+from cdk_clearml.autoscaler.scaler import (
+    DEFAULT_MAX_PASS_INTERVAL_MIN,
+    DEFAULT_MAX_PROBE_INTERVAL_SECONDS,
+    DEFAULT_PRESCALE_LEAD_TIME_MIN,
+    DEFAULT_PROBE_INTERVAL_SECONDS,
+    DEFAULT_QUIET_MAX_IDLE_TIME_MIN,
+    autoscaler_class,
+)
+from cdk_clearml.autoscaler.warm_pool import WarmPoolAWSDriver, is_poolable
+
+DEFAULT_DOCKER_IMAGE = "nvidia/cuda:10.1-runtime-ubuntu18.04"
+
+
+default_config = {
+    "hyper_params": {
+        "git_user": "",
+        "git_pass": "",
+        "cloud_credentials_key": "",
+        "cloud_credentials_secret": "",
+        "cloud_credentials_region": None,
+        "default_docker_image": "nvidia/cuda",
+        "max_idle_time_min": 15,
+        "polling_interval_time_min": 5,
+        "max_spin_up_time_min": 30,
+        "workers_prefix": "dynamic_worker",
+        "cloud_provider": "",
+        "precompiled_launch_templates": True,
+        "event_driven_wakeup": True,
+        "wakeup_probe_interval_sec": DEFAULT_PROBE_INTERVAL_SECONDS,
+        "wakeup_max_probe_interval_sec": DEFAULT_MAX_PROBE_INTERVAL_SECONDS,
+        "max_pass_interval_min": DEFAULT_MAX_PASS_INTERVAL_MIN,
+        "bin_packing_queues": [],
+        "predictive_prescaling": False,
+        "prescale_queues": [],
+        "arrival_history_path": "~/.clearml/autoscaler_arrival_history.jsonl",
+        "prescale_lead_time_min": DEFAULT_PRESCALE_LEAD_TIME_MIN,
+        "quiet_max_idle_time_min": DEFAULT_QUIET_MAX_IDLE_TIME_MIN,
+        "prescale_seasonality": "day",
+        "metrics": True,
+        "metrics_emf": False,
+    },
+    "configurations": {
+        "resource_configurations": None,
+        "queues": None,
+        "extra_trains_conf": "",
+        "extra_clearml_conf": "",
+        "extra_vm_bash_script": "",
+    },
+}
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument(
+        "--run",
+        help="Run the autoscaler after wizard finished",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--remote",
+        help="Run the autoscaler as a service, launch on the `services` queue",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--service",
+        help="Run unattended with the configuration of --config-ssm-parameter (implies --run)",
+        action="store_true",
+        default=False,
+    )
+    parser.add_argument(
+        "--config-ssm-parameter",
+        help="SSM parameter with the configuration, instead of --config-file",
+        default=None,
+    )
+    parser.add_argument(
+        "--heartbeat-file",
+        help="File touched on every pass of the autoscaler, for health checks",
+        type=Path,
+        default=None,
+    )
+    parser.add_argument(
+        "--config-file",
+        help="Configuration file name",
+        type=Path,
+        default=Path("aws_autoscaler.yaml"),
+    )
+    parser.add_argument(
+        "--agent-clearml-conf-parameter",
+        help="SSM parameter with the clearml.conf section for the agents (the AgentClearMLConfParameterName stack output)",
+        default=None,
+    )
+    parser.add_argument(
+        "--agent-vm-bash-script-parameter",
+        help="SSM parameter with the worker cache setup (the AgentVmBashScriptParameterName stack output)",
+        default=None,
+    )
+    args = parser.parse_args()
+    run = args.run or args.service
+
+    if running_remotely():
+        conf = copy.deepcopy(default_config)
+    elif args.config_ssm_parameter:
+        conf = parse_autoscaler_config(
+            fetch_ssm_parameter(args.config_ssm_parameter, region=os.environ.get("AWS_REGION"))
+        ).to_clearml_config()
+    elif args.service:
+        parser.error("--service needs --config-ssm-parameter")
+    else:
+        print(
+            "AWS Autoscaler setup wizard\n"
+            "---------------------------\n"
+            "Follow the wizard to configure your AWS auto-scaler service.\n"
+            "Once completed, you will be able to view and change the configuration in the clearml-server web UI.\n"
+            "It means there is no need to worry about typos or mistakes :)\n"
+        )
+
+        if (
+            True  # TODO: remove this line
+            or args.config_file.exists()
+            and input_bool(
+                "Load configurations from config file '{}' [Y/n]? ".format(args.config_file),
+                default=True,
+            )
+        ):
+            # fails on typos and inconsistent queues before anything is registered with ClearML
+            conf = load_autoscaler_config(args.config_file).to_clearml_config()
+        else:
+            configurations, hyper_params = run_wizard()
+            conf = {
+                "hyper_params": hyper_params,
+                "configurations": configurations,
+            }
+            # noinspection PyBroadException
+            try:
+                with args.config_file.open("w+") as f:
+                    yaml.safe_dump(conf, f)
+            except Exception:
+                print("Error! Could not write configuration file at: {}".format(args.config_file))
+                return
+
+    # Connecting ClearML with the current process,
+    # from here on everything is logged automatically
+    task = Task.init(project_name="DevOps", task_name="AWS Auto-Scaler", task_type=Task.TaskTypes.service)
+    task.connect(conf["hyper_params"])
+    configurations = conf["configurations"]
+    configurations.update(json.loads(task.get_configuration_object(name="General") or "{}"))
+    if args.agent_clearml_conf_parameter:
+        configurations["extra_clearml_conf"] = prepend_stack_section(
+            user_section=configurations.get("extra_clearml_conf", ""),
+            stack_section=fetch_ssm_parameter(
+                args.agent_clearml_conf_parameter, region=conf["hyper_params"].get("cloud_credentials_region")
+            ),
+        )
+    if args.agent_vm_bash_script_parameter:
+        configurations["extra_vm_bash_script"] = prepend_stack_section(
+            user_section=configurations.get("extra_vm_bash_script", ""),
+            stack_section=fetch_ssm_parameter(
+                args.agent_vm_bash_script_parameter, region=conf["hyper_params"].get("cloud_credentials_region")
+            ),
+        )
+    task.set_configuration_object(name="General", config_text=json.dumps(configurations, indent=2))
+
+    if "AWS_ACCESS_KEY_ID" in os.environ:
+        conf["hyper_params"]["cloud_credentials_key"] = os.environ["AWS_ACCESS_KEY_ID"]
+        conf["hyper_params"]["cloud_credentials_secret"] = os.environ["AWS_SECRET_ACCESS_KEY"]
+    else:
+        # e.g. the task role of the autoscaler service
+        conf["hyper_params"]["use_credentials_chain"] = True
+
+    if args.remote or run:
+        print("Running AWS auto-scaler as a service\nExecution log {}".format(task.get_output_log_web_page()))
+
+    if args.remote:
+        # if we are running remotely enqueue this run, and leave the process
+        # the clearml-agent services will pick it up and execute it for us.
+        task.execute_remotely(queue_name="services")
+
+    # the hyper parameters and configurations may have been edited in the ClearML web UI
+    config = AutoscalerConfig.parse_obj(conf)
+    hyper_params = config.hyper_params
+    conf = config.to_clearml_config()
+    # resources with a cache_volume_size get a second volume for the node-local caches
+    resource_configurations = {
+        resource_name: with_cache_volume(resource_conf)
+        for resource_name, resource_conf in conf["configurations"]["resource_configurations"].items()
+    }
+    conf["configurations"]["resource_configurations"] = resource_configurations
+    bin_packing_queues = hyper_params.bin_packing_queues
+    if bin_packing_queues:
+        # runs one GPU-pinned agent per packed task on the instances of bin_packing_queues
+        driver = BinPackingAWSDriver.from_config(conf)
+    elif any(is_poolable(resource_conf) for resource_conf in resource_configurations.values()):
+        # resources with a warm_pool_size stop idle workers instead of terminating them
+        driver = WarmPoolAWSDriver.from_config(conf)
+    elif any(uses_fleet(resource_conf) for resource_conf in resource_configurations.values()):
+        # resources with instance_types are launched spot-first through EC2 Fleet
+        driver = FleetAWSDriver.from_config(conf)
+    else:
+        driver = LaunchTemplateAWSDriver.from_config(conf)
+
+    scaler_kwargs = {}
+    if hyper_params.event_driven_wakeup:
+        scaler_kwargs.update(
+            probe_interval_seconds=hyper_params.wakeup_probe_interval_sec,
+            max_probe_interval_seconds=hyper_params.wakeup_max_probe_interval_sec,
+            max_pass_interval_min=hyper_params.max_pass_interval_min,
+        )
+    if bin_packing_queues:
+        scaler_kwargs.update(bin_packing_queues=bin_packing_queues)
+    if hyper_params.predictive_prescaling:
+        scaler_kwargs.update(
+            arrival_history_path=Path(hyper_params.arrival_history_path).expanduser(),
+            prescale_queues=hyper_params.prescale_queues,
+            prescale_lead_time_min=hyper_params.prescale_lead_time_min,
+            quiet_max_idle_time_min=hyper_params.quiet_max_idle_time_min,
+            seasonality=hyper_params.prescale_seasonality,
+        )
+    if hyper_params.metrics:
+        scaler_kwargs.update(emf=hyper_params.metrics_emf)
+    if args.heartbeat_file:
+        scaler_kwargs.update(heartbeat_fpath=args.heartbeat_file)
+    scaler_class = autoscaler_class(
+        event_driven=hyper_params.event_driven_wakeup,
+        bin_packing=bool(bin_packing_queues),
+        predictive=hyper_params.predictive_prescaling,
+        instrumented=hyper_params.metrics,
+        heartbeat=bool(args.heartbeat_file),
+    )
+    autoscaler = scaler_class(ScalerConfig.from_config(conf), driver, **scaler_kwargs)
+    if running_remotely() or run:
+        if hyper_params.precompiled_launch_templates:
+            # launches become a RunInstances call referencing a version compiled once per resource
+            driver.compile_launch_templates()
+        autoscaler.start()
+
+
+def fetch_ssm_parameter(parameter_name: str, region: str) -> str:
+    import boto3
+
+    ssm_client = boto3.client("ssm", region_name=region)
+    return ssm_client.get_parameter(Name=parameter_name)["Parameter"]["Value"]
+
+
+def prepend_stack_section(user_section: str, stack_section: str) -> str:
+    """
+    Put the stack's section of ``extra_clearml_conf`` or ``extra_vm_bash_script`` ahead of the user's.
+
+    Later keys win in HOCON, and later commands in bash, so anything set explicitly in the config
+    file still takes precedence. The section is only added once, so that restarting the autoscaler
+    does not duplicate it.
+    """
+    if stack_section.strip() in user_section:
+        return user_section
+    return stack_section.strip() + "\n" + (user_section or "")
+
+
+def run_wizard():
+    # type: () -> Tuple[dict, dict]
+
+    # a copy, so that the defaults stay untouched by the answers
+    config = copy.deepcopy(default_config)
+    hyper_params = config["hyper_params"]
+    configurations = config["configurations"]
+
+    hyper_params["cloud_credentials_key"] = get_input("AWS Access Key ID", required=True)
+    hyper_params["cloud_credentials_secret"] = get_input("AWS Secret Access Key", required=True)
+    hyper_params["cloud_credentials_region"] = get_input("AWS region name", "[us-east-1]", default="us-east-1")
+    # get GIT User/Pass for cloning
+    print(
+        "\nGIT credentials:"
+        "\nEnter GIT username for repository cloning (leave blank for SSH key authentication): [] ",
+        end="",
+    )
+    git_user = input()
+    if git_user.strip():
+        print("Enter password for user '{}': ".format(git_user), end="")
+        git_pass = input()
+        print("Git repository cloning will be using user={} password={}".format(git_user, git_pass))
+    else:
+        git_user = ""
+        git_pass = ""
+
+    hyper_params["git_user"] = git_user
+    hyper_params["git_pass"] = git_pass
+
+    hyper_params["default_docker_image"] = get_input(
+        "default docker image/parameters",
+        "to use [{}]".format(DEFAULT_DOCKER_IMAGE),
+        default=DEFAULT_DOCKER_IMAGE,
+        new_line=True,
+    )
+    print("\nConfigure the machine types for the auto-scaler:")
+    print("------------------------------------------------")
+    resource_configurations = {}
+    while True:
+        a_resource = {
+            "instance_type": get_input(
+                "Amazon instance type",
+                "['g4dn.4xlarge']",
+                question="Select",
+                default="g4dn.4xlarge",
+            ),
+            "is_spot": input_bool("Use spot instances? [y/N]"),
+            "availability_zone": get_input(
+                "availability zone",
+                "['us-east-1b']",
+                question="Select",
+                default="us-east-1b",
+            ),
+            "ami_id": get_input(
+                "the Amazon Machine Image id",
+                "['ami-04c0416d6bd8e4b1f']",
+                question="Select",
+                default="ami-04c0416d6bd8e4b1f",
+            ),
+            "ebs_device_name": get_input(
+                "the Amazon EBS device",
+                "['/dev/sda1']",
+                default="/dev/sda1",
+            ),
+            "ebs_volume_size": input_int(
+                "the Amazon EBS volume size",
+                "(in GiB) [100]",
+                default=100,
+            ),
+            "ebs_volume_type": get_input(
+                "the Amazon EBS volume type",
+                "['gp3']",
+                default="gp3",
+            ),
+            "key_name": get_input(
+                "the Amazon Key Pair name",
+            ),
+            "security_group_ids": input_list(
+                "Amazon Security Group ID",
+            ),
+        }
+
+        while True:
+            resource_name = get_input(
+                "a name for this instance type",
+                "(used in the budget section) For example 'aws4gpu'",
+                question="Select",
+                required=True,
+            )
+            if resource_name in resource_configurations:
+                print("\tError: instance type '{}' already used!".format(resource_name))
+                continue
+            break
+        resource_configurations[resource_name] = a_resource
+
+        if not input_bool("\nDefine another instance type? [y/N]"):
+            break
+
+    configurations["resource_configurations"] = resource_configurations
+
+    configurations["extra_vm_bash_script"], num_lines_bash_script = multiline_input(
+        "\nEnter any pre-execution bash script to be executed on the newly created instances []"
+    )
+    print("Entered {} lines of pre-execution bash script".format(num_lines_bash_script))
+
+    configurations["extra_clearml_conf"], num_lines_clearml_conf = multiline_input(
+        "\nEnter anything you'd like to include in your clearml.conf file []"
+    )
+    print("Entered {} extra lines for clearml.conf file".format(num_lines_clearml_conf))
+
+    print("\nDefine the machines budget:")
+    print("-----------------------------")
+    resource_configurations_names = list(configurations["resource_configurations"].keys())
+    queues = defaultdict(list)
+    while True:
+        while True:
+            queue_name = get_input("a queue name (for example: 'aws_4gpu_machines')", question="Select", required=True)
+            if queue_name in queues:
+                print("\tError: queue name '{}' already used!".format(queue_name))
+                continue
+            break
+
+        while True:
+            valid_instances = [k for k in resource_configurations_names if k not in (q[0] for q in queues[queue_name])]
+            while True:
+                queue_type = get_input(
+                    "an instance type to attach to the queue",
+                    "{}".format(valid_instances),
+                    question="Select",
+                    required=True,
+                )
+                if queue_type not in configurations["resource_configurations"]:
+                    print(
+                        "\tError: instance type '{}' not in predefined instances {}!".format(
+                            queue_type, resource_configurations_names
+                        )
+                    )
+                    continue
+
+                if queue_type in (q[0] for q in queues[queue_name]):
+                    print("\tError: instance type '{}' already in {}!".format(queue_type, queue_name))
+                    continue
+
+                if queue_type in [q[0] for q in chain.from_iterable(queues.values())]:
+                    queue_type_new = "{}_{}".format(queue_type, queue_name)
+                    print(
+                        "\tInstance type '{}' already used, renaming instance to {}".format(queue_type, queue_type_new)
+                    )
+                    configurations["resource_configurations"][queue_type_new] = dict(
+                        **configurations["resource_configurations"][queue_type]
+                    )
+                    queue_type = queue_type_new
+
+                    # make sure the renamed name is not reused
+                    if queue_type in (q[0] for q in queues[queue_name]):
+                        print("\tError: instance type '{}' already in {}!".format(queue_type, queue_name))
+                        continue
+
+                break
+            max_instances = input_int(
+                "maximum number of '{}' instances to spin simultaneously (example: 3)".format(queue_type),
+                required=True,
+            )
+
+            queues[queue_name].append((queue_type, max_instances))
+            valid_instances = [
+                k
+                for k in configurations["resource_configurations"].keys()
+                if k not in (q[0] for q in queues[queue_name])
+            ]
+            if not valid_instances:
+                break
+
+            if not input_bool("Do you wish to add another instance type to queue? [y/N]: "):
+                break
+        if not input_bool("\nAdd another queue? [y/N]"):
+            break
+    configurations["queues"] = dict(queues)
+
+    hyper_params["max_idle_time_min"] = input_int(
+        "maximum idle time",
+        "for the auto-scaler to spin down an instance (in minutes) [15]",
+        default=15,
+        new_line=True,
+    )
+    hyper_params["polling_interval_time_min"] = input_int(
+        "instances polling interval",
+        "for the auto-scaler (in minutes) [5]",
+        default=5,
+    )
+
+    return configurations, hyper_params
+
+
+if __name__ == "__main__":
+    main()
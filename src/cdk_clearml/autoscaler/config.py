@@ -0,0 +1,230 @@
+"""
+Typed model of ``aws_autoscaler.yaml``, validated before the autoscaler starts.
+
+``AutoScaler`` and ``AWSDriver`` read the configuration as plain dicts and only fail on a missing
+key or a queue with an unknown resource once they spin up a worker. ``AutoscalerConfig`` checks the
+whole file when it is loaded: unknown keys (usually typos), resources that do not exist, resources
+serving several queues, and the settings of bin packing, warm pools, EC2 Fleet, the cache volume,
+and pre-scaling. ``to_clearml_config`` turns it back into the dicts ClearML expects.
+
+This module does not import ``clearml``.
+"""
+
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+from pydantic import BaseModel, Extra, root_validator, validator
+
+from cdk_clearml.autoscaler.fleet import CAPACITY_TYPES, INTERRUPTION_ACTIONS
+
+PRESCALE_SEASONALITIES = ("day", "week")
+
+
+class ResourceConfig(BaseModel):
+    """
+    One entry of ``resource_configurations``.
+
+    The keys beyond ClearML's own are described in ``binpacking.py``, ``warm_pool.py``,
+    ``fleet.py``, and ``cache_volume.py``.
+    """
+
+    instance_type: str
+    ami_id: str
+    ebs_device_name: str = "/dev/sda1"
+    ebs_volume_size: int = 100
+    ebs_volume_type: str = "gp3"
+    availability_zone: Optional[str] = None
+    subnet_id: Optional[str] = None
+    is_spot: bool = False
+    cpu_only: bool = False
+    key_name: Optional[str] = None
+    security_group_ids: List[str] = []
+    tags: str = ""
+    extra_configurations: Dict[str, Any] = {}
+
+    # bin packing
+    gpus: Optional[int] = None
+    memory_gib: Optional[float] = None
+    hourly_price: Optional[float] = None
+
+    # warm pool
+    warm_pool_size: int = 0
+    warm_pool_hibernate: bool = False
+
+    # EC2 Fleet
+    instance_types: List[str] = []
+    subnet_ids: List[str] = []
+    availability_zones: List[str] = []
+    capacity_type: str = "spot-first"
+    interruption_action: str = "checkpoint"
+    interruption_grace_sec: int = 90
+
+    # cache volume
+    cache_volume_size: Optional[int] = None
+    cache_volume_type: str = "gp3"
+    cache_volume_snapshot_id: Optional[str] = None
+    cache_volume_iops: Optional[int] = None
+    cache_volume_throughput: Optional[int] = None
+
+    class Config:
+        extra = Extra.forbid
+
+    @validator("capacity_type")
+    def capacity_type_must_be_known(cls, capacity_type: str) -> str:  # noqa: N805
+        if capacity_type not in CAPACITY_TYPES:
+            raise ValueError(f"capacity_type must be one of {CAPACITY_TYPES}, got '{capacity_type}'")
+        return capacity_type
+
+    @validator("interruption_action")
+    def interruption_action_must_be_known(cls, interruption_action: str) -> str:  # noqa: N805
+        if interruption_action not in INTERRUPTION_ACTIONS:
+            raise ValueError(f"interruption_action must be one of {INTERRUPTION_ACTIONS}, got '{interruption_action}'")
+        return interruption_action
+
+    @validator("warm_pool_size", "interruption_grace_sec")
+    def must_not_be_negative(cls, value: int) -> int:  # noqa: N805
+        if value < 0:
+            raise ValueError(f"must not be negative, got {value}")
+        return value
+
+    @root_validator(skip_on_failure=True)
+    def must_have_a_placement(cls, values: dict) -> dict:  # noqa: N805
+        if not any(values[key] for key in ("availability_zone", "subnet_id", "subnet_ids", "availability_zones")):
+            raise ValueError(
+                "needs an availability_zone or a subnet_id (subnet_ids or availability_zones with EC2 Fleet)"
+            )
+        return values
+
+    @property
+    def can_be_bin_packed(self) -> bool:
+        return None not in (self.gpus, self.memory_gib, self.hourly_price)
+
+
+class HyperParams(BaseModel):
+    """``hyper_params``; the defaults are the ones of ``default_config`` in ``cli.py``."""
+
+    git_user: str = ""
+    git_pass: str = ""
+    cloud_credentials_key: str = ""
+    cloud_credentials_secret: str = ""
+    cloud_credentials_region: Optional[str] = None
+    cloud_provider: str = ""
+    use_credentials_chain: bool = False
+    use_iam_instance_profile: bool = False
+    iam_arn: Optional[str] = None
+    iam_name: Optional[str] = None
+    tags: str = ""
+    default_docker_image: str = "nvidia/cuda"
+    max_idle_time_min: float = 15
+    polling_interval_time_min: float = 5
+    max_spin_up_time_min: float = 30
+    workers_prefix: str = "dynamic_worker"
+    precompiled_launch_templates: bool = True
+    event_driven_wakeup: bool = True
+    wakeup_probe_interval_sec: float = 2.0
+    wakeup_max_probe_interval_sec: float = 15.0
+    max_pass_interval_min: float = 5.0
+    bin_packing_queues: List[str] = []
+    predictive_prescaling: bool = False
+    prescale_queues: List[str] = []
+    arrival_history_path: str = "~/.clearml/autoscaler_arrival_history.jsonl"
+    prescale_lead_time_min: float = 10.0
+    quiet_max_idle_time_min: float = 2.0
+    prescale_seasonality: str = "day"
+    metrics: bool = True
+    metrics_emf: bool = False
+
+    class Config:
+        extra = Extra.forbid
+
+    @validator("bin_packing_queues", "prescale_queues", pre=True)
+    def none_means_no_queues(cls, queues: Optional[List[str]]) -> List[str]:  # noqa: N805
+        return queues or []
+
+    @validator("prescale_seasonality")
+    def seasonality_must_be_known(cls, seasonality: str) -> str:  # noqa: N805
+        if seasonality not in PRESCALE_SEASONALITIES:
+            raise ValueError(f"prescale_seasonality must be one of {PRESCALE_SEASONALITIES}, got '{seasonality}'")
+        return seasonality
+
+
+class Configurations(BaseModel):
+    """``configurations``: the resources, the queues they serve, and the additions to the workers' bootstrap."""
+
+    resource_configurations: Dict[str, ResourceConfig] = {}
+    # queue -> (resource, maximum number of instances), in order of preference
+    queues: Dict[str, List[Tuple[str, int]]] = {}
+    extra_trains_conf: str = ""
+    extra_clearml_conf: str = ""
+    extra_vm_bash_script: str = ""
+
+    class Config:
+        extra = Extra.forbid
+
+    @validator("resource_configurations", "queues", pre=True)
+    def none_means_empty(cls, value: Optional[dict]) -> dict:  # noqa: N805
+        return value or {}
+
+    @validator("extra_trains_conf", "extra_clearml_conf", "extra_vm_bash_script", pre=True)
+    def none_means_no_section(cls, section: Optional[str]) -> str:  # noqa: N805
+        return section or ""
+
+
+class AutoscalerConfig(BaseModel):
+    hyper_params: HyperParams = HyperParams()
+    configurations: Configurations = Configurations()
+
+    class Config:
+        extra = Extra.forbid
+
+    @root_validator(skip_on_failure=True)
+    def queues_must_match_resources(cls, values: dict) -> dict:  # noqa: N805
+        hyper_params: HyperParams = values["hyper_params"]
+        configurations: Configurations = values["configurations"]
+        resources = configurations.resource_configurations
+
+        queue_of_resource: Dict[str, str] = {}
+        for queue, queue_resources in configurations.queues.items():
+            for resource_name, max_instances in queue_resources:
+                if resource_name not in resources:
+                    raise ValueError(f"Queue '{queue}' uses the unknown resource '{resource_name}'")
+                if resource_name in queue_of_resource:
+                    raise ValueError(
+                        f"Resource '{resource_name}' serves both '{queue_of_resource[resource_name]}' and '{queue}'; "
+                        "give each queue its own copy of it"
+                    )
+                if max_instances < 0:
+                    raise ValueError(f"Queue '{queue}' allows a negative number of '{resource_name}' instances")
+                queue_of_resource[resource_name] = queue
+
+        for key in ("bin_packing_queues", "prescale_queues"):
+            unknown_queues = [queue for queue in getattr(hyper_params, key) if queue not in configurations.queues]
+            if unknown_queues:
+                raise ValueError(f"{key} names queues that are not in queues: {unknown_queues}")
+
+        for queue in hyper_params.bin_packing_queues:
+            for resource_name, _ in configurations.queues[queue]:
+                if not resources[resource_name].can_be_bin_packed:
+                    raise ValueError(
+                        f"Resource '{resource_name}' of bin-packing queue '{queue}' needs gpus, memory_gib, "
+                        "and hourly_price"
+                    )
+        return values
+
+    def to_clearml_config(self) -> dict:
+        """The ``{"hyper_params": ..., "configurations": ...}`` dict of ``AutoScaler`` and ``AWSDriver``."""
+        config = self.dict(exclude_none=True)
+        config["configurations"]["queues"] = {
+            queue: [[resource_name, max_instances] for resource_name, max_instances in queue_resources]
+            for queue, queue_resources in self.configurations.queues.items()
+        }
+        return config
+
+
+def parse_autoscaler_config(config_text: str) -> AutoscalerConfig:
+    return AutoscalerConfig.parse_obj(yaml.load(config_text, Loader=yaml.SafeLoader) or {})
+
+
+def load_autoscaler_config(config_fpath: Path) -> AutoscalerConfig:
+    return parse_autoscaler_config(config_fpath.read_text())
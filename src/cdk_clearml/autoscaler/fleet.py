@@ -0,0 +1,176 @@
+"""
+Spot-first launches through EC2 Fleet, over several instance types and subnets per resource.
+
+A resource with ``instance_types`` in ``resource_configurations`` is launched with an instant
+EC2 Fleet rather than ``RunInstances``:
+
+    aws4gpu_spot:
+      instance_type: g4dn.4xlarge  # still names the workers of the resource
+      instance_types: [g4dn.4xlarge, g4dn.8xlarge, g5.4xlarge]  # most preferred first
+      subnet_ids: [subnet-aaa, subnet-bbb, subnet-ccc]          # one per availability zone
+      capacity_type: spot-first   # spot-first (default) | spot | on-demand
+      interruption_action: checkpoint                          # checkpoint (default) | requeue
+
+Spot instances come from the pools (instance type and subnet) with the most spare capacity,
+``capacity-optimized-prioritized`` breaking ties by the order of ``instance_types`` and then
+``subnet_ids``. With ``spot-first``, a fleet that gets no spot capacity is retried on demand.
+
+Every worker runs ``spot_interruption.py``, which watches for the two-minute interruption
+notice and hands the tasks of the instance back to their queue.
+
+This module does not import ``clearml`` or ``boto3``; ``fleet_driver.py`` does the EC2 calls.
+"""
+
+import base64
+from itertools import product
+from typing import List, Optional, Sequence, Tuple
+
+CAPACITY_TYPES = ("spot-first", "spot", "on-demand")
+INTERRUPTION_ACTIONS = ("checkpoint", "requeue")
+
+# errors of an instant fleet that mean "try other pools or capacity types", not "the request is wrong"
+CAPACITY_ERROR_CODES = {
+    "InsufficientInstanceCapacity",
+    "InsufficientCapacity",
+    "InsufficientFreeAddressesInSubnet",
+    "MaxSpotInstanceCountExceeded",
+    "SpotMaxPriceTooLow",
+    "UnfulfillableCapacity",
+}
+
+INTERRUPTION_WATCHER_FPATH = "/usr/local/bin/clearml-spot-interruption.py"
+
+
+class FleetCapacityError(Exception):
+    """No pool of the resource had capacity for any of the allowed capacity types."""
+
+
+def uses_fleet(resource_conf: dict) -> bool:
+    return bool(resource_conf.get("instance_types"))
+
+
+def capacity_types(resource_conf: dict) -> List[str]:
+    """Capacity types to try, in order."""
+    capacity_type = resource_conf.get("capacity_type", "spot-first")
+    if capacity_type not in CAPACITY_TYPES:
+        raise ValueError(f"capacity_type must be one of {CAPACITY_TYPES}, got '{capacity_type}'")
+    return ["spot", "on-demand"] if capacity_type == "spot-first" else [capacity_type]
+
+
+def fleet_overrides(resource_conf: dict) -> List[dict]:
+    """One launch template override per instance type and subnet (or availability zone), most preferred first."""
+    if resource_conf.get("subnet_ids") or resource_conf.get("subnet_id"):
+        placements = [
+            {"SubnetId": subnet_id} for subnet_id in resource_conf.get("subnet_ids") or [resource_conf["subnet_id"]]
+        ]
+    elif resource_conf.get("availability_zones") or resource_conf.get("availability_zone"):
+        placements = [
+            {"AvailabilityZone": zone}
+            for zone in resource_conf.get("availability_zones") or [resource_conf["availability_zone"]]
+        ]
+    else:
+        placements = [{}]
+    return [
+        {"InstanceType": instance_type, **placement, "Priority": float(priority)}
+        for priority, (instance_type, placement) in enumerate(product(resource_conf["instance_types"], placements))
+    ]
+
+
+def launch_template_data(resource_conf: dict, user_data: str, iam_arn: str = "", iam_name: str = "") -> dict:
+    """The settings ``AWSDriver.spin_up_worker`` passes to ``RunInstances``, as launch template data."""
+    data = {
+        "ImageId": resource_conf["ami_id"],
+        "BlockDeviceMappings": [
+            {
+                "DeviceName": resource_conf["ebs_device_name"],
+                "Ebs": {
+                    "VolumeSize": resource_conf["ebs_volume_size"],
+                    "VolumeType": resource_conf["ebs_volume_type"],
+                },
+            }
+        ],
+        "UserData": base64.b64encode(user_data.encode("utf-8")).decode("ascii"),
+        "InstanceInitiatedShutdownBehavior": "terminate",
+    }
+    if resource_conf.get("key_name"):
+        data["KeyName"] = resource_conf["key_name"]
+    if resource_conf.get("security_group_ids"):
+        data["SecurityGroupIds"] = resource_conf["security_group_ids"]
+    if iam_arn:
+        data["IamInstanceProfile"] = {"Arn": iam_arn}
+    elif iam_name:
+        data["IamInstanceProfile"] = {"Name": iam_name}
+    # extra_configurations are RunInstances parameters; the ones launch templates share apply here too
+    data.update(resource_conf.get("extra_configurations", {}))
+    return data
+
+
+def create_fleet_request(
+    resource_conf: dict,
+    launch_template_id: str,
+    launch_template_version: str,
+    capacity_type: str,
+    tags: Sequence[Tuple[str, str]] = (),
+) -> dict:
+    """Parameters of an instant ``CreateFleet`` call for a single instance of ``capacity_type``."""
+    request = {
+        "Type": "instant",
+        "LaunchTemplateConfigs": [
+            {
+                "LaunchTemplateSpecification": {
+                    "LaunchTemplateId": launch_template_id,
+                    "Version": launch_template_version,
+                },
+                "Overrides": fleet_overrides(resource_conf),
+            }
+        ],
+        "TargetCapacitySpecification": {
+            "TotalTargetCapacity": 1,
+            "DefaultTargetCapacityType": capacity_type,
+        },
+        "SpotOptions": {
+            "AllocationStrategy": "capacity-optimized-prioritized",
+            "InstanceInterruptionBehavior": "terminate",
+        },
+        "OnDemandOptions": {"AllocationStrategy": "prioritized"},
+    }
+    if tags:
+        request["TagSpecifications"] = [
+            {"ResourceType": "instance", "Tags": [{"Key": key, "Value": value} for key, value in tags]}
+        ]
+    return request
+
+
+def parse_create_fleet_response(response: dict) -> Tuple[Optional[str], List[Tuple[str, str]]]:
+    """The launched instance, if any, and the ``(error code, message)`` of every pool that failed."""
+    instance_ids = [
+        instance_id for instances in response.get("Instances", []) for instance_id in instances["InstanceIds"]
+    ]
+    errors = [(error.get("ErrorCode", ""), error.get("ErrorMessage", "")) for error in response.get("Errors", [])]
+    return (instance_ids[0] if instance_ids else None), errors
+
+
+def is_capacity_error(errors: List[Tuple[str, str]]) -> bool:
+    return any(code in CAPACITY_ERROR_CODES for code, _ in errors)
+
+
+def render_interruption_watcher(
+    user_data: str, watcher_script: str, action: str = "checkpoint", grace_seconds: int = 90
+) -> str:
+    """Start ``spot_interruption.py`` in the background right before the first agent daemon of ``user_data``."""
+    if action not in INTERRUPTION_ACTIONS:
+        raise ValueError(f"interruption_action must be one of {INTERRUPTION_ACTIONS}, got '{action}'")
+    lines = user_data.splitlines(keepends=True)
+    daemon_index = next(
+        (index for index, line in enumerate(lines) if "python -m clearml_agent " in line and " daemon " in line), None
+    )
+    if daemon_index is None:
+        raise ValueError("The user data has no agent daemon")
+    watcher = (
+        f"cat << 'CLEARML_SPOT_INTERRUPTION_EOF' > {INTERRUPTION_WATCHER_FPATH}\n"
+        f"{watcher_script.rstrip()}\n"
+        "CLEARML_SPOT_INTERRUPTION_EOF\n"
+        f"nohup python3 {INTERRUPTION_WATCHER_FPATH} --action {action} --grace-seconds {grace_seconds} "
+        ">> /var/log/clearml-spot-interruption.log 2>&1 &\n"
+    )
+    return "".join(lines[:daemon_index] + [watcher] + lines[daemon_index:])
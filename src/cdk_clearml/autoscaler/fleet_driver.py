@@ -0,0 +1,98 @@
+"""``AWSDriver`` that launches the resources with ``instance_types`` through EC2 Fleet; see ``fleet.py``."""
+
+from pathlib import Path
+
+import attr
+import boto3
+from clearml.automation.cloud_driver import parse_tags
+
+from cdk_clearml.autoscaler.fleet import (
+    FleetCapacityError,
+    capacity_types,
+    create_fleet_request,
+    is_capacity_error,
+    launch_template_data,
+    parse_create_fleet_response,
+    render_interruption_watcher,
+    uses_fleet,
+)
+from cdk_clearml.autoscaler.launch_template_driver import LaunchTemplateAWSDriver
+
+SPOT_INTERRUPTION_SCRIPT_FPATH = Path(__file__).parent / "spot_interruption.py"
+
+
+@attr.s
+class FleetAWSDriver(LaunchTemplateAWSDriver):
+    """
+    ``LaunchTemplateAWSDriver`` that launches resources with ``instance_types`` as a single-instance instant EC2 Fleet.
+
+    The fleet uses the launch template version compiled for the resource. A launch whose user data
+    differs from the compiled one adds a version with its own user data, which is deleted again
+    once the fleet request returned. Resources without ``instance_types`` are launched by
+    ``LaunchTemplateAWSDriver`` as before.
+    """
+
+    def spin_up_worker(self, resource_conf, worker_prefix, queue_name, task_id):
+        if not uses_fleet(resource_conf):
+            return super().spin_up_worker(resource_conf, worker_prefix, queue_name, task_id)
+
+        user_data = self.launch_user_data(resource_conf, worker_prefix, queue_name, task_id)
+        ec2 = boto3.client("ec2", **self.creds())
+        compiled = self.compiled_launch_templates.get((worker_prefix, queue_name))
+        if compiled is not None and compiled.user_data == user_data:
+            instance_id = self.create_fleet_instance(
+                ec2, resource_conf, worker_prefix, compiled.launch_template_id, compiled.version
+            )
+        else:
+            instance_id = self.create_fleet_instance_with_user_data(ec2, resource_conf, worker_prefix, user_data)
+
+        boto3.resource("ec2", **self.creds()).Instance(instance_id).wait_until_running()
+        return instance_id
+
+    def launch_user_data(self, resource_conf, worker_prefix, queue_name, task_id):
+        user_data = super().launch_user_data(resource_conf, worker_prefix, queue_name, task_id)
+        if not uses_fleet(resource_conf):
+            return user_data
+        return render_interruption_watcher(
+            user_data,
+            watcher_script=SPOT_INTERRUPTION_SCRIPT_FPATH.read_text(),
+            action=resource_conf.get("interruption_action", "checkpoint"),
+            grace_seconds=int(resource_conf.get("interruption_grace_sec", 90)),
+        )
+
+    def launch_template_data(self, resource_conf, user_data):
+        if not uses_fleet(resource_conf):
+            return super().launch_template_data(resource_conf, user_data)
+        # the fleet request sets the instance type, placement, capacity type, and tags
+        return launch_template_data(resource_conf, user_data, self.iam_arn, self.iam_name), {}
+
+    def create_fleet_instance_with_user_data(
+        self, ec2, resource_conf: dict, worker_prefix: str, user_data: str
+    ) -> str:
+        launch_template_id = self.ensure_launch_template(ec2, worker_prefix, resource_conf)
+        version = ec2.create_launch_template_version(
+            LaunchTemplateId=launch_template_id,
+            LaunchTemplateData=launch_template_data(resource_conf, user_data, self.iam_arn, self.iam_name),
+        )["LaunchTemplateVersion"]["VersionNumber"]
+        try:
+            return self.create_fleet_instance(ec2, resource_conf, worker_prefix, launch_template_id, str(version))
+        finally:
+            # instant fleets do not need the version after they returned
+            ec2.delete_launch_template_versions(LaunchTemplateId=launch_template_id, Versions=[str(version)])
+
+    def create_fleet_instance(
+        self, ec2, resource_conf: dict, worker_prefix: str, launch_template_id: str, version: str
+    ) -> str:
+        tags = parse_tags(resource_conf.get("tags", ""))
+        for capacity_type in capacity_types(resource_conf):
+            response = ec2.create_fleet(
+                **create_fleet_request(resource_conf, launch_template_id, version, capacity_type, tags)
+            )
+            instance_id, errors = parse_create_fleet_response(response)
+            if instance_id:
+                self.logger.info("Launched %s instance %s for %s", capacity_type, instance_id, worker_prefix)
+                return instance_id
+            self.logger.warning("No %s capacity for %s: %s", capacity_type, worker_prefix, errors)
+            if not is_capacity_error(errors):
+                raise RuntimeError(f"EC2 Fleet for {worker_prefix} failed: {errors}")
+        raise FleetCapacityError(f"No capacity for {worker_prefix} in any of its pools")
@@ -0,0 +1,208 @@
+"""
+Forecast of queue arrivals, for launching workers ahead of the daily bursts.
+
+``AutoScaler`` only reacts to tasks that are already queued, so the first tasks of every burst
+wait for a cold start. ``SeasonalArrivalModel`` learns the arrival rate and task duration for
+every hour of the day (or of the week) from the recorded arrivals, with recent days weighing
+more. ``PreScalePolicy`` turns the forecast into a number of workers to have running
+``lead_time_min`` ahead, and into a shorter ``max_idle_time_min`` while no burst is expected.
+
+Arrivals are recorded in an ``ArrivalStore``, a JSON lines file that ``simulation.py`` can also
+replay offline.
+
+This module does not import ``clearml``; ``scaler.py`` plugs it into the real ``AutoScaler``.
+"""
+
+import json
+import math
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+HOUR = 3600.0
+DAY = 24 * HOUR
+WEEK = 7 * DAY
+
+
+@dataclass
+class ArrivalRecord:
+    """
+    A task that was enqueued on ``queue`` at ``enqueued_at`` (seconds since the epoch).
+
+    ``duration_seconds`` is ``None`` until the task finished, and 0 if it was deleted before.
+    """
+
+    task_id: str
+    queue: str
+    enqueued_at: float
+    duration_seconds: Optional[float] = None
+
+
+class ArrivalStore:
+    """
+    Arrivals of the last ``retention_days``, one JSON object per line in ``path``.
+
+    :param path: Local file; it survives restarts of the autoscaler as long as the file system does.
+    """
+
+    def __init__(self, path: Path, retention_days: float = 28.0):
+        self.path = Path(path)
+        self.retention_days = retention_days
+        self.records: Dict[str, ArrivalRecord] = {}
+        if self.path.exists():
+            for line in self.path.read_text().splitlines():
+                if line.strip():
+                    record = ArrivalRecord(**json.loads(line))
+                    self.records[record.task_id] = record
+
+    def add(self, record: ArrivalRecord) -> bool:
+        """Record an arrival; return False if the task was already recorded."""
+        if record.task_id in self.records:
+            return False
+        self.records[record.task_id] = record
+        return True
+
+    def set_duration(self, task_id: str, duration_seconds: float) -> None:
+        self.records[task_id].duration_seconds = duration_seconds
+
+    def without_duration(self) -> List[ArrivalRecord]:
+        return [record for record in self.records.values() if record.duration_seconds is None]
+
+    def save(self, now: Optional[float] = None) -> None:
+        """Drop the records older than ``retention_days`` and rewrite the file."""
+        oldest = (now if now is not None else time.time()) - self.retention_days * DAY
+        self.records = {task_id: record for task_id, record in self.records.items() if record.enqueued_at >= oldest}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        temporary_path = self.path.with_suffix(self.path.suffix + ".tmp")
+        temporary_path.write_text("".join(json.dumps(asdict(record)) + "\n" for record in self.records.values()))
+        temporary_path.replace(self.path)
+
+
+class SeasonalArrivalModel:
+    """
+    Arrivals per hour and mean task duration for each hour of a ``period`` (a day or a week).
+
+    Each past period counts with a weight halving every ``half_life_days``, so the model follows
+    changes in the workload within a few periods. Hours are in UTC.
+
+    :param default_duration_seconds: Duration assumed until some task durations are known.
+    """
+
+    def __init__(
+        self, period_seconds: float = DAY, half_life_days: float = 7.0, default_duration_seconds: float = HOUR
+    ):
+        if period_seconds not in (DAY, WEEK):
+            raise ValueError("period_seconds must be a day or a week")
+        self.period_seconds = period_seconds
+        self.half_life_days = half_life_days
+        self.default_duration_seconds = default_duration_seconds
+        self.slots = int(period_seconds // HOUR)
+        self.arrivals_per_hour = [0.0] * self.slots
+        self.mean_duration_seconds = [default_duration_seconds] * self.slots
+        self.observed_seconds = 0.0
+
+    def slot(self, timestamp: float) -> int:
+        return int((timestamp % self.period_seconds) // HOUR)
+
+    def fit(self, records: Iterable[ArrivalRecord], now: float) -> "SeasonalArrivalModel":
+        records = [record for record in records if record.enqueued_at <= now]
+        if not records:
+            return self
+        first_arrival = min(record.enqueued_at for record in records)
+        self.observed_seconds = now - first_arrival
+
+        # weight of every hour slot that was observed, i.e. lies between the first arrival and now
+        observed_weight = [0.0] * self.slots
+        hour_start = first_arrival - first_arrival % HOUR
+        while hour_start < now:
+            observed_weight[self.slot(hour_start)] += self._weight(now - hour_start)
+            hour_start += HOUR
+
+        arrival_weight = [0.0] * self.slots
+        duration_weight = [0.0] * self.slots
+        weighted_durations = [0.0] * self.slots
+        for record in records:
+            slot, weight = self.slot(record.enqueued_at), self._weight(now - record.enqueued_at)
+            arrival_weight[slot] += weight
+            if record.duration_seconds:
+                duration_weight[slot] += weight
+                weighted_durations[slot] += weight * record.duration_seconds
+
+        all_durations_weight = sum(duration_weight)
+        overall_duration = (
+            sum(weighted_durations) / all_durations_weight if all_durations_weight else self.default_duration_seconds
+        )
+        for slot in range(self.slots):
+            self.arrivals_per_hour[slot] = arrival_weight[slot] / observed_weight[slot] if observed_weight[slot] else 0
+            self.mean_duration_seconds[slot] = (
+                weighted_durations[slot] / duration_weight[slot] if duration_weight[slot] else overall_duration
+            )
+        return self
+
+    def expected_arrivals(self, start: float, end: float) -> float:
+        """Expected number of arrivals between ``start`` and ``end``."""
+        expected, hour_start = 0.0, start
+        while hour_start < end:
+            hour_end = min(end, hour_start - hour_start % HOUR + HOUR)
+            expected += self.arrivals_per_hour[self.slot(hour_start)] * (hour_end - hour_start) / HOUR
+            hour_start = hour_end
+        return expected
+
+    def expected_busy_workers(self, at: float) -> float:
+        """Tasks expected to run at once at ``at``: the arrivals over the preceding mean duration (Little's law)."""
+        duration = self.mean_duration_seconds[self.slot(at)]
+        return self.expected_arrivals(at - duration, at)
+
+    def _weight(self, age_seconds: float) -> float:
+        return 0.5 ** (age_seconds / (self.half_life_days * DAY))
+
+
+@dataclass
+class PreScalePolicy:
+    """
+    Workers to have running ahead of expected arrivals, and how long to keep idle ones.
+
+    ``workers_to_prelaunch`` launches at most ``desired_workers`` per forecast hour, so that
+    pre-launched workers that stayed idle and were spun down are not launched over and over.
+
+    :param lead_time_min: How far ahead to look; about the time a worker takes to boot and register.
+    :param min_busy_workers: Expected busy workers below which nothing is pre-launched, so that a
+        trickle of tasks does not keep a worker up all day.
+    :param burst_arrivals_per_hour: Expected arrivals over the next hour from which the configured
+        ``max_idle_time_min`` applies; below it, idle workers are spun down after
+        ``quiet_max_idle_time_min``.
+    """
+
+    model: SeasonalArrivalModel
+    lead_time_min: float = 10.0
+    min_busy_workers: float = 0.5
+    burst_arrivals_per_hour: float = 2.0
+    quiet_max_idle_time_min: float = 2.0
+    prelaunched_hour: int = field(default=-1, init=False)
+    prelaunched: int = field(default=0, init=False)
+
+    def desired_workers(self, now: float, max_workers: int) -> int:
+        expected = self.model.expected_busy_workers(now + self.lead_time_min * 60)
+        if expected < self.min_busy_workers:
+            return 0
+        return min(max_workers, math.ceil(expected))
+
+    def workers_to_prelaunch(self, now: float, running_workers: int, max_workers: int) -> int:
+        """Workers to launch now on top of the ``running_workers``, and count them as launched."""
+        desired = self.desired_workers(now, max_workers)
+        forecast_hour = int((now + self.lead_time_min * 60) // HOUR)
+        if forecast_hour != self.prelaunched_hour:
+            self.prelaunched_hour, self.prelaunched = forecast_hour, 0
+        count = max(0, min(desired - running_workers, desired - self.prelaunched, max_workers - running_workers))
+        self.prelaunched += count
+        return count
+
+    def max_idle_time_min(self, now: float, configured_max_idle_time_min: float) -> float:
+        # without a full period of history, a quiet hour may just be one that was never observed
+        if (
+            self.model.observed_seconds < self.model.period_seconds
+            or self.model.expected_arrivals(now, now + HOUR) >= self.burst_arrivals_per_hour
+        ):
+            return configured_max_idle_time_min
+        return min(configured_max_idle_time_min, self.quiet_max_idle_time_min)
@@ -0,0 +1,158 @@
+"""
+Where ``InstrumentedAutoScaler`` gets its metrics from, and where it publishes them.
+
+``AutoScaler.supervisor`` keeps its state (launched workers, idle workers) in local variables and
+calls the driver and the ClearML API directly, so the calls are timed through proxies:
+
+- ``InstrumentedDriver`` times ``spin_up_worker`` and counts spin downs and launch failures;
+- ``TimedAPIClient`` times every ClearML API call, e.g. ``queues.get_all``;
+- ``register_ec2_latency_hooks`` times every EC2 call of the drivers through botocore events.
+
+``publish_emf`` writes the EMF documents of a snapshot to stdout, and ``report_scalars`` reports
+the snapshot as scalars of the autoscaler task.
+"""
+
+import sys
+from time import perf_counter, time
+from typing import Dict, Optional, Set, TextIO, Tuple
+
+import boto3
+
+from cdk_clearml.autoscaler.binpacking import instance_id_of
+from cdk_clearml.autoscaler.metrics import MetricsRegistry, MetricsSnapshot, emf_documents, percentile, render_emf
+
+EC2_LATENCY_START_KEY = "clearml_autoscaler_start"
+
+
+class InstrumentedDriver:
+    """
+    Proxy of a ``CloudDriver`` that records its launches and spin downs.
+
+    ``launched`` maps the instance ID of every launch to its resource and launch time, until
+    ``InstrumentedAutoScaler`` sees its agent register; ``spun_down`` holds the instances spun down
+    since the end of the last pass. A driver whose ``spin_down_worker`` returns False kept the
+    instance, e.g. ``BinPackingAWSDriver`` while other agents of the instance run tasks; the
+    drivers of ClearML return None.
+    """
+
+    def __init__(self, driver, metrics: MetricsRegistry):
+        self._driver = driver
+        self._metrics = metrics
+        self.launched: Dict[str, Tuple[str, float]] = {}
+        self.spun_down: Set[str] = set()
+
+    def __getattr__(self, name):
+        return getattr(self._driver, name)
+
+    def spin_up_worker(self, resource_conf, worker_prefix, queue_name, task_id):
+        resource = worker_prefix.split(":")[1] if ":" in worker_prefix else worker_prefix
+        try:
+            with self._metrics.timer("spin_up_call_seconds", Resource=resource):
+                instance_id = self._driver.spin_up_worker(resource_conf, worker_prefix, queue_name, task_id)
+        except Exception:
+            self._metrics.increment("launch_failures", Resource=resource)
+            raise
+        self._metrics.increment("launches", Resource=resource)
+        self.launched[instance_id] = (resource, time())
+        return instance_id
+
+    def spin_down_worker(self, instance_id):
+        spun_down = self._driver.spin_down_worker(instance_id)
+        if spun_down is False:
+            return spun_down
+        instance_id = instance_id_of(instance_id)
+        self.spun_down.add(instance_id)
+        # the supervisor only spins down workers it gave up waiting for, or idle ones
+        reason = "stuck" if self.launched.pop(instance_id, None) else "idle"
+        self._metrics.increment("spin_downs", Reason=reason)
+        return spun_down
+
+
+class _TimedService:
+    def __init__(self, service, service_name: str, metrics: MetricsRegistry):
+        self._service = service
+        self._service_name = service_name
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        attribute = getattr(self._service, name)
+        if not callable(attribute):
+            return attribute
+        operation = f"{self._service_name}.{name}"
+
+        def timed_call(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return attribute(*args, **kwargs)
+            except Exception:
+                self._metrics.increment("clearml_api_errors", Operation=operation)
+                raise
+            finally:
+                self._metrics.observe("clearml_api_latency_ms", (perf_counter() - start) * 1000, Operation=operation)
+
+        return timed_call
+
+
+class TimedAPIClient:
+    """Proxy of a ClearML ``APIClient`` that times the calls of its services."""
+
+    def __init__(self, api_client, metrics: MetricsRegistry):
+        self._api_client = api_client
+        self._metrics = metrics
+
+    def __getattr__(self, name):
+        return _TimedService(getattr(self._api_client, name), name, self._metrics)
+
+
+def register_ec2_latency_hooks(metrics: MetricsRegistry, session: Optional[boto3.Session] = None) -> None:
+    """
+    Time the EC2 calls of the clients of ``session``.
+
+    The drivers create their clients with ``boto3.client``, i.e. from the default session.
+    """
+    if session is None:
+        boto3.setup_default_session()
+        session = boto3.DEFAULT_SESSION
+
+    def before_call(model, context, **kwargs):
+        context[EC2_LATENCY_START_KEY] = (model.name, perf_counter())
+
+    def after_call(context, **kwargs):
+        operation, start = context.pop(EC2_LATENCY_START_KEY, (None, None))
+        if operation is not None:
+            metrics.observe("ec2_api_latency_ms", (perf_counter() - start) * 1000, Operation=operation)
+        return operation
+
+    def after_call_error(context, **kwargs):
+        # unlike after-call, after-call-error does not pass the operation model
+        operation = after_call(context)
+        if operation is not None:
+            metrics.increment("ec2_api_errors", Operation=operation)
+
+    session.events.register("before-call.ec2", before_call)
+    session.events.register("after-call.ec2", after_call)
+    session.events.register("after-call-error.ec2", after_call_error)
+
+
+def publish_emf(snapshot: MetricsSnapshot, dimensions: Dict[str, str], stream: TextIO = sys.stdout) -> None:
+    documents = emf_documents(snapshot, timestamp_ms=int(time() * 1000), dimensions=dimensions)
+    if documents:
+        stream.write(render_emf(documents) + "\n")
+        stream.flush()
+
+
+def report_scalars(task_logger, snapshot: MetricsSnapshot, iteration: int) -> None:
+    """Report ``snapshot`` on the autoscaler task: one plot per metric, one series per set of dimension values."""
+    for metrics in (snapshot.counters, snapshot.gauges):
+        for (name, dimensions), value in metrics.items():
+            series = ",".join(dimension_value for _, dimension_value in dimensions) or "total"
+            task_logger.report_scalar(title=name, series=series, value=value, iteration=iteration)
+    for (name, dimensions), values in snapshot.histograms.items():
+        if not values:
+            continue
+        prefix = ",".join(dimension_value for _, dimension_value in dimensions)
+        for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99)):
+            series = f"{prefix} {label}" if prefix else label
+            task_logger.report_scalar(
+                title=name, series=series, value=percentile(values, fraction), iteration=iteration
+            )
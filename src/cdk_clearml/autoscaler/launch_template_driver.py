@@ -0,0 +1,113 @@
+"""``AWSDriver`` that launches workers from launch templates compiled at startup; see ``launch_templates.py``."""
+
+from typing import Tuple
+
+import attr
+import boto3
+from botocore.exceptions import ClientError
+from clearml.automation.aws_driver import AWSDriver
+from clearml.automation.cloud_driver import parse_tags
+
+from cdk_clearml.autoscaler.launch_templates import (
+    CompiledLaunchTemplate,
+    compile_launch_template,
+    launch_template_fingerprint,
+    launch_template_name,
+    run_instances_request,
+)
+
+
+@attr.s
+class LaunchTemplateAWSDriver(AWSDriver):
+    """
+    ``AWSDriver`` that launches each resource from a launch template version compiled by ``compile_launch_templates``.
+
+    Each resource gets a launch template named after its ``worker_prefix``. Resources are launched
+    by ``AWSDriver`` as before until they are compiled.
+
+    Subclasses that change how a resource is launched override the ``launch_*`` hooks, so that the
+    compiled version matches what they would otherwise pass to ``RunInstances``.
+    """
+
+    launch_template_ids = attr.ib(factory=dict, init=False)
+    compiled_launch_templates = attr.ib(factory=dict, init=False)
+
+    def spin_up_worker(self, resource_conf, worker_prefix, queue_name, task_id):
+        compiled = self.compiled_launch_templates.get((worker_prefix, queue_name))
+        if compiled is None:
+            return super().spin_up_worker(resource_conf, worker_prefix, queue_name, task_id)
+
+        ec2 = boto3.client("ec2", **self.creds())
+        user_data = self.launch_user_data(resource_conf, worker_prefix, queue_name, task_id)
+        instance_id = ec2.run_instances(**run_instances_request(compiled, user_data))["Instances"][0]["InstanceId"]
+        boto3.resource("ec2", **self.creds()).Instance(instance_id).wait_until_running()
+        return instance_id
+
+    def compile_launch_templates(self) -> None:
+        """Compile a launch template version for every resource of every queue of the autoscaler."""
+        scaler = self.scaler
+        ec2 = boto3.client("ec2", **self.creds())
+        for queue_name, resources in scaler.queues.items():
+            for resource_name, _ in resources:
+                resource_conf = scaler.resource_configurations[resource_name]
+                worker_prefix = scaler.gen_worker_prefix(resource_name, resource_conf)
+                compiled = self.compile_launch_template(ec2, resource_conf, worker_prefix, queue_name)
+                self.compiled_launch_templates[(worker_prefix, queue_name)] = compiled
+                self.logger.info(
+                    "Launching %s from %s version %s", worker_prefix, compiled.launch_template_id, compiled.version
+                )
+
+    def compile_launch_template(
+        self, ec2, resource_conf: dict, worker_prefix: str, queue_name: str
+    ) -> CompiledLaunchTemplate:
+        launch_conf = self.launch_resource_conf(resource_conf, worker_prefix)
+        user_data = self.launch_user_data(launch_conf, worker_prefix, queue_name, task_id=None)
+        data, run_parameters = self.launch_template_data(launch_conf, user_data)
+        launch_template_id = self.ensure_launch_template(ec2, worker_prefix, launch_conf)
+        version = self.ensure_launch_template_version(ec2, launch_template_id, data)
+        return CompiledLaunchTemplate(launch_template_id, version, user_data, run_parameters)
+
+    def launch_resource_conf(self, resource_conf: dict, worker_prefix: str) -> dict:
+        """The settings a new instance of the resource is launched with."""
+        return resource_conf
+
+    def launch_user_data(self, resource_conf: dict, worker_prefix: str, queue_name: str, task_id) -> str:
+        """The user data a new instance of the resource is launched with."""
+        return self.gen_user_data(worker_prefix, queue_name, task_id, resource_conf.get("cpu_only", False))
+
+    def launch_template_data(self, resource_conf: dict, user_data: str) -> Tuple[dict, dict]:
+        """The launch template data of the resource, and the parameters left for the ``RunInstances`` call."""
+        return compile_launch_template(
+            resource_conf, user_data, self.iam_arn, self.iam_name, tags=parse_tags(resource_conf.get("tags", ""))
+        )
+
+    def ensure_launch_template(self, ec2, worker_prefix: str, resource_conf: dict) -> str:
+        if worker_prefix in self.launch_template_ids:
+            return self.launch_template_ids[worker_prefix]
+
+        name = launch_template_name(worker_prefix)
+        try:
+            launch_template = ec2.describe_launch_templates(LaunchTemplateNames=[name])["LaunchTemplates"][0]
+        except ClientError as err:
+            if "NotFound" not in err.response["Error"]["Code"]:
+                raise
+            # the default version only holds the AMI; launches use versions with their own user data
+            launch_template = ec2.create_launch_template(
+                LaunchTemplateName=name, LaunchTemplateData={"ImageId": resource_conf["ami_id"]}
+            )["LaunchTemplate"]
+        self.launch_template_ids[worker_prefix] = launch_template["LaunchTemplateId"]
+        return launch_template["LaunchTemplateId"]
+
+    def ensure_launch_template_version(self, ec2, launch_template_id: str, data: dict) -> str:
+        """The version of the launch template with ``data``, created unless an earlier start already did."""
+        fingerprint = launch_template_fingerprint(data)
+        paginator = ec2.get_paginator("describe_launch_template_versions")
+        for page in paginator.paginate(LaunchTemplateId=launch_template_id):
+            for version in page["LaunchTemplateVersions"]:
+                if version.get("VersionDescription") == fingerprint:
+                    return str(version["VersionNumber"])
+        return str(
+            ec2.create_launch_template_version(
+                LaunchTemplateId=launch_template_id, VersionDescription=fingerprint, LaunchTemplateData=data
+            )["LaunchTemplateVersion"]["VersionNumber"]
+        )
@@ -0,0 +1,106 @@
+"""
+EC2 launch templates compiled once per resource, so that launching a worker is a small ``RunInstances`` call.
+
+``AWSDriver.spin_up_worker`` builds the whole launch request, user data included, for every
+worker. ``LaunchTemplateAWSDriver`` instead compiles the settings of each resource and the user
+data of its workers into a version of the resource's launch template when the autoscaler starts,
+and then launches with:
+
+    RunInstances(LaunchTemplate={"LaunchTemplateId": "lt-...", "Version": "3"}, MinCount=1, MaxCount=1)
+
+The description of a version is the fingerprint of its data, so restarting the autoscaler with
+an unchanged configuration reuses the version rather than adding one. Launches whose user data
+differs from the compiled one (bin-packed agent layouts, launches for a given task) pass their
+own ``UserData``, which overrides the template's.
+
+The user data holds the agents' ClearML credentials, as the instance user data did before;
+anyone allowed to describe the launch template versions can read them.
+
+This module does not import ``clearml`` or ``boto3``; ``launch_template_driver.py`` does the EC2 calls.
+"""
+
+import hashlib
+import json
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Sequence, Tuple
+
+from cdk_clearml.autoscaler.fleet import launch_template_data
+
+# RunInstances parameters that launch templates do not have; they stay in the RunInstances call
+RUN_INSTANCES_ONLY_KEYS = (
+    "SubnetId",
+    "PrivateIpAddress",
+    "Ipv6AddressCount",
+    "Ipv6Addresses",
+    "AdditionalInfo",
+    "ClientToken",
+)
+
+
+@dataclass
+class CompiledLaunchTemplate:
+    launch_template_id: str
+    version: str
+    user_data: str
+    run_parameters: Dict[str, object] = field(default_factory=dict)
+
+
+def launch_template_name(worker_prefix: str) -> str:
+    # launch template names only allow letters, digits, and ().-/_
+    return "clearml-" + re.sub(r"[^a-zA-Z0-9().\-/_]", "_", worker_prefix)
+
+
+def compile_launch_template(
+    resource_conf: dict,
+    user_data: str,
+    iam_arn: str = "",
+    iam_name: str = "",
+    tags: Sequence[Tuple[str, str]] = (),
+) -> Tuple[dict, dict]:
+    """
+    The launch template data of what ``AWSDriver.spin_up_worker`` passes to ``RunInstances``
+    (or ``RequestSpotInstances``), and the parameters left for the ``RunInstances`` call itself.
+    """
+    extra_configurations = dict(resource_conf.get("extra_configurations", {}))
+    run_parameters = {
+        key: extra_configurations.pop(key) for key in RUN_INSTANCES_ONLY_KEYS if key in extra_configurations
+    }
+    if resource_conf.get("subnet_id"):
+        run_parameters.setdefault("SubnetId", resource_conf["subnet_id"])
+
+    data = launch_template_data({**resource_conf, "extra_configurations": {}}, user_data, iam_arn, iam_name)
+    data["InstanceType"] = resource_conf["instance_type"]
+    # the subnet already determines the availability zone
+    if resource_conf.get("availability_zone") and "SubnetId" not in run_parameters:
+        data["Placement"] = {"AvailabilityZone": resource_conf["availability_zone"]}
+    if resource_conf.get("is_spot"):
+        data["InstanceMarketOptions"] = {
+            "MarketType": "spot",
+            "SpotOptions": {"SpotInstanceType": "one-time", "InstanceInterruptionBehavior": "terminate"},
+        }
+    if tags:
+        # tagged at launch rather than with a CreateTags call afterwards
+        data["TagSpecifications"] = [
+            {"ResourceType": "instance", "Tags": [{"Key": key, "Value": value} for key, value in tags]}
+        ]
+    data.update(extra_configurations)
+    return data, run_parameters
+
+
+def launch_template_fingerprint(data: dict) -> str:
+    """Identifies the launch template data in the description of its version (at most 255 characters)."""
+    return "clearml-autoscaler:" + hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def run_instances_request(compiled: CompiledLaunchTemplate, user_data: Optional[str] = None) -> dict:
+    """Parameters of a ``RunInstances`` call for a single instance; ``user_data`` overrides the compiled one."""
+    request = {
+        "LaunchTemplate": {"LaunchTemplateId": compiled.launch_template_id, "Version": compiled.version},
+        "MinCount": 1,
+        "MaxCount": 1,
+        **compiled.run_parameters,
+    }
+    if user_data is not None and user_data != compiled.user_data:
+        request["UserData"] = user_data
+    return request
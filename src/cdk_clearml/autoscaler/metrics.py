@@ -0,0 +1,173 @@
+"""
+Counters, gauges, and histograms of the autoscaler, and their CloudWatch embedded metric format.
+
+``InstrumentedAutoScaler`` (``scaler.py``) records into a ``MetricsRegistry`` during a pass of the
+supervisor and takes a ``MetricsSnapshot`` at the end of it. Counters and histograms cover the
+pass; gauges keep their last value. A snapshot is published as:
+
+- EMF documents, one JSON line per set of dimension values, which CloudWatch Logs turns into
+  metrics of ``METRICS_NAMESPACE`` (e.g. from the logs of the autoscaler service), both with
+  their own dimensions and with the autoscaler's alone, so that alarms see all queues at once;
+- ClearML scalars of the autoscaler task (see ``instrumentation.py``).
+
+The metric names end in their unit: ``_seconds`` and ``_ms`` are durations, anything else counts.
+
+This module does not import ``clearml`` or ``boto3``.
+"""
+
+import json
+import math
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from time import perf_counter
+from typing import Dict, Iterator, List, Optional, Tuple
+
+METRICS_NAMESPACE = "ClearML/Autoscaler"
+AUTOSCALER_DIMENSION = "Autoscaler"
+
+# CloudWatch takes at most 100 distinct values per histogram in an EMF document
+MAX_EMF_HISTOGRAM_VALUES = 100
+
+# (name, ((dimension, value), ...))
+MetricKey = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+def metric_key(name: str, dimensions: Dict[str, str]) -> MetricKey:
+    return name, tuple(sorted((key, str(value)) for key, value in dimensions.items()))
+
+
+def metric_unit(name: str) -> str:
+    if name.endswith("_seconds"):
+        return "Seconds"
+    if name.endswith("_ms"):
+        return "Milliseconds"
+    return "Count"
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of ``values``, e.g. ``fraction=0.9`` for the p90."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+@dataclass
+class MetricsSnapshot:
+    counters: Dict[MetricKey, float] = field(default_factory=dict)
+    gauges: Dict[MetricKey, float] = field(default_factory=dict)
+    histograms: Dict[MetricKey, List[float]] = field(default_factory=dict)
+
+
+class MetricsRegistry:
+    """
+    Thread-safe store of the metrics of the current pass.
+
+    The botocore hooks and the API client proxy record from whichever thread makes the call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[MetricKey, float] = defaultdict(float)
+        self._gauges: Dict[MetricKey, float] = {}
+        self._histograms: Dict[MetricKey, List[float]] = defaultdict(list)
+
+    def increment(self, name: str, value: float = 1.0, **dimensions: str) -> None:
+        with self._lock:
+            self._counters[metric_key(name, dimensions)] += value
+
+    def set_gauge(self, name: str, value: float, **dimensions: str) -> None:
+        with self._lock:
+            self._gauges[metric_key(name, dimensions)] = value
+
+    def observe(self, name: str, value: float, **dimensions: str) -> None:
+        with self._lock:
+            self._histograms[metric_key(name, dimensions)].append(value)
+
+    @contextmanager
+    def timer(self, name: str, **dimensions: str) -> Iterator[None]:
+        """Observe how long the block took, in the unit of ``name``."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            self.observe(name, elapsed * 1000 if name.endswith("_ms") else elapsed, **dimensions)
+
+    def snapshot(self) -> MetricsSnapshot:
+        """The metrics so far; counters and histograms start over."""
+        with self._lock:
+            snapshot = MetricsSnapshot(
+                counters=dict(self._counters), gauges=dict(self._gauges), histograms=dict(self._histograms)
+            )
+            self._counters.clear()
+            self._histograms.clear()
+        return snapshot
+
+
+def emf_histogram(values: List[float]) -> dict:
+    """``values`` as an EMF value/count pair, rounded to 3 significant digits to stay within the value limit."""
+    digits = 3
+    while True:
+        counts = Counter(float(f"{value:.{digits}g}") for value in values)
+        if len(counts) <= MAX_EMF_HISTOGRAM_VALUES or digits == 1:
+            break
+        digits -= 1
+    distinct = sorted(counts)[:MAX_EMF_HISTOGRAM_VALUES]
+    return {
+        "Values": distinct,
+        "Counts": [counts[value] for value in distinct],
+        "Max": max(values),
+        "Min": min(values),
+        "Count": len(values),
+        "Sum": sum(values),
+    }
+
+
+def emf_documents(
+    snapshot: MetricsSnapshot,
+    timestamp_ms: int,
+    dimensions: Optional[Dict[str, str]] = None,
+    namespace: str = METRICS_NAMESPACE,
+) -> List[dict]:
+    """
+    One EMF document per set of dimension values in ``snapshot``, each also carrying ``dimensions``.
+
+    The metrics of a document with dimensions of its own are also published with ``dimensions`` only.
+    """
+    dimensions = dimensions or {}
+    grouped: Dict[Tuple[Tuple[str, str], ...], Dict[str, object]] = defaultdict(dict)
+    for metrics in (snapshot.counters, snapshot.gauges):
+        for (name, metric_dimensions), value in metrics.items():
+            grouped[metric_dimensions][name] = value
+    for (name, metric_dimensions), values in snapshot.histograms.items():
+        if values:
+            grouped[metric_dimensions][name] = emf_histogram(values)
+
+    documents = []
+    for metric_dimensions, values in grouped.items():
+        all_dimensions = {**dimensions, **dict(metric_dimensions)}
+        dimension_sets = [sorted(all_dimensions)]
+        if metric_dimensions and dimensions:
+            dimension_sets.append(sorted(dimensions))
+        documents.append(
+            {
+                "_aws": {
+                    "Timestamp": timestamp_ms,
+                    "CloudWatchMetrics": [
+                        {
+                            "Namespace": namespace,
+                            "Dimensions": dimension_sets,
+                            "Metrics": [{"Name": name, "Unit": metric_unit(name)} for name in sorted(values)],
+                        }
+                    ],
+                },
+                **all_dimensions,
+                **values,
+            }
+        )
+    return documents
+
+
+def render_emf(documents: List[dict]) -> str:
+    return "\n".join(json.dumps(document, sort_keys=True) for document in documents)
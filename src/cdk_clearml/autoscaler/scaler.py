@@ -0,0 +1,538 @@
+"""
+ClearML ``AutoScaler`` subclasses: one wakes up on queue changes instead of polling at a fixed
+interval, one bin-packs queued tasks onto multi-GPU instances, one launches workers ahead of
+the bursts forecast from past queue arrivals, one records metrics about its passes, and one
+leaves a heartbeat for health checks. ``autoscaler_class`` combines them.
+"""
+
+import threading
+from collections import Counter, defaultdict, deque
+from contextlib import contextmanager
+from pathlib import Path
+from time import perf_counter, time
+from typing import Callable, Deque, Dict, Iterable, Iterator, List, Optional, Set, Tuple, Type
+
+from clearml.automation import auto_scaler
+from clearml.automation.auto_scaler import MINUTE, AutoScaler, WorkerId
+
+from cdk_clearml.autoscaler.binpacking import (
+    ResourceRequest,
+    gpu_queue_name,
+    instance_id_of,
+    instance_options_from_config,
+    parse_resource_request,
+    plan_instances,
+)
+from cdk_clearml.autoscaler.forecast import (
+    DAY,
+    WEEK,
+    ArrivalRecord,
+    ArrivalStore,
+    PreScalePolicy,
+    SeasonalArrivalModel,
+)
+from cdk_clearml.autoscaler.instrumentation import (
+    InstrumentedDriver,
+    TimedAPIClient,
+    publish_emf,
+    register_ec2_latency_hooks,
+    report_scalars,
+)
+from cdk_clearml.autoscaler.metrics import AUTOSCALER_DIMENSION, MetricsRegistry
+from cdk_clearml.autoscaler.wakeup import AdaptiveBackoff, EventDrivenSleep, QueueWatcher
+
+DEFAULT_PROBE_INTERVAL_SECONDS = 2.0
+DEFAULT_MAX_PROBE_INTERVAL_SECONDS = 15.0
+DEFAULT_MAX_PASS_INTERVAL_MIN = 5.0
+
+DEFAULT_PRESCALE_LEAD_TIME_MIN = 10.0
+DEFAULT_QUIET_MAX_IDLE_TIME_MIN = 2.0
+DEFAULT_ARRIVAL_HISTORY_UPDATE_MIN = 10.0
+TASKS_PER_REQUEST = 500
+FINISHED_TASK_STATUSES = {"completed", "failed", "stopped", "published", "closed"}
+
+
+@contextmanager
+def replace_auto_scaler_sleep(sleep: Callable[[float], None]) -> Iterator[None]:
+    """
+    Swap the ``sleep`` the ``auto_scaler`` module imported from ``time``.
+
+    ``AutoScaler.supervisor`` has no hook for its idle wait, so this is the narrowest place to change it.
+    """
+    original_sleep = auto_scaler.sleep
+    auto_scaler.sleep = sleep
+    try:
+        yield
+    finally:
+        auto_scaler.sleep = original_sleep
+
+
+class EventDrivenAutoScaler(AutoScaler):
+    """
+    ``AutoScaler`` whose supervisor runs a full pass as soon as one of its queues changes.
+
+    ``polling_interval_time_min`` becomes the time between passes right after activity; while the
+    queues stay unchanged, it backs off to ``max_pass_interval_min``. In between, the queues are
+    probed with a single API call, every ``probe_interval_seconds`` after activity and backing off
+    to every ``max_probe_interval_seconds`` while idle.
+    """
+
+    def __init__(
+        self,
+        config,
+        driver,
+        probe_interval_seconds: float = DEFAULT_PROBE_INTERVAL_SECONDS,
+        max_probe_interval_seconds: float = DEFAULT_MAX_PROBE_INTERVAL_SECONDS,
+        max_pass_interval_min: float = DEFAULT_MAX_PASS_INTERVAL_MIN,
+        logger=None,
+    ):
+        super().__init__(config, driver, logger=logger)
+        idle_seconds = self.polling_interval_time_min * MINUTE
+        self.event_driven_sleep = EventDrivenSleep(
+            watcher=QueueWatcher(self.api_client, queue_names=self.queues),
+            idle_seconds=idle_seconds,
+            backoff=AdaptiveBackoff(
+                min_seconds=idle_seconds,
+                max_seconds=max(idle_seconds, max_pass_interval_min * MINUTE),
+            ),
+            probe_interval_seconds=probe_interval_seconds,
+            max_probe_interval_seconds=max_probe_interval_seconds,
+        )
+
+    def start(self):
+        self.event_driven_sleep.supervisor_thread = threading.current_thread()
+        with replace_auto_scaler_sleep(self.event_driven_sleep):
+            super().start()
+
+
+class BinPackingAutoScaler(AutoScaler):
+    """
+    ``AutoScaler`` that packs the tasks of ``bin_packing_queues`` onto multi-GPU instances.
+
+    ``AutoScaler.supervisor`` skips these queues. Instead, ``extra_allocations`` moves their tasks to
+    the ``<queue>-<n>gpu`` queue matching their ``gpus=<n>`` tag, and launches the instances planned
+    by ``binpacking.plan_instances`` for the tasks no idle or booting agent daemon can take.
+    ``BinPackingAWSDriver`` then starts one daemon per planned task on each of them, pinned to the
+    task's GPUs.
+
+    The resources of these queues need ``gpus``, ``memory_gib``, and ``hourly_price`` in
+    ``resource_configurations``.
+    """
+
+    def __init__(self, config, driver, bin_packing_queues: Iterable[str] = (), logger=None, **kwargs):
+        super().__init__(config, driver, logger=logger, **kwargs)
+        unknown_queues = set(bin_packing_queues) - set(self.queues)
+        if unknown_queues:
+            raise ValueError(f"Bin-packing queues {sorted(unknown_queues)} are not in 'queues'")
+
+        # the supervisor would spin up one instance per queued task on the queues left in self.queues
+        self.bin_packing_queues = {queue: self.queues.pop(queue) for queue in bin_packing_queues}
+        self.instance_options = {
+            queue: instance_options_from_config(queue_resources, self.resource_configurations)
+            for queue, queue_resources in self.bin_packing_queues.items()
+        }
+        self.task_requests: Dict[str, ResourceRequest] = {}
+        # GPUs of the agent daemons of the planned instances, until the driver launches them
+        self.pending_agent_gpus: Dict[str, Deque[List[Tuple[int, ...]]]] = defaultdict(deque)
+        # instance ID -> (spin up time, worker prefix, queues of its agent daemons), until they register
+        self.booting_agents: Dict[str, Tuple[float, str, List[str]]] = {}
+
+        event_driven_sleep = getattr(self, "event_driven_sleep", None)
+        if event_driven_sleep is not None:
+            event_driven_sleep.watcher.queue_names.update(self.gpu_queue_names())
+
+    def gpu_queue_names(self) -> List[str]:
+        return [
+            gpu_queue_name(queue, gpus)
+            for queue, options in self.instance_options.items()
+            for gpus in range(1, max(option.gpus for option in options) + 1)
+        ]
+
+    def ensure_queues(self):
+        super().ensure_queues()
+        all_queues = {queue.name for queue in self.api_client.queues.get_all(only_fields=["name"])}
+        for queue in sorted(set(self.bin_packing_queues).union(self.gpu_queue_names()) - all_queues):
+            self.logger.info("Creating queue %r", queue)
+            self.api_client.queues.create(queue)
+
+    def extra_allocations(self):
+        allocations = super().extra_allocations()
+        if not self.bin_packing_queues:
+            return allocations
+
+        queues_by_name = {
+            queue.name: queue for queue in self.api_client.queues.get_all(only_fields=["id", "name", "entries"])
+        }
+        workers = self.get_workers()
+        for queue in self.bin_packing_queues:
+            routed_tasks = self.route_to_gpu_queues(queue, queues_by_name)
+            allocations.extend(self.allocate_packed_instances(queue, queues_by_name, workers, routed_tasks))
+        return allocations
+
+    def route_to_gpu_queues(self, queue: str, queues_by_name: dict) -> List[Tuple[str, ResourceRequest]]:
+        """Move the tasks enqueued on ``queue`` to the GPU queue matching their request, and return them."""
+        task_ids = [entry.task for entry in queues_by_name[queue].entries or []]
+        self.fetch_task_requests(task_ids)
+        max_gpus = max(option.gpus for option in self.instance_options[queue])
+
+        routed_tasks = []
+        for task_id in task_ids:
+            request = self.task_requests[task_id]
+            if not 1 <= request.gpus <= max_gpus:
+                self.logger.warning(
+                    "Task %s requests %d GPUs, %r offers 1 to %d", task_id, request.gpus, queue, max_gpus
+                )
+                continue
+            self.api_client.queues.remove_task(queue=queues_by_name[queue].id, task=task_id)
+            self.api_client.queues.add_task(queue=queues_by_name[gpu_queue_name(queue, request.gpus)].id, task=task_id)
+            routed_tasks.append((task_id, request))
+        return routed_tasks
+
+    def allocate_packed_instances(
+        self, queue: str, queues_by_name: dict, workers: list, routed_tasks: List[Tuple[str, ResourceRequest]]
+    ) -> List[str]:
+        """Plan instances for the queued tasks of ``queue`` that no idle or booting agent can take."""
+        options = self.instance_options[queue]
+        resource_names = {option.resource_name for option in options}
+        gpu_queue_task_ids = [
+            entry.task
+            for gpus in range(1, max(option.gpus for option in options) + 1)
+            for entry in queues_by_name[gpu_queue_name(queue, gpus)].entries or []
+        ]
+        self.fetch_task_requests(gpu_queue_task_ids)
+        queued_tasks = routed_tasks + [(task_id, self.task_requests[task_id]) for task_id in gpu_queue_task_ids]
+
+        free_agents: Counter = Counter()
+        instances_by_resource: Dict[str, set] = defaultdict(set)
+        registered_instance_ids = set()
+        for worker in workers:
+            worker_id = WorkerId(worker.id)
+            registered_instance_ids.add(instance_id_of(worker_id.cloud_id))
+            if worker_id.name not in resource_names:
+                continue
+            instances_by_resource[worker_id.name].add(instance_id_of(worker_id.cloud_id))
+            if not getattr(worker, "task", None):
+                free_agents.update(getattr(worker_queue, "name", None) for worker_queue in worker.queues or [])
+
+        for instance_id, (spin_up_time, worker_prefix, agent_queues) in list(self.booting_agents.items()):
+            if instance_id in registered_instance_ids or time() - spin_up_time > self.max_spin_up_time_min * MINUTE:
+                self.booting_agents.pop(instance_id)
+                continue
+            for resource_name in resource_names:
+                if self.gen_worker_prefix(resource_name, self.resource_configurations[resource_name]) == worker_prefix:
+                    instances_by_resource[resource_name].add(instance_id)
+                    free_agents.update(agent_queues)
+                    break
+
+        # queued tasks first go to the agents that are idle or about to register
+        unserved_tasks = []
+        for task_id, request in queued_tasks:
+            agent_queue = gpu_queue_name(queue, request.gpus)
+            if free_agents[agent_queue] > 0:
+                free_agents[agent_queue] -= 1
+            else:
+                unserved_tasks.append((task_id, request))
+        if not unserved_tasks:
+            return []
+
+        planned_instances, unplaced_task_ids = plan_instances(
+            unserved_tasks,
+            options,
+            running_instances={resource: len(ids) for resource, ids in instances_by_resource.items()},
+        )
+        if unplaced_task_ids:
+            self.logger.info("No capacity left on %r for tasks %s", queue, unplaced_task_ids)
+
+        allocations = []
+        for instance in planned_instances:
+            resource_name = instance.option.resource_name
+            worker_prefix = self.gen_worker_prefix(resource_name, self.resource_configurations[resource_name])
+            self.logger.info(
+                "Packing %d tasks of %r onto a new %r instance (%d of %d GPUs)",
+                len(instance.tasks),
+                queue,
+                resource_name,
+                instance.option.gpus - instance.free_gpus,
+                instance.option.gpus,
+            )
+            self.pending_agent_gpus[worker_prefix].append(instance.agent_gpus())
+            allocations.append(resource_name)
+        return allocations
+
+    def fetch_task_requests(self, task_ids: List[str]) -> None:
+        unknown_task_ids = [task_id for task_id in task_ids if task_id not in self.task_requests]
+        if not unknown_task_ids:
+            return
+        for task in self.api_client.tasks.get_all(id=unknown_task_ids, only_fields=["id", "tags"]):
+            self.task_requests[task.id] = parse_resource_request(task.tags)
+        for task_id in unknown_task_ids:
+            # e.g. a task that was deleted while enqueued
+            self.task_requests.setdefault(task_id, ResourceRequest())
+
+    def pop_agent_gpus(self, worker_prefix: str) -> Optional[List[Tuple[int, ...]]]:
+        """GPUs of the agent daemons of the next instance to launch for ``worker_prefix``, if it was bin-packed."""
+        pending = self.pending_agent_gpus.get(worker_prefix)
+        return pending.popleft() if pending else None
+
+    def register_booting_agents(self, instance_id: str, worker_prefix: str, agent_queues: List[str]) -> None:
+        self.booting_agents[instance_id] = (time(), worker_prefix, agent_queues)
+
+
+class PredictiveAutoScaler(AutoScaler):
+    """
+    ``AutoScaler`` that launches workers for ``prescale_queues`` ahead of the forecast bursts.
+
+    Every pass, the tasks found on the queues are recorded in an ``ArrivalStore`` at
+    ``arrival_history_path``; every ``history_update_min``, the durations of the finished ones are
+    filled in, the store is saved, and a ``SeasonalArrivalModel`` per queue is fitted again.
+
+    ``extra_allocations`` then launches the first resource of every prescale queue, as many as
+    ``PreScalePolicy.workers_to_prelaunch`` tells from the workers the queue already has.
+    ``max_idle_time_min`` drops to ``quiet_max_idle_time_min`` while no burst is expected on any queue.
+    """
+
+    def __init__(
+        self,
+        config,
+        driver,
+        arrival_history_path: Path,
+        prescale_queues: Iterable[str] = (),
+        prescale_lead_time_min: float = DEFAULT_PRESCALE_LEAD_TIME_MIN,
+        quiet_max_idle_time_min: float = DEFAULT_QUIET_MAX_IDLE_TIME_MIN,
+        seasonality: str = "day",
+        history_update_min: float = DEFAULT_ARRIVAL_HISTORY_UPDATE_MIN,
+        logger=None,
+        **kwargs,
+    ):
+        super().__init__(config, driver, logger=logger, **kwargs)
+        unknown_queues = set(prescale_queues) - set(self.queues)
+        if unknown_queues:
+            raise ValueError(f"Prescale queues {sorted(unknown_queues)} are not in 'queues'")
+        if seasonality not in ("day", "week"):
+            raise ValueError(f"seasonality must be 'day' or 'week', got '{seasonality}'")
+
+        self.prescale_queues = list(prescale_queues)
+        self.configured_max_idle_time_min = self.max_idle_time_min
+        self.history_update_min = history_update_min
+        self.arrival_store = ArrivalStore(arrival_history_path)
+        self.policies = {
+            queue: PreScalePolicy(
+                model=SeasonalArrivalModel(period_seconds=DAY if seasonality == "day" else WEEK),
+                lead_time_min=prescale_lead_time_min,
+                quiet_max_idle_time_min=quiet_max_idle_time_min,
+            )
+            for queue in self.queues
+        }
+        self.history_updated_at = 0.0
+
+    def extra_allocations(self):
+        allocations = super().extra_allocations()
+        now = time()
+        self.record_arrivals(now)
+        if now - self.history_updated_at > self.history_update_min * MINUTE:
+            self.update_history(now)
+
+        self.max_idle_time_min = max(
+            policy.max_idle_time_min(now, self.configured_max_idle_time_min) for policy in self.policies.values()
+        )
+        if not self.prescale_queues:
+            return allocations
+
+        workers = Counter(WorkerId(worker.id).name for worker in self.get_workers())
+        for queue in self.prescale_queues:
+            allocations.extend(self.prelaunch(queue, workers, now))
+        return allocations
+
+    def record_arrivals(self, now: float) -> None:
+        for queue in self.api_client.queues.get_all(only_fields=["name", "entries"]):
+            if queue.name not in self.policies:
+                continue
+            for entry in queue.entries or []:
+                added = getattr(entry, "added", None)
+                self.arrival_store.add(
+                    ArrivalRecord(
+                        task_id=entry.task,
+                        queue=queue.name,
+                        enqueued_at=added.timestamp() if hasattr(added, "timestamp") else now,
+                    )
+                )
+
+    def update_history(self, now: float) -> None:
+        """Fill in the durations of the finished tasks, save the store, and fit the models again."""
+        pending_task_ids = [record.task_id for record in self.arrival_store.without_duration()]
+        for start in range(0, len(pending_task_ids), TASKS_PER_REQUEST):
+            task_ids = pending_task_ids[start : start + TASKS_PER_REQUEST]
+            tasks = self.api_client.tasks.get_all(id=task_ids, only_fields=["id", "status", "started", "completed"])
+            for task in tasks:
+                if task.status in FINISHED_TASK_STATUSES and task.started and task.completed:
+                    self.arrival_store.set_duration(task.id, (task.completed - task.started).total_seconds())
+            for task_id in set(task_ids) - {task.id for task in tasks}:
+                # deleted tasks still count as arrivals, they just do not tell how long tasks run
+                self.arrival_store.set_duration(task_id, 0.0)
+        self.arrival_store.save(now)
+
+        records_by_queue: Dict[str, List[ArrivalRecord]] = defaultdict(list)
+        for record in self.arrival_store.records.values():
+            records_by_queue[record.queue].append(record)
+        for queue, policy in self.policies.items():
+            policy.model.fit(records_by_queue[queue], now)
+        self.history_updated_at = now
+
+    def prelaunch(self, queue: str, workers: Counter, now: float) -> List[str]:
+        resource, max_instances = self.queues[queue][0]
+        # workers of the other resources of the queue serve it too, but only `resource` is pre-launched
+        other_workers = sum(workers[resource_name] for resource_name, _ in self.queues[queue][1:])
+        count = self.policies[queue].workers_to_prelaunch(
+            now, running_workers=workers[resource] + other_workers, max_workers=int(max_instances) + other_workers
+        )
+        if count:
+            self.logger.info("Pre-launching %d %r workers for the arrivals forecast on %r", count, resource, queue)
+        return [resource] * count
+
+
+class InstrumentedAutoScaler(AutoScaler):
+    """
+    ``AutoScaler`` that records metrics about its passes; see ``metrics.py`` and ``instrumentation.py``.
+
+    Every pass records the depth of each queue and the age of its oldest task, how long the tasks
+    that left a queue since the last pass waited on it, the running, idle, and booting workers,
+    how long launched workers took to register, and how long idle workers stayed idle before a
+    task reused them or they were spun down. Together with the launches, spin downs, and the
+    latency of the EC2 and ClearML API calls, they are published at the end of the pass: as
+    scalars of the autoscaler task, and with ``emf=True`` as EMF on stdout.
+
+    The waits and durations are seen at the pass boundaries, so they are accurate to the time
+    between passes. ``report_app_stats`` only runs with a current ClearML task, which
+    ``aws_autoscaler.py`` always has.
+    """
+
+    def __init__(self, config, driver, emf: bool = False, logger=None, **kwargs):
+        self.metrics = MetricsRegistry()
+        super().__init__(config, InstrumentedDriver(driver, self.metrics), logger=logger, **kwargs)
+        self.api_client = TimedAPIClient(self.api_client, self.metrics)
+        register_ec2_latency_hooks(self.metrics)
+        self.emf = emf
+        self.pass_count = 0
+        self.pass_started_at: Optional[float] = None
+        self.last_workers: list = []
+        # task ID -> (queue, enqueue time) of the tasks queued at the last pass
+        self.queued_tasks: Dict[str, Tuple[str, float]] = {}
+        # worker ID -> time since which it is idle, at the last pass
+        self.idle_since: Dict[str, float] = {}
+
+    def watched_queue_names(self) -> Set[str]:
+        # resource_to_queue still has the bin-packing queues, which BinPackingAutoScaler takes out of self.queues
+        gpu_queue_names = getattr(self, "gpu_queue_names", None)
+        return set(self.resource_to_queue.values()).union(gpu_queue_names() if gpu_queue_names else [])
+
+    def get_workers(self):
+        self.last_workers = super().get_workers()
+        return self.last_workers
+
+    def extra_allocations(self):
+        self.pass_started_at = perf_counter()
+        self.record_queues(time())
+        return super().extra_allocations()
+
+    def report_app_stats(self, logger, queue_id_to_name, up_machines, idle_workers):
+        super().report_app_stats(logger, queue_id_to_name, up_machines, idle_workers)
+        self.record_workers(idle_workers, time())
+        if self.pass_started_at is not None:
+            self.metrics.observe("pass_seconds", perf_counter() - self.pass_started_at)
+
+        snapshot = self.metrics.snapshot()
+        self.pass_count += 1
+        if self.emf:
+            publish_emf(snapshot, dimensions={AUTOSCALER_DIMENSION: self.workers_prefix})
+        report_scalars(logger, snapshot, iteration=self.pass_count)
+
+    def record_queues(self, now: float) -> None:
+        watched_queue_names = self.watched_queue_names()
+        queued_tasks: Dict[str, Tuple[str, float]] = {}
+        for queue in self.api_client.queues.get_all(only_fields=["name", "entries"]):
+            if queue.name not in watched_queue_names:
+                continue
+            entries = queue.entries or []
+            oldest_enqueued_at = now
+            for entry in entries:
+                added = getattr(entry, "added", None)
+                enqueued_at = added.timestamp() if hasattr(added, "timestamp") else now
+                queued_tasks[entry.task] = (queue.name, enqueued_at)
+                oldest_enqueued_at = min(oldest_enqueued_at, enqueued_at)
+            self.metrics.set_gauge("queue_depth", len(entries), Queue=queue.name)
+            self.metrics.set_gauge("oldest_task_age_seconds", now - oldest_enqueued_at, Queue=queue.name)
+
+        for task_id, (queue_name, enqueued_at) in self.queued_tasks.items():
+            if task_id not in queued_tasks:
+                # taken, moved to another queue, or dequeued since the last pass
+                self.metrics.observe("queue_wait_seconds", now - enqueued_at, Queue=queue_name)
+        self.queued_tasks = queued_tasks
+
+    def record_workers(self, idle_workers: dict, now: float) -> None:
+        worker_ids = {worker.id for worker in self.last_workers}
+        registered_instance_ids = {instance_id_of(WorkerId(worker_id).cloud_id) for worker_id in worker_ids}
+        self.metrics.set_gauge("running_workers", len(worker_ids))
+        self.metrics.set_gauge("idle_workers", len(idle_workers))
+
+        launched = self.driver.launched
+        for instance_id, (resource, launched_at) in list(launched.items()):
+            if instance_id in registered_instance_ids:
+                self.metrics.observe("registration_seconds", now - launched_at, Resource=resource)
+                del launched[instance_id]
+        self.metrics.set_gauge("booting_workers", len(launched))
+
+        for worker_id, idle_since in self.idle_since.items():
+            if worker_id in idle_workers:
+                continue
+            if instance_id_of(WorkerId(worker_id).cloud_id) in self.driver.spun_down:
+                self.metrics.observe("idle_seconds_before_spin_down", now - idle_since)
+            elif worker_id in worker_ids:
+                # a task reused the worker: keeping it for max_idle_time_min saved a launch
+                self.metrics.observe("idle_seconds_before_reuse", now - idle_since)
+        self.idle_since = {worker_id: idle_since for worker_id, (idle_since, _, _) in idle_workers.items()}
+        self.driver.spun_down.clear()
+
+
+class HeartbeatAutoScaler(AutoScaler):
+    """
+    ``AutoScaler`` that touches ``heartbeat_fpath`` on every pass of its supervisor.
+
+    The supervisor runs in a single thread that can get stuck in an API call or a spin up without
+    the process exiting; a health check on the age of the file notices that.
+    """
+
+    def __init__(self, config, driver, heartbeat_fpath: Path, logger=None, **kwargs):
+        super().__init__(config, driver, logger=logger, **kwargs)
+        self.heartbeat_fpath = heartbeat_fpath
+        self.heartbeat_fpath.parent.mkdir(parents=True, exist_ok=True)
+        self.heartbeat_fpath.touch()
+
+    def extra_allocations(self):
+        self.heartbeat_fpath.touch()
+        return super().extra_allocations()
+
+
+def autoscaler_class(
+    event_driven: bool = False,
+    bin_packing: bool = False,
+    predictive: bool = False,
+    instrumented: bool = False,
+    heartbeat: bool = False,
+) -> Type[AutoScaler]:
+    """The ``AutoScaler`` subclass with the given features; the keyword arguments of each are passed through."""
+    bases = tuple(
+        scaler_class
+        for scaler_class, enabled in (
+            (HeartbeatAutoScaler, heartbeat),
+            (InstrumentedAutoScaler, instrumented),
+            (PredictiveAutoScaler, predictive),
+            (BinPackingAutoScaler, bin_packing),
+            (EventDrivenAutoScaler, event_driven),
+        )
+        if enabled
+    )
+    if not bases:
+        return AutoScaler
+    if len(bases) == 1:
+        return bases[0]
+    return type("".join(base.__name__[: -len("AutoScaler")] for base in bases) + "AutoScaler", bases, {})
@@ -0,0 +1,810 @@
+"""
+Simulation of the autoscaler against a simulated ClearML queue and a fake EC2 driver.
+
+A simulated clock lets a day of traffic run in seconds. ``SimulatedSupervisor`` mirrors what
+``AutoScaler.supervisor`` does on every pass and counts the ClearML API and EC2 calls it would
+make, so that scheduling policies can be compared on the same synthetic trace:
+
+    python -m cdk_clearml.autoscaler.simulation --hours 24 --polling-interval-min 0.33
+
+It also compares cold starts with starts from a warm pool of stopped instances (see
+``warm_pool.py``) and prints a histogram of the spin-up times of both, and replays the trace on
+spot capacity that runs short and gets interrupted, with a single spot pool and with a
+diversified spot-first fleet that hands interrupted tasks back to the queue (see ``fleet.py``).
+
+Finally, it replays the last ``--hours`` of a longer trace with and without pre-scaling (see
+``forecast.py``), the forecast learned from the days before. ``--arrival-history`` replays the
+arrivals an autoscaler recorded instead of a synthetic trace.
+
+Only the standard library is needed; ``clearml`` is not imported.
+"""
+
+import math
+import random
+import statistics
+from argparse import ArgumentParser
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from cdk_clearml.autoscaler.forecast import DAY, ArrivalRecord, ArrivalStore, PreScalePolicy, SeasonalArrivalModel
+from cdk_clearml.autoscaler.wakeup import AdaptiveBackoff, EventDrivenSleep
+
+HOUR = 3600.0
+MINUTE = 60.0
+
+
+@dataclass
+class SimulatedTask:
+    """A task and the times it went through the queue."""
+
+    task_id: str
+    enqueued_at: float
+    duration_seconds: float
+    seen_at: Optional[float] = None
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    interruptions: int = 0
+    lost_at: Optional[float] = None
+
+
+@dataclass
+class SimulatedInstance:
+    """An EC2 instance running one agent."""
+
+    instance_id: str
+    launched_at: float
+    ready_at: float
+    task: Optional[SimulatedTask] = None
+    idle_since: Optional[float] = None
+    terminated_at: Optional[float] = None
+    hourly_price: float = 0.0
+    interrupt_at: Optional[float] = None
+
+    @property
+    def is_alive(self) -> bool:
+        return self.terminated_at is None
+
+
+class SimulatedClearML:
+    """
+    The queue, the agents on the instances, and the clock.
+
+    Time only moves forward through ``sleep``. Every ``tick_seconds``, arrived tasks are enqueued,
+    finished tasks free their instance, and idle agents pull the oldest task from the queue.
+
+    :param requeue_interrupted: Whether the task of an interrupted spot instance goes back to the
+        queue, as ``spot_interruption.py`` does, or is lost.
+    """
+
+    def __init__(self, trace: List[SimulatedTask], tick_seconds: float = 1.0, requeue_interrupted: bool = True):
+        self.now = 0.0
+        self.requeue_interrupted = requeue_interrupted
+        self.interruptions = 0
+        self.tick_seconds = tick_seconds
+        self.trace = sorted(trace, key=lambda task: task.enqueued_at)
+        self.next_arrival_index = 0
+        self.queue: Deque[SimulatedTask] = deque()
+        self.instances: Dict[str, SimulatedInstance] = {}
+        self.api_calls = 0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.advance_to(self.now + seconds)
+
+    def advance_to(self, until: float) -> None:
+        while self.now < until:
+            self.now = min(until, self.now + self.tick_seconds)
+            self._tick()
+
+    def alive_instances(self) -> List[SimulatedInstance]:
+        return [instance for instance in self.instances.values() if instance.is_alive]
+
+    def snapshot(self) -> Tuple[str, ...]:
+        """The single ``queues.get_all`` call of ``QueueWatcher.snapshot``."""
+        self.api_calls += 1
+        return tuple(task.task_id for task in self.queue)
+
+    def _tick(self) -> None:
+        while self.next_arrival_index < len(self.trace):
+            task = self.trace[self.next_arrival_index]
+            if task.enqueued_at > self.now:
+                break
+            self.queue.append(task)
+            self.next_arrival_index += 1
+
+        for instance in self.alive_instances():
+            if instance.interrupt_at is not None and instance.interrupt_at <= self.now:
+                self._interrupt(instance)
+                continue
+            if instance.ready_at > self.now:
+                continue
+            if instance.task and instance.task.started_at + instance.task.duration_seconds <= self.now:
+                instance.task.finished_at = self.now
+                instance.task = None
+                instance.idle_since = self.now
+            if instance.task is None:
+                if self.queue:
+                    instance.task = self.queue.popleft()
+                    instance.task.started_at = self.now
+                    instance.idle_since = None
+                elif instance.idle_since is None:
+                    instance.idle_since = self.now
+
+    def _interrupt(self, instance: SimulatedInstance) -> None:
+        self.interruptions += 1
+        instance.terminated_at = self.now
+        task, instance.task = instance.task, None
+        if task is None:
+            return
+        task.interruptions += 1
+        if self.requeue_interrupted:
+            task.started_at = None
+            self.queue.append(task)
+        else:
+            task.lost_at = self.now
+
+
+class FakeEc2Driver:
+    """
+    Launches simulated instances that become ready about ``boot_seconds`` later.
+
+    With a ``warm_pool_size``, workers that are spun down are stopped rather than terminated, up to
+    that many, and the next spin-up starts one of them in about ``warm_start_seconds`` instead. A
+    stopped instance does not accrue instance hours; each run of it is recorded as its own instance.
+
+    :param ec2_calls_per_launch: RunInstances plus the DescribeInstances calls of ``wait_until_running``.
+    :param seed: Seed of the log-normal jitter on boot and start times.
+    """
+
+    def __init__(
+        self,
+        clearml: SimulatedClearML,
+        boot_seconds: float = 180.0,
+        ec2_calls_per_launch: int = 4,
+        warm_pool_size: int = 0,
+        warm_start_seconds: float = 60.0,
+        seed: int = 0,
+    ):
+        self.clearml = clearml
+        self.boot_seconds = boot_seconds
+        self.ec2_calls_per_launch = ec2_calls_per_launch
+        self.warm_pool_size = warm_pool_size
+        self.warm_start_seconds = warm_start_seconds
+        self.rng = random.Random(seed)
+        self.ec2_calls = 0
+        self.launches = 0
+        self.warm_pool = 0
+        self.spin_up_seconds: Dict[str, List[float]] = {"cold": [], "warm": []}
+
+    def spin_up_worker(self) -> SimulatedInstance:
+        self.launches += 1
+        if self.warm_pool:
+            self.warm_pool -= 1
+            # DescribeInstances for the pool, ModifyInstanceAttribute, StartInstances, and the waiters
+            self.ec2_calls += self.ec2_calls_per_launch + 2
+            path, mean_seconds = "warm", self.warm_start_seconds
+        else:
+            self.ec2_calls += self.ec2_calls_per_launch + (1 if self.warm_pool_size else 0)
+            path, mean_seconds = "cold", self.boot_seconds
+
+        spin_up_seconds = self.rng.lognormvariate(math.log(mean_seconds), 0.2)
+        self.spin_up_seconds[path].append(spin_up_seconds)
+        instance = SimulatedInstance(
+            instance_id=f"i-{self.launches:08d}",
+            launched_at=self.clearml.now,
+            ready_at=self.clearml.now + spin_up_seconds,
+        )
+        self.clearml.instances[instance.instance_id] = instance
+        return instance
+
+    def spin_down_worker(self, instance: SimulatedInstance) -> None:
+        self.ec2_calls += 1
+        instance.terminated_at = self.clearml.now
+        if self.warm_pool < self.warm_pool_size:
+            # DescribeInstances to check whether the pool is full
+            self.ec2_calls += 1
+            self.warm_pool += 1
+
+
+@dataclass
+class SimulatedCapacityPool:
+    """
+    A spot capacity pool (instance type and availability zone).
+
+    :param shortage_hours: Hours (since the start of the trace) during which the pool has no spot capacity.
+    """
+
+    name: str
+    spot_price: float
+    on_demand_price: float
+    shortage_hours: Set[int] = field(default_factory=set)
+
+    def has_spot_capacity(self, now: float) -> bool:
+        return int(now // HOUR) not in self.shortage_hours
+
+
+class FakeFleetDriver(FakeEc2Driver):
+    """
+    Launches like ``FleetAWSDriver``: spot from the first pool with capacity, else on demand.
+
+    Every pool without spot capacity counts as a capacity error. Spot instances are interrupted
+    after an exponentially distributed time, ``interruptions_per_hour`` on average.
+
+    :param capacity_type: ``spot-first``, ``spot``, or ``on-demand``, as in ``fleet.capacity_types``.
+    """
+
+    def __init__(
+        self,
+        clearml: SimulatedClearML,
+        pools: List[SimulatedCapacityPool],
+        capacity_type: str = "spot-first",
+        interruptions_per_hour: float = 0.05,
+        boot_seconds: float = 180.0,
+        seed: int = 0,
+    ):
+        super().__init__(clearml, boot_seconds=boot_seconds, seed=seed)
+        self.pools = pools
+        self.capacity_types = ["spot", "on-demand"] if capacity_type == "spot-first" else [capacity_type]
+        self.interruptions_per_hour = interruptions_per_hour
+        self.capacity_errors = 0
+        self.failed_launches = 0
+        self.on_demand_launches = 0
+
+    def spin_up_worker(self) -> Optional[SimulatedInstance]:
+        now = self.clearml.now
+        for capacity_type in self.capacity_types:
+            self.ec2_calls += 1
+            if capacity_type == "on-demand":
+                self.on_demand_launches += 1
+                return self._launch(self.pools[0].on_demand_price, interrupt_at=None)
+            pool = next((pool for pool in self.pools if pool.has_spot_capacity(now)), None)
+            self.capacity_errors += self.pools.index(pool) if pool else len(self.pools)
+            if pool:
+                interrupt_at = now + self.rng.expovariate(self.interruptions_per_hour / HOUR)
+                return self._launch(pool.spot_price, interrupt_at=interrupt_at)
+        self.failed_launches += 1
+        return None
+
+    def _launch(self, hourly_price: float, interrupt_at: Optional[float]) -> SimulatedInstance:
+        instance = super().spin_up_worker()
+        instance.hourly_price = hourly_price
+        instance.interrupt_at = interrupt_at
+        return instance
+
+
+def generate_capacity_pools(
+    hours: float, seed: int = 0, shortage_probability: float = 0.25
+) -> List[SimulatedCapacityPool]:
+    """
+    The pools of three g4dn/g5 instance types in three availability zones, most preferred first.
+
+    Every pool independently runs out of spot capacity for each hour with ``shortage_probability``.
+    """
+    rng = random.Random(seed)
+    instance_types = [("g4dn.4xlarge", 0.45, 1.204), ("g4dn.8xlarge", 0.75, 2.176), ("g5.4xlarge", 0.65, 1.624)]
+    return [
+        SimulatedCapacityPool(
+            name=f"{instance_type}/{zone}",
+            spot_price=spot_price,
+            on_demand_price=on_demand_price,
+            shortage_hours={hour for hour in range(math.ceil(hours)) if rng.random() < shortage_probability},
+        )
+        for instance_type, spot_price, on_demand_price in instance_types
+        for zone in ("a", "b", "c")
+    ]
+
+
+class SimulatedSupervisor:
+    """
+    The decisions ``AutoScaler.supervisor`` makes on each pass, for a single queue and resource.
+
+    Each pass costs ``2 + number of queues`` ClearML API calls: the queue mapping, the list of
+    workers, and the entries of every queue.
+
+    With a ``prescale_policy``, each pass also pre-launches workers and shortens the idle time as
+    ``PredictiveAutoScaler`` does; the forecast sees the time as ``forecast_clock_offset + now``.
+    """
+
+    def __init__(
+        self,
+        clearml: SimulatedClearML,
+        driver: FakeEc2Driver,
+        max_instances: int,
+        max_idle_time_min: float,
+        polling_interval_time_min: float,
+        prescale_policy: Optional[PreScalePolicy] = None,
+        forecast_clock_offset: float = 0.0,
+    ):
+        self.clearml = clearml
+        self.driver = driver
+        self.max_instances = max_instances
+        self.max_idle_time_min = max_idle_time_min
+        self.idle_seconds = polling_interval_time_min * MINUTE
+        self.prescale_policy = prescale_policy
+        self.forecast_clock_offset = forecast_clock_offset
+        self.passes = 0
+
+    def supervisor_pass(self) -> None:
+        now = self.clearml.now
+        self.passes += 1
+        self.clearml.api_calls += 3
+
+        queued = list(self.clearml.queue)
+        for task in queued:
+            if task.seen_at is None:
+                task.seen_at = now
+
+        alive = self.clearml.alive_instances()
+        booting = [instance for instance in alive if instance.ready_at > now]
+        idle = [instance for instance in alive if instance.ready_at <= now and instance.task is None]
+
+        max_idle_time_min = self.max_idle_time_min
+        if self.prescale_policy is not None:
+            forecast_now = self.forecast_clock_offset + now
+            max_idle_time_min = self.prescale_policy.max_idle_time_min(forecast_now, self.max_idle_time_min)
+            for _ in range(self.prescale_policy.workers_to_prelaunch(forecast_now, len(alive), self.max_instances)):
+                self.driver.spin_up_worker()
+
+        spin_up_count = min(len(queued) - len(idle) - len(booting), self.max_instances - len(alive))
+        for _ in range(max(0, spin_up_count)):
+            self.driver.spin_up_worker()
+
+        # idle workers are kept while there are tasks waiting for them
+        if not queued:
+            for instance in idle:
+                if now - instance.idle_since > max_idle_time_min * MINUTE:
+                    self.driver.spin_down_worker(instance)
+
+    def run(self, sleep: Callable[[float], None], until: float) -> None:
+        while self.clearml.now < until:
+            self.supervisor_pass()
+            sleep(self.idle_seconds)
+
+
+@dataclass
+class SimulationReport:
+    """Latency and cost of one policy on one trace."""
+
+    policy: str
+    tasks_finished: int
+    scale_up_latency_p50_seconds: float
+    scale_up_latency_p95_seconds: float
+    queue_wait_p50_seconds: float
+    queue_wait_p95_seconds: float
+    clearml_api_calls_per_hour: float
+    ec2_calls_per_hour: float
+    instance_hours: float
+    spin_up_seconds: Dict[str, List[float]] = field(default_factory=dict)
+
+    def as_row(self) -> str:
+        return (
+            f"{self.policy:<22} tasks={self.tasks_finished:<5} "
+            f"scale_up_p50={self.scale_up_latency_p50_seconds:7.1f}s p95={self.scale_up_latency_p95_seconds:7.1f}s "
+            f"queue_wait_p50={self.queue_wait_p50_seconds:7.1f}s p95={self.queue_wait_p95_seconds:7.1f}s "
+            f"api_calls/h={self.clearml_api_calls_per_hour:8.1f} ec2_calls/h={self.ec2_calls_per_hour:6.1f} "
+            f"instance_hours={self.instance_hours:6.1f}"
+        )
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method="inclusive")[max(0, math.ceil(fraction * 100) - 1)]
+
+
+def render_histogram(values: List[float], bin_seconds: float = 30.0, width: int = 40) -> List[str]:
+    """ASCII histogram of durations, one line per ``bin_seconds`` wide bin."""
+    if not values:
+        return ["(none)"]
+    counts: Dict[int, int] = {}
+    for value in values:
+        counts[int(value // bin_seconds)] = counts.get(int(value // bin_seconds), 0) + 1
+    largest_count = max(counts.values())
+    return [
+        f"{f'{bin_index * bin_seconds:.0f}-{(bin_index + 1) * bin_seconds:.0f}s':>10} "
+        f"{'#' * math.ceil(counts.get(bin_index, 0) * width / largest_count):<{width}} {counts.get(bin_index, 0)}"
+        for bin_index in range(min(counts), max(counts) + 1)
+    ]
+
+
+def generate_trace(
+    hours: float,
+    seed: int = 0,
+    base_tasks_per_hour: float = 0.5,
+    burst_tasks_per_hour: float = 12.0,
+    burst_hours: Tuple[int, ...] = (9, 10, 14),
+    mean_duration_min: float = 20.0,
+) -> List[SimulatedTask]:
+    """
+    Poisson task arrivals, with daily bursts during ``burst_hours`` and log-normal durations.
+
+    The same seed always yields the same trace, so policies can be compared on identical traffic.
+    """
+    rng = random.Random(seed)
+    trace: List[SimulatedTask] = []
+    now = 0.0
+    while True:
+        hour_of_day = int(now // HOUR) % 24
+        tasks_per_hour = burst_tasks_per_hour if hour_of_day in burst_hours else base_tasks_per_hour
+        now += rng.expovariate(tasks_per_hour / HOUR)
+        if now >= hours * HOUR:
+            return trace
+        duration_seconds = rng.lognormvariate(math.log(mean_duration_min * MINUTE), 0.5)
+        trace.append(
+            SimulatedTask(task_id=f"task-{len(trace):05d}", enqueued_at=now, duration_seconds=duration_seconds)
+        )
+
+
+def report(policy: str, clearml: SimulatedClearML, driver: FakeEc2Driver, hours: float) -> SimulationReport:
+    tasks = clearml.trace
+    scale_up_latencies = [task.seen_at - task.enqueued_at for task in tasks if task.seen_at is not None]
+    queue_waits = [task.started_at - task.enqueued_at for task in tasks if task.started_at is not None]
+    instance_seconds = sum(
+        (instance.terminated_at if instance.terminated_at is not None else clearml.now) - instance.launched_at
+        for instance in clearml.instances.values()
+    )
+    return SimulationReport(
+        policy=policy,
+        tasks_finished=sum(1 for task in tasks if task.finished_at is not None),
+        scale_up_latency_p50_seconds=percentile(scale_up_latencies, 0.50),
+        scale_up_latency_p95_seconds=percentile(scale_up_latencies, 0.95),
+        queue_wait_p50_seconds=percentile(queue_waits, 0.50),
+        queue_wait_p95_seconds=percentile(queue_waits, 0.95),
+        clearml_api_calls_per_hour=clearml.api_calls / hours,
+        ec2_calls_per_hour=driver.ec2_calls / hours,
+        instance_hours=instance_seconds / HOUR,
+        spin_up_seconds=driver.spin_up_seconds,
+    )
+
+
+def spot_report_row(policy: str, clearml: SimulatedClearML, driver: FakeFleetDriver) -> str:
+    tasks = clearml.trace
+    queue_waits = [task.started_at - task.enqueued_at for task in tasks if task.finished_at is not None]
+    cost = sum(
+        ((instance.terminated_at if instance.terminated_at is not None else clearml.now) - instance.launched_at)
+        / HOUR
+        * instance.hourly_price
+        for instance in clearml.instances.values()
+    )
+    return (
+        f"{policy:<22} tasks={sum(1 for task in tasks if task.finished_at is not None):<5} "
+        f"lost={sum(1 for task in tasks if task.lost_at is not None):<4} "
+        f"interruptions={clearml.interruptions:<4} capacity_errors={driver.capacity_errors:<5} "
+        f"failed_launches={driver.failed_launches:<5} on_demand_launches={driver.on_demand_launches:<4} "
+        f"queue_wait_p50={percentile(queue_waits, 0.50):7.1f}s p95={percentile(queue_waits, 0.95):7.1f}s "
+        f"cost=${cost:7.2f}"
+    )
+
+
+def simulate_spot(
+    scenario: str,
+    trace: List[SimulatedTask],
+    hours: float,
+    pools: List[SimulatedCapacityPool],
+    interruptions_per_hour: float = 0.05,
+    polling_interval_time_min: float = 0.33,
+    max_idle_time_min: float = 20.0,
+    max_instances: int = 4,
+    boot_seconds: float = 180.0,
+    seed: int = 0,
+) -> str:
+    """
+    Run ``trace`` with fixed polling on one of the capacity scenarios and return its report row.
+
+    - ``single-spot-pool``: ``is_spot: true``, i.e. one instance type in one subnet, tasks of
+      interrupted instances are lost;
+    - ``spot-first-fleet``: every pool, falling back to on-demand, interrupted tasks are requeued;
+    - ``on-demand``: the first pool, on demand only.
+    """
+    if scenario == "single-spot-pool":
+        pools, capacity_type, requeue_interrupted = pools[:1], "spot", False
+    elif scenario == "spot-first-fleet":
+        capacity_type, requeue_interrupted = "spot-first", True
+    elif scenario == "on-demand":
+        pools, capacity_type, requeue_interrupted = pools[:1], "on-demand", False
+    else:
+        raise ValueError(f"Unknown scenario '{scenario}'")
+
+    clearml = SimulatedClearML(trace, requeue_interrupted=requeue_interrupted)
+    driver = FakeFleetDriver(
+        clearml,
+        pools,
+        capacity_type=capacity_type,
+        interruptions_per_hour=interruptions_per_hour,
+        boot_seconds=boot_seconds,
+        seed=seed,
+    )
+    supervisor = SimulatedSupervisor(
+        clearml,
+        driver,
+        max_instances=max_instances,
+        max_idle_time_min=max_idle_time_min,
+        polling_interval_time_min=polling_interval_time_min,
+    )
+    supervisor.run(clearml.sleep, until=hours * HOUR)
+    return spot_report_row(scenario, clearml, driver)
+
+
+def split_trace(tasks: List[SimulatedTask], replay_start: float) -> Tuple[List[ArrivalRecord], List[SimulatedTask]]:
+    """
+    The arrivals before ``replay_start``, as the history to fit the forecast on, and the tasks
+    from ``replay_start`` on, moved to start at 0 for ``SimulatedClearML``.
+    """
+    history = [
+        ArrivalRecord(
+            task_id=task.task_id, queue="default", enqueued_at=task.enqueued_at, duration_seconds=task.duration_seconds
+        )
+        for task in tasks
+        if task.enqueued_at < replay_start
+    ]
+    replay = [
+        SimulatedTask(
+            task_id=task.task_id,
+            enqueued_at=task.enqueued_at - replay_start,
+            duration_seconds=task.duration_seconds,
+        )
+        for task in tasks
+        if task.enqueued_at >= replay_start
+    ]
+    return history, replay
+
+
+def trace_from_arrival_history(path: Path) -> List[SimulatedTask]:
+    """The finished tasks an ``ArrivalStore`` recorded, to replay in place of a synthetic trace."""
+    return [
+        SimulatedTask(task_id=record.task_id, enqueued_at=record.enqueued_at, duration_seconds=record.duration_seconds)
+        for record in ArrivalStore(path).records.values()
+        if record.duration_seconds
+    ]
+
+
+def prescaling_report_row(policy: str, clearml: SimulatedClearML, driver: FakeEc2Driver, hourly_price: float) -> str:
+    tasks = clearml.trace
+    queue_waits = [task.started_at - task.enqueued_at for task in tasks if task.started_at is not None]
+    instance_seconds = sum(
+        (instance.terminated_at if instance.terminated_at is not None else clearml.now) - instance.launched_at
+        for instance in clearml.instances.values()
+    )
+    busy_seconds = sum(
+        (task.finished_at if task.finished_at is not None else clearml.now) - task.started_at
+        for task in tasks
+        if task.started_at is not None
+    )
+    idle_instance_hours = (instance_seconds - busy_seconds) / HOUR
+    return (
+        f"{policy:<22} tasks={sum(1 for task in tasks if task.finished_at is not None):<5} "
+        f"launches={driver.launches:<4} "
+        f"queue_wait_p50={percentile(queue_waits, 0.50):7.1f}s p95={percentile(queue_waits, 0.95):7.1f}s "
+        f"instance_hours={instance_seconds / HOUR:6.1f} idle_instance_hours={idle_instance_hours:6.1f} "
+        f"idle_cost=${idle_instance_hours * hourly_price:7.2f}"
+    )
+
+
+def simulate_prescaling(
+    policy: str,
+    history: List[ArrivalRecord],
+    replay: List[SimulatedTask],
+    replay_start: float,
+    hours: float,
+    polling_interval_time_min: float = 0.33,
+    max_idle_time_min: float = 20.0,
+    max_instances: int = 4,
+    boot_seconds: float = 180.0,
+    lead_time_min: float = 10.0,
+    quiet_max_idle_time_min: float = 2.0,
+    hourly_price: float = 1.204,
+    seed: int = 0,
+) -> str:
+    """
+    Replay ``replay`` with fixed polling, either ``reactive`` as ``AutoScaler`` or ``predictive``
+    as ``PredictiveAutoScaler`` with a forecast fitted on ``history``, and return its report row.
+    """
+    if policy == "reactive":
+        prescale_policy = None
+    elif policy == "predictive":
+        prescale_policy = PreScalePolicy(
+            model=SeasonalArrivalModel(period_seconds=DAY).fit(history, now=replay_start),
+            lead_time_min=lead_time_min,
+            quiet_max_idle_time_min=quiet_max_idle_time_min,
+        )
+    else:
+        raise ValueError(f"Unknown policy '{policy}'")
+
+    clearml = SimulatedClearML(replay)
+    driver = FakeEc2Driver(clearml, boot_seconds=boot_seconds, seed=seed)
+    supervisor = SimulatedSupervisor(
+        clearml,
+        driver,
+        max_instances=max_instances,
+        max_idle_time_min=max_idle_time_min,
+        polling_interval_time_min=polling_interval_time_min,
+        prescale_policy=prescale_policy,
+        forecast_clock_offset=replay_start,
+    )
+    supervisor.run(clearml.sleep, until=hours * HOUR)
+    return prescaling_report_row(policy, clearml, driver, hourly_price)
+
+
+def simulate(
+    policy: str,
+    trace: List[SimulatedTask],
+    hours: float,
+    polling_interval_time_min: float = 0.33,
+    max_idle_time_min: float = 20.0,
+    max_instances: int = 4,
+    boot_seconds: float = 180.0,
+    probe_interval_seconds: float = 2.0,
+    max_probe_interval_seconds: float = 15.0,
+    max_pass_interval_min: float = 5.0,
+    warm_pool_size: int = 0,
+    warm_start_seconds: float = 60.0,
+    seed: int = 0,
+) -> SimulationReport:
+    """
+    Run ``trace`` through the supervisor with either ``fixed`` polling or ``event-driven`` wakeup.
+
+    ``trace`` is modified in place; generate a new one for every run.
+    """
+    clearml = SimulatedClearML(trace)
+    driver = FakeEc2Driver(
+        clearml,
+        boot_seconds=boot_seconds,
+        warm_pool_size=warm_pool_size,
+        warm_start_seconds=warm_start_seconds,
+        seed=seed,
+    )
+    supervisor = SimulatedSupervisor(
+        clearml,
+        driver,
+        max_instances=max_instances,
+        max_idle_time_min=max_idle_time_min,
+        polling_interval_time_min=polling_interval_time_min,
+    )
+
+    if policy == "fixed":
+        sleep = clearml.sleep
+    elif policy == "event-driven":
+        sleep = EventDrivenSleep(
+            watcher=clearml,
+            idle_seconds=supervisor.idle_seconds,
+            backoff=AdaptiveBackoff(
+                min_seconds=supervisor.idle_seconds,
+                max_seconds=max(supervisor.idle_seconds, max_pass_interval_min * MINUTE),
+            ),
+            probe_interval_seconds=probe_interval_seconds,
+            max_probe_interval_seconds=max_probe_interval_seconds,
+            clock=clearml.monotonic,
+            sleep=clearml.sleep,
+        )
+    else:
+        raise ValueError(f"Unknown policy '{policy}'")
+
+    supervisor.run(sleep, until=hours * HOUR)
+    return report(policy + ("+warm-pool" if warm_pool_size else ""), clearml, driver, hours)
+
+
+def main():
+    parser = ArgumentParser(description="Compare autoscaler policies on a synthetic queue trace")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--polling-interval-min", type=float, nargs="+", default=[0.33, 5.0])
+    parser.add_argument("--probe-interval-seconds", type=float, default=2.0)
+    parser.add_argument("--max-probe-interval-seconds", type=float, default=15.0)
+    parser.add_argument("--max-pass-interval-min", type=float, default=5.0)
+    parser.add_argument("--boot-seconds", type=float, default=180.0)
+    parser.add_argument("--max-instances", type=int, default=4)
+    parser.add_argument("--warm-pool-size", type=int, default=2)
+    parser.add_argument("--warm-start-seconds", type=float, default=60.0)
+    parser.add_argument("--spot-interruptions-per-hour", type=float, default=0.1)
+    parser.add_argument("--spot-shortage-probability", type=float, default=0.5)
+    parser.add_argument("--history-days", type=int, default=7, help="Days of arrivals the forecast learns from")
+    parser.add_argument("--prescale-lead-time-min", type=float, default=10.0)
+    parser.add_argument("--quiet-max-idle-time-min", type=float, default=2.0)
+    parser.add_argument("--hourly-price", type=float, default=1.204, help="Price of an instance, for the idle cost")
+    parser.add_argument(
+        "--arrival-history",
+        type=Path,
+        default=None,
+        help="Arrivals recorded by PredictiveAutoScaler (arrival_history_path) to replay instead of a synthetic trace",
+    )
+    args = parser.parse_args()
+
+    for polling_interval_time_min in args.polling_interval_min:
+        print(f"polling_interval_time_min={polling_interval_time_min}")
+        for policy in ("fixed", "event-driven"):
+            simulation_report = simulate(
+                policy,
+                trace=generate_trace(args.hours, seed=args.seed),
+                hours=args.hours,
+                polling_interval_time_min=polling_interval_time_min,
+                max_instances=args.max_instances,
+                boot_seconds=args.boot_seconds,
+                probe_interval_seconds=args.probe_interval_seconds,
+                max_probe_interval_seconds=args.max_probe_interval_seconds,
+                max_pass_interval_min=args.max_pass_interval_min,
+            )
+            print("  " + simulation_report.as_row())
+
+    print(f"polling_interval_time_min={args.polling_interval_min[0]}, warm_pool_size=0 vs {args.warm_pool_size}")
+    spin_up_seconds: Dict[str, List[float]] = {}
+    for warm_pool_size in (0, args.warm_pool_size):
+        simulation_report = simulate(
+            "event-driven",
+            trace=generate_trace(args.hours, seed=args.seed),
+            hours=args.hours,
+            polling_interval_time_min=args.polling_interval_min[0],
+            max_instances=args.max_instances,
+            boot_seconds=args.boot_seconds,
+            probe_interval_seconds=args.probe_interval_seconds,
+            max_probe_interval_seconds=args.max_probe_interval_seconds,
+            max_pass_interval_min=args.max_pass_interval_min,
+            warm_pool_size=warm_pool_size,
+            warm_start_seconds=args.warm_start_seconds,
+            seed=args.seed,
+        )
+        print("  " + simulation_report.as_row())
+        spin_up_seconds = simulation_report.spin_up_seconds
+
+    for path in ("cold", "warm"):
+        print(f"{path} spin-up seconds (warm_pool_size={args.warm_pool_size}):")
+        for line in render_histogram(spin_up_seconds[path]):
+            print("  " + line)
+
+    print(
+        f"spot capacity: shortage_probability={args.spot_shortage_probability}, "
+        f"interruptions_per_hour={args.spot_interruptions_per_hour}"
+    )
+    for scenario in ("single-spot-pool", "spot-first-fleet", "on-demand"):
+        row = simulate_spot(
+            scenario,
+            trace=generate_trace(args.hours, seed=args.seed),
+            hours=args.hours,
+            pools=generate_capacity_pools(
+                args.hours, seed=args.seed, shortage_probability=args.spot_shortage_probability
+            ),
+            interruptions_per_hour=args.spot_interruptions_per_hour,
+            polling_interval_time_min=args.polling_interval_min[0],
+            max_instances=args.max_instances,
+            boot_seconds=args.boot_seconds,
+            seed=args.seed,
+        )
+        print("  " + row)
+
+    if args.arrival_history:
+        tasks = trace_from_arrival_history(args.arrival_history)
+        replay_start = max(task.enqueued_at for task in tasks) - args.hours * HOUR
+    else:
+        tasks = generate_trace(args.history_days * 24 + args.hours, seed=args.seed)
+        replay_start = args.history_days * DAY
+    print(
+        f"pre-scaling: {len(tasks)} arrivals, last {args.hours:g} hours replayed, "
+        f"lead_time_min={args.prescale_lead_time_min}, quiet_max_idle_time_min={args.quiet_max_idle_time_min}"
+    )
+    for policy in ("reactive", "predictive"):
+        # SimulatedClearML updates the tasks in place, so every run gets its own copies
+        history, replay = split_trace(tasks, replay_start)
+        row = simulate_prescaling(
+            policy,
+            history,
+            replay,
+            replay_start=replay_start,
+            hours=args.hours,
+            polling_interval_time_min=args.polling_interval_min[0],
+            max_instances=args.max_instances,
+            boot_seconds=args.boot_seconds,
+            lead_time_min=args.prescale_lead_time_min,
+            quiet_max_idle_time_min=args.quiet_max_idle_time_min,
+            hourly_price=args.hourly_price,
+            seed=args.seed,
+        )
+        print("  " + row)
+
+
+if __name__ == "__main__":
+    main()
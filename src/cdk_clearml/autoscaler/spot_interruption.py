@@ -0,0 +1,143 @@
+"""
+Watch for the spot interruption notice on an autoscaled worker and hand its tasks back to their queue.
+
+EC2 announces the interruption of a spot instance two minutes ahead in the instance metadata
+(``spot/instance-action``). Once it appears, every task run by an agent daemon of this instance
+is stopped and enqueued again on the queue it came from, so another worker picks it up:
+
+- ``checkpoint``: the tasks are first asked to stop (``tasks.stop`` without ``force``), which
+  runs the callback registered with ``Task.register_abort_callback`` so that they can save a
+  checkpoint; after ``--grace-seconds``, they are stopped for good and enqueued again.
+- ``requeue``: the tasks are stopped and enqueued again right away.
+
+Outputs are not reset, so a task that resumes from its last checkpoint picks up where it left off.
+
+The bootstrap of every worker launched through ``FleetAWSDriver`` writes this file to the
+instance and runs it with the ``python3`` of the AMI, so it only uses the standard library. It
+authenticates with the ``CLEARML_API_*`` (or ``CLEARML_AUTH_TOKEN``) variables the bootstrap
+exports.
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from typing import List, Optional
+
+IMDS_URL = "http://169.254.169.254/latest"
+
+logger = logging.getLogger("clearml-spot-interruption")
+
+
+def imds_get(path: str) -> Optional[str]:
+    """Read instance metadata with IMDSv2; ``None`` if ``path`` does not exist (yet)."""
+    token_request = urllib.request.Request(
+        f"{IMDS_URL}/api/token", method="PUT", headers={"X-aws-ec2-metadata-token-ttl-seconds": "60"}
+    )
+    with urllib.request.urlopen(token_request, timeout=2) as response:
+        token = response.read().decode()
+    request = urllib.request.Request(f"{IMDS_URL}/meta-data/{path}", headers={"X-aws-ec2-metadata-token": token})
+    try:
+        with urllib.request.urlopen(request, timeout=2) as response:
+            return response.read().decode()
+    except urllib.error.HTTPError as err:
+        if err.code == 404:
+            return None
+        raise
+
+
+class ClearMLApi:
+    """The few calls of the ClearML REST API needed here."""
+
+    def __init__(self, api_server: str, access_key: str = "", secret_key: str = "", auth_token: str = ""):
+        self.api_server = api_server.rstrip("/")
+        self.token = auth_token
+        if not self.token:
+            credentials = base64.b64encode(f"{access_key}:{secret_key}".encode()).decode()
+            self.token = self._call("auth.login", {}, authorization=f"Basic {credentials}")["token"]
+
+    def call(self, endpoint: str, payload: dict) -> dict:
+        return self._call(endpoint, payload, authorization=f"Bearer {self.token}")
+
+    def _call(self, endpoint: str, payload: dict, authorization: str) -> dict:
+        request = urllib.request.Request(
+            f"{self.api_server}/{endpoint}",
+            data=json.dumps(payload).encode(),
+            method="POST",
+            headers={"Content-Type": "application/json", "Authorization": authorization},
+        )
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return json.load(response)["data"]
+
+
+def instance_task_ids(api: ClearMLApi, instance_id: str) -> List[str]:
+    """Tasks run by the agent daemons of this instance, whose worker IDs end with ``<instance id>[-gpu<n>]``."""
+    workers = api.call("workers.get_all", {})["workers"]
+    return [
+        worker["task"]["id"]
+        for worker in workers
+        if worker.get("task") and (worker["id"].endswith(f":{instance_id}") or f":{instance_id}-gpu" in worker["id"])
+    ]
+
+
+def hand_back_tasks(api: ClearMLApi, task_ids: List[str], action: str, grace_seconds: float) -> None:
+    tasks = api.call("tasks.get_all", {"id": task_ids, "only_fields": ["id", "execution.queue"]})["tasks"]
+    if action == "checkpoint":
+        for task in tasks:
+            logger.info("Asking task %s to stop", task["id"])
+            api.call("tasks.stop", {"task": task["id"], "status_reason": "spot interruption"})
+        time.sleep(grace_seconds)
+
+    for task in tasks:
+        queue_id = (task.get("execution") or {}).get("queue")
+        try:
+            api.call("tasks.stop", {"task": task["id"], "force": True, "status_reason": "spot interruption"})
+        except urllib.error.HTTPError as err:
+            # the task may have already stopped on its own during the grace period
+            logger.info("Could not stop task %s: %s", task["id"], err)
+        if queue_id:
+            logger.info("Enqueuing task %s on queue %s again", task["id"], queue_id)
+            api.call("tasks.enqueue", {"task": task["id"], "queue": queue_id, "status_reason": "spot interruption"})
+        else:
+            logger.warning("Task %s has no queue to return to", task["id"])
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--action", choices=["checkpoint", "requeue"], default="checkpoint")
+    parser.add_argument("--grace-seconds", type=float, default=90.0, help="Time tasks get to checkpoint")
+    parser.add_argument("--poll-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    instance_id = imds_get("instance-id")
+    logger.info("Watching %s for spot interruptions", instance_id)
+    while True:
+        try:
+            instance_action = imds_get("spot/instance-action")
+        except OSError as err:
+            logger.warning("Cannot read the instance metadata: %s", err)
+            instance_action = None
+        if instance_action:
+            break
+        time.sleep(args.poll_seconds)
+
+    logger.info("Interruption notice: %s", instance_action)
+    api = ClearMLApi(
+        os.environ["CLEARML_API_HOST"],
+        access_key=os.environ.get("CLEARML_API_ACCESS_KEY", ""),
+        secret_key=os.environ.get("CLEARML_API_SECRET_KEY", ""),
+        auth_token=os.environ.get("CLEARML_AUTH_TOKEN", ""),
+    )
+    task_ids = instance_task_ids(api, instance_id)
+    logger.info("Tasks on this instance: %s", task_ids)
+    if task_ids:
+        hand_back_tasks(api, task_ids, args.action, args.grace_seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Event-driven wakeup for the ClearML autoscaler.
+
+``AutoScaler.supervisor`` runs a full pass (list the queues, list the workers, read the entries
+of every queue, spin instances up and down) and then sleeps ``polling_interval_time_min``. A
+short interval makes new tasks start sooner, but every pass costs several API calls.
+
+``EventDrivenSleep`` replaces that sleep. It probes the queues with a single cheap API call
+and wakes the supervisor as soon as they change. While nothing changes, both the time between
+probes and the time between full passes back off up to a maximum; the latter still bounds how
+late idle workers are spun down.
+
+This module does not import ``clearml`` so that it can be exercised by the simulation in
+``simulation.py``; ``scaler.py`` plugs it into the real ``AutoScaler``.
+"""
+
+import threading
+import time
+from typing import Callable, Hashable, Iterable, Optional, Tuple
+
+
+class AdaptiveBackoff:
+    """
+    Time between full supervisor passes: reset to ``min_seconds`` on activity, multiplied by ``factor`` while idle.
+
+    :param min_seconds: Interval right after the queues changed.
+    :param max_seconds: Longest interval while the queues stay unchanged.
+    :param factor: Growth of the interval after each idle pass.
+    """
+
+    def __init__(self, min_seconds: float, max_seconds: float, factor: float = 2.0):
+        if not 0 < min_seconds <= max_seconds:
+            raise ValueError(f"Expected 0 < min_seconds <= max_seconds, got {min_seconds} and {max_seconds}")
+        if factor < 1:
+            raise ValueError(f"factor must be at least 1, got {factor}")
+        self.min_seconds = min_seconds
+        self.max_seconds = max_seconds
+        self.factor = factor
+        self.current_seconds = min_seconds
+
+    def reset(self) -> None:
+        self.current_seconds = self.min_seconds
+
+    def increase(self) -> float:
+        self.current_seconds = min(self.max_seconds, self.current_seconds * self.factor)
+        return self.current_seconds
+
+
+class QueueWatcher:
+    """
+    Summarizes the entries of the watched queues with a single ``queues.get_all`` call.
+
+    :param api_client: A ``clearml.backend_api.session.client.APIClient``.
+    :param queue_names: The queues the autoscaler serves.
+    """
+
+    def __init__(self, api_client, queue_names: Iterable[str]):
+        self.api_client = api_client
+        self.queue_names = set(queue_names)
+
+    def snapshot(self) -> Tuple[Tuple[str, Tuple[str, ...]], ...]:
+        queues = self.api_client.queues.get_all(only_fields=["name", "entries"])
+        return tuple(
+            sorted(
+                (queue.name, tuple(entry.task for entry in (queue.entries or [])))
+                for queue in queues
+                if queue.name in self.queue_names
+            )
+        )
+
+
+class EventDrivenSleep:
+    """
+    Drop-in replacement for ``time.sleep`` in the autoscaler's supervisor loop.
+
+    Only the supervisor's idle sleep, i.e. a call with exactly ``idle_seconds`` from the
+    supervisor's thread, waits for queue changes; every other call sleeps as usual.
+
+    :param watcher: Probes the queues; anything with a ``snapshot()`` method returning a comparable
+        summary of their entries, such as ``QueueWatcher``.
+    :param idle_seconds: The sleep duration used by the supervisor between passes.
+    :param backoff: Bounds the time between full passes while nothing changes.
+    :param probe_interval_seconds: Time between two probes of the queues right after they changed.
+    :param max_probe_interval_seconds: Time between two probes once the queues have been quiet for a while.
+    :param clock: Monotonic clock; replaced by a simulated clock in ``simulation.py``.
+    :param sleep: Sleep function matching ``clock``.
+    """
+
+    def __init__(
+        self,
+        watcher,
+        idle_seconds: float,
+        backoff: AdaptiveBackoff,
+        probe_interval_seconds: float = 2.0,
+        max_probe_interval_seconds: float = 15.0,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.watcher = watcher
+        self.idle_seconds = idle_seconds
+        self.backoff = backoff
+        self.probe_backoff = AdaptiveBackoff(
+            min_seconds=probe_interval_seconds,
+            max_seconds=max(probe_interval_seconds, max_probe_interval_seconds),
+            factor=1.25,
+        )
+        self.clock = clock
+        self.sleep = sleep
+        self.supervisor_thread: Optional[threading.Thread] = None
+
+        self.probes = 0
+        self.wakeups_on_change = 0
+        self.wakeups_on_timeout = 0
+
+    def __call__(self, seconds: float) -> None:
+        is_supervisor_thread = self.supervisor_thread in (None, threading.current_thread())
+        if seconds != self.idle_seconds or not is_supervisor_thread:
+            self.sleep(seconds)
+            return
+        self.wait_for_change()
+
+    def wait_for_change(self) -> bool:
+        """Sleep until the queues change or the backoff interval passes; return True if they changed."""
+        baseline = self._probe()
+        deadline = self.clock() + self.backoff.current_seconds
+
+        while True:
+            remaining_seconds = deadline - self.clock()
+            if remaining_seconds <= 0:
+                break
+            self.sleep(min(self.probe_backoff.current_seconds, remaining_seconds))
+            if self._probe() != baseline:
+                self.backoff.reset()
+                self.probe_backoff.reset()
+                self.wakeups_on_change += 1
+                return True
+            self.probe_backoff.increase()
+
+        self.backoff.increase()
+        self.wakeups_on_timeout += 1
+        return False
+
+    def _probe(self) -> Hashable:
+        self.probes += 1
+        return self.watcher.snapshot()
@@ -0,0 +1,188 @@
+"""
+Warm pool of stopped (or hibernated) workers for the ClearML AWS autoscaler.
+
+A cold start pays for booting a fresh instance from ``ami_id``, running the bootstrap and
+``extra_vm_bash_script``, and pulling the task's docker image. ``WarmPoolAWSDriver`` instead
+stops idle workers and starts them again for the next task, so their root volume, with the
+agent's virtualenv, pip cache, and docker images, is reused.
+
+The pool is configured per resource in ``resource_configurations``:
+
+    aws4gpu:
+      instance_type: g4dn.4xlarge
+      warm_pool_size: 2          # stopped instances to keep around
+      warm_pool_hibernate: true  # hibernate instead of stop; needs an AMI and instance type that support it
+
+Spot instances cannot be stopped, so resources with ``is_spot: true`` are never pooled, and
+neither are the resources launched through EC2 Fleet (with ``instance_types``).
+"""
+
+import copy
+from typing import List, Optional
+
+import attr
+import boto3
+
+from cdk_clearml.autoscaler.cache_volume import root_volume_mapping
+from cdk_clearml.autoscaler.fleet import uses_fleet
+from cdk_clearml.autoscaler.fleet_driver import FleetAWSDriver
+
+WARM_POOL_TAG_KEY = "clearml-warm-pool"
+
+# cloud-init only runs user data on the first boot unless told otherwise
+ALWAYS_RUN_USER_DATA_TEMPLATE = """\
+Content-Type: multipart/mixed; boundary="//"
+MIME-Version: 1.0
+
+--//
+Content-Type: text/cloud-config; charset="us-ascii"
+MIME-Version: 1.0
+Content-Transfer-Encoding: 7bit
+Content-Disposition: attachment; filename="cloud-config.txt"
+
+#cloud-config
+cloud_final_modules:
+- [scripts-user, always]
+
+--//
+Content-Type: text/x-shellscript; charset="us-ascii"
+MIME-Version: 1.0
+Content-Transfer-Encoding: 7bit
+Content-Disposition: attachment; filename="userdata.txt"
+
+{script}
+--//--
+"""
+
+
+def render_always_run_user_data(script: str) -> str:
+    """
+    Wrap a user data script so that cloud-init runs it on every boot, not just the first one.
+
+    The ClearML bootstrap appends to ``~/clearml.conf``; it is removed first so that restarts
+    do not accumulate copies of it.
+    """
+    shebang, _, body = script.partition("\n")
+    return ALWAYS_RUN_USER_DATA_TEMPLATE.format(script=f"{shebang}\nrm -f ~/clearml.conf\n{body}")
+
+
+def is_poolable(resource_conf: dict) -> bool:
+    return (
+        int(resource_conf.get("warm_pool_size", 0)) > 0
+        and not resource_conf.get("is_spot", False)
+        and not uses_fleet(resource_conf)
+    )
+
+
+def poolable_resource_conf(resource_conf: dict, worker_prefix: str) -> dict:
+    """Launch settings for an instance that can later be stopped and started again as part of the pool."""
+    resource_conf = copy.deepcopy(resource_conf)
+    extra_configurations = resource_conf.setdefault("extra_configurations", {})
+
+    # workers that shut themselves down (the bootstrap ends with "shutdown") stay in the pool
+    extra_configurations["InstanceInitiatedShutdownBehavior"] = "stop"
+
+    if resource_conf.get("warm_pool_hibernate", False):
+        extra_configurations["HibernationOptions"] = {"Configured": True}
+        # the RAM is saved to the root volume, which therefore has to be encrypted
+        mappings = extra_configurations.get("BlockDeviceMappings") or [root_volume_mapping(resource_conf)]
+        for mapping in mappings:
+            if mapping["DeviceName"] == resource_conf["ebs_device_name"]:
+                mapping["Ebs"]["Encrypted"] = True
+        extra_configurations["BlockDeviceMappings"] = mappings
+
+    resource_conf["tags"] = ", ".join(
+        tag for tag in (resource_conf.get("tags", ""), f"{WARM_POOL_TAG_KEY}={worker_prefix}") if tag
+    )
+    return resource_conf
+
+
+@attr.s
+class WarmPoolAWSDriver(FleetAWSDriver):
+    """
+    ``AWSDriver`` that starts stopped workers before launching new ones, and stops idle workers
+    instead of terminating them.
+
+    Instances belong to the pool of their ``worker_prefix`` (autoscaler prefix, resource name, and
+    instance type) through the ``clearml-warm-pool`` tag. A pool member is any stopped instance
+    carrying the tag.
+    """
+
+    def spin_up_worker(self, resource_conf, worker_prefix, queue_name, task_id):
+        if not is_poolable(resource_conf):
+            return super().spin_up_worker(resource_conf, worker_prefix, queue_name, task_id)
+
+        warm_instance_ids = self.warm_instance_ids(worker_prefix)
+        if warm_instance_ids:
+            instance_id = warm_instance_ids[0]
+            self.logger.info("Starting warm instance %s for %s", instance_id, worker_prefix)
+            user_data = self.gen_user_data(worker_prefix, queue_name, task_id, resource_conf.get("cpu_only", False))
+            return self.start_warm_instance(instance_id, user_data)
+
+        self.logger.info("Warm pool of %s is empty, launching a new instance", worker_prefix)
+        return super().spin_up_worker(
+            poolable_resource_conf(resource_conf, worker_prefix), worker_prefix, queue_name, task_id
+        )
+
+    def spin_down_worker(self, instance_id):
+        instance = boto3.resource("ec2", **self.creds()).Instance(instance_id)
+        pool_key = next((tag["Value"] for tag in instance.tags or [] if tag["Key"] == WARM_POOL_TAG_KEY), None)
+        resource_conf = self._resource_conf_for_pool(pool_key)
+
+        if pool_key is None or resource_conf is None or instance.state["Name"] not in ("pending", "running"):
+            super().spin_down_worker(instance_id)
+            return True
+
+        if len(self.warm_instance_ids(pool_key)) >= int(resource_conf["warm_pool_size"]):
+            self.logger.info("Warm pool of %s is full, terminating %s", pool_key, instance_id)
+            super().spin_down_worker(instance_id)
+            return True
+
+        hibernate = bool(resource_conf.get("warm_pool_hibernate", False))
+        self.logger.info("Returning %s to the warm pool of %s (hibernate=%s)", instance_id, pool_key, hibernate)
+        instance.stop(Hibernate=hibernate)
+        return True
+
+    def launch_resource_conf(self, resource_conf, worker_prefix):
+        if not is_poolable(resource_conf):
+            return super().launch_resource_conf(resource_conf, worker_prefix)
+        return poolable_resource_conf(resource_conf, worker_prefix)
+
+    def gen_user_data(self, worker_prefix, queue_name, task_id, cpu_only=False):
+        # instances that are not pooled are never restarted, so running on every boot does not matter for them
+        return render_always_run_user_data(super().gen_user_data(worker_prefix, queue_name, task_id, cpu_only))
+
+    def warm_instance_ids(self, worker_prefix: str) -> List[str]:
+        """IDs of the stopped (or stopping) instances in the pool of ``worker_prefix``."""
+        ec2 = boto3.client("ec2", **self.creds())
+        paginator = ec2.get_paginator("describe_instances")
+        pages = paginator.paginate(
+            Filters=[
+                {"Name": f"tag:{WARM_POOL_TAG_KEY}", "Values": [worker_prefix]},
+                {"Name": "instance-state-name", "Values": ["stopped", "stopping"]},
+            ]
+        )
+        instances = [
+            instance for page in pages for reservation in page["Reservations"] for instance in reservation["Instances"]
+        ]
+        # stopped instances can be started right away; stopping ones have to finish stopping first
+        instances.sort(key=lambda instance: instance["State"]["Name"] != "stopped")
+        return [instance["InstanceId"] for instance in instances]
+
+    def start_warm_instance(self, instance_id: str, user_data: str) -> str:
+        ec2 = boto3.client("ec2", **self.creds())
+        ec2.get_waiter("instance_stopped").wait(InstanceIds=[instance_id])
+        # the user data can only be replaced while the instance is stopped
+        ec2.modify_instance_attribute(InstanceId=instance_id, UserData={"Value": user_data.encode("utf-8")})
+        ec2.start_instances(InstanceIds=[instance_id])
+        boto3.resource("ec2", **self.creds()).Instance(instance_id).wait_until_running()
+        return instance_id
+
+    def _resource_conf_for_pool(self, pool_key: Optional[str]) -> Optional[dict]:
+        scaler = getattr(self, "scaler", None)
+        if pool_key is None or scaler is None:
+            return None
+        for resource_name, resource_conf in scaler.resource_configurations.items():
+            if scaler.gen_worker_prefix(resource_name, resource_conf) == pool_key and is_poolable(resource_conf):
+                return resource_conf
+        return None
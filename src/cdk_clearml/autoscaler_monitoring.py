@@ -0,0 +1,215 @@
+"""
+Dashboard and alarms over the metrics the autoscaler publishes as EMF (see ``autoscaler/metrics.py``).
+
+The dashboard is laid out around the hyper parameters it helps tune:
+
+- ``max_idle_time_min``: how long idle workers stayed idle before a task reused them, against how
+  long the ones spun down waited for nothing;
+- ``polling_interval_time_min``: how long tasks waited on their queue, against how long passes
+  and worker registrations take;
+- ``max_spin_up_time_min``: how long launched workers took to register with the ClearML server.
+
+The alarms go off when launches fail, when a queued task waits longer than a launch should
+take, when workers register close to the time after which they are spun down as stuck, and when
+the EC2 or ClearML API calls fail.
+"""
+
+from typing import List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import aws_cloudwatch as cloudwatch
+from constructs import Construct
+
+from cdk_clearml.autoscaler.config import AutoscalerConfig
+from cdk_clearml.autoscaler.metrics import AUTOSCALER_DIMENSION, METRICS_NAMESPACE
+
+PERIOD = cdk.Duration.minutes(5)
+
+# registration_seconds p90 alarms at this fraction of max_spin_up_time_min
+REGISTRATION_ALARM_FRACTION = 0.75
+
+
+class ClearMLAutoscalerMonitoring(Construct):
+    """
+    A CloudWatch dashboard and alarms for an autoscaler publishing EMF (``metrics_emf: true``).
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param autoscaler_config: The configuration of the autoscaler, for its ``workers_prefix``
+        (the ``Autoscaler`` dimension), its queues, and the alarm thresholds.
+    :param extra_widgets: Widgets appended to the dashboard, e.g. graphs of the alarms of the service.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        autoscaler_config: AutoscalerConfig,
+        extra_widgets: Optional[List[cloudwatch.IWidget]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        hyper_params = autoscaler_config.hyper_params
+        self.workers_prefix = hyper_params.workers_prefix
+        queue_names = sorted(autoscaler_config.configurations.queues)
+
+        self.launch_failure_alarm = cloudwatch.Alarm(
+            self,
+            "LaunchFailureAlarm",
+            alarm_description="The ClearML autoscaler failed to launch workers (capacity, quotas, or permissions)",
+            metric=self.metric("launch_failures", statistic="Sum"),
+            threshold=0,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            evaluation_periods=3,
+            datapoints_to_alarm=2,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+        max_wait_min = hyper_params.max_spin_up_time_min + hyper_params.polling_interval_time_min
+        self.queued_task_age_alarm = cloudwatch.Alarm(
+            self,
+            "QueuedTaskAgeAlarm",
+            alarm_description=f"A task waited on a ClearML autoscaler queue for more than {max_wait_min:g} minutes",
+            metric=self.metric("oldest_task_age_seconds", statistic="Maximum"),
+            threshold=max_wait_min * 60,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            evaluation_periods=3,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+        self.registration_time_alarm = cloudwatch.Alarm(
+            self,
+            "RegistrationTimeAlarm",
+            alarm_description=(
+                "Workers launched by the ClearML autoscaler take close to max_spin_up_time_min to register, "
+                "after which they are spun down as stuck"
+            ),
+            metric=self.metric("registration_seconds", statistic="p90", period=cdk.Duration.minutes(15)),
+            threshold=hyper_params.max_spin_up_time_min * 60 * REGISTRATION_ALARM_FRACTION,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+            evaluation_periods=2,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+        self.api_error_alarm = cloudwatch.Alarm(
+            self,
+            "ApiErrorAlarm",
+            alarm_description="EC2 or ClearML API calls of the ClearML autoscaler keep failing",
+            metric=cloudwatch.MathExpression(
+                expression="FILL(ec2, 0) + FILL(clearml, 0)",
+                using_metrics={
+                    "ec2": self.metric("ec2_api_errors", statistic="Sum"),
+                    "clearml": self.metric("clearml_api_errors", statistic="Sum"),
+                },
+                label="API errors",
+                period=PERIOD,
+            ),
+            threshold=5,
+            comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+            evaluation_periods=2,
+            treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+        )
+
+        def percentiles(metric_name: str) -> List[cloudwatch.IMetric]:
+            return [self.metric(metric_name, statistic=statistic) for statistic in ("p50", "p90", "p99")]
+
+        self.dashboard = cloudwatch.Dashboard(
+            self,
+            "Dashboard",
+            dashboard_name=f"{cdk.Stack.of(self).stack_name}-clearml-autoscaler",
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Queue depth",
+                left=[self.metric("queue_depth", statistic="Maximum", Queue=queue) for queue in queue_names],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="Age of the oldest queued task (s)",
+                left=[
+                    self.metric("oldest_task_age_seconds", statistic="Maximum", Queue=queue) for queue in queue_names
+                ],
+                left_annotations=[cloudwatch.HorizontalAnnotation(value=max_wait_min * 60, label="alarm")],
+                width=12,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Workers",
+                left=[
+                    self.metric(metric_name, statistic="Average")
+                    for metric_name in ("running_workers", "idle_workers", "booting_workers")
+                ],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Launches and spin downs",
+                left=[
+                    self.metric(metric_name, statistic="Sum")
+                    for metric_name in ("launches", "launch_failures", "spin_downs")
+                ],
+                width=8,
+            ),
+            cloudwatch.AlarmWidget(title="API errors", alarm=self.api_error_alarm, width=8),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Idle time before reuse (max_idle_time_min)",
+                left=percentiles("idle_seconds_before_reuse"),
+                left_annotations=[
+                    cloudwatch.HorizontalAnnotation(value=hyper_params.max_idle_time_min * 60, label="max_idle_time")
+                ],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="Idle time before spin down (max_idle_time_min)",
+                left=percentiles("idle_seconds_before_spin_down"),
+                width=12,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Queue wait (polling_interval_time_min)",
+                left=percentiles("queue_wait_seconds"),
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Registration time (max_spin_up_time_min)",
+                left=percentiles("registration_seconds"),
+                left_annotations=[
+                    cloudwatch.HorizontalAnnotation(
+                        value=hyper_params.max_spin_up_time_min * 60, label="max_spin_up_time"
+                    )
+                ],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Pass duration (s)",
+                left=percentiles("pass_seconds"),
+                width=8,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="EC2 API latency (ms)",
+                left=percentiles("ec2_api_latency_ms"),
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="ClearML API latency (ms)",
+                left=percentiles("clearml_api_latency_ms"),
+                width=12,
+            ),
+        )
+        if extra_widgets:
+            self.dashboard.add_widgets(*extra_widgets)
+
+    def metric(
+        self, metric_name: str, statistic: str, period: cdk.Duration = PERIOD, **dimensions: str
+    ) -> cloudwatch.Metric:
+        """A metric of the autoscaler; without ``dimensions``, the one over all queues, resources, and operations."""
+        return cloudwatch.Metric(
+            namespace=METRICS_NAMESPACE,
+            metric_name=metric_name,
+            dimensions_map={AUTOSCALER_DIMENSION: self.workers_prefix, **dimensions},
+            statistic=statistic,
+            period=period,
+            label=f"{metric_name} {statistic}" if not dimensions else f"{','.join(dimensions.values())} {statistic}",
+        )
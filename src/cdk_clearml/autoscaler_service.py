@@ -0,0 +1,283 @@
+"""
+The ClearML AWS autoscaler as a Fargate service of the stack.
+
+Run by hand, the autoscaler lives on a laptop or on the ``services`` queue of the ClearML server,
+where it competes with Elasticsearch and Mongo for the server's CPU and memory, and it needs
+static AWS keys. ``ClearMLAutoscalerService`` runs it as a single Fargate task instead:
+
+- the configuration (``aws_autoscaler.yaml``) is validated at synth time and stored in an SSM
+  parameter, with the region, the instance profile of the workers, and the credentials chain
+  filled in;
+- the task role has the EC2 permissions of the drivers and may pass the workers' role on;
+- the ClearML API keys come from a Secrets Manager secret with ``access_key`` and ``secret_key``,
+  created for the autoscaler in the ClearML web UI;
+- the container health check fails once the supervisor stops touching its heartbeat file, and
+  an alarm goes off when no task is running (from Container Insights);
+- the autoscaler publishes its metrics as EMF in its logs, for the dashboard and alarms of
+  ``ClearMLAutoscalerMonitoring``.
+
+The service never runs two tasks at once, so that two autoscalers do not both launch workers
+for the same queued task.
+"""
+
+import math
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+import yaml
+from aws_cdk import Stack
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecs as ecs
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_logs as logs
+from aws_cdk import aws_secretsmanager as secretsmanager
+from aws_cdk import aws_ssm as ssm
+from constructs import Construct
+from pydantic import BaseModel, validator
+
+from cdk_clearml.autoscaler.config import load_autoscaler_config
+from cdk_clearml.autoscaler_monitoring import ClearMLAutoscalerMonitoring
+
+THIS_DIR = Path(__file__).parent
+DOCKERFILE_FPATH = "resources/autoscaler/Dockerfile"
+HEARTBEAT_FPATH = "/tmp/clearml-autoscaler-heartbeat"
+
+# valid memory sizes (MiB) of a Fargate task per CPU size (CPU units)
+FARGATE_MEMORY_MIB: Dict[int, List[int]] = {
+    256: [512, 1024, 2048],
+    512: [1024 * gib for gib in range(1, 5)],
+    1024: [1024 * gib for gib in range(2, 9)],
+    2048: [1024 * gib for gib in range(4, 17)],
+    4096: [1024 * gib for gib in range(8, 31)],
+}
+
+# what the drivers in cdk_clearml/autoscaler do to the workers
+AUTOSCALER_EC2_ACTIONS = [
+    "ec2:RunInstances",
+    "ec2:RequestSpotInstances",
+    "ec2:CreateFleet",
+    "ec2:StartInstances",
+    "ec2:StopInstances",
+    "ec2:TerminateInstances",
+    "ec2:ModifyInstanceAttribute",
+    "ec2:CreateTags",
+    "ec2:DescribeInstances",
+    "ec2:DescribeSpotInstanceRequests",
+    "ec2:GetConsoleOutput",
+    "ec2:CreateLaunchTemplate",
+    "ec2:CreateLaunchTemplateVersion",
+    "ec2:DeleteLaunchTemplateVersions",
+    "ec2:DescribeLaunchTemplates",
+    "ec2:DescribeLaunchTemplateVersions",
+]
+
+
+class AutoscalerServiceConfig(BaseModel):
+    """
+    How ``ClearMLAutoscalerService`` runs the autoscaler.
+
+    :param config_fpath: The autoscaler configuration, as for ``aws_autoscaler.py --config-file``.
+        AWS credentials, region, and ``iam_arn`` in it are replaced by the stack's.
+    :param cpu: CPU units of the Fargate task.
+    :param memory_mib: Memory of the Fargate task.
+    :param assign_public_ip: Run the task in a public subnet with a public IP, for VPCs whose
+        private subnets have no NAT gateway.
+    :param clearml_credentials_secret_name: Secrets Manager secret with the ``access_key`` and
+        ``secret_key`` the autoscaler uses to talk to the ClearML API server.
+    """
+
+    config_fpath: Path
+    cpu: int = 256
+    memory_mib: int = 512
+    assign_public_ip: bool = False
+    clearml_credentials_secret_name: str = "/clearml/autoscaler_api_credentials"
+
+    @validator("config_fpath")
+    def config_must_be_valid(cls, config_fpath: Path) -> Path:  # noqa: N805
+        load_autoscaler_config(config_fpath)
+        return config_fpath
+
+    @validator("memory_mib")
+    def must_be_a_fargate_size(cls, memory_mib: int, values: dict) -> int:  # noqa: N805
+        check_fargate_size(values.get("cpu"), memory_mib)
+        return memory_mib
+
+
+def check_fargate_size(cpu: Optional[int], memory_mib: int) -> None:
+    """:raises ValueError: If Fargate has no task size with ``cpu`` units and ``memory_mib``."""
+    if cpu not in FARGATE_MEMORY_MIB:
+        raise ValueError(f"cpu must be one of {sorted(FARGATE_MEMORY_MIB)}, got {cpu}")
+    if memory_mib not in FARGATE_MEMORY_MIB[cpu]:
+        raise ValueError(
+            f"Fargate tasks with {cpu} CPU units take {FARGATE_MEMORY_MIB[cpu]} MiB of memory, got {memory_mib}"
+        )
+
+
+class ClearMLAutoscalerService(Construct):
+    """
+    A Fargate service running ``python -m cdk_clearml.autoscaler --service``.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param vpc: The VPC of the ClearML server and the workers.
+    :param config: How to run the autoscaler.
+    :param api_host: URL of the ClearML API server, e.g. ``https://api.clearml.example.com``.
+    :param web_host: URL of the ClearML web server.
+    :param files_host: URL of the ClearML fileserver.
+    :param worker_role: Role of the instance profile the workers are launched with.
+    :param worker_instance_profile: The instance profile the workers are launched with.
+    :param agent_parameters: SSM parameters passed on to the autoscaler, by command line option
+        (e.g. ``--agent-clearml-conf-parameter``).
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        config: AutoscalerServiceConfig,
+        api_host: str,
+        web_host: str,
+        files_host: str,
+        worker_role: iam.IRole,
+        worker_instance_profile: iam.CfnInstanceProfile,
+        agent_parameters: Optional[Dict[str, ssm.IStringParameter]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        stack = Stack.of(self)
+        agent_parameters = agent_parameters or {}
+
+        autoscaler_config = load_autoscaler_config(config.config_fpath)
+        hyper_params = autoscaler_config.hyper_params
+        hyper_params.cloud_credentials_key = ""
+        hyper_params.cloud_credentials_secret = ""
+        hyper_params.cloud_credentials_region = stack.region
+        hyper_params.use_credentials_chain = True
+        hyper_params.iam_arn = worker_instance_profile.attr_arn
+        hyper_params.iam_name = None
+        # the container logs are where ClearMLAutoscalerMonitoring's metrics come from
+        hyper_params.metrics = True
+        hyper_params.metrics_emf = True
+        self.config_parameter = ssm.StringParameter(
+            self,
+            "AutoscalerConfig",
+            parameter_name=f"/clearml/{stack.stack_name}/autoscaler_config",
+            string_value=yaml.safe_dump(autoscaler_config.to_clearml_config()),
+            # the configuration easily outgrows the 4 KB of a standard parameter
+            tier=ssm.ParameterTier.INTELLIGENT_TIERING,
+            description="Configuration of the ClearML autoscaler service",
+        )
+
+        self.cluster = ecs.Cluster(self, "Cluster", vpc=vpc, container_insights=True)
+        self.task_definition = ecs.FargateTaskDefinition(
+            self, "TaskDefinition", cpu=config.cpu, memory_limit_mib=config.memory_mib
+        )
+        self.grant_autoscaling(self.task_definition.task_role, worker_role)
+        self.config_parameter.grant_read(self.task_definition.task_role)
+        for parameter in agent_parameters.values():
+            parameter.grant_read(self.task_definition.task_role)
+
+        clearml_credentials = secretsmanager.Secret.from_secret_name_v2(
+            self, "ClearMLCredentials", config.clearml_credentials_secret_name
+        )
+        command = ["--service", "--config-ssm-parameter", self.config_parameter.parameter_name]
+        command += ["--heartbeat-file", HEARTBEAT_FPATH]
+        for option, parameter in agent_parameters.items():
+            command += [option, parameter.parameter_name]
+
+        # a pass runs at least every max_pass_interval_min, but may spend max_spin_up_time_min spinning up
+        heartbeat_max_age_min = math.ceil(
+            max(hyper_params.polling_interval_time_min, hyper_params.max_pass_interval_min)
+            + hyper_params.max_spin_up_time_min
+            + 5
+        )
+        self.task_definition.add_container(
+            "autoscaler",
+            image=ecs.ContainerImage.from_asset(
+                str(THIS_DIR),
+                file=DOCKERFILE_FPATH,
+                exclude=["**/__pycache__", "resources/packer", "resources/image-builder", "resources/bootstrap-shims"],
+            ),
+            command=command,
+            environment={
+                "CLEARML_API_HOST": api_host,
+                "CLEARML_WEB_HOST": web_host,
+                "CLEARML_FILES_HOST": files_host,
+            },
+            secrets={
+                "CLEARML_API_ACCESS_KEY": ecs.Secret.from_secrets_manager(clearml_credentials, "access_key"),
+                "CLEARML_API_SECRET_KEY": ecs.Secret.from_secrets_manager(clearml_credentials, "secret_key"),
+            },
+            health_check=ecs.HealthCheck(
+                command=["CMD-SHELL", f'test -n "$(find {HEARTBEAT_FPATH} -mmin -{heartbeat_max_age_min})"'],
+                interval=cdk.Duration.minutes(1),
+                retries=3,
+                start_period=cdk.Duration.minutes(5),
+            ),
+            logging=ecs.LogDrivers.aws_logs(stream_prefix="autoscaler", log_retention=logs.RetentionDays.ONE_MONTH),
+        )
+
+        self.service = ecs.FargateService(
+            self,
+            "Service",
+            cluster=self.cluster,
+            task_definition=self.task_definition,
+            desired_count=1,
+            # stop the old task before starting the new one: two autoscalers would both launch workers
+            min_healthy_percent=0,
+            max_healthy_percent=100,
+            circuit_breaker=ecs.DeploymentCircuitBreaker(rollback=True),
+            assign_public_ip=config.assign_public_ip,
+            vpc_subnets=ec2.SubnetSelection(
+                subnet_type=ec2.SubnetType.PUBLIC if config.assign_public_ip else ec2.SubnetType.PRIVATE_WITH_EGRESS
+            ),
+        )
+
+        self.running_task_alarm = cloudwatch.Alarm(
+            self,
+            "NotRunningAlarm",
+            alarm_description="The ClearML autoscaler service has no running task, so no workers are launched",
+            metric=cloudwatch.Metric(
+                namespace="ECS/ContainerInsights",
+                metric_name="RunningTaskCount",
+                dimensions_map={
+                    "ClusterName": self.cluster.cluster_name,
+                    "ServiceName": self.service.service_name,
+                },
+                statistic="Minimum",
+                period=cdk.Duration.minutes(5),
+            ),
+            threshold=1,
+            comparison_operator=cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD,
+            evaluation_periods=3,
+            treat_missing_data=cloudwatch.TreatMissingData.BREACHING,
+        )
+        self.monitoring = ClearMLAutoscalerMonitoring(
+            self,
+            "Monitoring",
+            autoscaler_config=autoscaler_config,
+            extra_widgets=[cloudwatch.AlarmWidget(title="Running autoscaler tasks", alarm=self.running_task_alarm)],
+        )
+
+    @staticmethod
+    def grant_autoscaling(role: iam.IRole, worker_role: iam.IRole) -> None:
+        """Allow ``role`` to launch, stop, and terminate workers with ``worker_role``."""
+        role.add_to_principal_policy(iam.PolicyStatement(actions=AUTOSCALER_EC2_ACTIONS, resources=["*"]))
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["iam:PassRole"],
+                resources=[worker_role.role_arn],
+                conditions={"StringEquals": {"iam:PassedToService": "ec2.amazonaws.com"}},
+            )
+        )
+        # the first spot request and EC2 Fleet of an account create their service-linked roles
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["iam:CreateServiceLinkedRole"],
+                resources=["*"],
+                conditions={"StringEquals": {"iam:AWSServiceName": ["spot.amazonaws.com", "ec2fleet.amazonaws.com"]}},
+            )
+        )
@@ -0,0 +1,223 @@
+"""
+Backups of the ClearML server's data stores, and the restore paths.
+
+Two kinds of backups complement each other:
+
+- Data Lifecycle Manager takes crash-consistent EBS snapshots of every data volume (see
+  ``data_volumes.py``) on a schedule. The latest snapshot is kept fast-restore enabled in the
+  server's availability zone, so that a volume created from it (``restore_volumes_from_snapshots``)
+  performs fully from the start rather than loading its blocks from S3 on first access.
+- The ``backup`` docker-compose service (``server_backup.py``) backs Mongo and Elasticsearch up
+  to S3 more often, incrementally for Elasticsearch. With ``restore_on_boot``, a server whose data
+  volumes are new loads the most recent of those backups before ClearML starts.
+
+Fast snapshot restore is billed per hour for every snapshot it is enabled on, i.e. one per data volume.
+"""
+
+from pathlib import Path
+from typing import Dict, Tuple
+
+import aws_cdk as cdk
+from aws_cdk import Stack
+from aws_cdk import aws_dlm as dlm
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecr_assets as ecr_assets
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_s3 as s3
+from constructs import Construct
+from pydantic import BaseModel, validator
+
+from cdk_clearml.data_volumes import DATA_STORE_MOUNT_POINTS
+
+THIS_DIR = Path(__file__).parent
+DOCKERFILE_FPATH = "resources/backup/Dockerfile"
+
+# where the server's cfn-init places the units running the backup service
+BACKUP_UNIT_FPATH = "/etc/systemd/system/clearml-backup.service"
+BACKUP_TIMER_FPATH = "/etc/systemd/system/clearml-backup.timer"
+
+# the data volumes of a stack carry this tag, with the stack name as its value, for the DLM policy
+BACKUP_TAG_KEY = "clearml:backup"
+
+# the intervals Data Lifecycle Manager accepts
+DLM_INTERVAL_HOURS = [1, 2, 3, 4, 6, 8, 12, 24]
+
+
+class BackupsConfig(BaseModel):
+    """
+    Schedules and retention of the backups.
+
+    The Elasticsearch snapshot repository lives on the root volume next to the data volumes, so
+    ``DataVolumesConfig.root_volume_size_gib`` has to leave room for it.
+    """
+
+    snapshot_interval_hours: int = 24
+    snapshot_retain_count: int = 7
+    fast_snapshot_restore: bool = True
+    # systemd calendar expression of the backups to S3
+    logical_backup_schedule: str = "hourly"
+    keep_elasticsearch_snapshots: int = 24
+    mongo_dump_retention_days: int = 7
+    restore_on_boot: bool = True
+    # data store to the ID of the EBS snapshot its volume is created from
+    restore_volumes_from_snapshots: Dict[str, str] = {}
+
+    @validator("snapshot_interval_hours")
+    def must_be_a_dlm_interval(cls, snapshot_interval_hours: int) -> int:  # noqa: N805
+        if snapshot_interval_hours not in DLM_INTERVAL_HOURS:
+            raise ValueError(
+                f"snapshot_interval_hours must be one of {DLM_INTERVAL_HOURS}, got {snapshot_interval_hours}"
+            )
+        return snapshot_interval_hours
+
+    @validator("snapshot_retain_count", "keep_elasticsearch_snapshots", "mongo_dump_retention_days")
+    def must_keep_one(cls, count: int) -> int:  # noqa: N805
+        if count < 1:
+            raise ValueError(f"At least one backup must be kept, got {count}")
+        return count
+
+    @validator("restore_volumes_from_snapshots")
+    def must_be_snapshots_of_data_stores(cls, snapshot_ids: Dict[str, str]) -> Dict[str, str]:  # noqa: N805
+        for data_store, snapshot_id in snapshot_ids.items():
+            if data_store not in DATA_STORE_MOUNT_POINTS:
+                raise ValueError(f"Data stores must be one of {list(DATA_STORE_MOUNT_POINTS)}, got '{data_store}'")
+            if not snapshot_id.startswith("snap-"):
+                raise ValueError(f"Expected an EBS snapshot ID for {data_store}, got '{snapshot_id}'")
+        return snapshot_ids
+
+
+def render_backup_units(config: BackupsConfig, docker_compose_fpath: str) -> Tuple[str, str]:
+    """systemd service and timer running the backup service, placed on disk by ``ClearMLServerEC2Instance``."""
+    service = f"""[Unit]
+Description=Back the ClearML Mongo and Elasticsearch up to S3
+After=docker.service
+Requires=docker.service
+
+[Service]
+Type=oneshot
+WorkingDirectory={Path(docker_compose_fpath).parent}
+ExecStart=/usr/bin/docker-compose -f {docker_compose_fpath} run --rm backup backup
+"""
+    timer = f"""[Unit]
+Description=Back the ClearML Mongo and Elasticsearch up to S3 on a schedule
+
+[Timer]
+OnCalendar={config.logical_backup_schedule}
+RandomizedDelaySec=5min
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+"""
+    return service, timer
+
+
+class ClearMLBackups(Construct):
+    """
+    The DLM snapshot policy of the data volumes, the bucket of the backup service, and its image.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param volumes: The data volumes, by data store.
+    :param availability_zone: The availability zone of the server, where snapshots restore fast.
+    :param config: Schedules and retention of the backups.
+    :param arm64: Build the image of the backup service for a Graviton server.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        volumes: Dict[str, ec2.IVolume],
+        availability_zone: str,
+        config: BackupsConfig,
+        arm64: bool = False,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        stack_name = Stack.of(self).stack_name
+
+        for volume in volumes.values():
+            cdk.Tags.of(volume).add(BACKUP_TAG_KEY, stack_name)
+
+        dlm_role = iam.Role(
+            self,
+            "DlmRole",
+            assumed_by=iam.ServicePrincipal("dlm.amazonaws.com"),
+            managed_policies=[
+                iam.ManagedPolicy.from_aws_managed_policy_name("service-role/AWSDataLifecycleManagerServiceRole")
+            ],
+        )
+        dlm_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=[
+                    "ec2:EnableFastSnapshotRestores",
+                    "ec2:DisableFastSnapshotRestores",
+                    "ec2:DescribeFastSnapshotRestores",
+                ],
+                resources=["*"],
+            )
+        )
+
+        self.snapshot_policy = dlm.CfnLifecyclePolicy(
+            self,
+            "SnapshotPolicy",
+            description=f"Snapshots of the ClearML data volumes of {stack_name}",
+            state="ENABLED",
+            execution_role_arn=dlm_role.role_arn,
+            policy_details=dlm.CfnLifecyclePolicy.PolicyDetailsProperty(
+                resource_types=["VOLUME"],
+                target_tags=[cdk.CfnTag(key=BACKUP_TAG_KEY, value=stack_name)],
+                schedules=[
+                    dlm.CfnLifecyclePolicy.ScheduleProperty(
+                        name="clearml-data-volumes",
+                        # the clearml:data-store tag tells which volume a snapshot is of
+                        copy_tags=True,
+                        create_rule=dlm.CfnLifecyclePolicy.CreateRuleProperty(
+                            interval=config.snapshot_interval_hours, interval_unit="HOURS"
+                        ),
+                        retain_rule=dlm.CfnLifecyclePolicy.RetainRuleProperty(count=config.snapshot_retain_count),
+                        fast_restore_rule=dlm.CfnLifecyclePolicy.FastRestoreRuleProperty(
+                            availability_zones=[availability_zone], count=1
+                        )
+                        if config.fast_snapshot_restore
+                        else None,
+                    )
+                ],
+            ),
+        )
+
+        self.bucket = s3.Bucket(
+            self,
+            "BackupBucket",
+            encryption=s3.BucketEncryption.S3_MANAGED,
+            block_public_access=s3.BlockPublicAccess.BLOCK_ALL,
+            enforce_ssl=True,
+            lifecycle_rules=[
+                s3.LifecycleRule(
+                    id="expire-mongo-dumps",
+                    prefix="mongo/",
+                    expiration=cdk.Duration.days(config.mongo_dump_retention_days),
+                ),
+                s3.LifecycleRule(
+                    id="abort-incomplete-multipart-uploads",
+                    abort_incomplete_multipart_upload_after=cdk.Duration.days(1),
+                ),
+            ],
+            # the backups are what is left when everything else is gone
+            removal_policy=cdk.RemovalPolicy.RETAIN,
+        )
+
+        self.image = ecr_assets.DockerImageAsset(
+            self,
+            "BackupImage",
+            directory=str(THIS_DIR),
+            file=DOCKERFILE_FPATH,
+            exclude=["**/__pycache__", "resources/packer", "resources/image-builder", "resources/bootstrap-shims"],
+            platform=ecr_assets.Platform.LINUX_ARM64 if arm64 else ecr_assets.Platform.LINUX_AMD64,
+        )
+
+    def grant(self, role: iam.IRole) -> None:
+        """Allow the server to pull the image of the backup service, and to write and read the backups."""
+        self.image.repository.grant_pull(role)
+        self.bucket.grant_read_write(role)
@@ -0,0 +1,213 @@
+"""
+Capacity profiles for the ClearML server.
+
+A profile picks the EC2 instance type for the server and sizes the memory-hungry
+components (Elasticsearch heap, Mongo's WiredTiger cache, Redis maxmemory, apiserver
+workers) from the instance's memory and vCPUs, so that together they fit the instance.
+"""
+
+import re
+from typing import Dict, Tuple, Union
+
+from pydantic import BaseModel, validator
+
+# (memory in MiB, vCPUs) of the instance types we expect to run the server on
+INSTANCE_TYPE_SPECS: Dict[str, Tuple[int, int]] = {
+    "t3.large": (8 * 1024, 2),
+    "t3.xlarge": (16 * 1024, 4),
+    "t3.2xlarge": (32 * 1024, 8),
+    "t4g.large": (8 * 1024, 2),
+    "t4g.xlarge": (16 * 1024, 4),
+    "t4g.2xlarge": (32 * 1024, 8),
+    "m6i.large": (8 * 1024, 2),
+    "m6i.xlarge": (16 * 1024, 4),
+    "m6i.2xlarge": (32 * 1024, 8),
+    "m6i.4xlarge": (64 * 1024, 16),
+    "m6g.large": (8 * 1024, 2),
+    "m6g.xlarge": (16 * 1024, 4),
+    "m6g.2xlarge": (32 * 1024, 8),
+    "m6g.4xlarge": (64 * 1024, 16),
+    "m7g.xlarge": (16 * 1024, 4),
+    "m7g.2xlarge": (32 * 1024, 8),
+    "r6i.large": (16 * 1024, 2),
+    "r6i.xlarge": (32 * 1024, 4),
+    "r6i.2xlarge": (64 * 1024, 8),
+    "r6i.4xlarge": (128 * 1024, 16),
+    "r6g.large": (16 * 1024, 2),
+    "r6g.xlarge": (32 * 1024, 4),
+    "r6g.2xlarge": (64 * 1024, 8),
+    "r6g.4xlarge": (128 * 1024, 16),
+    "r7g.xlarge": (32 * 1024, 4),
+    "r7g.2xlarge": (64 * 1024, 8),
+}
+
+# memory set aside for the OS, the docker daemon, and the page cache
+MIN_OS_RESERVED_MIB = 1024
+OS_RESERVED_FRACTION = 0.10
+
+# webserver, fileserver, async_delete, and agent-services are small and roughly constant
+SMALL_SERVICES_RESERVED_MIB = 1024
+
+APISERVER_MIB_PER_WORKER = 256
+MAX_APISERVER_WORKERS = 16
+
+# fractions of the memory left over for Elasticsearch, Mongo and Redis; the rest is headroom
+ELASTICSEARCH_HEAP_FRACTION = 0.50
+MONGO_CACHE_FRACTION = 0.25
+REDIS_MAXMEMORY_FRACTION = 0.10
+
+# above ~31 GiB the JVM can no longer use compressed object pointers
+MAX_ELASTICSEARCH_HEAP_MIB = 31 * 1024
+MIN_DATA_STORES_MIB = 2048
+
+
+class CapacityProfile(BaseModel):
+    """
+    The instance type of the ClearML server, along with its memory and vCPU count.
+
+    Use one of the presets (``CapacityProfile.preset("medium")``), look up a known instance
+    type (``CapacityProfile.from_instance_type("r6g.xlarge")``), or give all three fields.
+    """
+
+    instance_type: str
+    memory_mib: int
+    vcpus: int
+
+    @validator("instance_type")
+    def instance_type_must_look_like_an_ec2_instance_type(cls, instance_type: str) -> str:  # noqa: N805
+        if not re.match(r"^[a-z][a-z0-9-]*\.[a-z0-9]+$", instance_type):
+            raise ValueError(f"'{instance_type}' is not an EC2 instance type, e.g. 'm6i.xlarge'")
+        return instance_type
+
+    @property
+    def is_graviton(self) -> bool:
+        """True for ARM (Graviton) instance families such as m6g, r7g, or t4g."""
+        instance_family = self.instance_type.split(".")[0]
+        return re.match(r"^[a-z]+\d+g", instance_family) is not None
+
+    @classmethod
+    def from_instance_type(cls, instance_type: str) -> "CapacityProfile":
+        """Create a profile for one of the instance types in ``INSTANCE_TYPE_SPECS``."""
+        if instance_type not in INSTANCE_TYPE_SPECS:
+            raise ValueError(
+                f"Unknown instance type '{instance_type}'. Pass memory_mib and vcpus explicitly, "
+                f"or use one of: {sorted(INSTANCE_TYPE_SPECS)}"
+            )
+        memory_mib, vcpus = INSTANCE_TYPE_SPECS[instance_type]
+        return cls(instance_type=instance_type, memory_mib=memory_mib, vcpus=vcpus)
+
+    @classmethod
+    def preset(cls, name: str) -> "CapacityProfile":
+        """Create a profile from one of the names in ``CAPACITY_PROFILE_PRESETS``."""
+        if name not in CAPACITY_PROFILE_PRESETS:
+            raise ValueError(f"Unknown capacity profile '{name}'. Expected one of: {sorted(CAPACITY_PROFILE_PRESETS)}")
+        return cls.from_instance_type(CAPACITY_PROFILE_PRESETS[name])
+
+
+CAPACITY_PROFILE_PRESETS: Dict[str, str] = {
+    "small": "t3.large",
+    "medium": "m6i.xlarge",
+    "large": "r6i.2xlarge",
+    "medium-graviton": "m6g.xlarge",
+    "large-graviton": "r6g.2xlarge",
+}
+
+
+def resolve_capacity_profile(capacity_profile: Union[str, CapacityProfile]) -> CapacityProfile:
+    """Accept either a preset name or a ``CapacityProfile``."""
+    if isinstance(capacity_profile, CapacityProfile):
+        return capacity_profile
+    return CapacityProfile.preset(capacity_profile)
+
+
+class ServerTuning(BaseModel):
+    """Memory and concurrency settings of the ClearML server components."""
+
+    os_reserved_mib: int
+    small_services_reserved_mib: int
+    apiserver_workers: int
+    elasticsearch_heap_mib: int
+    mongo_wiredtiger_cache_mib: int
+    redis_maxmemory_mib: int
+
+    @property
+    def total_reserved_mib(self) -> int:
+        """Memory reserved by everything running on the server."""
+        return (
+            self.os_reserved_mib
+            + self.small_services_reserved_mib
+            + self.apiserver_workers * APISERVER_MIB_PER_WORKER
+            + self.elasticsearch_heap_mib
+            + self.mongo_wiredtiger_cache_mib
+            + self.redis_maxmemory_mib
+        )
+
+
+def _round_down(value: float, multiple: int) -> int:
+    return int(value // multiple * multiple)
+
+
+def compute_server_tuning(profile: CapacityProfile, stores_only: bool = False) -> ServerTuning:
+    """
+    Size the server components to fit the instance described by ``profile``.
+
+    :param stores_only: The apiserver runs elsewhere (``ClearMLStatelessServices``), so its
+        memory goes to the data stores.
+    :raises ValueError: If the instance is too small to leave room for the data stores.
+    """
+    os_reserved_mib = max(MIN_OS_RESERVED_MIB, int(profile.memory_mib * OS_RESERVED_FRACTION))
+    apiserver_workers = 0 if stores_only else max(1, min(profile.vcpus * 2, MAX_APISERVER_WORKERS))
+
+    data_stores_mib = (
+        profile.memory_mib
+        - os_reserved_mib
+        - SMALL_SERVICES_RESERVED_MIB
+        - apiserver_workers * APISERVER_MIB_PER_WORKER
+    )
+    if data_stores_mib < MIN_DATA_STORES_MIB:
+        raise ValueError(
+            f"{profile.instance_type} ({profile.memory_mib} MiB) leaves only {data_stores_mib} MiB for "
+            f"Elasticsearch, Mongo and Redis; at least {MIN_DATA_STORES_MIB} MiB are needed."
+        )
+
+    tuning = ServerTuning(
+        os_reserved_mib=os_reserved_mib,
+        small_services_reserved_mib=SMALL_SERVICES_RESERVED_MIB,
+        apiserver_workers=apiserver_workers,
+        elasticsearch_heap_mib=min(
+            MAX_ELASTICSEARCH_HEAP_MIB, _round_down(data_stores_mib * ELASTICSEARCH_HEAP_FRACTION, 256)
+        ),
+        mongo_wiredtiger_cache_mib=max(256, _round_down(data_stores_mib * MONGO_CACHE_FRACTION, 256)),
+        redis_maxmemory_mib=max(128, _round_down(data_stores_mib * REDIS_MAXMEMORY_FRACTION, 64)),
+    )
+
+    if tuning.total_reserved_mib > profile.memory_mib:
+        raise ValueError(
+            f"Reserved memory ({tuning.total_reserved_mib} MiB) exceeds the memory of "
+            f"{profile.instance_type} ({profile.memory_mib} MiB)."
+        )
+    return tuning
+
+
+def render_docker_compose_env(profile: CapacityProfile, stores_only: bool = False) -> str:
+    """
+    Render the ``.env`` file read by ``docker-compose`` next to ``docker-compose.yml``.
+
+    The variables are referenced by the elasticsearch, mongo, redis, and apiserver services.
+
+    :param stores_only: The instance only runs the data stores, see ``compute_server_tuning``.
+    """
+    tuning = compute_server_tuning(profile, stores_only=stores_only)
+    env = {
+        "CLEARML_ES_JAVA_OPTS": (
+            f"-Xms{tuning.elasticsearch_heap_mib}m -Xmx{tuning.elasticsearch_heap_mib}m "
+            "-Dlog4j2.formatMsgNoLookups=true"
+        ),
+        "CLEARML_MONGO_WIREDTIGER_CACHE_GB": f"{tuning.mongo_wiredtiger_cache_mib / 1024:.2f}",
+        "CLEARML_REDIS_MAXMEMORY_MB": str(tuning.redis_maxmemory_mib),
+    }
+    if tuning.apiserver_workers:
+        env["CLEARML_GUNICORN_WORKERS"] = str(tuning.apiserver_workers)
+    lines = [f"# sized for {profile.instance_type}: {profile.memory_mib} MiB, {profile.vcpus} vCPUs"]
+    lines += [f"{name}={value}" for name, value in env.items()]
+    return "\n".join(lines) + "\n"
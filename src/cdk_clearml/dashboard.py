@@ -0,0 +1,255 @@
+"""
+One CloudWatch dashboard for diagnosing a slow ClearML server.
+
+Rows, from what the user sees down to what the server is waiting on:
+
+1. response time (p50/p90/p99) of the web app, fileserver, and API target groups of the ALB;
+2. requests and 5xx responses per target group, and the 5xx of the ALB itself;
+3. CPU, memory, I/O wait, and disk usage of the server instance;
+4. queue length and operations of the EBS data volumes;
+5. CPU and memory of the containers, Elasticsearch heap and GC, Mongo latencies, Redis memory,
+   from ``server_metrics_collector.py``;
+6. the state of the server's alarms.
+"""
+
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_elasticloadbalancingv2 as elbv2
+from constructs import Construct
+
+from cdk_clearml.server_metrics_collector import SERVER_METRICS_NAMESPACE
+
+PERIOD = cdk.Duration.minutes(1)
+PERCENTILES = ("p50", "p90", "p99")
+
+# container_name of the docker-compose.yml services
+SERVER_CONTAINERS = [
+    "clearml-apiserver",
+    "clearml-webserver",
+    "clearml-fileserver",
+    "clearml-elastic",
+    "clearml-mongo",
+    "clearml-redis",
+]
+
+
+class ClearMLDashboard(Construct):
+    """
+    CloudWatch dashboard of the ClearML server.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param load_balancer: The ALB in front of the server.
+    :param target_groups: The target groups of the ALB by name, e.g. ``{"app": ..., "api": ...}``,
+        as returned by ``map_subdomain_to_alb``.
+    :param instance_id: The ID of the server instance.
+    :param disk_paths: The mount points whose disk usage the CloudWatch agent publishes.
+    :param data_volumes: The EBS data volumes of the server by data store.
+    :param alarms: Alarms shown at the bottom of the dashboard.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        load_balancer: elbv2.IApplicationLoadBalancer,
+        target_groups: Dict[str, elbv2.IApplicationTargetGroup],
+        instance_id: str,
+        disk_paths: List[str],
+        data_volumes: Dict[str, ec2.IVolume],
+        alarms: Optional[List[cloudwatch.IAlarm]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        self.load_balancer = load_balancer
+        self.instance_id = instance_id
+
+        self.dashboard = cloudwatch.Dashboard(
+            self,
+            "Dashboard",
+            dashboard_name=f"{cdk.Stack.of(self).stack_name}-clearml-server",
+        )
+
+        self.dashboard.add_widgets(
+            *[
+                cloudwatch.GraphWidget(
+                    title=f"{name} response time (s)",
+                    left=[
+                        self.target_group_metric(target_group, "TargetResponseTime", statistic)
+                        for statistic in PERCENTILES
+                    ],
+                    width=24 // len(target_groups),
+                )
+                for name, target_group in target_groups.items()
+            ]
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Requests",
+                left=[
+                    self.target_group_metric(target_group, "RequestCount", "Sum", label=name)
+                    for name, target_group in target_groups.items()
+                ],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="5xx responses",
+                left=[
+                    *[
+                        self.target_group_metric(target_group, "HTTPCode_Target_5XX_Count", "Sum", label=name)
+                        for name, target_group in target_groups.items()
+                    ],
+                    self.load_balancer_metric("HTTPCode_ELB_5XX_Count", "Sum", label="ALB"),
+                ],
+                width=12,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Instance CPU (%)",
+                left=[
+                    self.instance_metric("CPUUtilization", "Average", namespace="AWS/EC2", label="CPU"),
+                    self.instance_metric("CpuIoWait", "Average", label="I/O wait", cpu="cpu-total"),
+                ],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Instance memory (%)",
+                left=[self.instance_metric("MemoryUtilization", "Average", label="memory")],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Disk usage (%)",
+                left=[
+                    self.instance_metric("DiskSpaceUtilization", "Maximum", label=disk_path, path=disk_path)
+                    for disk_path in disk_paths
+                ],
+                width=8,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="EBS queue length",
+                left=[
+                    self.volume_metric(volume, "VolumeQueueLength", "Average", label=data_store)
+                    for data_store, volume in data_volumes.items()
+                ],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="EBS operations",
+                left=[
+                    self.volume_metric(volume, f"Volume{operation}Ops", "Sum", label=f"{data_store} {operation}")
+                    for data_store, volume in data_volumes.items()
+                    for operation in ("Read", "Write")
+                ],
+                width=12,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Container CPU (% of the instance)",
+                left=[
+                    self.instance_metric("ContainerCpuUtilization", "Average", label=container, Container=container)
+                    for container in SERVER_CONTAINERS
+                ],
+                width=12,
+            ),
+            cloudwatch.GraphWidget(
+                title="Container memory (% of the instance)",
+                left=[
+                    self.instance_metric("ContainerMemoryUtilization", "Average", label=container, Container=container)
+                    for container in SERVER_CONTAINERS
+                ],
+                width=12,
+            ),
+        )
+        self.dashboard.add_widgets(
+            cloudwatch.GraphWidget(
+                title="Elasticsearch JVM",
+                left=[self.instance_metric("ElasticsearchJvmHeapUsedPercent", "Maximum", label="heap used (%)")],
+                right=[self.instance_metric("ElasticsearchOldGcTimeMs", "Sum", label="old GC time (ms)")],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Mongo latency (ms)",
+                left=[
+                    self.instance_metric(metric_name, statistic, label=f"{operation} {statistic}")
+                    for operation, metric_name in (
+                        ("read", "MongoReadLatencyMs"),
+                        ("write", "MongoWriteLatencyMs"),
+                        ("command", "MongoCommandLatencyMs"),
+                    )
+                    for statistic in PERCENTILES
+                ],
+                width=8,
+            ),
+            cloudwatch.GraphWidget(
+                title="Redis",
+                left=[self.instance_metric("RedisMemoryUsedPercent", "Maximum", label="memory used (% of maxmemory)")],
+                right=[self.instance_metric("RedisEvictedKeys", "Sum", label="evicted keys")],
+                width=8,
+            ),
+        )
+        if alarms:
+            self.dashboard.add_widgets(cloudwatch.AlarmStatusWidget(title="Alarms", alarms=alarms, width=24))
+
+    def load_balancer_metric(self, metric_name: str, statistic: str, label: str) -> cloudwatch.Metric:
+        return cloudwatch.Metric(
+            namespace="AWS/ApplicationELB",
+            metric_name=metric_name,
+            dimensions_map={"LoadBalancer": self.load_balancer.load_balancer_full_name},
+            statistic=statistic,
+            period=PERIOD,
+            label=label,
+        )
+
+    def target_group_metric(
+        self,
+        target_group: elbv2.IApplicationTargetGroup,
+        metric_name: str,
+        statistic: str,
+        label: Optional[str] = None,
+    ) -> cloudwatch.Metric:
+        return cloudwatch.Metric(
+            namespace="AWS/ApplicationELB",
+            metric_name=metric_name,
+            dimensions_map={
+                "LoadBalancer": self.load_balancer.load_balancer_full_name,
+                "TargetGroup": target_group.target_group_full_name,
+            },
+            statistic=statistic,
+            period=PERIOD,
+            label=label or statistic,
+        )
+
+    def instance_metric(
+        self,
+        metric_name: str,
+        statistic: str,
+        label: str,
+        namespace: str = SERVER_METRICS_NAMESPACE,
+        **dimensions: str,
+    ) -> cloudwatch.Metric:
+        return cloudwatch.Metric(
+            namespace=namespace,
+            metric_name=metric_name,
+            dimensions_map={"InstanceId": self.instance_id, **dimensions},
+            statistic=statistic,
+            period=PERIOD,
+            label=label,
+        )
+
+    @staticmethod
+    def volume_metric(volume: ec2.IVolume, metric_name: str, statistic: str, label: str) -> cloudwatch.Metric:
+        return cloudwatch.Metric(
+            namespace="AWS/EBS",
+            metric_name=metric_name,
+            dimensions_map={"VolumeId": volume.volume_id},
+            statistic=statistic,
+            period=PERIOD,
+            label=label,
+        )
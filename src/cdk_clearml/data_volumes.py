@@ -0,0 +1,157 @@
+"""Dedicated gp3 EBS volumes for the ClearML data stores."""
+
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import Stack
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_iam as iam
+from constructs import Construct
+from pydantic import BaseModel, root_validator
+
+# where the bootstrap mounts each data store's volume; these are the host paths of the
+# bind mounts in docker-compose.yml
+DATA_STORE_MOUNT_POINTS: Dict[str, str] = {
+    "elasticsearch": "/clearml/opt/clearml/data/elastic_7",
+    "mongo": "/clearml/opt/clearml/data/mongo_4",
+    "redis": "/clearml/opt/clearml/data/redis",
+    "fileserver": "/clearml/opt/clearml/data/fileserver",
+}
+
+DATA_STORE_DEVICE_NAMES: Dict[str, str] = {
+    "elasticsearch": "/dev/sdf",
+    "mongo": "/dev/sdg",
+    "redis": "/dev/sdh",
+    "fileserver": "/dev/sdi",
+}
+
+DATA_STORE_TAG_KEY = "clearml:data-store"
+
+
+class DataVolumeConfig(BaseModel):
+    """Size and provisioned performance of one gp3 volume."""
+
+    size_gib: int = 50
+    iops: int = 3000
+    throughput_mibps: int = 125
+
+    @root_validator(skip_on_failure=True)
+    def must_be_within_gp3_limits(cls, values: dict) -> dict:  # noqa: N805
+        size_gib, iops, throughput_mibps = values["size_gib"], values["iops"], values["throughput_mibps"]
+        if not 3000 <= iops <= 16000:
+            raise ValueError(f"gp3 IOPS must be between 3000 and 16000, got {iops}")
+        if not 125 <= throughput_mibps <= 1000:
+            raise ValueError(f"gp3 throughput must be between 125 and 1000 MiB/s, got {throughput_mibps}")
+        if iops > 500 * size_gib:
+            raise ValueError(f"gp3 allows at most 500 IOPS per GiB; {size_gib} GiB allows {500 * size_gib} IOPS")
+        if throughput_mibps > iops / 4:
+            raise ValueError(f"gp3 allows at most 0.25 MiB/s per IOPS; {iops} IOPS allow {iops // 4} MiB/s")
+        return values
+
+
+class DataVolumesConfig(BaseModel):
+    """One volume per data store; Elasticsearch gets more performance since it is the most I/O-bound."""
+
+    elasticsearch: DataVolumeConfig = DataVolumeConfig(size_gib=100, iops=6000, throughput_mibps=250)
+    mongo: DataVolumeConfig = DataVolumeConfig(size_gib=50, iops=4000, throughput_mibps=125)
+    redis: DataVolumeConfig = DataVolumeConfig(size_gib=10)
+    fileserver: DataVolumeConfig = DataVolumeConfig(size_gib=100)
+    root_volume_size_gib: int = 30
+
+
+class ClearMLDataVolumes(Construct):
+    """
+    gp3 volumes for Elasticsearch, Mongo, Redis and the fileserver.
+
+    The volumes are retained when the stack or the instance is deleted. The bootstrap attaches
+    them with ``attach-data-volumes.sh`` rather than with CloudFormation volume attachments, so that a
+    replacement instance can take them over from the instance it replaces.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param availability_zone: The availability zone of the ClearML server.
+    :param config: Size and performance of each volume.
+    :param data_stores: The data stores that run on the server, e.g. without those that are managed
+        (see ``ClearMLManagedDataStores``). Defaults to all of them.
+    :param snapshot_ids: EBS snapshots to create the volumes of some data stores from, e.g. to
+        restore them from the snapshots of ``ClearMLBackups``. Changing them replaces the volumes.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        availability_zone: str,
+        config: DataVolumesConfig,
+        data_stores: Optional[List[str]] = None,
+        snapshot_ids: Optional[Dict[str, str]] = None,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        self.volumes: Dict[str, ec2.Volume] = {}
+        for data_store in data_stores or DATA_STORE_MOUNT_POINTS:
+            volume_config: DataVolumeConfig = getattr(config, data_store)
+            volume = ec2.Volume(
+                self,
+                f"{data_store}-volume",
+                availability_zone=availability_zone,
+                size=cdk.Size.gibibytes(volume_config.size_gib),
+                volume_type=ec2.EbsDeviceVolumeType.GP3,
+                iops=volume_config.iops,
+                throughput=volume_config.throughput_mibps,
+                encrypted=True,
+                snapshot_id=(snapshot_ids or {}).get(data_store),
+                removal_policy=cdk.RemovalPolicy.RETAIN,
+            )
+            cdk.Tags.of(volume).add(DATA_STORE_TAG_KEY, data_store)
+            cdk.Tags.of(volume).add("Name", f"{Stack.of(self).stack_name}-clearml-{data_store}")
+            self.volumes[data_store] = volume
+
+    def render_volumes_file(self) -> str:
+        """Render the file read by ``attach-data-volumes.sh``: one ``<volume id> <device> <mount point>`` per line."""
+        lines: List[str] = [
+            f"{volume.volume_id} {DATA_STORE_DEVICE_NAMES[data_store]} {DATA_STORE_MOUNT_POINTS[data_store]}"
+            for data_store, volume in self.volumes.items()
+        ]
+        return "\n".join(lines) + "\n"
+
+    def grant_attach(self, role: iam.IRole) -> None:
+        """Allow the server to take the volumes over from the instance it replaces."""
+        stack = Stack.of(self)
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["ec2:AttachVolume", "ec2:DetachVolume"],
+                resources=[
+                    *[
+                        stack.format_arn(service="ec2", resource="volume", resource_name=volume.volume_id)
+                        for volume in self.volumes.values()
+                    ],
+                    stack.format_arn(service="ec2", resource="instance", resource_name="*"),
+                ],
+            )
+        )
+        role.add_to_principal_policy(iam.PolicyStatement(actions=["ec2:DescribeVolumes"], resources=["*"]))
+
+        # used to stop ClearML on the previous instance and unmount the volumes before detaching them
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["ssm:SendCommand"],
+                resources=[stack.format_arn(service="ec2", resource="instance", resource_name="*")],
+                conditions={"StringEquals": {"ssm:resourceTag/aws:cloudformation:stack-name": stack.stack_name}},
+            )
+        )
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["ssm:SendCommand"],
+                resources=[
+                    stack.format_arn(
+                        service="ssm",
+                        account="",
+                        resource="document",
+                        resource_name="AWS-RunShellScript",
+                    )
+                ],
+            )
+        )
+        role.add_to_principal_policy(iam.PolicyStatement(actions=["ssm:GetCommandInvocation"], resources=["*"]))
@@ -1,6 +1,8 @@
 from aws_cdk import aws_route53 as route53
 from constructs import Construct
 
+from cdk_clearml.imported_resources import ImportedResources
+
 
 def map_subdomain_to_ec2_ip(
     scope: Construct,
@@ -12,11 +14,7 @@ def map_subdomain_to_ec2_ip(
     fully_qualified_subdomain = f"{subdomain}.{top_level_domain_name}"
     a_record_id = fully_qualified_subdomain.replace(".", "")
 
-    hosted_zone = route53.HostedZone.from_lookup(
-        scope=scope,
-        id=f"{a_record_id}-ClearMLHostedZone",
-        domain_name=top_level_domain_name,
-    )
+    hosted_zone = ImportedResources.of(scope).hosted_zone(domain_name=top_level_domain_name)
 
     route53.ARecord(
         scope=scope,
@@ -1,6 +1,8 @@
 from pathlib import Path
+from typing import Optional
 
 # from aws_cdk import aws_param
+from aws_cdk import Stack
 from aws_cdk import aws_iam as iam
 from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_ssm as ssm
@@ -11,13 +13,20 @@ RESOURCES_DIR = THIS_DIR / "resources"
 
 
 class AutoscaledEc2InstanceProfile(Construct):
-    """Role and instance profile for the EC2 instance that adds permission to access the S3 bucket."""
+    """
+    Role and instance profile for the EC2 instance that adds permission to access the S3 bucket.
+
+    :param agent_clearml_conf: ``clearml.conf`` section for the autoscaled agents, e.g. the one
+        rendered by ``render_agent_clearml_conf``. It is stored in an SSM parameter that the
+        autoscaler merges into ``extra_clearml_conf``.
+    """
 
     def __init__(
         self,
         scope: Construct,
         construct_id: str,
         artifacts_bucket: s3.Bucket,
+        agent_clearml_conf: Optional[str] = None,
         **kwargs,
     ):
         super().__init__(scope=scope, id=construct_id, **kwargs)
@@ -51,6 +60,16 @@ class AutoscaledEc2InstanceProfile(Construct):
             roles=[self.role.role_name],
         )
 
+        self.agent_clearml_conf_parameter: Optional[ssm.StringParameter] = None
+        if agent_clearml_conf:
+            self.agent_clearml_conf_parameter = ssm.StringParameter(
+                self,
+                id="AgentClearMLConf",
+                parameter_name=f"/clearml/{Stack.of(self).stack_name}/agent_clearml_conf",
+                string_value=agent_clearml_conf,
+                description="clearml.conf section merged into extra_clearml_conf by the autoscaler",
+            )
+
 
 def add_policy_for_querying_athena(role: iam.Role):
     role.add_to_policy(
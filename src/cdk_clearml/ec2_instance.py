@@ -1,49 +1,71 @@
+import hashlib
 from pathlib import Path
-from string import Template
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 
 import aws_cdk as cdk
 from aws_cdk import Stack
-from aws_cdk import aws_cloudwatch as cloudwatch
 from aws_cdk import aws_ec2 as ec2
-from aws_cdk import aws_ecr as ecr
 from aws_cdk import aws_iam as iam
-from aws_cdk import aws_s3 as s3
 from constructs import Construct
 
+from cdk_clearml.backups import (
+    BACKUP_TIMER_FPATH,
+    BACKUP_UNIT_FPATH,
+    BackupsConfig,
+    ClearMLBackups,
+    render_backup_units,
+)
+from cdk_clearml.capacity import CapacityProfile, render_docker_compose_env
+from cdk_clearml.data_volumes import DATA_STORE_MOUNT_POINTS, ClearMLDataVolumes, DataVolumesConfig
 from cdk_clearml.ec2_autoscaled_instance import AutoscaledEc2InstanceProfile
+from cdk_clearml.elasticsearch_tuning import (
+    APPLY_TEMPLATE_UNIT_FPATH,
+    EXPIRY_TIMER_FPATH,
+    EXPIRY_UNIT_FPATH,
+    INDEX_MAINTENANCE_FPATH,
+    ElasticsearchTuningConfig,
+    render_apply_template_unit,
+    render_expiry_units,
+)
+from cdk_clearml.imported_resources import ImportedResources
+from cdk_clearml.managed_data_stores import (
+    MONGO_CA_BUNDLE_FNAME,
+    MONGO_CA_BUNDLE_URL,
+    DataStoreEndpoint,
+    render_external_data_stores_docker_compose,
+    render_external_data_stores_env,
+)
+from cdk_clearml.server_backup import DATA_STORES as BACKED_UP_DATA_STORES
+from cdk_clearml.server_monitoring import (
+    CLOUDWATCH_AGENT_CONFIG_FPATH,
+    METRICS_COLLECTOR_FPATH,
+    METRICS_COLLECTOR_UNIT_FPATH,
+    ClearMLServerMonitoring,
+    render_cloudwatch_agent_config,
+    render_metrics_collector_unit,
+    server_alarm_specs,
+)
+from cdk_clearml.stateless_services import render_stores_docker_compose
+from cdk_clearml.user_data import render_user_data_script
 
 THIS_DIR = Path(__file__).parent
 DOCKER_COMPOSE_FPATH = THIS_DIR / "resources/docker-compose.yml"
-USER_DATA_TEMPLATE_FPATH = THIS_DIR / "resources/user-data.template.sh"
-
-
-def render_user_data_script(
-    docker_compose_yaml_contents: str,
-    aws_account_id: str,
-    aws_region: str,
-    stack_name: str,
-    logical_ec2_instance_resource_id: str,
-    cfn_wait_handle: str,
-):
-    """Render the user data script using a templated string."""
-    user_data_template = USER_DATA_TEMPLATE_FPATH.read_text(encoding="utf-8")
-
-    # use templated string to substitute CLEARML_DOCKER_COMPOSE_YAML_CONTENTS in
-    # the user data script
-    template = Template(user_data_template)
-    return template.substitute(
-        {
-            "CLEARML_DOCKER_COMPOSE_YAML_CONTENTS": docker_compose_yaml_contents,
-            "AWS_ACCOUNT_ID": aws_account_id,
-            "AWS_REGION": aws_region,
-            "STACK_NAME": stack_name,
-            "LOGICAL_EC2_INSTANCE_RESOURCE_ID": logical_ec2_instance_resource_id,
-            "BACKUP_SERVICE_DOCKER_IMAGE_URI": "<todo: get this from ECR>",
-            "RESTORE_FROM_MOST_RECENT_BACKUP": "<todo: implement this functionality>",
-            "CFN_WAIT_HANDLE": cfn_wait_handle,
-        }
-    )
+INSTALL_SCRIPT_FPATH = THIS_DIR / "resources/install-clearml-server-dependencies.sh"
+ATTACH_DATA_VOLUMES_SCRIPT_FPATH = THIS_DIR / "resources/attach-data-volumes.sh"
+S3_BATCH_DELETE_SCRIPT_FPATH = THIS_DIR / "s3_batch_delete.py"
+METRICS_COLLECTOR_SCRIPT_FPATH = THIS_DIR / "server_metrics_collector.py"
+INDEX_MAINTENANCE_SCRIPT_FPATH = THIS_DIR / "elasticsearch_index_maintenance.py"
+UPDATE_SCRIPT_FPATH = THIS_DIR / "resources/update-clearml-server.sh"
+SERVER_BACKUP_SCRIPT_FPATH = THIS_DIR / "server_backup.py"
+BACKUP_DOCKERFILE_FPATH = THIS_DIR / "resources/backup/Dockerfile"
+
+# the volumes whose disk usage the CloudWatch agent publishes
+MONITORED_DISK_PATHS = ["/", *DATA_STORE_MOUNT_POINTS.values()]
+
+# where cfn-init places the docker-compose file on the instance
+DOCKER_COMPOSE_INSTANCE_FPATH = "/clearml/docker-compose.clear-ml.yml"
+# where cfn-init places the URL of the wait condition handle of the current configuration
+WAIT_CONDITION_HANDLE_INSTANCE_FPATH = "/etc/clearml/wait-condition-handle.txt"
 
 
 class ClearMLServerEC2Instance(Construct):
@@ -53,8 +75,33 @@ class ClearMLServerEC2Instance(Construct):
     Docs for deploying ClearML to EC2 are here: https://clear.ml/docs/latest/docs/deploying_clearml/clearml_server_aws_ec2_ami/
     We're not using one of the pre-built AMI's.
 
+    Everything the server runs with is placed on disk by cfn-init: the docker-compose and .env files,
+    the scripts, and the systemd units. When any of it changes, cfn-hup re-runs cfn-init on the running
+    instance and ``update-clearml-server.sh`` recreates only the changed containers, keeping the instance
+    and its data volumes. Only changes to the bootstrap itself (the user data, the install script, and
+    the attach script) replace the instance. Either way, the deployment waits for the server to answer.
+
     :param scope: The scope of the stack.
     :param construct_id: The ID of the stack.
+    :param vpc: The VPC to launch the instance in; defaults to the default VPC.
+    :param prebaked_machine_image: AMI built by ``ClearMLServerImagePipeline``. If given,
+        the user data skips installing packages and pulling docker images.
+    :param capacity_profile: Instance type of the server; the memory and worker settings of
+        the ClearML components are derived from it. Defaults to the "small" preset.
+    :param data_volumes: Size and performance of the gp3 volumes holding the Elasticsearch, Mongo,
+        Redis, and fileserver data. The instance is placed in the availability zone of the volumes.
+    :param s3_batch_delete_bucket_name: If given, the server runs ``s3_batch_delete.py`` to delete the
+        objects of deleted tasks and models from this bucket.
+    :param stores_only: Only run the data stores, with their ports published to the VPC, for a
+        ``ClearMLStatelessServices`` tier running the apiserver, webserver, and fileserver.
+    :param files_host: URL of the fileserver when it does not run on the instance, for the async
+        delete job.
+    :param external_data_stores: Data stores that do not run on the instance, e.g. the endpoints of
+        ``ClearMLManagedDataStores``. Their containers and volumes are dropped, and the instance is
+        let in.
+    :param elasticsearch_tuning: Settings and retention of the event indices of a local Elasticsearch.
+    :param backups: If given, the data volumes are snapshotted, and the local Mongo and Elasticsearch
+        are backed up to S3 and, on a server with new data volumes, restored from there.
     """
 
     def __init__(
@@ -62,13 +109,46 @@ class ClearMLServerEC2Instance(Construct):
         scope: Construct,
         construct_id: str,
         vpc: Optional[ec2.Vpc] = None,
+        prebaked_machine_image: Optional[ec2.IMachineImage] = None,
+        capacity_profile: Optional[CapacityProfile] = None,
+        data_volumes: Optional[DataVolumesConfig] = None,
+        s3_batch_delete_bucket_name: Optional[str] = None,
+        stores_only: bool = False,
+        files_host: Optional[str] = None,
+        external_data_stores: Optional[Dict[str, DataStoreEndpoint]] = None,
+        elasticsearch_tuning: Optional[ElasticsearchTuningConfig] = None,
+        backups: Optional[BackupsConfig] = None,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        capacity_profile = capacity_profile or CapacityProfile.preset("small")
+        data_volumes = data_volumes or DataVolumesConfig()
+        docker_compose_env: str = render_docker_compose_env(capacity_profile, stores_only=stores_only)
+        docker_compose_yaml: str = DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8")
+        if stores_only:
+            docker_compose_yaml = render_stores_docker_compose(docker_compose_yaml)
+            docker_compose_env += f"CLEARML_FILES_HOST={files_host or ''}\n"
+        external_data_stores = external_data_stores or {}
+        mongo_tls: bool = "mongo" in external_data_stores and external_data_stores["mongo"].tls
+        if external_data_stores:
+            docker_compose_yaml = render_external_data_stores_docker_compose(
+                docker_compose_yaml, data_stores=list(external_data_stores), mongo_tls=mongo_tls
+            )
+
+        # the bucket name is a token, so it is kept out of the bootstrap fingerprint below
+        docker_compose_env_file: str = docker_compose_env
+        if s3_batch_delete_bucket_name:
+            docker_compose_env += "COMPOSE_PROFILES=s3-artifacts\n"
+            docker_compose_env_file = docker_compose_env + f"CLEARML_ARTIFACT_BUCKET={s3_batch_delete_bucket_name}\n"
+        # so are the endpoints of external data stores
+        docker_compose_env_file += render_external_data_stores_env(external_data_stores)
+
         # we should prefer the default VPC to save money
-        vpc = vpc or ec2.Vpc.from_lookup(scope=self, id="DefaultVPC", is_default=True)
+        vpc = vpc or ImportedResources.of(self).vpc(construct_id="DefaultVPC")
         self.security_group = create_clearml_security_group(self, vpc=vpc)
+        for endpoint in external_data_stores.values():
+            endpoint.connections.allow_default_port_from(self.security_group)
 
         # enable SSH connection using AWS SSM (so users do not need SSH keys to access the instance)
         iam_role = iam.Role(
@@ -77,49 +157,252 @@ class ClearMLServerEC2Instance(Construct):
             assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
         )
         iam_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSSMManagedInstanceCore"))
+        # the CloudWatch agent publishes the host metrics and the EMF documents of the metrics collector
+        iam_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name("CloudWatchAgentServerPolicy"))
+        iam_role.add_to_policy(
+            iam.PolicyStatement(
+                actions=["cloudwatch:PutMetricData"],
+                resources=["*"],
+                conditions={"StringEquals": {"cloudwatch:namespace": "ClearML/Server"}},
+            )
+        )
+        # the bootstrap reads the password of a managed Mongo, see fetch_data_store_credentials
+        for endpoint in external_data_stores.values():
+            if endpoint.credentials:
+                endpoint.credentials.grant_read(iam_role)
 
         stack = Stack.of(self)
+        metrics_log_group_name = f"/clearml/{stack.stack_name}/server-metrics"
+        cloudwatch_agent_config = render_cloudwatch_agent_config(MONITORED_DISK_PATHS)
+        metrics_collector_unit = render_metrics_collector_unit(metrics_log_group_name)
+
+        local_elasticsearch: bool = "elasticsearch" not in external_data_stores
+        elasticsearch_tuning = elasticsearch_tuning or ElasticsearchTuningConfig()
+        apply_template_unit = render_apply_template_unit(elasticsearch_tuning)
+        expiry_unit, expiry_timer = render_expiry_units(elasticsearch_tuning)
+        elasticsearch_tuning_files = (
+            [
+                ec2.InitFile.from_string(
+                    INDEX_MAINTENANCE_FPATH,
+                    INDEX_MAINTENANCE_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                    mode="000755",
+                ),
+                ec2.InitFile.from_string(APPLY_TEMPLATE_UNIT_FPATH, apply_template_unit),
+                ec2.InitFile.from_string(EXPIRY_UNIT_FPATH, expiry_unit),
+                ec2.InitFile.from_string(EXPIRY_TIMER_FPATH, expiry_timer),
+            ]
+            if local_elasticsearch
+            else []
+        )
 
-        # create a CfnWaitHandle
-        cfn_wait_handle = cdk.CfnWaitConditionHandle(scope=self, id="CfnWaitHandle")
+        # EBS volumes live in a single availability zone, so the instance has to stay in it
+        availability_zone: str = (
+            vpc.select_subnets(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS).subnets[0].availability_zone
+        )
+        self.subnet_selection = ec2.SubnetSelection(
+            subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS,
+            availability_zones=[availability_zone],
+        )
 
-        self.subnet_selection = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS)
+        self.data_volumes = ClearMLDataVolumes(
+            self,
+            "ClearMLDataVolumes",
+            availability_zone=availability_zone,
+            config=data_volumes,
+            data_stores=[
+                data_store for data_store in DATA_STORE_MOUNT_POINTS if data_store not in external_data_stores
+            ],
+            snapshot_ids=backups.restore_volumes_from_snapshots if backups else None,
+        )
+        self.data_volumes.grant_attach(iam_role)
+
+        self.backups: Optional[ClearMLBackups] = None
+        backup_files: List[ec2.InitFile] = []
+        backup_units: Tuple[str, ...] = ()
+        backup_image_sources: str = ""
+        if backups:
+            self.backups = ClearMLBackups(
+                self,
+                "Backups",
+                volumes=self.data_volumes.volumes,
+                availability_zone=availability_zone,
+                config=backups,
+                arm64=capacity_profile.is_graviton,
+            )
+            self.backups.grant(iam_role)
+            backed_up_data_stores = [
+                data_store for data_store in BACKED_UP_DATA_STORES if data_store not in external_data_stores
+            ]
+            backup_env = (
+                f"CLEARML_BACKUP_DATA_STORES={' '.join(backed_up_data_stores)}\n"
+                f"CLEARML_BACKUP_KEEP_SNAPSHOTS={backups.keep_elasticsearch_snapshots}\n"
+            )
+            docker_compose_env += backup_env
+            # the image URI, bucket name, and region are tokens
+            docker_compose_env_file += (
+                backup_env
+                + f"CLEARML_BACKUP_IMAGE={self.backups.image.image_uri}\n"
+                + f"CLEARML_BACKUP_BUCKET={self.backups.bucket.bucket_name}\n"
+                + f"CLEARML_BACKUP_REGION={stack.region}\n"
+            )
+            backup_units = render_backup_units(backups, docker_compose_fpath=DOCKER_COMPOSE_INSTANCE_FPATH)
+            backup_files = [
+                ec2.InitFile.from_string(BACKUP_UNIT_FPATH, backup_units[0]),
+                ec2.InitFile.from_string(BACKUP_TIMER_FPATH, backup_units[1]),
+            ]
+            # the image URI is a token, so its sources stand in for it in the fingerprint below
+            backup_image_sources = "".join(
+                fpath.read_text(encoding="utf-8") for fpath in (BACKUP_DOCKERFILE_FPATH, SERVER_BACKUP_SCRIPT_FPATH)
+            )
+
+        user_data_options = dict(
+            install_dependencies=prebaked_machine_image is None,
+            stores_only=stores_only,
+            local_elasticsearch=local_elasticsearch,
+            backups=backups is not None,
+            restore_from_most_recent_backup=backups is not None and backups.restore_on_boot,
+        )
+        # the user data only runs on the first boot, so changes to the bootstrap replace the instance: the ID of
+        # the instance changes with them. The stack's identifiers are left out, since they never change.
+        boot_fingerprint = hashlib.sha256(
+            (
+                render_user_data_script(
+                    aws_account_id="",
+                    aws_region="",
+                    stack_name="",
+                    logical_ec2_instance_resource_id="",
+                    **user_data_options,
+                )
+                + INSTALL_SCRIPT_FPATH.read_text(encoding="utf-8")
+                + ATTACH_DATA_VOLUMES_SCRIPT_FPATH.read_text(encoding="utf-8")
+            ).encode("utf-8")
+        ).hexdigest()[:8]
+
+        # the deployment completes as soon as the server answers: after the bootstrap of a new instance, or after
+        # update-clearml-server.sh applied a new configuration in place. A wait condition only waits once and a
+        # handle must not be reused, so both are new whenever anything placed on the instance changes.
+        config_fingerprint = hashlib.sha256(
+            (
+                boot_fingerprint
+                + docker_compose_yaml
+                + UPDATE_SCRIPT_FPATH.read_text(encoding="utf-8")
+                + S3_BATCH_DELETE_SCRIPT_FPATH.read_text(encoding="utf-8")
+                + METRICS_COLLECTOR_SCRIPT_FPATH.read_text(encoding="utf-8")
+                + cloudwatch_agent_config
+                + metrics_collector_unit
+                + INDEX_MAINTENANCE_SCRIPT_FPATH.read_text(encoding="utf-8")
+                + apply_template_unit
+                + expiry_unit
+                + expiry_timer
+                + "".join(backup_units)
+                + backup_image_sources
+                + docker_compose_env
+            ).encode("utf-8")
+        ).hexdigest()[:8]
+        cfn_wait_handle = cdk.CfnWaitConditionHandle(scope=self, id=f"CfnWaitHandle{config_fingerprint}")
 
         self.ec2_instance = ec2.Instance(
             scope=self,
-            id="ClearMLServerInstance",
+            id=f"ClearMLServerInstance{boot_fingerprint}",
             vpc=vpc,
-            instance_type=ec2.InstanceType("t2.medium"),
-            machine_image=ec2.MachineImage.latest_amazon_linux(),
-            user_data_causes_replacement=True,
+            instance_type=ec2.InstanceType(capacity_profile.instance_type),
+            machine_image=prebaked_machine_image
+            or ec2.MachineImage.latest_amazon_linux(
+                generation=ec2.AmazonLinuxGeneration.AMAZON_LINUX_2,
+                cpu_type=ec2.AmazonLinuxCpuType.ARM_64
+                if capacity_profile.is_graviton
+                else ec2.AmazonLinuxCpuType.X86_64,
+            ),
+            # configuration changes are applied in place, see update-clearml-server.sh
+            user_data_causes_replacement=False,
+            block_devices=[
+                ec2.BlockDevice(
+                    device_name="/dev/xvda",
+                    volume=ec2.BlockDeviceVolume.ebs(
+                        data_volumes.root_volume_size_gib,
+                        volume_type=ec2.EbsDeviceVolumeType.GP3,
+                        encrypted=True,
+                    ),
+                )
+            ],
             role=iam_role,
             security_group=self.security_group,
             init=ec2.CloudFormationInit.from_elements(
                 # docker-compose file at /clearml/docker-compose.clearml.yml
+                ec2.InitFile.from_string(DOCKER_COMPOSE_INSTANCE_FPATH, docker_compose_yaml),
+                # memory and worker settings referenced by the docker-compose file
+                ec2.InitFile.from_string("/clearml/.env", docker_compose_env_file, mode="000600"),
                 ec2.InitFile.from_string(
-                    "/clearml/docker-compose.clear-ml.yml",
-                    DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8"),
-                )
+                    "/clearml/s3_batch_delete.py",
+                    S3_BATCH_DELETE_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                ),
+                # the CA bundle of a managed Mongo, mounted into the containers connecting to it
+                *(
+                    [ec2.InitFile.from_url(f"/clearml/{MONGO_CA_BUNDLE_FNAME}", MONGO_CA_BUNDLE_URL)]
+                    if mongo_tls
+                    else []
+                ),
+                ec2.InitFile.from_string(
+                    "/usr/local/bin/install-clearml-server-dependencies.sh",
+                    INSTALL_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                    mode="000755",
+                ),
+                # volume IDs, devices, and mount points read by attach-data-volumes.sh
+                ec2.InitFile.from_string("/etc/clearml/data-volumes.txt", self.data_volumes.render_volumes_file()),
+                ec2.InitFile.from_string(
+                    "/usr/local/bin/attach-data-volumes.sh",
+                    ATTACH_DATA_VOLUMES_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                    mode="000755",
+                ),
+                # host metrics from the CloudWatch agent, container and data store metrics from the collector
+                ec2.InitFile.from_string(CLOUDWATCH_AGENT_CONFIG_FPATH, cloudwatch_agent_config),
+                ec2.InitFile.from_string(
+                    METRICS_COLLECTOR_FPATH,
+                    METRICS_COLLECTOR_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                    mode="000755",
+                ),
+                ec2.InitFile.from_string(METRICS_COLLECTOR_UNIT_FPATH, metrics_collector_unit),
+                # settings and retention of the event indices, see elasticsearch_tuning.py
+                *elasticsearch_tuning_files,
+                # scheduled backups to S3, see backups.py
+                *backup_files,
+                # run by cfn-hup when any of the above changes, and signals the wait condition of the change
+                ec2.InitFile.from_string(
+                    "/usr/local/bin/update-clearml-server.sh",
+                    UPDATE_SCRIPT_FPATH.read_text(encoding="utf-8"),
+                    mode="000755",
+                ),
+                ec2.InitFile.from_string(WAIT_CONDITION_HANDLE_INSTANCE_FPATH, cfn_wait_handle.ref),
             ),
+            # the fingerprint of the cfn-init metadata would change the user data, and stop the instance to update it
+            init_options=ec2.ApplyCloudFormationInitOptions(embed_fingerprint=False),
             key_name="ericriddoch",
             vpc_subnets=self.subnet_selection,
             # vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PUBLIC),
         )
 
-        # the logical ID is needed by the cfn-init command so it can grab the docker-compose file
+        # the logical ID is needed by cfn-hup, which watches the cfn-init metadata of the instance
         ec2_logical_resource_id = stack.get_logical_id(element=self.ec2_instance.node.default_child)
 
         user_data_contents: str = render_user_data_script(
-            docker_compose_yaml_contents=DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8"),
             aws_account_id=stack.account,
             aws_region=stack.region,
             stack_name=stack.stack_name,
             logical_ec2_instance_resource_id=ec2_logical_resource_id,
-            cfn_wait_handle=cfn_wait_handle.logical_id,
+            **user_data_options,
         )
 
         self.ec2_instance.user_data.add_commands(user_data_contents)
 
+        self.server_ready_wait_condition = cdk.CfnWaitCondition(
+            scope=self,
+            id=f"ClearMLServerReady{config_fingerprint}",
+            handle=cfn_wait_handle.ref,
+            count=1,
+            timeout=str(30 * 60),
+        )
+        self.server_ready_wait_condition.add_dependency(self.ec2_instance.node.default_child)
+
         # # assign elastic IP address to the instance
         # ec2.CfnEIP(
         #     scope=self,
@@ -136,7 +419,13 @@ class ClearMLServerEC2Instance(Construct):
             description="The public IP address of the ClearML server",
         )
 
-        add_cloudwatch_alarms_to_ec2(scope=self, ec2_instance_id=self.ec2_instance.instance_id)
+        self.monitoring = ClearMLServerMonitoring(
+            self,
+            "Monitoring",
+            instance_id=self.ec2_instance.instance_id,
+            alarm_specs=server_alarm_specs(capacity_profile, disk_paths=MONITORED_DISK_PATHS),
+            metrics_log_group_name=metrics_log_group_name,
+        )
 
 
 def create_clearml_security_group(scope: Construct, vpc: ec2.Vpc):
@@ -180,111 +469,13 @@ def create_clearml_security_group(scope: Construct, vpc: ec2.Vpc):
     return security_group
 
 
-def grant_ecr_pull_access(ecr_repo_arn: str, role: iam.Role, repo_construct_id: str):
+def grant_ecr_pull_access(ecr_repo_arn: str, role: iam.Role, repo_construct_id: Optional[str] = None):
     """Grant the given role access to pull docker images from the given ECR repo."""
-    ecr_repo = ecr.Repository.from_repository_arn(scope=role, id=repo_construct_id, repository_arn=ecr_repo_arn)
+    ecr_repo = ImportedResources.of(role).ecr_repository(repository_arn=ecr_repo_arn, construct_id=repo_construct_id)
     ecr_repo.grant_pull(role)
 
 
-def grant_s3_read_write_access(bucket_name: str, role: iam.Role, bucket_construct_id: str):
+def grant_s3_read_write_access(bucket_name: str, role: iam.Role, bucket_construct_id: Optional[str] = None):
     """Grant the given role read/write access to the given S3 bucket."""
-    bucket = s3.Bucket.from_bucket_name(scope=role, id=bucket_construct_id, bucket_name=bucket_name)
+    bucket = ImportedResources.of(role).bucket(bucket_name=bucket_name, construct_id=bucket_construct_id)
     bucket.grant_read_write(role)
-
-
-def add_cloudwatch_alarms_to_ec2(scope: Construct, ec2_instance_id: str) -> None:
-    """Add alarms to the ec2 instance."""
-    cloudwatch.Alarm(
-        scope=scope,
-        id="ClearMLServerCpuAlarm",
-        metric=cloudwatch.Metric(
-            namespace="AWS/EC2",
-            metric_name="CPUUtilization",
-            dimensions_map={"InstanceId": ec2_instance_id},
-            statistic="Average",
-            period=cdk.Duration.minutes(1),
-        ),
-        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        threshold=80,
-        evaluation_periods=1,
-        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
-        alarm_description="Alarm if CPU usage is greater than 80% for 1 minute",
-    )
-
-    cloudwatch.Alarm(
-        scope=scope,
-        id="ClearMLServerMemoryAlarm",
-        metric=cloudwatch.Metric(
-            namespace="System/Linux",
-            metric_name="MemoryUtilization",
-            dimensions_map={"InstanceId": ec2_instance_id},
-            statistic="Average",
-            period=cdk.Duration.minutes(1),
-        ),
-        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        threshold=80,
-        evaluation_periods=1,
-        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
-        alarm_description="Alarm if memory usage is greater than 80% for 1 minute",
-    )
-
-    cloudwatch.Alarm(
-        scope=scope,
-        id="ClearMLServerDiskAlarm",
-        metric=cloudwatch.Metric(
-            namespace="System/Linux",
-            metric_name="DiskSpaceUtilization",
-            dimensions_map={"InstanceId": ec2_instance_id},
-            statistic="Average",
-            period=cdk.Duration.minutes(1),
-        ),
-        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        threshold=80,
-        evaluation_periods=1,
-        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
-        alarm_description="Alarm if disk usage is greater than 80% for 1 minute",
-    )
-
-    cloudwatch.Alarm(
-        scope=scope,
-        id="ClearMLServerNetworkAlarm",
-        metric=cloudwatch.Metric(
-            namespace="System/Linux",
-            metric_name="NetworkIn",
-            dimensions_map={"InstanceId": ec2_instance_id},
-            statistic="Average",
-            period=cdk.Duration.minutes(1),
-        ),
-        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        threshold=80,
-        evaluation_periods=1,
-        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
-        alarm_description="Alarm if network usage is greater than 80% for 1 minute",
-    )
-
-    cloudwatch.Alarm(
-        scope=scope,
-        id="ClearMLServerOpenConnectionsAlarm",
-        metric=cloudwatch.Metric(
-            namespace="System/Linux",
-            metric_name="NetworkIn",
-            dimensions_map={"InstanceId": ec2_instance_id},
-            statistic="Average",
-            period=cdk.Duration.minutes(1),
-        ),
-        comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
-        threshold=80,
-        evaluation_periods=1,
-        treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
-        alarm_description="Alarm if number of open connections is greater than 80% for 1 minute",
-    )
-
-
-# if __name__ == "__main__":
-#     print(
-#         render_user_data_script(
-#             docker_compose_yaml_contents=DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8"),
-#             aws_account_id="hi",
-#             aws_region="hi",
-#         )
-#     )
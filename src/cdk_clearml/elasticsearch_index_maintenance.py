@@ -0,0 +1,173 @@
+"""
+Index settings and retention of the ClearML event indices in the server's Elasticsearch.
+
+ClearML keeps the events of every company in one index per event type: ``events-log-<company>``,
+``events-training_stats_scalar-<company>``, ``events-training_debug_image-<company>``, and
+``events-plot-<company>``. It creates them with Elasticsearch's defaults and never deletes
+anything from them, so the log events of old tasks pile up for as long as the server runs.
+
+``apply-template`` puts a legacy index template over ``events-*`` with a higher ``order`` than
+the templates of the apiserver, so that its settings are merged into theirs:
+
+- one shard per index, since the indices are per company and small next to a 50 GiB shard;
+- no replicas, since the server runs a single node that cannot allocate them anyway;
+- a longer ``refresh_interval``, so that Elasticsearch builds fewer tiny segments while tasks
+  report, at the cost of new events showing up in the UI a few seconds later;
+- the ``best_compression`` codec, trading a little CPU on merges for disk space.
+
+The codec only applies to new indices; the dynamic settings are applied to the existing ones too.
+
+ClearML writes straight to its indices rather than through rollover aliases, so ILM cannot roll
+them over, and deleting a whole index would drop the events of every task of a company. ``expire``
+rather deletes the events older than a number of days by type, with ``_delete_by_query``:
+
+    python3 elasticsearch_index_maintenance.py apply-template --shards 1 --refresh-interval 5s
+    python3 elasticsearch_index_maintenance.py expire --older-than log=90
+
+Elasticsearch is only reachable on the docker-compose network, so it is queried with ``docker exec``
+through the curl of its container unless ``--url`` is given. Only depends on the standard library.
+"""
+
+import json
+import logging
+import subprocess
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from typing import Dict, List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+ELASTICSEARCH_CONTAINER = "clearml-elastic"
+
+EVENT_INDEX_PATTERN = "events-*"
+EVENT_TYPES = ["log", "training_stats_scalar", "training_debug_image", "plot"]
+INDEX_TEMPLATE_NAME = "clearml-events-tuning"
+
+# the apiserver's templates have lower orders; the higher order wins where settings overlap
+INDEX_TEMPLATE_ORDER = 100
+
+
+def index_template(number_of_shards: int, refresh_interval: str, best_compression: bool) -> dict:
+    """Legacy index template with the settings of new event indices."""
+    settings = {
+        "index.number_of_shards": number_of_shards,
+        "index.number_of_replicas": 0,
+        "index.refresh_interval": refresh_interval,
+    }
+    if best_compression:
+        settings["index.codec"] = "best_compression"
+    return {"index_patterns": [EVENT_INDEX_PATTERN], "order": INDEX_TEMPLATE_ORDER, "settings": settings}
+
+
+def existing_index_settings(refresh_interval: str) -> dict:
+    """The dynamic settings of ``index_template``, for the event indices that already exist."""
+    return {"index": {"number_of_replicas": 0, "refresh_interval": refresh_interval}}
+
+
+def expiry_query(older_than_days: int) -> dict:
+    """Matches the events reported more than ``older_than_days`` days ago."""
+    return {"query": {"range": {"timestamp": {"lt": f"now-{older_than_days}d"}}}}
+
+
+def parse_older_than(values: List[str]) -> Dict[str, int]:
+    """``["log=90"]`` to ``{"log": 90}``."""
+    older_than_days = {}
+    for value in values:
+        event_type, _, days = value.partition("=")
+        if event_type not in EVENT_TYPES or not days.isdigit() or int(days) < 1:
+            raise ValueError(f"Expected <event type>=<days> with an event type of {EVENT_TYPES}, got '{value}'")
+        older_than_days[event_type] = int(days)
+    return older_than_days
+
+
+class Elasticsearch:
+    """
+    Sends JSON requests to Elasticsearch at ``url``, or through the curl of ``container``.
+
+    :raises RuntimeError: If Elasticsearch answers with an error.
+    """
+
+    def __init__(self, url: Optional[str] = None, container: str = ELASTICSEARCH_CONTAINER):
+        self.url = url.rstrip("/") if url else None
+        self.container = container
+
+    def request(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        data = json.dumps(body) if body is not None else None
+        if self.url:
+            request = urllib.request.Request(
+                self.url + path,
+                method=method,
+                data=data.encode("utf-8") if data is not None else None,
+                headers={"Content-Type": "application/json"},
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    return json.loads(response.read())
+            except urllib.error.HTTPError as error:
+                raise RuntimeError(f"{method} {path} failed: {error.read().decode('utf-8')}") from error
+
+        command = ["docker", "exec", "-i", self.container, "curl", "-s", "-X", method, f"localhost:9200{path}"]
+        if data is not None:
+            command += ["-H", "Content-Type: application/json", "--data-binary", "@-"]
+        output = subprocess.run(command, input=data, capture_output=True, text=True, timeout=60, check=True).stdout
+        response = json.loads(output)
+        if isinstance(response, dict) and "error" in response:
+            raise RuntimeError(f"{method} {path} failed: {json.dumps(response['error'])}")
+        return response
+
+
+def apply_template(
+    elasticsearch: Elasticsearch, number_of_shards: int, refresh_interval: str, best_compression: bool
+) -> None:
+    elasticsearch.request(
+        "PUT",
+        f"/_template/{INDEX_TEMPLATE_NAME}",
+        index_template(number_of_shards, refresh_interval, best_compression),
+    )
+    elasticsearch.request(
+        "PUT",
+        f"/{EVENT_INDEX_PATTERN}/_settings?allow_no_indices=true",
+        existing_index_settings(refresh_interval),
+    )
+    LOGGER.info("Applied the %s template and updated the existing event indices", INDEX_TEMPLATE_NAME)
+
+
+def expire(elasticsearch: Elasticsearch, older_than_days: Dict[str, int]) -> None:
+    """Start a ``_delete_by_query`` task per event type; they run in the background of Elasticsearch."""
+    for event_type, days in older_than_days.items():
+        response = elasticsearch.request(
+            "POST",
+            f"/events-{event_type}-*/_delete_by_query"
+            "?conflicts=proceed&slices=auto&wait_for_completion=false&allow_no_indices=true",
+            expiry_query(days),
+        )
+        LOGGER.info("Deleting the %s events older than %d days in task %s", event_type, days, response.get("task"))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", help="URL of Elasticsearch; defaults to the curl of its docker-compose container")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    apply_template_parser = subparsers.add_parser("apply-template", help="Put the settings of the event indices")
+    apply_template_parser.add_argument("--shards", type=int, default=1)
+    apply_template_parser.add_argument("--refresh-interval", default="5s")
+    apply_template_parser.add_argument("--no-best-compression", action="store_true")
+    expire_parser = subparsers.add_parser("expire", help="Delete old events")
+    expire_parser.add_argument(
+        "--older-than", action="append", default=[], metavar="EVENT_TYPE=DAYS", help=f"One of {EVENT_TYPES}"
+    )
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    elasticsearch = Elasticsearch(url=args.url)
+    if args.command == "apply-template":
+        apply_template(
+            elasticsearch, args.shards, args.refresh_interval, best_compression=not args.no_best_compression
+        )
+    else:
+        expire(elasticsearch, parse_older_than(args.older_than))
+
+
+if __name__ == "__main__":
+    main()
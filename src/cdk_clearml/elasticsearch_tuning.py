@@ -0,0 +1,104 @@
+"""
+Settings and retention of the ClearML event indices, applied by ``elasticsearch_index_maintenance.py``.
+
+The bootstrap applies the index template once Elasticsearch is up, as does every in-place update
+of the server's configuration, and a systemd timer deletes old events every day. Both only run
+when Elasticsearch runs on the server instance; see ``ClearMLManagedDataStores`` for the managed
+alternative.
+"""
+
+import re
+from typing import Dict, Tuple
+
+from pydantic import BaseModel, validator
+
+from cdk_clearml.elasticsearch_index_maintenance import EVENT_TYPES
+
+# where the server's cfn-init places the script and the units running it
+INDEX_MAINTENANCE_FPATH = "/usr/local/bin/clearml-elasticsearch-index-maintenance.py"
+EXPIRY_UNIT_FPATH = "/etc/systemd/system/clearml-elasticsearch-expiry.service"
+EXPIRY_TIMER_FPATH = "/etc/systemd/system/clearml-elasticsearch-expiry.timer"
+APPLY_TEMPLATE_UNIT_FPATH = "/etc/systemd/system/clearml-elasticsearch-template.service"
+
+
+class ElasticsearchTuningConfig(BaseModel):
+    """
+    Settings of the event indices, and how long to keep the events of each type.
+
+    Debug image events only point to the images on the fileserver or in S3, so expiring them
+    leaves the images behind; only log events expire by default.
+    """
+
+    number_of_shards: int = 1
+    refresh_interval: str = "5s"
+    best_compression: bool = True
+    retention_days: Dict[str, int] = {"log": 90}
+
+    @validator("number_of_shards")
+    def must_have_a_shard(cls, number_of_shards: int) -> int:  # noqa: N805
+        if number_of_shards < 1:
+            raise ValueError(f"number_of_shards must be at least 1, got {number_of_shards}")
+        return number_of_shards
+
+    @validator("refresh_interval")
+    def must_be_a_time_unit(cls, refresh_interval: str) -> str:  # noqa: N805
+        if refresh_interval != "-1" and not re.fullmatch(r"\d+(ms|s|m)", refresh_interval):
+            raise ValueError(f"refresh_interval must look like '5s', '500ms', or be '-1', got '{refresh_interval}'")
+        return refresh_interval
+
+    @validator("retention_days")
+    def must_be_known_event_types(cls, retention_days: Dict[str, int]) -> Dict[str, int]:  # noqa: N805
+        for event_type, days in retention_days.items():
+            if event_type not in EVENT_TYPES:
+                raise ValueError(f"retention_days keys must be one of {EVENT_TYPES}, got '{event_type}'")
+            if days < 1:
+                raise ValueError(f"The {event_type} events must be kept for at least a day, got {days}")
+        return retention_days
+
+
+def render_apply_template_command(config: ElasticsearchTuningConfig) -> str:
+    """The command applying the index template."""
+    command = (
+        f"/usr/bin/python3 {INDEX_MAINTENANCE_FPATH} apply-template"
+        f" --shards {config.number_of_shards} --refresh-interval {config.refresh_interval}"
+    )
+    return command if config.best_compression else command + " --no-best-compression"
+
+
+def render_apply_template_unit(config: ElasticsearchTuningConfig) -> str:
+    """systemd service applying the index template, started by the bootstrap and by ``update-clearml-server.sh``."""
+    return f"""[Unit]
+Description=Apply the settings of the ClearML event indices
+After=docker.service
+Requires=docker.service
+
+[Service]
+Type=oneshot
+ExecStart={render_apply_template_command(config)}
+"""
+
+
+def render_expiry_units(config: ElasticsearchTuningConfig) -> Tuple[str, str]:
+    """systemd service and timer deleting the expired events daily, placed on disk by ``ClearMLServerEC2Instance``."""
+    older_than = " ".join(f"--older-than {event_type}={days}" for event_type, days in config.retention_days.items())
+    service = f"""[Unit]
+Description=Delete the expired events of the ClearML event indices
+After=docker.service
+Requires=docker.service
+
+[Service]
+Type=oneshot
+ExecStart=/usr/bin/python3 {INDEX_MAINTENANCE_FPATH} expire {older_than}
+"""
+    timer = """[Unit]
+Description=Delete the expired events of the ClearML event indices every day
+
+[Timer]
+OnCalendar=daily
+RandomizedDelaySec=1h
+Persistent=true
+
+[Install]
+WantedBy=timers.target
+"""
+    return service, timer
@@ -0,0 +1,94 @@
+"""Registry of the resources that a stack imports rather than creates."""
+
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aws_cdk import Stack
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecr as ecr
+from aws_cdk import aws_route53 as route53
+from aws_cdk import aws_s3 as s3
+from constructs import Construct
+
+
+class ImportedResources:
+    """
+    Per-stack registry that imports each external resource exactly once.
+
+    ``from_lookup`` calls become context provider queries (and round-trips to AWS when the
+    result is not in ``cdk.context.json``), and every ``from_*`` call adds a construct to
+    the tree. Going through this registry guarantees one lookup and one construct per
+    external resource, no matter how many constructs in the stack need it.
+
+    Use ``ImportedResources.of(scope)`` rather than instantiating this class directly.
+
+    :param stack: The stack that owns the imported constructs.
+    """
+
+    def __init__(self, stack: Stack):
+        self.stack = stack
+        self._resources: Dict[Tuple[str, str], Any] = {}
+        self.context_lookup_count = 0
+
+    @staticmethod
+    def of(scope: Construct) -> "ImportedResources":
+        """Get the registry of the stack containing ``scope``, creating it on first use."""
+        stack = Stack.of(scope)
+        registry: Optional[ImportedResources] = getattr(stack, "imported_resources", None)
+        if registry is None:
+            registry = ImportedResources(stack)
+            stack.imported_resources = registry
+        return registry
+
+    def _get_or_import(self, kind: str, identifier: str, do_import: Callable[[], Any], is_lookup: bool = False) -> Any:
+        key = (kind, identifier)
+        if key not in self._resources:
+            self._resources[key] = do_import()
+            if is_lookup:
+                self.context_lookup_count += 1
+        return self._resources[key]
+
+    def vpc(self, vpc_name: Optional[str] = None, construct_id: str = "VPC") -> ec2.IVpc:
+        """Look up a VPC by name, or the default VPC if no name is given."""
+        return self._get_or_import(
+            kind="vpc",
+            identifier=vpc_name or "<default>",
+            do_import=lambda: (
+                ec2.Vpc.from_lookup(self.stack, construct_id, vpc_name=vpc_name)
+                if vpc_name
+                else ec2.Vpc.from_lookup(self.stack, construct_id, is_default=True)
+            ),
+            is_lookup=True,
+        )
+
+    def hosted_zone(self, domain_name: str, construct_id: str = "hosted-zone") -> route53.IHostedZone:
+        """Look up the public hosted zone for ``domain_name``."""
+        return self._get_or_import(
+            kind="hosted-zone",
+            identifier=domain_name,
+            do_import=lambda: route53.HostedZone.from_lookup(self.stack, construct_id, domain_name=domain_name),
+            is_lookup=True,
+        )
+
+    def ecr_repository(self, repository_arn: str, construct_id: Optional[str] = None) -> ecr.IRepository:
+        """Import an existing ECR repository."""
+        return self._get_or_import(
+            kind="ecr-repository",
+            identifier=repository_arn,
+            do_import=lambda: ecr.Repository.from_repository_arn(
+                self.stack,
+                construct_id or f"ImportedEcrRepo{len(self._resources)}",
+                repository_arn=repository_arn,
+            ),
+        )
+
+    def bucket(self, bucket_name: str, construct_id: Optional[str] = None) -> s3.IBucket:
+        """Import an existing S3 bucket."""
+        return self._get_or_import(
+            kind="s3-bucket",
+            identifier=bucket_name,
+            do_import=lambda: s3.Bucket.from_bucket_name(
+                self.stack,
+                construct_id or f"ImportedBucket{len(self._resources)}",
+                bucket_name=bucket_name,
+            ),
+        )
@@ -0,0 +1,438 @@
+"""
+Managed, multi-node replacements for the data store containers of ``docker-compose.yml``.
+
+The ``elasticsearch``, ``mongo``, and ``redis`` services are single-node containers on the server
+instance. ``ClearMLManagedDataStores`` provisions any of them as a managed service instead:
+
+- Elasticsearch as an Amazon OpenSearch Service domain running Elasticsearch 7.10, spread over
+  two availability zones, with dedicated master nodes;
+- Mongo as an Amazon DocumentDB cluster. DocumentDB implements the MongoDB 4.0/5.0 API, but not
+  all of it; try the ClearML server version against it before moving production data;
+- Redis as an ElastiCache replication group with automatic failover.
+
+``render_external_data_stores_docker_compose`` removes the containers from the docker-compose
+file and points the services using them at the ``CLEARML_*_SERVICE_HOST`` and ``_PORT``
+variables of the ``.env`` file, which ``ClearMLServerEC2Instance`` fills in with the endpoints.
+The DocumentDB password is not written into the ``.env`` file by the CDK: the bootstrap fetches
+it from Secrets Manager. The connections to DocumentDB use TLS, verified against the CA bundle of
+Amazon RDS, which cfn-init places on the server instance and the apiserver tasks download.
+
+The first OpenSearch domain of an account needs the ``AWSServiceRoleForAmazonOpenSearchService``
+service-linked role.
+"""
+
+from typing import Dict, List, NamedTuple, Optional
+
+import aws_cdk as cdk
+import yaml
+from aws_cdk import aws_docdb as docdb
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_elasticache as elasticache
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_opensearchservice as opensearch
+from aws_cdk import aws_secretsmanager as secretsmanager
+from constructs import Construct
+from pydantic import BaseModel, validator
+
+# the Elasticsearch clusters the apiserver connects to
+ELASTICSEARCH_CLUSTERS = ["events", "workers"]
+
+# the Mongo databases of the apiserver
+MONGO_DATABASES = ["backend", "auth"]
+MONGO_USERNAME = "clearml"
+
+# the CA bundle of the certificates of DocumentDB, and where the containers connecting to it find it
+MONGO_CA_BUNDLE_URL = "https://truststore.pki.rds.amazonaws.com/global/global-bundle.pem"
+MONGO_CA_BUNDLE_FNAME = "rds-global-bundle.pem"
+MONGO_CA_BUNDLE_FPATH = f"/opt/clearml/{MONGO_CA_BUNDLE_FNAME}"
+
+# characters that would need escaping in a mongodb:// URI, a shell, or a docker-compose .env file
+MONGO_PASSWORD_EXCLUDED_CHARACTERS = "\"'`$@/\\:?#[]%&+=;{}<>|^~ "
+
+# the environment variables of docker-compose.yml pointing a service at a data store
+DATA_STORE_ENVIRONMENT_PREFIXES: Dict[str, str] = {
+    "elasticsearch": "CLEARML_ELASTIC_SERVICE",
+    "mongo": "CLEARML_MONGODB_SERVICE",
+    "redis": "CLEARML_REDIS_SERVICE",
+}
+
+# families of the ElastiCache parameter groups by major Redis version
+REDIS_PARAMETER_GROUP_FAMILIES: Dict[str, str] = {
+    "5": "redis5.0",
+    "6": "redis6.x",
+    "7": "redis7",
+}
+
+
+class DataStoreEndpoint(NamedTuple):
+    """
+    Where the apiserver finds a data store.
+
+    :param host: Host name or IP address.
+    :param port: Port, as a string since it may be a token.
+    :param connections: Security groups and port of the data store, to let clients in.
+    :param tls: Whether the data store only accepts TLS connections.
+    :param credentials: Secret with the ``username`` and ``password`` of the data store, if it needs them.
+    """
+
+    host: str
+    port: str
+    connections: ec2.Connections
+    tls: bool = False
+    credentials: Optional[secretsmanager.ISecret] = None
+
+
+class ManagedElasticsearchConfig(BaseModel):
+    """
+    Size of the OpenSearch Service domain; the data nodes are spread over two availability zones.
+
+    :param master_nodes: Dedicated master nodes; 0 lets the data nodes elect the master.
+    """
+
+    engine_version: str = "7.10"
+    data_node_instance_type: str = "r6g.large.search"
+    data_nodes: int = 2
+    master_node_instance_type: str = "m6g.large.search"
+    master_nodes: int = 3
+    volume_size_gib: int = 100
+    volume_iops: int = 3000
+
+    @validator("engine_version")
+    def must_be_elasticsearch_7(cls, engine_version: str) -> str:  # noqa: N805
+        if not engine_version.startswith("7."):
+            raise ValueError(f"ClearML needs the Elasticsearch 7 API, got Elasticsearch {engine_version}")
+        return engine_version
+
+    @validator("data_node_instance_type", "master_node_instance_type")
+    def must_be_an_opensearch_instance_type(cls, instance_type: str) -> str:  # noqa: N805
+        if not instance_type.endswith(".search"):
+            raise ValueError(f"'{instance_type}' is not an OpenSearch Service instance type, e.g. 'r6g.large.search'")
+        return instance_type
+
+    @validator("data_nodes")
+    def must_fill_both_availability_zones(cls, data_nodes: int) -> int:  # noqa: N805
+        if data_nodes < 2 or data_nodes % 2:
+            raise ValueError(f"The data nodes fill two availability zones; expected an even count, got {data_nodes}")
+        return data_nodes
+
+    @validator("master_nodes")
+    def must_have_a_quorum(cls, master_nodes: int) -> int:  # noqa: N805
+        if master_nodes not in (0, 3, 5):
+            raise ValueError(f"master_nodes must be 0, 3, or 5, got {master_nodes}")
+        return master_nodes
+
+
+class ManagedMongoConfig(BaseModel):
+    """
+    Size of the DocumentDB cluster: one writer, and readers for the rest of the instances.
+
+    :param tls: Only accept TLS connections, verified against ``MONGO_CA_BUNDLE_URL``. Turning it off
+        sends the credentials and the data of the apiserver unencrypted through the VPC; only do so
+        for clients that cannot be given the CA bundle.
+    """
+
+    engine_version: str = "5.0.0"
+    instance_type: str = "r6g.large"
+    instances: int = 2
+    tls: bool = True
+
+    @validator("engine_version")
+    def must_be_a_documentdb_version(cls, engine_version: str) -> str:  # noqa: N805
+        if engine_version not in ("4.0.0", "5.0.0"):
+            raise ValueError(f"engine_version must be 4.0.0 or 5.0.0, got {engine_version}")
+        return engine_version
+
+    @validator("instances")
+    def must_be_a_documentdb_cluster_size(cls, instances: int) -> int:  # noqa: N805
+        if not 1 <= instances <= 16:
+            raise ValueError(f"A DocumentDB cluster has 1 to 16 instances, got {instances}")
+        return instances
+
+
+class ManagedRedisConfig(BaseModel):
+    """Size of the ElastiCache replication group; with replicas, a replica takes over when the primary fails."""
+
+    engine_version: str = "6.2"
+    node_type: str = "cache.r6g.large"
+    replicas: int = 1
+
+    @validator("engine_version")
+    def must_be_a_supported_redis_version(cls, engine_version: str) -> str:  # noqa: N805
+        if engine_version.split(".")[0] not in REDIS_PARAMETER_GROUP_FAMILIES:
+            raise ValueError(
+                f"engine_version must be Redis {sorted(REDIS_PARAMETER_GROUP_FAMILIES)}.x, got {engine_version}"
+            )
+        return engine_version
+
+    @validator("replicas")
+    def must_be_a_replication_group_size(cls, replicas: int) -> int:  # noqa: N805
+        if not 0 <= replicas <= 5:
+            raise ValueError(f"A replication group has 0 to 5 replicas, got {replicas}")
+        return replicas
+
+
+class ManagedDataStoresConfig(BaseModel):
+    """The data stores to run as managed services; the others keep running on the server instance."""
+
+    elasticsearch: Optional[ManagedElasticsearchConfig] = None
+    mongo: Optional[ManagedMongoConfig] = None
+    redis: Optional[ManagedRedisConfig] = None
+
+
+def elasticsearch_tls_environment() -> Dict[str, str]:
+    """Make the apiserver connect to Elasticsearch over TLS."""
+    return {f"CLEARML__hosts__elastic__{cluster}__args__use_ssl": "true" for cluster in ELASTICSEARCH_CLUSTERS}
+
+
+def mongo_uri_options(tls: bool) -> str:
+    """Query string of the URIs of DocumentDB, which has no retryable writes."""
+    return "retryWrites=false" + (f"&tls=true&tlsCAFile={MONGO_CA_BUNDLE_FPATH}" if tls else "")
+
+
+def mongo_uri_environment(username: str, password: str, host: str, port: str, tls: bool = False) -> Dict[str, str]:
+    """
+    URIs with credentials of the apiserver's Mongo databases.
+
+    :param tls: Connect over TLS; the CA bundle must be at ``MONGO_CA_BUNDLE_FPATH``.
+    """
+    return {
+        f"CLEARML__hosts__mongo__{database}__host": (
+            f"mongodb://{username}:{password}@{host}:{port}/{database}?{mongo_uri_options(tls)}"
+        )
+        for database in MONGO_DATABASES
+    }
+
+
+def render_external_data_stores_docker_compose(
+    docker_compose_yaml: str, data_stores: List[str], mongo_tls: bool = False
+) -> str:
+    """
+    Render the docker-compose file for ``data_stores`` running outside of it.
+
+    Their services are removed, and the services using them connect to the hosts and ports in
+    the ``.env`` file. With an external Mongo, they authenticate as ``CLEARML_MONGODB_USERNAME``
+    with ``CLEARML_MONGODB_PASSWORD``; with an external Elasticsearch, they connect over TLS.
+
+    :param mongo_tls: Connect to the external Mongo over TLS, with the CA bundle that is expected
+        next to the docker-compose file as ``MONGO_CA_BUNDLE_FNAME``.
+    """
+    docker_compose = yaml.safe_load(docker_compose_yaml)
+    services: dict = docker_compose["services"]
+    for data_store in data_stores:
+        services.pop(data_store, None)
+
+    for service in services.values():
+        if "depends_on" in service:
+            service["depends_on"] = [name for name in service["depends_on"] if name not in data_stores]
+        environment: Optional[dict] = service.get("environment")
+        if not environment:
+            continue
+        for data_store in data_stores:
+            prefix = DATA_STORE_ENVIRONMENT_PREFIXES[data_store]
+            if f"{prefix}_HOST" not in environment:
+                continue
+            environment[f"{prefix}_HOST"] = f"${{{prefix}_HOST}}"
+            environment[f"{prefix}_PORT"] = f"${{{prefix}_PORT}}"
+            if data_store == "elasticsearch":
+                environment.update(elasticsearch_tls_environment())
+            if data_store == "mongo":
+                environment.update(
+                    mongo_uri_environment(
+                        "${CLEARML_MONGODB_USERNAME}",
+                        "${CLEARML_MONGODB_PASSWORD}",
+                        "${CLEARML_MONGODB_SERVICE_HOST}",
+                        "${CLEARML_MONGODB_SERVICE_PORT}",
+                        tls=mongo_tls,
+                    )
+                )
+                if mongo_tls:
+                    service.setdefault("volumes", []).append(f"./{MONGO_CA_BUNDLE_FNAME}:{MONGO_CA_BUNDLE_FPATH}:ro")
+
+    # s3_batch_delete.py takes the URI of the Mongo server on the command line
+    s3_batch_delete: Optional[dict] = services.get("s3_batch_delete")
+    if "mongo" in data_stores and s3_batch_delete:
+        s3_batch_delete_entrypoint: List[str] = s3_batch_delete["entrypoint"]
+        mongo_uri_index = s3_batch_delete_entrypoint.index("--mongo-uri") + 1
+        s3_batch_delete_entrypoint[mongo_uri_index] = (
+            "mongodb://${CLEARML_MONGODB_USERNAME}:${CLEARML_MONGODB_PASSWORD}"
+            f"@${{CLEARML_MONGODB_SERVICE_HOST}}:${{CLEARML_MONGODB_SERVICE_PORT}}/?{mongo_uri_options(mongo_tls)}"
+        )
+        if mongo_tls:
+            s3_batch_delete.setdefault("volumes", []).append(f"./{MONGO_CA_BUNDLE_FNAME}:{MONGO_CA_BUNDLE_FPATH}:ro")
+
+    return (
+        f"# rendered by cdk_clearml.managed_data_stores: {', '.join(data_stores)} run outside of docker-compose\n"
+        + yaml.safe_dump(docker_compose, sort_keys=False)
+    )
+
+
+def render_external_data_stores_env(endpoints: Dict[str, DataStoreEndpoint]) -> str:
+    """The lines of the ``.env`` file read by ``render_external_data_stores_docker_compose``."""
+    lines: List[str] = []
+    for data_store, endpoint in endpoints.items():
+        prefix = DATA_STORE_ENVIRONMENT_PREFIXES[data_store]
+        lines += [f"{prefix}_HOST={endpoint.host}", f"{prefix}_PORT={endpoint.port}"]
+        if endpoint.credentials:
+            # the bootstrap adds the password, see fetch_data_store_credentials in user-data.template.sh
+            lines += [
+                f"CLEARML_MONGODB_USERNAME={MONGO_USERNAME}",
+                f"CLEARML_MONGODB_SECRET_ARN={endpoint.credentials.secret_arn}",
+            ]
+    return "".join(f"{line}\n" for line in lines)
+
+
+class ClearMLManagedDataStores(Construct):
+    """
+    OpenSearch, DocumentDB, and ElastiCache in the private subnets of the VPC.
+
+    The data stores are retained (DocumentDB: snapshotted) when the stack is deleted. Clients are
+    let in with ``allow_from``.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param vpc: The VPC of the ClearML server.
+    :param config: The data stores to provision, and their sizes.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        config: ManagedDataStoresConfig,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        self.endpoints: Dict[str, DataStoreEndpoint] = {}
+        private_subnets = ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS)
+
+        self.elasticsearch: Optional[opensearch.Domain] = None
+        if config.elasticsearch:
+            elasticsearch_config = config.elasticsearch
+            self.elasticsearch = opensearch.Domain(
+                self,
+                "Elasticsearch",
+                version=opensearch.EngineVersion.elasticsearch(elasticsearch_config.engine_version),
+                vpc=vpc,
+                vpc_subnets=[
+                    ec2.SubnetSelection(
+                        subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS,
+                        availability_zones=vpc.availability_zones[:2],
+                    )
+                ],
+                zone_awareness=opensearch.ZoneAwarenessConfig(enabled=True, availability_zone_count=2),
+                capacity=opensearch.CapacityConfig(
+                    data_nodes=elasticsearch_config.data_nodes,
+                    data_node_instance_type=elasticsearch_config.data_node_instance_type,
+                    master_nodes=elasticsearch_config.master_nodes or None,
+                    master_node_instance_type=elasticsearch_config.master_node_instance_type
+                    if elasticsearch_config.master_nodes
+                    else None,
+                ),
+                ebs=opensearch.EbsOptions(
+                    volume_size=elasticsearch_config.volume_size_gib,
+                    volume_type=ec2.EbsDeviceVolumeType.GP3,
+                    iops=elasticsearch_config.volume_iops,
+                ),
+                encryption_at_rest=opensearch.EncryptionAtRestOptions(enabled=True),
+                node_to_node_encryption=True,
+                enforce_https=True,
+                removal_policy=cdk.RemovalPolicy.RETAIN,
+            )
+            # the domain is only reachable from the security groups let in with allow_from
+            self.elasticsearch.add_access_policies(
+                iam.PolicyStatement(
+                    principals=[iam.AnyPrincipal()],
+                    actions=["es:ESHttp*"],
+                    resources=[f"{self.elasticsearch.domain_arn}/*"],
+                )
+            )
+            self.endpoints["elasticsearch"] = DataStoreEndpoint(
+                host=self.elasticsearch.domain_endpoint,
+                port="443",
+                connections=ec2.Connections(
+                    security_groups=self.elasticsearch.connections.security_groups, default_port=ec2.Port.tcp(443)
+                ),
+                tls=True,
+            )
+
+        self.mongo: Optional[docdb.DatabaseCluster] = None
+        if config.mongo:
+            mongo_config = config.mongo
+            engine_major_minor = ".".join(mongo_config.engine_version.split(".")[:2])
+            self.mongo = docdb.DatabaseCluster(
+                self,
+                "Mongo",
+                master_user=docdb.Login(
+                    username=MONGO_USERNAME, exclude_characters=MONGO_PASSWORD_EXCLUDED_CHARACTERS
+                ),
+                engine_version=mongo_config.engine_version,
+                instance_type=ec2.InstanceType(mongo_config.instance_type),
+                instances=mongo_config.instances,
+                vpc=vpc,
+                vpc_subnets=private_subnets,
+                parameter_group=docdb.ClusterParameterGroup(
+                    self,
+                    "MongoParameters",
+                    family=f"docdb{engine_major_minor}",
+                    parameters={"tls": "enabled" if mongo_config.tls else "disabled"},
+                    description="DocumentDB parameters of the ClearML server",
+                ),
+                storage_encrypted=True,
+                removal_policy=cdk.RemovalPolicy.SNAPSHOT,
+            )
+            self.endpoints["mongo"] = DataStoreEndpoint(
+                host=self.mongo.cluster_endpoint.hostname,
+                port=self.mongo.cluster_endpoint.port_as_string(),
+                connections=self.mongo.connections,
+                tls=mongo_config.tls,
+                credentials=self.mongo.secret,
+            )
+
+        self.redis: Optional[elasticache.CfnReplicationGroup] = None
+        if config.redis:
+            redis_config = config.redis
+            redis_security_group = ec2.SecurityGroup(
+                self, "RedisSecurityGroup", vpc=vpc, description="ElastiCache Redis of the ClearML server"
+            )
+            redis_subnet_group = elasticache.CfnSubnetGroup(
+                self,
+                "RedisSubnets",
+                description="ElastiCache Redis of the ClearML server",
+                subnet_ids=vpc.select_subnets(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS).subnet_ids,
+            )
+            # as in docker-compose.yml: only keys with a TTL (i.e. caches) are evicted
+            redis_parameter_group = elasticache.CfnParameterGroup(
+                self,
+                "RedisParameters",
+                cache_parameter_group_family=REDIS_PARAMETER_GROUP_FAMILIES[redis_config.engine_version.split(".")[0]],
+                description="ElastiCache Redis parameters of the ClearML server",
+                properties={"maxmemory-policy": "volatile-lru"},
+            )
+            self.redis = elasticache.CfnReplicationGroup(
+                self,
+                "Redis",
+                replication_group_description="ClearML server",
+                engine="redis",
+                engine_version=redis_config.engine_version,
+                cache_node_type=redis_config.node_type,
+                num_cache_clusters=1 + redis_config.replicas,
+                automatic_failover_enabled=redis_config.replicas > 0,
+                multi_az_enabled=redis_config.replicas > 0,
+                cache_subnet_group_name=redis_subnet_group.ref,
+                cache_parameter_group_name=redis_parameter_group.ref,
+                security_group_ids=[redis_security_group.security_group_id],
+                at_rest_encryption_enabled=True,
+                snapshot_retention_limit=7,
+            )
+            self.redis.apply_removal_policy(cdk.RemovalPolicy.RETAIN)
+            self.endpoints["redis"] = DataStoreEndpoint(
+                host=self.redis.attr_primary_end_point_address,
+                port=self.redis.attr_primary_end_point_port,
+                connections=ec2.Connections(security_groups=[redis_security_group], default_port=ec2.Port.tcp(6379)),
+            )
+
+    def allow_from(self, peer: ec2.IConnectable) -> None:
+        """Let ``peer`` connect to every data store."""
+        for endpoint in self.endpoints.values():
+            endpoint.connections.allow_default_port_from(peer)
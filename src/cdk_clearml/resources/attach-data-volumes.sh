@@ -0,0 +1,131 @@
+#!/bin/bash
+
+# Attach, format (on first use only), and mount the EBS volumes of the ClearML data stores.
+#
+# usage: attach-data-volumes.sh <volumes file> <aws region>
+#
+# Each line of the volumes file reads "<volume id> <device name> <mount point>". The file is
+# rendered by the CDK (see cdk_clearml/data_volumes.py) and placed on disk by cfn-init.
+#
+# The volumes outlive the instance. When the instance is replaced, the new instance asks the
+# previous one (through SSM) to stop ClearML and unmount the volumes, and then takes them over.
+
+set -euxo pipefail
+
+VOLUMES_FPATH="$1"
+AWS_REGION="$2"
+
+function imds() {
+    local token
+    token=$(curl --silent --fail -X PUT "http://169.254.169.254/latest/api/token" -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
+    curl --silent --fail -H "X-aws-ec2-metadata-token: $token" "http://169.254.169.254/latest/$1"
+}
+
+INSTANCE_ID=$(imds meta-data/instance-id)
+
+# usage: find_block_device <volume id> <device name>
+#
+# Nitro instances expose EBS volumes as NVMe devices whose serial number is the volume ID;
+# Xen instances rename /dev/sdX to /dev/xvdX.
+function find_block_device() {
+    local nvme_link="/dev/disk/by-id/nvme-Amazon_Elastic_Block_Store_${1//-/}"
+    local xen_device="${2/\/dev\/sd//dev/xvd}"
+    if [ -e "$nvme_link" ]; then
+        readlink -f "$nvme_link"
+    elif [ -e "$xen_device" ]; then
+        echo "$xen_device"
+    elif [ -e "$2" ]; then
+        echo "$2"
+    else
+        return 1
+    fi
+}
+
+# usage: attached_instance_id <volume id>
+function attached_instance_id() {
+    aws ec2 describe-volumes \
+        --region "$AWS_REGION" \
+        --volume-ids "$1" \
+        --query 'Volumes[0].Attachments[0].InstanceId' \
+        --output text
+}
+
+# usage: release_from_previous_instance <volume id> <instance id> <mount point>
+function release_from_previous_instance() {
+    local volume_id="$1" previous_instance_id="$2" mount_point="$3"
+    local command_id
+
+    # stopping the containers first flushes Elasticsearch, Mongo and Redis to disk
+    command_id=$(aws ssm send-command \
+        --region "$AWS_REGION" \
+        --instance-ids "$previous_instance_id" \
+        --document-name AWS-RunShellScript \
+        --parameters "commands=[\"docker-compose -f /clearml/docker-compose.clear-ml.yml down || true\",\"umount $mount_point || true\"]" \
+        --query 'Command.CommandId' \
+        --output text) || command_id=""
+
+    if [ -n "$command_id" ]; then
+        aws ssm wait command-executed \
+            --region "$AWS_REGION" \
+            --command-id "$command_id" \
+            --instance-id "$previous_instance_id" \
+            || echo "The previous instance did not confirm that $mount_point is unmounted"
+        aws ec2 detach-volume --region "$AWS_REGION" --volume-id "$volume_id"
+    else
+        # the previous instance is unreachable, e.g. because it is stopped or already terminating
+        aws ec2 detach-volume --region "$AWS_REGION" --volume-id "$volume_id" --force
+    fi
+    aws ec2 wait volume-available --region "$AWS_REGION" --volume-ids "$volume_id"
+}
+
+# usage: attach_volume <volume id> <device name> <mount point>
+function attach_volume() {
+    local volume_id="$1" device_name="$2" mount_point="$3"
+    local attached_to
+
+    for attempt in $(seq 1 30); do
+        attached_to=$(attached_instance_id "$volume_id")
+        if [ "$attached_to" = "$INSTANCE_ID" ]; then
+            break
+        elif [ "$attached_to" != "None" ]; then
+            release_from_previous_instance "$volume_id" "$attached_to" "$mount_point" || true
+        fi
+
+        aws ec2 attach-volume \
+            --region "$AWS_REGION" \
+            --volume-id "$volume_id" \
+            --instance-id "$INSTANCE_ID" \
+            --device "$device_name" \
+            && break
+        echo "Attaching $volume_id failed (attempt $attempt), retrying..."
+        sleep 10
+    done
+
+    for attempt in $(seq 1 60); do
+        find_block_device "$volume_id" "$device_name" > /dev/null && return 0
+        sleep 2
+    done
+    echo "$volume_id never appeared as a block device"
+    return 1
+}
+
+while read -r volume_id device_name mount_point; do
+    [ -n "$volume_id" ] || continue
+
+    find_block_device "$volume_id" "$device_name" > /dev/null || attach_volume "$volume_id" "$device_name" "$mount_point"
+    block_device=$(find_block_device "$volume_id" "$device_name")
+
+    # a new volume has no filesystem yet; never format a volume that already holds data
+    if ! blkid "$block_device"; then
+        mkfs.xfs "$block_device"
+    fi
+
+    filesystem_uuid=$(blkid -s UUID -o value "$block_device")
+    mkdir -p "$mount_point"
+
+    # "nofail" lets the instance boot even if a volume is missing, so it can still be reached to fix it
+    if ! grep -q "UUID=$filesystem_uuid" /etc/fstab; then
+        echo "UUID=$filesystem_uuid $mount_point xfs defaults,noatime,nofail 0 2" >> /etc/fstab
+    fi
+    mountpoint -q "$mount_point" || mount "$mount_point"
+done < "$VOLUMES_FPATH"
@@ -0,0 +1,75 @@
+#!/bin/bash
+
+# Back up and restore the ClearML server started by `just run-clearml-locally`, through the image
+# of the backup service, with a local MinIO standing in for S3.
+#
+# A marker document is written to Mongo and to Elasticsearch and backed up; both are then deleted
+# and must come back with the restore.
+#
+# Usage (from the repository root): just run-clearml-locally && just test-backup-locally
+
+set -euo pipefail
+
+THIS_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+PACKAGE_DIR="$(dirname "$(dirname "$THIS_DIR")")"
+WORK_DIR="${CLEARML_LOCAL_DIR:-/tmp/clearml-local}"
+MINIO_CONTAINER=clearml-backup-test-minio
+BUCKET=clearml-backup-test
+MARKER="backup-test-$(date +%s)"
+
+function compose() {
+    docker-compose --project-name clearml-local -f "$WORK_DIR/docker-compose.yml" "$@"
+}
+
+function backup_service() {
+    compose run --rm \
+        -e CLEARML_BACKUP_BUCKET="$BUCKET" \
+        -e CLEARML_BACKUP_S3_ENDPOINT_URL="http://$MINIO_CONTAINER:9000" \
+        -e AWS_ACCESS_KEY_ID=minio \
+        -e AWS_SECRET_ACCESS_KEY=minio-secret \
+        "$@"
+}
+
+function count_markers() {
+    local mongo_count elasticsearch_count
+    mongo_count=$(docker exec clearml-mongo mongo backend --quiet --eval "db.backup_test.count({marker: '$MARKER'})")
+    elasticsearch_count=$(docker exec clearml-elastic curl -s "localhost:9200/backup-test/_count?q=marker:$MARKER" \
+        | python3 -c 'import json, sys; print(json.load(sys.stdin).get("count", 0))')
+    echo "$mongo_count $elasticsearch_count"
+}
+
+function cleanup() {
+    docker rm --force "$MINIO_CONTAINER" > /dev/null 2>&1 || true
+    docker exec clearml-mongo mongo backend --quiet --eval "db.backup_test.drop()" > /dev/null || true
+    docker exec clearml-elastic curl -s -X DELETE "localhost:9200/backup-test" > /dev/null || true
+}
+trap cleanup EXIT
+
+docker build --tag clearml-backup:local --file "$THIS_DIR/Dockerfile" "$PACKAGE_DIR"
+
+docker run --detach --name "$MINIO_CONTAINER" --network clearml-local_backend \
+    -e MINIO_ROOT_USER=minio -e MINIO_ROOT_PASSWORD=minio-secret \
+    minio/minio server /data
+sleep 5
+backup_service --entrypoint aws backup --endpoint-url "http://$MINIO_CONTAINER:9000" s3 mb "s3://$BUCKET"
+
+echo "--- writing the markers ---"
+docker exec clearml-mongo mongo backend --quiet --eval "db.backup_test.insertOne({marker: '$MARKER'})"
+docker exec clearml-elastic curl -s -X POST "localhost:9200/backup-test/_doc?refresh=true" \
+    -H "Content-Type: application/json" -d "{\"marker\": \"$MARKER\"}"
+[ "$(count_markers)" = "1 1" ]
+
+echo "--- backing up ---"
+backup_service backup backup
+
+echo "--- deleting the markers ---"
+docker exec clearml-mongo mongo backend --quiet --eval "db.backup_test.drop()"
+docker exec clearml-elastic curl -s -X DELETE "localhost:9200/backup-test"
+[ "$(count_markers)" = "0 0" ]
+
+echo "--- restoring ---"
+backup_service backup restore
+docker exec clearml-elastic curl -s "localhost:9200/backup-test/_refresh" > /dev/null
+
+echo "--- markers after the restore (mongo elasticsearch): $(count_markers) ---"
+[ "$(count_markers)" = "1 1" ]
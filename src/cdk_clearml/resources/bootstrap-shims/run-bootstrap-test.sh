@@ -0,0 +1,51 @@
+#!/bin/bash
+
+# Run the ClearML server bootstrap inside a local Amazon Linux 2 container.
+#
+# The AWS binaries (aws, cfn-signal, amazon-cloudwatch-agent-ctl) and systemctl are replaced by
+# the shims in this folder, which log their arguments to /var/log/bootstrap-shims.log. The
+# bootstrap runs twice: the second run must skip every completed phase.
+#
+# Usage (from the repository root): just test-bootstrap-locally
+
+set -euo pipefail
+
+THIS_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+RESOURCES_DIR="$(dirname "$THIS_DIR")"
+SRC_DIR="$(dirname "$(dirname "$RESOURCES_DIR")")"
+WORK_DIR="$(mktemp -d)"
+
+PYTHONPATH="$SRC_DIR" python3 -m cdk_clearml.user_data > "$WORK_DIR/user-data.sh"
+
+docker run --rm --privileged \
+    -v "$WORK_DIR/user-data.sh:/user-data.sh:ro" \
+    -v "$RESOURCES_DIR:/resources:ro" \
+    -e CFN_BIN_DIR=/shims \
+    -e CLOUDWATCH_AGENT_CTL=/shims/amazon-cloudwatch-agent-ctl \
+    amazonlinux:2 \
+    bash -c '
+        set -euo pipefail
+
+        # what cfn-init and the CDK would have put on disk before the user data runs
+        mkdir -p /shims /clearml
+        cp /resources/bootstrap-shims/aws /resources/bootstrap-shims/cfn-signal /resources/bootstrap-shims/systemctl /shims/
+        cp /resources/bootstrap-shims/amazon-cloudwatch-agent-ctl /shims/
+        chmod +x /shims/*
+        cp /resources/docker-compose.yml /clearml/docker-compose.clear-ml.yml
+        install -m 0755 /resources/install-clearml-server-dependencies.sh /usr/local/bin/
+        install -m 0755 /resources/update-clearml-server.sh /usr/local/bin/
+        mkdir -p /etc/clearml
+        echo "https://local-test/wait-condition-handle" > /etc/clearml/wait-condition-handle.txt
+        yum install -y -q util-linux procps-ng tar gzip > /dev/null
+        export PATH="/shims:$PATH"
+
+        bash /user-data.sh
+        echo "--- second run: every completed phase must be skipped ---"
+        bash /user-data.sh
+
+        echo "--- phase durations ---"
+        grep "\[bootstrap\]" /var/log/user-data.log
+        echo "--- calls to the AWS shims ---"
+        cat /var/log/bootstrap-shims.log
+        grep -q "cfn-signal -e 0" /var/log/bootstrap-shims.log
+    '
@@ -0,0 +1,73 @@
+#!/bin/bash
+
+# Install everything the ClearML server needs on Amazon Linux 2.
+#
+# This script is shared by the cold-boot user-data, the EC2 Image Builder component, and the
+# local Packer build, so that a pre-baked AMI contains exactly what a cold boot would install.
+#
+# Usage: install-clearml-server-dependencies.sh [docker|clis|images|packages|all] [path/to/docker-compose.yml]
+#
+#   docker:   docker, docker-compose, cfn-bootstrap, and the CloudWatch agent
+#   clis:     the AWS CLI and clearml-agent (requires "docker")
+#   images:   pull every image referenced by the docker-compose file (requires "docker")
+#   packages: docker + clis
+#   all:      docker + clis + images
+#
+# Once "docker" is done, "clis" and "images" are independent, so the bootstrap runs them concurrently.
+
+set -euxo pipefail
+
+PHASE="${1:-all}"
+DOCKER_COMPOSE_FPATH="${2:-/clearml/docker-compose.clear-ml.yml}"
+
+# pinned so that a pre-baked image and a cold boot end up with the same binary
+DOCKER_COMPOSE_VERSION="${DOCKER_COMPOSE_VERSION:-v2.17.2}"
+
+function install_docker() {
+    yum update -y
+    yum install -y docker python3 python3-pip aws-cfn-bootstrap amazon-cloudwatch-agent
+
+    # install docker-compose and make the binary executable
+    curl -fsSL \
+        "https://github.com/docker/compose/releases/download/${DOCKER_COMPOSE_VERSION}/docker-compose-$(uname -s | tr '[:upper:]' '[:lower:]')-$(uname -m)" \
+        -o /usr/bin/docker-compose
+    chmod +x /usr/bin/docker-compose
+
+    systemctl enable docker
+    systemctl start docker
+}
+
+function install_clis() {
+    # python3-pip is installed by the "docker" phase
+    pip3 install --upgrade awscli clearml-agent
+}
+
+function pull_images() {
+    systemctl start docker
+    docker-compose -f "$DOCKER_COMPOSE_FPATH" pull --quiet
+}
+
+case "$PHASE" in
+    docker)
+        install_docker
+        ;;
+    clis)
+        install_clis
+        ;;
+    images)
+        pull_images
+        ;;
+    packages)
+        install_docker
+        install_clis
+        ;;
+    all)
+        install_docker
+        install_clis
+        pull_images
+        ;;
+    *)
+        echo "Unknown phase '$PHASE'. Expected one of: docker, clis, images, packages, all." >&2
+        exit 1
+        ;;
+esac
@@ -0,0 +1,73 @@
+# Local build recipe for the pre-baked ClearML server AMI.
+#
+# Produces the same image as the EC2 Image Builder pipeline in server_image.py, for when you
+# want to iterate on the image without deploying the stack:
+#
+#   just build-clearml-server-ami
+
+packer {
+  required_plugins {
+    amazon = {
+      version = ">= 1.2.0"
+      source  = "github.com/hashicorp/amazon"
+    }
+  }
+}
+
+variable "region" {
+  type    = string
+  default = "us-west-2"
+}
+
+variable "subnet_id" {
+  type        = string
+  default     = ""
+  description = "Subnet with internet egress; leave empty to use the default VPC."
+}
+
+source "amazon-ebs" "clearml_server" {
+  region        = var.region
+  instance_type = "t3.medium"
+  ssh_username  = "ec2-user"
+  subnet_id     = var.subnet_id
+  ami_name      = "clearml-server-{{timestamp}}"
+
+  source_ami_filter {
+    filters = {
+      name                = "amzn2-ami-hvm-*-x86_64-gp2"
+      virtualization-type = "hvm"
+      root-device-type    = "ebs"
+    }
+    owners      = ["amazon"]
+    most_recent = true
+  }
+
+  tags = {
+    Name       = "clearml-server"
+    BuiltBy    = "packer"
+    BaseAmiId  = "{{ .SourceAMI }}"
+  }
+}
+
+build {
+  sources = ["source.amazon-ebs.clearml_server"]
+
+  provisioner "file" {
+    source      = "${path.root}/../install-clearml-server-dependencies.sh"
+    destination = "/tmp/install-clearml-server-dependencies.sh"
+  }
+
+  provisioner "file" {
+    source      = "${path.root}/../docker-compose.yml"
+    destination = "/tmp/docker-compose.clear-ml.yml"
+  }
+
+  provisioner "shell" {
+    inline = [
+      "sudo mkdir -p /clearml",
+      "sudo mv /tmp/docker-compose.clear-ml.yml /clearml/docker-compose.clear-ml.yml",
+      "sudo install -m 0755 /tmp/install-clearml-server-dependencies.sh /usr/local/bin/install-clearml-server-dependencies.sh",
+      "sudo /usr/local/bin/install-clearml-server-dependencies.sh all /clearml/docker-compose.clear-ml.yml",
+    ]
+  }
+}
@@ -0,0 +1,166 @@
+#!/bin/bash
+
+# Apply a changed configuration of the ClearML server in place, keeping the instance and its data volumes.
+#
+# cfn-hup runs "apply" whenever the CloudFormation::Init metadata of the instance changes, right
+# after cfn-init has written the new docker-compose file, .env, scripts, and systemd units to disk
+# (see watch_for_config_updates in user-data.template.sh). docker-compose then recreates only the
+# containers whose configuration changed, one service at a time, so that the others keep serving.
+# The wait condition of the change is signaled once the server answers again.
+#
+#     update-clearml-server.sh apply <region> [<readiness check URL>]  # what cfn-hup runs
+#     update-clearml-server.sh roll                                    # only the rolling docker-compose update
+#     update-clearml-server.sh fetch-credentials <region>              # also run by the bootstrap
+#     update-clearml-server.sh pull-backup-image <region>              # also run by the bootstrap
+#
+# The configuration files in opt/clearml/config are mounted rather than part of the docker-compose
+# file, so the containers mounting them are recreated when their checksum changed since the last roll.
+#
+# Changes to the bootstrap itself still replace the instance, see ec2_instance.py.
+
+set -eEuo pipefail
+
+WORKDIR="${WORKDIR:-/clearml}"
+DOCKER_COMPOSE_FPATH="${DOCKER_COMPOSE_FPATH:-$WORKDIR/docker-compose.clear-ml.yml}"
+STATE_DIR="${STATE_DIR:-/var/lib/clearml-bootstrap}"
+CFN_BIN_DIR="${CFN_BIN_DIR:-/opt/aws/bin}"
+CLOUDWATCH_AGENT_CTL="${CLOUDWATCH_AGENT_CTL:-/opt/aws/amazon-cloudwatch-agent/bin/amazon-cloudwatch-agent-ctl}"
+WAIT_CONDITION_HANDLE_FPATH=/etc/clearml/wait-condition-handle.txt
+CONFIG_MOUNT_POINT=/opt/clearml/config
+
+function compose() {
+    docker-compose -f "$DOCKER_COMPOSE_FPATH" "$@"
+}
+
+# the .env file only references the secret holding the password of a managed Mongo (see
+# managed_data_stores.py), so that the password is not part of the CloudFormation template.
+# cfn-init rewrites the .env file on every change, so this runs before every docker-compose up.
+function fetch_credentials() {
+    local region="$1" secret_arn password
+    secret_arn=$(sed -n 's/^CLEARML_MONGODB_SECRET_ARN=//p' "$WORKDIR/.env")
+    [ -n "$secret_arn" ] || return 0
+    password=$(
+        aws secretsmanager get-secret-value --region "$region" --secret-id "$secret_arn" \
+            --query SecretString --output text \
+            | python3 -c 'import json, sys; print(json.load(sys.stdin)["password"])'
+    )
+    sed -i '/^CLEARML_MONGODB_PASSWORD=/d' "$WORKDIR/.env"
+    echo "CLEARML_MONGODB_PASSWORD=$password" >> "$WORKDIR/.env"
+}
+
+# login to ECR and pull the image of the backup service (see backups.py); the timer runs it with
+# `docker-compose run`, which would otherwise pull it without credentials
+function pull_backup_image() {
+    local region="$1" image
+    image=$(sed -n 's/^CLEARML_BACKUP_IMAGE=//p' "$WORKDIR/.env")
+    [ -n "$image" ] || return 0
+    aws ecr get-login-password --region "$region" \
+        | docker login --username AWS --password-stdin "${image%%/*}"
+    docker pull "$image"
+}
+
+function config_checksum() {
+    [ -d "$WORKDIR$CONFIG_MOUNT_POINT" ] || return 0
+    find "$WORKDIR$CONFIG_MOUNT_POINT" -type f -print0 \
+        | sort -z \
+        | xargs -0 -r sha256sum \
+        | sha256sum \
+        | cut -d ' ' -f 1
+}
+
+# usage: mounts_config <service>
+function mounts_config() {
+    local container
+    container=$(compose ps -q "$1")
+    [ -n "$container" ] || return 1
+    docker inspect -f '{{range .Mounts}}{{println .Destination}}{{end}}' "$container" | grep -qx "$CONFIG_MOUNT_POINT"
+}
+
+# usage: wait_until_running <service>
+function wait_until_running() {
+    local deadline=$((SECONDS + 300)) container
+    container=$(compose ps -q "$1")
+    until [ "$(docker inspect -f '{{.State.Running}}' "$container" 2>/dev/null)" = "true" ]; do
+        if [ "$SECONDS" -gt "$deadline" ]; then
+            echo "$1 is not running after 5 minutes" >&2
+            return 1
+        fi
+        sleep 1
+    done
+}
+
+# recreate the containers whose configuration changed, one service at a time, in the dependency
+# order of `docker-compose config --services` so that the data stores come back first
+function roll() {
+    local checksum previous service force_recreate
+    mkdir -p "$STATE_DIR"
+    checksum=$(config_checksum)
+    previous=$(cat "$STATE_DIR/config.sha256" 2>/dev/null || echo "$checksum")
+
+    for service in $(compose config --services); do
+        force_recreate=""
+        if [ "$checksum" != "$previous" ] && mounts_config "$service"; then
+            force_recreate="--force-recreate"
+        fi
+        # a no-op for the services whose configuration is unchanged
+        compose up -d --no-deps $force_recreate "$service"
+        wait_until_running "$service"
+    done
+
+    # drop the containers of services removed from the docker-compose file
+    compose up -d --remove-orphans
+    echo "$checksum" > "$STATE_DIR/config.sha256"
+}
+
+# systemd units and the CloudWatch agent configuration placed by cfn-init
+function reload_host_services() {
+    local timer
+    systemctl daemon-reload
+    "$CLOUDWATCH_AGENT_CTL" -a fetch-config -m ec2 -s -c file:/etc/clearml/cloudwatch-agent.json
+    systemctl try-restart clearml-metrics-collector
+    # restarting a timer re-evaluates its schedule
+    for timer in clearml-elasticsearch-expiry.timer clearml-backup.timer; do
+        if [ -f "/etc/systemd/system/$timer" ]; then
+            systemctl enable "$timer"
+            systemctl restart "$timer"
+        fi
+    done
+    if [ -f /etc/systemd/system/clearml-elasticsearch-template.service ]; then
+        systemctl start clearml-elasticsearch-template
+    fi
+}
+
+# usage: signal <exit code> <reason>
+function signal() {
+    [ -s "$WAIT_CONDITION_HANDLE_FPATH" ] || return 0
+    "$CFN_BIN_DIR/cfn-signal" -e "$1" --id clearml-server --reason "$2" "$(cat "$WAIT_CONDITION_HANDLE_FPATH")"
+}
+
+function apply() {
+    local region="$1" readiness_check_url="${2:-}" start=$SECONDS
+    trap 'signal 1 "Applying the ClearML server configuration failed"' ERR
+
+    fetch_credentials "$region"
+    pull_backup_image "$region" || echo "Failed to pull the backup image"
+    roll
+    reload_host_services
+    if [ -n "$readiness_check_url" ]; then
+        curl --silent --fail --retry 60 --retry-delay 2 --retry-connrefused --retry-max-time 600 \
+            "$readiness_check_url" > /dev/null
+    fi
+
+    echo "Applied the ClearML server configuration in $((SECONDS - start)) seconds"
+    signal 0 "ClearML server configuration applied"
+}
+
+case "${1:-}" in
+    apply) apply "${2:?region}" "${3:-}" ;;
+    roll) roll ;;
+    fetch-credentials) fetch_credentials "${2:?region}" ;;
+    pull-backup-image) pull_backup_image "${2:?region}" ;;
+    *)
+        echo "Usage: $0 apply <region> [<readiness check URL>] | roll | fetch-credentials <region>" \
+            "| pull-backup-image <region>" >&2
+        exit 1
+        ;;
+esac
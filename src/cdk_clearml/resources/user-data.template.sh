@@ -1,99 +1,344 @@
 #!/bin/bash
 
-# TODO: consider using try/catch expressions as shown in this SO answer: https://stackoverflow.com/questions/22009364/is-there-a-try-catch-command-in-bash
-# to return a failure cfn-signal or success.
-
+# Bootstrap for the ClearML server.
+#
 # This script is a templated string. All occurreces of "[dollar sign]<some var name>" will be substituted
 # with other values by the CDK code.
+#
+# The work is split into phases. Independent phases run concurrently, every phase is timed, and a
+# completed phase leaves a marker file behind so that re-running this script (e.g. after a reboot
+# or a failed attempt) skips it. Phase durations are written to the log and published as
+# CloudWatch metrics.
+#
+# The docker-compose file and the install script are placed on disk by cfn-init, which the CDK
+# runs right before this script. This script only runs on the first boot of an instance: later
+# changes of what cfn-init places on disk are applied in place by cfn-hup and
+# update-clearml-server.sh (see watch_for_config_updates).
+#
+# To run this locally, point CFN_BIN_DIR and PATH at shims for the AWS binaries:
+# see resources/bootstrap-shims/run-bootstrap-test.sh
 
 # make the logged output of this user-data script available in the EC2 console
-exec > >(tee /var/log/user-data.log | logger -t user-data -s 2>/dev/console) 2>&1
+exec > >(tee -a /var/log/user-data.log | logger -t user-data -s 2>/dev/console) 2>&1
 
 # print the commands this script runs as they are executed
 set -x
 
-# run the cfn-init to fetch files, this populates the docker-compose.yml, clearml.conf, and other files
-yum install -y aws-cfn-bootstrap
-/opt/aws/bin/cfn-init -v --stack $STACK_NAME --resource $LOGICAL_EC2_INSTANCE_RESOURCE_ID --region $AWS_REGION --configsets files
-
 export WORKDIR=/clearml
-mkdir -p "$$WORKDIR"
+export BOOTSTRAP_STATE_DIR="$${BOOTSTRAP_STATE_DIR:-/var/lib/clearml-bootstrap}"
+export CFN_BIN_DIR="$${CFN_BIN_DIR:-/opt/aws/bin}"
+export DOCKER_COMPOSE_FPATH="$$WORKDIR/docker-compose.clear-ml.yml"
+export METRICS_FPATH="$$BOOTSTRAP_STATE_DIR/phase-durations.tsv"
+CLOUDWATCH_AGENT_BIN_DIR=/opt/aws/amazon-cloudwatch-agent/bin
+export CLOUDWATCH_AGENT_CTL="$${CLOUDWATCH_AGENT_CTL:-$$CLOUDWATCH_AGENT_BIN_DIR/amazon-cloudwatch-agent-ctl}"
+# every change of the configuration comes with a new wait condition handle, so its URL is placed by cfn-init
+WAIT_CONDITION_HANDLE_FPATH=/etc/clearml/wait-condition-handle.txt
+UPDATE_SCRIPT=/usr/local/bin/update-clearml-server.sh
+
+mkdir -p "$$WORKDIR" "$$BOOTSTRAP_STATE_DIR"
 cd "$$WORKDIR"
 
-function install_and_run_clearml() {
+##############################
+# --- Bootstrap "engine" --- #
+##############################
+
+# usage: run_phase <phase name> <function name> [--always]
+#
+# Runs the function unless the phase already completed, prefixes its output with the phase name,
+# and records its duration. Returns the function's exit code. Phases run with "--always" are
+# never skipped and leave no marker behind.
+function run_phase() {
+    local phase_name="$$1"
+    local phase_function="$$2"
+    local always="$${3:-}"
+    local marker_fpath="$$BOOTSTRAP_STATE_DIR/$$phase_name.done"
 
-    #########################################
-    # --- Install CLI tool dependencies --- #
-    #########################################
+    if [ "$$always" != "--always" ] && [ -f "$$marker_fpath" ]; then
+        echo "[bootstrap] phase=$$phase_name status=skipped reason=already-completed"
+        return 0
+    fi
 
-    yum update -y
-    yum install -y docker
+    local start_time
+    start_time=$$(date +%s.%N)
 
-    # install docker-compose and make the binary executable
-    curl -L https://github.com/docker/compose/releases/latest/download/docker-compose-$$(uname -s)-$$(uname -m) -o /usr/bin/docker-compose
-    chmod +x /usr/bin/docker-compose
+    "$$phase_function" 2>&1 | sed -u "s/^/[$$phase_name] /"
+    local exit_code=$${PIPESTATUS[0]}
+
+    local duration_seconds
+    duration_seconds=$$(awk -v start="$$start_time" -v end="$$(date +%s.%N)" 'BEGIN { printf "%.2f", end - start }')
+
+    if [ "$$exit_code" -eq 0 ]; then
+        [ "$$always" = "--always" ] || touch "$$marker_fpath"
+        echo "[bootstrap] phase=$$phase_name status=succeeded duration_seconds=$$duration_seconds"
+        printf "%s\t%s\n" "$$phase_name" "$$duration_seconds" >> "$$METRICS_FPATH"
+    else
+        echo "[bootstrap] phase=$$phase_name status=failed exit_code=$$exit_code duration_seconds=$$duration_seconds"
+    fi
+    return "$$exit_code"
+}
 
-    # initialize docker and docker-swarm daemons
-    service docker start
+# publish the duration of every phase that ran during this boot as CloudWatch metrics
+function publish_phase_metrics() {
+    [ -f "$$METRICS_FPATH" ] || return 0
 
-    # install aws cli
-    yum install -y python38 python38-pip
-    pip3 install awscli --upgrade --user
+    local metric_data
+    metric_data=$$(awk -F '\t' -v image_type="$SERVER_IMAGE_TYPE" '
+        BEGIN { printf "[" }
+        {
+            if (NR > 1) printf ","
+            printf "{\"MetricName\":\"PhaseDurationSeconds\",\"Unit\":\"Seconds\",\"Value\":%s,", $$2
+            printf "\"Dimensions\":[{\"Name\":\"Phase\",\"Value\":\"%s\"},{\"Name\":\"ImageType\",\"Value\":\"%s\"}]}", $$1, image_type
+        }
+        END { printf "]" }
+    ' "$$METRICS_FPATH")
 
-    # login to ECR and pull the minecraft server backup/restore image
-    # aws ecr get-login-password --region us-west-2 | docker login --username AWS --password-stdin "$AWS_ACCOUNT_ID.dkr.ecr.$AWS_REGION.amazonaws.com"
-    # docker pull "$BACKUP_SERVICE_DOCKER_IMAGE_URI"
+    aws cloudwatch put-metric-data \
+        --region $AWS_REGION \
+        --namespace ClearML/Server \
+        --metric-data "$$metric_data" \
+        || echo "Failed to publish the bootstrap phase metrics"
 
-    # restore from backup if $RESTORE_FROM_MOST_RECENT_BACKUP is set to "true"
-    # if [ "$RESTORE_FROM_MOST_RECENT_BACKUP" = "true" ]; then
-    #     docker-compose run minecraft-backup restore || echo "Failed to restore from backup. Starting fresh..."
-    #     docker network rm minecraft-server
-    # fi
+    # only publish the durations from this boot once
+    mv "$$METRICS_FPATH" "$$METRICS_FPATH.published"
+}
 
-    ############################################
-    # --- Start up the with docker compose --- #
-    ############################################
+function emit_cfn_success_signal() {
+    "$$CFN_BIN_DIR/cfn-signal" -e 0 --id clearml-server --reason "ClearML server is ready" \
+        "$$(cat "$$WAIT_CONDITION_HANDLE_FPATH")"
+}
 
-    # create volumes used by docker-compose
-    mkdir -p "$$WORKDIR/opt/clearml/logs"
-    mkdir -p "$$WORKDIR/opt/clearml/config"
-    mkdir -p "$$WORKDIR/opt/clearml/data/fileserver"
-    mkdir -p "$$WORKDIR/opt/clearml/data/elastic_7"
-    mkdir -p "$$WORKDIR/usr/share/elasticsearch/logs"
-    mkdir -p "$$WORKDIR/opt/clearml/logs"
-    mkdir -p "$$WORKDIR/opt/clearml/data/fileserver"
-    mkdir -p "$$WORKDIR/opt/clearml/config"
-    mkdir -p "$$WORKDIR/opt/clearml/data/mongo_4/db"
-    mkdir -p "$$WORKDIR/opt/clearml/data/mongo_4/configdb"
-    mkdir -p "$$WORKDIR/opt/clearml/data/redis"
-    mkdir -p "$$WORKDIR/opt/clearml/logs"
-    mkdir -p "$$WORKDIR/opt/clearml/agent"
+function emit_cfn_failure_signal() {
+    "$$CFN_BIN_DIR/cfn-signal" -e 1 --id clearml-server --reason "Bootstrap phase failed: $$1" \
+        "$$(cat "$$WAIT_CONDITION_HANDLE_FPATH")"
+}
 
-    # certain containers were failing due to not having sufficient file permissions
-    chmod -R 777 "$$WORKDIR"
-    docker-compose -f "$$WORKDIR/docker-compose.clear-ml.yml" up -d
+# usage: fail <phase name>
+function fail() {
+    publish_phase_metrics
+    emit_cfn_failure_signal "$$1"
+    exit 1
+}
 
-    # start a worker in the services queue
-    pip install clearml-agent
-    clearml-agent daemon --queue default --docker python:3.9 --cpu-only
+##################
+# --- Phases --- #
+##################
 
+function install_docker() {
+    /usr/local/bin/install-clearml-server-dependencies.sh docker "$$DOCKER_COMPOSE_FPATH"
 }
 
+function install_clis() {
+    /usr/local/bin/install-clearml-server-dependencies.sh clis "$$DOCKER_COMPOSE_FPATH"
+}
+
+function pull_images() {
+    /usr/local/bin/install-clearml-server-dependencies.sh images "$$DOCKER_COMPOSE_FPATH"
+}
+
+# attach and mount the EBS volumes of Elasticsearch, Mongo, Redis, and the fileserver; the volumes
+# file is only placed on disk when the stack provisions dedicated data volumes
+function mount_data_volumes() {
+    if [ ! -s /etc/clearml/data-volumes.txt ]; then
+        echo "No dedicated data volumes; the data stores live on the root volume"
+        return 0
+    fi
+    /usr/local/bin/attach-data-volumes.sh /etc/clearml/data-volumes.txt $AWS_REGION
+}
+
+# create the directories mounted into the containers; certain containers fail without write access
+# to them. The mode is only applied to the directories themselves, never recursively to the data.
+function prepare_directories() {
+    local directories=(
+        "$$WORKDIR/opt/clearml/logs"
+        "$$WORKDIR/opt/clearml/config"
+        "$$WORKDIR/opt/clearml/agent"
+        "$$WORKDIR/opt/clearml/data/fileserver"
+        "$$WORKDIR/opt/clearml/data/elastic_7"
+        "$$WORKDIR/opt/clearml/data/elastic_backup"
+        "$$WORKDIR/opt/clearml/data/mongo_4/db"
+        "$$WORKDIR/opt/clearml/data/mongo_4/configdb"
+        "$$WORKDIR/opt/clearml/data/redis"
+        "$$WORKDIR/usr/share/elasticsearch/logs"
+    )
+    install -d -m 0777 "$${directories[@]}"
+}
+
+# login to ECR and pull the image of the backup service (see backups.py)
+function pull_backup_image() {
+    "$$UPDATE_SCRIPT" pull-backup-image $AWS_REGION
+}
+
+# load the most recent backups of Mongo and Elasticsearch from S3, but only into the data stores whose data
+# volume is empty: the data of volumes taken over from a previous instance is never overwritten
+function restore_from_backup() {
+    local data_stores data_store data_dir empty_data_stores=""
+    data_stores=$$(sed -n 's/^CLEARML_BACKUP_DATA_STORES=//p' "$$WORKDIR/.env")
+    for data_store in $$data_stores; do
+        case "$$data_store" in
+            mongo) data_dir="$$WORKDIR/opt/clearml/data/mongo_4/db" ;;
+            elasticsearch) data_dir="$$WORKDIR/opt/clearml/data/elastic_7" ;;
+            *)
+                echo "Unknown data store in CLEARML_BACKUP_DATA_STORES: $$data_store"
+                return 1
+                ;;
+        esac
+        # e.g. a volume restored from a snapshot: its data is newer than the last backup
+        if [ -d "$$data_dir" ] && [ -n "$$(ls -A "$$data_dir")" ]; then
+            echo "$$data_dir already holds data, not restoring $$data_store"
+        else
+            empty_data_stores="$$empty_data_stores $$data_store"
+        fi
+    done
+    if [ -z "$$empty_data_stores" ]; then
+        return 0
+    fi
+
+    systemctl start docker
+    docker-compose -f "$$DOCKER_COMPOSE_FPATH" up -d $$empty_data_stores
+    docker-compose -f "$$DOCKER_COMPOSE_FPATH" run --rm backup restore --data-stores $$empty_data_stores
+}
+
+# back up to S3 on the schedule of the clearml-backup timer
+function schedule_backups() {
+    systemctl daemon-reload
+    systemctl enable --now clearml-backup.timer
+}
+
+# the password of a managed Mongo, which the .env file only references (see managed_data_stores.py)
+function fetch_data_store_credentials() {
+    "$$UPDATE_SCRIPT" fetch-credentials $AWS_REGION
+}
+
+function start_clearml() {
+    systemctl start docker
+    docker-compose -f "$$DOCKER_COMPOSE_FPATH" up -d
+}
+
+# the API server, or Elasticsearch when the instance only runs the data stores (see stateless_services.py);
+# nothing if Elasticsearch is managed as well
 function ping_clearml_with_retries() {
-    curl --retry 10 --retry-delay 3 --retry-connrefused 'http://localhost:8008/debug.ping'
+    [ -n '$READINESS_CHECK_URL' ] || return 0
+    curl --silent --fail --retry 120 --retry-delay 2 --retry-connrefused --retry-max-time 1200 '$READINESS_CHECK_URL'
 }
 
-function emit_cfn_success_signal() {
-    /opt/aws/bin/cfn-signal -e 0 --stack $STACK_NAME --resource $LOGICAL_EC2_INSTANCE_RESOURCE_ID --region $AWS_REGION $CFN_WAIT_HANDLE
+# log and publish how long it took since the instance booted for the API server to answer
+function report_time_to_first_ping() {
+    SECONDS_SINCE_BOOT=$$(awk '{print $$1}' /proc/uptime)
+    echo "ClearML API answered its first debug.ping $$SECONDS_SINCE_BOOT seconds after boot (image type: $SERVER_IMAGE_TYPE)"
+    aws cloudwatch put-metric-data \
+        --region $AWS_REGION \
+        --namespace ClearML/Server \
+        --metric-name TimeToFirstPingSeconds \
+        --unit Seconds \
+        --value "$$SECONDS_SINCE_BOOT" \
+        --dimensions "ImageType=$SERVER_IMAGE_TYPE" \
+        || echo "Failed to publish the TimeToFirstPingSeconds metric"
 }
 
-function emit_cfn_failure_signal() {
-    /opt/aws/bin/cfn-signal -e 1 --stack $STACK_NAME --resource $LOGICAL_EC2_INSTANCE_RESOURCE_ID --region $AWS_REGION $CFN_WAIT_HANDLE
+# the CloudWatch agent publishes the host metrics and listens for the EMF documents of the
+# metrics collector, which samples the containers and data stores (see server_monitoring.py)
+function start_monitoring() {
+    "$$CLOUDWATCH_AGENT_CTL" -a fetch-config -m ec2 -s -c file:/etc/clearml/cloudwatch-agent.json
+    systemctl daemon-reload
+    systemctl enable --now clearml-metrics-collector
+}
+
+# the settings of the event indices, and a daily deletion of their expired events (see elasticsearch_tuning.py)
+function tune_elasticsearch() {
+    systemctl daemon-reload
+    systemctl start clearml-elasticsearch-template
+    systemctl enable --now clearml-elasticsearch-expiry.timer
+}
+
+# cfn-hup polls the CloudFormation::Init metadata of this instance every minute and, when it
+# changed, re-runs cfn-init and applies the new configuration in place
+function watch_for_config_updates() {
+    mkdir -p /etc/cfn/hooks.d
+    cat > /etc/cfn/cfn-hup.conf <<EOF
+[main]
+stack=$STACK_NAME
+region=$AWS_REGION
+interval=1
+EOF
+    cat > /etc/cfn/hooks.d/clearml-server-config.conf <<EOF
+[clearml-server-config]
+triggers=post.update
+path=Resources.$LOGICAL_EC2_INSTANCE_RESOURCE_ID.Metadata.AWS::CloudFormation::Init
+action=$$CFN_BIN_DIR/cfn-init -v --region $AWS_REGION --stack $STACK_NAME --resource $LOGICAL_EC2_INSTANCE_RESOURCE_ID -c default && $$UPDATE_SCRIPT apply $AWS_REGION '$READINESS_CHECK_URL'
+runas=root
+EOF
+    cat > /etc/systemd/system/cfn-hup.service <<EOF
+[Unit]
+Description=Apply the changes of the CloudFormation::Init metadata of the ClearML server
+After=network-online.target
+
+[Service]
+ExecStart=$$CFN_BIN_DIR/cfn-hup --no-daemon
+Restart=always
+
+[Install]
+WantedBy=multi-user.target
+EOF
+    systemctl daemon-reload
+    systemctl enable cfn-hup
+    systemctl restart cfn-hup
 }
 
-install_and_run_clearml || emit_cfn_failure_signal
+# start a worker in the default queue
+function start_default_queue_agent() {
+    clearml-agent daemon --queue default --docker python:3.9 --cpu-only --detached
+}
+
+###########################
+# --- Run the phases --- #
+###########################
+
+# the directories of the data stores are created on the mounted volumes
+{ run_phase mount-data-volumes mount_data_volumes && run_phase prepare-directories prepare_directories; } &
+PREPARE_STORAGE_PID=$$!
+
+# the pre-baked server AMI already has the packages and docker images installed
+if [ "$INSTALL_CLEARML_SERVER_DEPENDENCIES" = "true" ]; then
+    run_phase install-docker install_docker || fail install-docker
+
+    run_phase install-clis install_clis &
+    INSTALL_CLIS_PID=$$!
+    run_phase pull-images pull_images || fail pull-images
+    wait "$$INSTALL_CLIS_PID" || fail install-clis
+fi
+
+wait "$$PREPARE_STORAGE_PID" || fail prepare-storage
+
+if [ "$BACKUPS" = "true" ]; then
+    run_phase pull-backup-image pull_backup_image || echo "Failed to pull the backup image"
+    if [ "$RESTORE_FROM_MOST_RECENT_BACKUP" = "true" ]; then
+        run_phase restore-from-backup restore_from_backup || echo "Failed to restore from backup. Starting fresh..."
+    fi
+fi
+
+run_phase fetch-data-store-credentials fetch_data_store_credentials --always || fail fetch-data-store-credentials
+run_phase start-clearml start_clearml || fail start-clearml
+
+run_phase wait-for-api ping_clearml_with_retries --always || fail wait-for-api
+report_time_to_first_ping
+
+# before tasks report their first events to a new server
+if [ "$TUNE_ELASTICSEARCH" = "true" ]; then
+    run_phase tune-elasticsearch tune_elasticsearch --always || echo "Failed to tune Elasticsearch"
+fi
+emit_cfn_success_signal
+
+if [ "$START_DEFAULT_QUEUE_AGENT" = "true" ]; then
+    run_phase start-default-queue-agent start_default_queue_agent || echo "Failed to start the default queue agent"
+fi
+
+# re-applied on every run, so that a changed agent configuration takes effect
+run_phase start-monitoring start_monitoring --always || echo "Failed to start the monitoring"
+
+if [ "$BACKUPS" = "true" ]; then
+    run_phase schedule-backups schedule_backups --always || echo "Failed to schedule the backups"
+fi
 
-# ping_clearml && emit_cfn_success_signal
+run_phase watch-for-config-updates watch_for_config_updates --always || echo "Failed to start cfn-hup"
 
-# # if we get here, then we failed to ping clearml
-# emit_cfn_failure_signal
\ No newline at end of file
+publish_phase_metrics
@@ -0,0 +1,61 @@
+# --- node-local caches of the autoscaled worker (rendered by cdk_clearml/worker_cache.py) ---
+CACHE_DIR=${CACHE_MOUNT_POINT}
+mkdir -p "$$CACHE_DIR"
+
+# mount the cache volume the autoscaler adds to resources with a cache_volume_size
+IMDS_TOKEN=$$(curl -s -X PUT http://169.254.169.254/latest/api/token -H "X-aws-ec2-metadata-token-ttl-seconds: 60")
+CACHE_INSTANCE_ID=$$(curl -s -H "X-aws-ec2-metadata-token: $$IMDS_TOKEN" http://169.254.169.254/latest/meta-data/instance-id)
+CACHE_VOLUME_ID=$$(aws ec2 describe-instances --region ${AWS_REGION} --instance-ids "$$CACHE_INSTANCE_ID" \
+    --query "Reservations[0].Instances[0].BlockDeviceMappings[?DeviceName=='${CACHE_DEVICE_NAME}'].Ebs.VolumeId" \
+    --output text)
+if [ -n "$$CACHE_VOLUME_ID" ] && [ "$$CACHE_VOLUME_ID" != "None" ]; then
+    # Nitro instances expose EBS volumes as NVMe devices whose serial number is the volume ID
+    CACHE_DEVICE=$$(readlink -f "/dev/disk/by-id/nvme-Amazon_Elastic_Block_Store_$${CACHE_VOLUME_ID//-/}" || true)
+    [ -b "$$CACHE_DEVICE" ] || CACHE_DEVICE=${CACHE_DEVICE_NAME}
+    # a volume restored from a snapshot already holds a primed cache
+    blkid "$$CACHE_DEVICE" || mkfs.xfs "$$CACHE_DEVICE"
+    mountpoint -q "$$CACHE_DIR" || mount -o noatime "$$CACHE_DEVICE" "$$CACHE_DIR"
+
+    # keep the docker images on the cache volume
+    mkdir -p "$$CACHE_DIR/docker"
+    python3 -c "
+import json, pathlib
+path = pathlib.Path('/etc/docker/daemon.json')
+daemon = json.loads(path.read_text()) if path.exists() else {}
+if daemon.get('data-root') != '$$CACHE_DIR/docker':
+    daemon['data-root'] = '$$CACHE_DIR/docker'
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(daemon, indent=2))
+" && systemctl restart docker
+fi
+
+# log docker in to the pull-through cache and point pip at the PyPI proxy; both tokens expire after 12 hours
+cat << 'CLEARML_WORKER_CACHE_EOF' > /usr/local/bin/clearml-worker-cache-credentials
+#!/bin/bash
+# usage: clearml-worker-cache-credentials <region> <registry host> [<codeartifact domain> <owner> <repository>]
+aws ecr get-login-password --region "$$1" | docker login --username AWS --password-stdin "$$2"
+touch /etc/clearml-worker-cache.env
+if [ -n "$$3" ]; then
+    token=$$(aws codeartifact get-authorization-token --region "$$1" --domain "$$3" --domain-owner "$$4" \
+        --query authorizationToken --output text)
+    endpoint=$$(aws codeartifact get-repository-endpoint --region "$$1" --domain "$$3" --domain-owner "$$4" \
+        --repository "$$5" --format pypi --query repositoryEndpoint --output text)
+    echo "PIP_INDEX_URL=https://aws:$$token@$${endpoint#https://}simple/" > /etc/clearml-worker-cache.env.tmp
+    mv /etc/clearml-worker-cache.env.tmp /etc/clearml-worker-cache.env
+fi
+CLEARML_WORKER_CACHE_EOF
+chmod +x /usr/local/bin/clearml-worker-cache-credentials
+CACHE_CREDENTIALS_ARGS="${AWS_REGION} ${REGISTRY_HOST} ${CODEARTIFACT_ARGS}"
+/usr/local/bin/clearml-worker-cache-credentials $$CACHE_CREDENTIALS_ARGS
+nohup bash -c "while sleep ${CREDENTIALS_REFRESH_SECONDS}; do \
+    /usr/local/bin/clearml-worker-cache-credentials $$CACHE_CREDENTIALS_ARGS; done" > /dev/null 2>&1 &
+
+# docker reads the env file every time the agent starts a task container, so refreshed tokens apply
+cat << CLEARML_WORKER_CACHE_EOF >> ~/clearml.conf
+agent.docker_pip_cache: "$$CACHE_DIR/pip"
+agent.docker_apt_cache: "$$CACHE_DIR/apt"
+agent.pip_download_cache { enabled: true, path: "$$CACHE_DIR/pip-download" }
+agent.vcs_cache { enabled: true, path: "$$CACHE_DIR/vcs" }
+agent.extra_docker_arguments: ["--env-file", "/etc/clearml-worker-cache.env"]
+sdk.storage.cache.default_base_dir: "$$CACHE_DIR/storage"
+CLEARML_WORKER_CACHE_EOF
@@ -0,0 +1,190 @@
+"""
+Batch deletion of the S3 objects ClearML asks to delete.
+
+When tasks or models are deleted, the ClearML apiserver records the URLs of their artifacts,
+models, and debug images in the ``url_to_delete`` collection of its Mongo database. The
+``async_delete`` service in docker-compose.yml only deletes fileserver URLs, one at a time.
+This worker handles the ``s3://<artifact bucket>/`` URLs, deleting up to 1000 objects per
+``DeleteObjects`` request.
+
+It runs as the ``s3_batch_delete`` docker-compose service in S3 artifact mode, inside the
+ClearML server image, so it only needs what that image already ships: boto3 and pymongo,
+imported where they are used, and the standard library:
+
+    python s3_batch_delete.py --bucket <artifact bucket> --mongo-uri mongodb://mongo:27017
+"""
+
+import logging
+import re
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+# the most keys S3 accepts in a single DeleteObjects request
+DELETE_OBJECTS_MAX_KEYS = 1000
+
+CLEARML_BACKEND_DATABASE = "backend"
+URL_TO_DELETE_COLLECTION = "url_to_delete"
+
+
+@dataclass
+class BatchDeleteResult:
+    """Outcome of one pass over the pending delete requests."""
+
+    deleted: int = 0
+    failed: int = 0
+    duration_seconds: float = 0.0
+
+    @property
+    def objects_per_second(self) -> float:
+        return self.deleted / self.duration_seconds if self.duration_seconds else 0.0
+
+
+def parse_s3_url(url: str) -> Tuple[str, str]:
+    """Split ``s3://<bucket>/<key>`` into the bucket and the key."""
+    match = re.match(r"^s3://([^/]+)/(.+)$", url)
+    if not match:
+        raise ValueError(f"'{url}' is not an s3://<bucket>/<key> URL")
+    return match.group(1), match.group(2)
+
+
+def chunks(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i : i + size] for i in range(0, len(items), size)]
+
+
+class S3BatchDeleter:
+    """
+    Deletes the objects of pending ``url_to_delete`` requests for one bucket.
+
+    Requests are removed from the collection once their object is gone. Failed requests stay,
+    with ``retry_count`` incremented, until ``max_retries`` is reached.
+
+    :param collection: The pymongo ``url_to_delete`` collection (or a stand-in such as mongomock).
+    :param s3_client: A boto3 S3 client.
+    :param bucket_name: Only URLs in this bucket are handled.
+    :param batch_size: Keys per ``DeleteObjects`` request.
+    :param concurrency: ``DeleteObjects`` requests in flight at once.
+    """
+
+    def __init__(
+        self,
+        collection,
+        s3_client,
+        bucket_name: str,
+        batch_size: int = DELETE_OBJECTS_MAX_KEYS,
+        concurrency: int = 4,
+        max_retries: int = 3,
+    ):
+        if not 1 <= batch_size <= DELETE_OBJECTS_MAX_KEYS:
+            raise ValueError(f"batch_size must be between 1 and {DELETE_OBJECTS_MAX_KEYS}, got {batch_size}")
+        self.collection = collection
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+
+    def pending_requests_query(self) -> Dict[str, Any]:
+        return {
+            "url": {"$regex": f"^s3://{re.escape(self.bucket_name)}/"},
+            "$or": [{"retry_count": {"$exists": False}}, {"retry_count": {"$lt": self.max_retries}}],
+        }
+
+    def run_once(self) -> BatchDeleteResult:
+        """Delete the objects of up to ``batch_size * concurrency`` pending requests."""
+        start_time = time.perf_counter()
+        requests = list(
+            self.collection.find(self.pending_requests_query(), {"url": 1}).limit(self.batch_size * self.concurrency)
+        )
+
+        result = BatchDeleteResult()
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for deleted, failed in executor.map(self._delete_batch, chunks(requests, self.batch_size)):
+                result.deleted += deleted
+                result.failed += failed
+
+        result.duration_seconds = time.perf_counter() - start_time
+        return result
+
+    def run_forever(self, poll_interval_seconds: float = 10.0) -> None:
+        """Keep deleting; only sleep once there is nothing left to delete."""
+        while True:
+            result = self.run_once()
+            if result.deleted or result.failed:
+                LOGGER.info(
+                    "deleted=%d failed=%d objects_per_second=%.1f",
+                    result.deleted,
+                    result.failed,
+                    result.objects_per_second,
+                )
+            else:
+                time.sleep(poll_interval_seconds)
+
+    def _delete_batch(self, requests: List[dict]) -> Tuple[int, int]:
+        request_ids_by_key: Dict[str, List[Any]] = {}
+        for request in requests:
+            _, key = parse_s3_url(request["url"])
+            request_ids_by_key.setdefault(key, []).append(request["_id"])
+
+        response = self.s3_client.delete_objects(
+            Bucket=self.bucket_name,
+            Delete={"Objects": [{"Key": key} for key in request_ids_by_key], "Quiet": True},
+        )
+
+        # in quiet mode, only the keys that could not be deleted are listed
+        errors: Dict[str, str] = {
+            error["Key"]: error.get("Message", error.get("Code", "")) for error in response.get("Errors", [])
+        }
+        deleted_request_ids = [
+            request_id
+            for key, request_ids in request_ids_by_key.items()
+            if key not in errors
+            for request_id in request_ids
+        ]
+        if deleted_request_ids:
+            self.collection.delete_many({"_id": {"$in": deleted_request_ids}})
+
+        for key, reason in errors.items():
+            self.collection.update_many(
+                {"_id": {"$in": request_ids_by_key[key]}},
+                {
+                    "$inc": {"retry_count": 1},
+                    "$set": {"last_failure_time": datetime.utcnow(), "last_failure_reason": reason},
+                },
+            )
+
+        return len(deleted_request_ids), sum(len(request_ids_by_key[key]) for key in errors)
+
+
+def main():
+    import boto3
+    import pymongo
+
+    parser = ArgumentParser(description="Delete the S3 objects of deleted ClearML tasks and models in batches")
+    parser.add_argument("--bucket", required=True, help="Name of the artifact bucket")
+    parser.add_argument("--mongo-uri", default="mongodb://mongo:27017")
+    parser.add_argument("--batch-size", type=int, default=DELETE_OBJECTS_MAX_KEYS)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--poll-interval-seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    collection = pymongo.MongoClient(args.mongo_uri)[CLEARML_BACKEND_DATABASE][URL_TO_DELETE_COLLECTION]
+    deleter = S3BatchDeleter(
+        collection=collection,
+        s3_client=boto3.client("s3"),
+        bucket_name=args.bucket,
+        batch_size=args.batch_size,
+        concurrency=args.concurrency,
+    )
+    deleter.run_forever(poll_interval_seconds=args.poll_interval_seconds)
+
+
+if __name__ == "__main__":
+    main()
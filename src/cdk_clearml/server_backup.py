@@ -0,0 +1,262 @@
+"""
+Logical backups of the ClearML server's Mongo and Elasticsearch to S3, and their restore.
+
+The EBS snapshots of ``ClearMLBackups`` capture every data volume, but only as often as Data
+Lifecycle Manager runs and only within one region. This worker adds more frequent backups that
+can be restored into any server:
+
+- Mongo is dumped with ``mongodump --archive --gzip`` and streamed to
+  ``s3://<bucket>/mongo/<timestamp>.archive.gz``. ClearML's Mongo only holds metadata, so every
+  dump is complete; the bucket's lifecycle rule expires the old ones.
+- Elasticsearch takes a snapshot into a shared file system repository, which only writes the
+  segments that changed since the previous snapshot, and the repository is then synced to
+  ``s3://<bucket>/elasticsearch/``, which only uploads the new files. The oldest snapshots are
+  deleted beyond ``--keep-snapshots``.
+
+``restore`` loads the most recent of both into a server whose data stores are up but empty; it
+does nothing if the bucket holds no backup yet.
+
+It runs as the ``backup`` docker-compose service, in the image of ``resources/backup/Dockerfile``
+(``mongodump``, ``mongorestore``, and the AWS CLI); it only depends on the standard library:
+
+    python3 server_backup.py backup --bucket <backup bucket>
+    python3 server_backup.py restore --bucket <backup bucket>
+"""
+
+import json
+import logging
+import os
+import subprocess
+import time
+import urllib.error
+import urllib.request
+from argparse import ArgumentParser
+from datetime import datetime, timezone
+from typing import List, Optional
+
+LOGGER = logging.getLogger(__name__)
+
+DATA_STORES = ["mongo", "elasticsearch"]
+
+SNAPSHOT_REPOSITORY = "clearml-backup"
+# where docker-compose.yml mounts the snapshot repository: in the Elasticsearch container (its
+# path.repo), and in the backup container
+ELASTICSEARCH_REPOSITORY_PATH = "/usr/share/elasticsearch/backup"
+BACKUP_REPOSITORY_PATH = "/backup/elasticsearch"
+# the user of the Elasticsearch image, which must be able to write to the repository it restores from
+ELASTICSEARCH_UID = 1000
+
+# ClearML's indices; the system indices are left to Elasticsearch
+SNAPSHOT_INDICES = "*,-.*"
+
+
+def backup_timestamp() -> str:
+    """UTC timestamps sort like the backups they name."""
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def latest_key(s3_ls_output: str) -> Optional[str]:
+    """The newest object listed by ``aws s3 ls``, whose keys are timestamped."""
+    keys = [line.split()[-1] for line in s3_ls_output.splitlines() if line.strip() and not line.strip().endswith("/")]
+    return max(keys) if keys else None
+
+
+def snapshots_to_delete(snapshot_names: List[str], keep: int) -> List[str]:
+    """The oldest snapshots beyond the ``keep`` newest; their names are timestamped."""
+    return sorted(snapshot_names)[:-keep] if len(snapshot_names) > keep else []
+
+
+class ServerBackup:
+    """
+    Backs up and restores the data stores of one ClearML server.
+
+    :param bucket: Bucket the backups are written to and restored from.
+    :param data_stores: The data stores to back up; those that are managed back up on their own.
+    :param s3_endpoint_url: S3-compatible endpoint, e.g. a local MinIO for testing.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        data_stores: List[str],
+        mongo_uri: str = "mongodb://mongo:27017",
+        elasticsearch_url: str = "http://elasticsearch:9200",
+        keep_snapshots: int = 24,
+        s3_endpoint_url: Optional[str] = None,
+    ):
+        self.bucket = bucket
+        self.data_stores = data_stores
+        self.mongo_uri = mongo_uri
+        self.elasticsearch_url = elasticsearch_url.rstrip("/")
+        self.keep_snapshots = keep_snapshots
+        self.s3_endpoint_url = s3_endpoint_url
+
+    def aws_s3(self, *args: str) -> List[str]:
+        endpoint_args = ["--endpoint-url", self.s3_endpoint_url] if self.s3_endpoint_url else []
+        return ["aws", *endpoint_args, "s3", *args]
+
+    def elasticsearch(self, method: str, path: str, body: Optional[dict] = None) -> dict:
+        request = urllib.request.Request(
+            self.elasticsearch_url + path,
+            method=method,
+            data=json.dumps(body).encode("utf-8") if body is not None else None,
+            headers={"Content-Type": "application/json"},
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=3600) as response:
+                return json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            raise RuntimeError(f"{method} {path} failed: {error.read().decode('utf-8')}") from error
+
+    def register_repository(self) -> None:
+        self.elasticsearch(
+            "PUT",
+            f"/_snapshot/{SNAPSHOT_REPOSITORY}",
+            {"type": "fs", "settings": {"location": ELASTICSEARCH_REPOSITORY_PATH, "compress": True}},
+        )
+
+    def snapshot_names(self) -> List[str]:
+        snapshots = self.elasticsearch("GET", f"/_snapshot/{SNAPSHOT_REPOSITORY}/_all")["snapshots"]
+        return [snapshot["snapshot"] for snapshot in snapshots if snapshot["state"] == "SUCCESS"]
+
+    def backup(self) -> None:
+        timestamp = backup_timestamp()
+        if "mongo" in self.data_stores:
+            self.backup_mongo(timestamp)
+        if "elasticsearch" in self.data_stores:
+            self.backup_elasticsearch(timestamp)
+
+    def backup_mongo(self, timestamp: str) -> None:
+        start = time.monotonic()
+        key = f"mongo/{timestamp}.archive.gz"
+        dump = subprocess.Popen(["mongodump", "--uri", self.mongo_uri, "--archive", "--gzip"], stdout=subprocess.PIPE)
+        subprocess.run(self.aws_s3("cp", "-", f"s3://{self.bucket}/{key}"), stdin=dump.stdout, check=True)
+        dump.stdout.close()
+        if dump.wait() != 0:
+            raise RuntimeError(f"mongodump exited with {dump.returncode}")
+        LOGGER.info("Backed up Mongo to s3://%s/%s in %.1fs", self.bucket, key, time.monotonic() - start)
+
+    def backup_elasticsearch(self, timestamp: str) -> None:
+        start = time.monotonic()
+        self.register_repository()
+        snapshot = f"snapshot-{timestamp}"
+        self.elasticsearch(
+            "PUT",
+            f"/_snapshot/{SNAPSHOT_REPOSITORY}/{snapshot}?wait_for_completion=true",
+            {"indices": SNAPSHOT_INDICES, "include_global_state": False},
+        )
+        for old_snapshot in snapshots_to_delete(self.snapshot_names(), self.keep_snapshots):
+            self.elasticsearch("DELETE", f"/_snapshot/{SNAPSHOT_REPOSITORY}/{old_snapshot}")
+        repository_url = self.s3_url("elasticsearch")
+        subprocess.run(
+            self.aws_s3("sync", "--delete", "--only-show-errors", BACKUP_REPOSITORY_PATH, repository_url), check=True
+        )
+        LOGGER.info("Backed up Elasticsearch as %s in %.1fs", snapshot, time.monotonic() - start)
+
+    def s3_url(self, prefix: str) -> str:
+        return f"s3://{self.bucket}/{prefix}/"
+
+    def wait_until_up(self, timeout_seconds: float = 600) -> None:
+        """Wait for the data stores, which a fresh server starts right before restoring them."""
+        deadline = time.monotonic() + timeout_seconds
+        while True:
+            try:
+                if "mongo" in self.data_stores:
+                    subprocess.run(
+                        ["mongo", self.mongo_uri, "--quiet", "--eval", "db.runCommand({ping: 1})"],
+                        capture_output=True,
+                        check=True,
+                    )
+                if "elasticsearch" in self.data_stores:
+                    self.elasticsearch("GET", "/_cluster/health?wait_for_status=yellow&timeout=1s")
+                return
+            except (OSError, RuntimeError, subprocess.CalledProcessError):
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(2)
+
+    def restore(self) -> None:
+        self.wait_until_up()
+        if "mongo" in self.data_stores:
+            self.restore_mongo()
+        if "elasticsearch" in self.data_stores:
+            self.restore_elasticsearch()
+
+    def restore_mongo(self) -> None:
+        listing = subprocess.run(self.aws_s3("ls", self.s3_url("mongo")), capture_output=True, text=True)
+        key = latest_key(listing.stdout) if listing.returncode == 0 else None
+        if not key:
+            LOGGER.info("No Mongo backup in s3://%s/mongo/, nothing to restore", self.bucket)
+            return
+        download = subprocess.Popen(self.aws_s3("cp", self.s3_url("mongo") + key, "-"), stdout=subprocess.PIPE)
+        subprocess.run(
+            ["mongorestore", "--uri", self.mongo_uri, "--archive", "--gzip", "--drop"],
+            stdin=download.stdout,
+            check=True,
+        )
+        download.stdout.close()
+        if download.wait() != 0:
+            raise RuntimeError(f"Downloading {key} exited with {download.returncode}")
+        LOGGER.info("Restored Mongo from s3://%s/mongo/%s", self.bucket, key)
+
+    def restore_elasticsearch(self) -> None:
+        repository_url = self.s3_url("elasticsearch")
+        subprocess.run(
+            self.aws_s3("sync", "--delete", "--only-show-errors", repository_url, BACKUP_REPOSITORY_PATH), check=True
+        )
+        subprocess.run(["chown", "-R", f"{ELASTICSEARCH_UID}:0", BACKUP_REPOSITORY_PATH], check=True)
+        self.register_repository()
+        snapshot_names = self.snapshot_names()
+        if not snapshot_names:
+            LOGGER.info("No Elasticsearch snapshot in s3://%s/elasticsearch/, nothing to restore", self.bucket)
+            return
+        snapshot = max(snapshot_names)
+        indices = self.elasticsearch("GET", f"/_snapshot/{SNAPSHOT_REPOSITORY}/{snapshot}")["snapshots"][0]["indices"]
+        # the apiserver may have created some of them empty already
+        for index in indices:
+            self.elasticsearch("DELETE", f"/{index}?ignore_unavailable=true")
+        self.elasticsearch(
+            "POST",
+            f"/_snapshot/{SNAPSHOT_REPOSITORY}/{snapshot}/_restore?wait_for_completion=true",
+            {"indices": SNAPSHOT_INDICES, "include_global_state": False},
+        )
+        LOGGER.info("Restored Elasticsearch from %s", snapshot)
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=["backup", "restore"])
+    parser.add_argument("--bucket", default=os.environ.get("CLEARML_BACKUP_BUCKET"))
+    parser.add_argument(
+        "--data-stores",
+        nargs="*",
+        choices=DATA_STORES,
+        default=os.environ.get("CLEARML_BACKUP_DATA_STORES", " ".join(DATA_STORES)).split(),
+    )
+    parser.add_argument("--mongo-uri", default="mongodb://mongo:27017")
+    parser.add_argument("--elasticsearch-url", default="http://elasticsearch:9200")
+    parser.add_argument(
+        "--keep-snapshots", type=int, default=int(os.environ.get("CLEARML_BACKUP_KEEP_SNAPSHOTS", "24"))
+    )
+    parser.add_argument("--s3-endpoint-url", default=os.environ.get("CLEARML_BACKUP_S3_ENDPOINT_URL") or None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if not args.bucket:
+        parser.error("--bucket or CLEARML_BACKUP_BUCKET is required")
+
+    server_backup = ServerBackup(
+        bucket=args.bucket,
+        data_stores=args.data_stores,
+        mongo_uri=args.mongo_uri,
+        elasticsearch_url=args.elasticsearch_url,
+        keep_snapshots=args.keep_snapshots,
+        s3_endpoint_url=args.s3_endpoint_url,
+    )
+    if args.command == "backup":
+        server_backup.backup()
+    else:
+        server_backup.restore()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""EC2 Image Builder pipeline that produces a pre-baked ClearML server AMI."""
+
+import hashlib
+from pathlib import Path
+from string import Template
+
+from aws_cdk import Stack
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_imagebuilder as imagebuilder
+from aws_cdk import aws_s3_assets as s3_assets
+from constructs import Construct
+
+THIS_DIR = Path(__file__).parent
+DOCKER_COMPOSE_FPATH = THIS_DIR / "resources/docker-compose.yml"
+INSTALL_SCRIPT_FPATH = THIS_DIR / "resources/install-clearml-server-dependencies.sh"
+COMPONENT_TEMPLATE_FPATH = THIS_DIR / "resources/image-builder/clearml-server-component.template.yml"
+
+
+def compute_image_version(*fpaths: Path) -> str:
+    """
+    Derive a semantic version from the contents of the files baked into the image.
+
+    Image Builder components and recipes are immutable, so a new version is needed
+    whenever the install script or the docker-compose file changes.
+    """
+    digest = hashlib.sha256()
+    for fpath in fpaths:
+        digest.update(fpath.read_bytes())
+    return f"1.0.{int(digest.hexdigest()[:6], 16)}"
+
+
+def render_component_document(install_script_s3_uri: str, docker_compose_s3_uri: str) -> str:
+    """Render the Image Builder component document using a templated string."""
+    template = Template(COMPONENT_TEMPLATE_FPATH.read_text(encoding="utf-8"))
+    return template.substitute(
+        {
+            "INSTALL_SCRIPT_S3_URI": install_script_s3_uri,
+            "DOCKER_COMPOSE_S3_URI": docker_compose_s3_uri,
+        }
+    )
+
+
+class ClearMLServerImagePipeline(Construct):
+    """
+    Bakes docker, docker-compose, the CLIs, and every ClearML server image into an AMI.
+
+    The image is built once when the stack is deployed (and again whenever the install script
+    or docker-compose file change). Booting ``ClearMLServerEC2Instance`` from it skips the
+    package installs and image pulls, which dominate the cold-boot time.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param vpc: The VPC to build the image in; the subnet needs internet egress to pull images.
+    :param arm64: Build an image for Graviton instances.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        arm64: bool = False,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        image_version = compute_image_version(INSTALL_SCRIPT_FPATH, DOCKER_COMPOSE_FPATH, COMPONENT_TEMPLATE_FPATH)
+
+        install_script_asset = s3_assets.Asset(self, "InstallScriptAsset", path=str(INSTALL_SCRIPT_FPATH))
+        docker_compose_asset = s3_assets.Asset(self, "DockerComposeAsset", path=str(DOCKER_COMPOSE_FPATH))
+
+        build_role = iam.Role(
+            scope=self,
+            id="ImageBuilderInstanceRole",
+            assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"),
+        )
+        build_role.add_managed_policy(iam.ManagedPolicy.from_aws_managed_policy_name("AmazonSSMManagedInstanceCore"))
+        build_role.add_managed_policy(
+            iam.ManagedPolicy.from_aws_managed_policy_name("EC2InstanceProfileForImageBuilder")
+        )
+        install_script_asset.grant_read(build_role)
+        docker_compose_asset.grant_read(build_role)
+
+        instance_profile = iam.CfnInstanceProfile(self, "ImageBuilderInstanceProfile", roles=[build_role.role_name])
+
+        security_group = ec2.SecurityGroup(self, "ImageBuilderSecurityGroup", vpc=vpc, allow_all_outbound=True)
+        subnet_id = vpc.select_subnets(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS).subnet_ids[0]
+
+        component = imagebuilder.CfnComponent(
+            self,
+            "ClearMLServerComponent",
+            name=f"{Stack.of(self).stack_name}-clearml-server-dependencies",
+            platform="Linux",
+            version=image_version,
+            data=render_component_document(
+                install_script_s3_uri=install_script_asset.s3_object_url,
+                docker_compose_s3_uri=docker_compose_asset.s3_object_url,
+            ),
+        )
+
+        recipe = imagebuilder.CfnImageRecipe(
+            self,
+            "ClearMLServerImageRecipe",
+            name=f"{Stack.of(self).stack_name}-clearml-server",
+            version=image_version,
+            parent_image=ec2.MachineImage.latest_amazon_linux(
+                generation=ec2.AmazonLinuxGeneration.AMAZON_LINUX_2,
+                cpu_type=ec2.AmazonLinuxCpuType.ARM_64 if arm64 else ec2.AmazonLinuxCpuType.X86_64,
+            )
+            .get_image(self)
+            .image_id,
+            components=[imagebuilder.CfnImageRecipe.ComponentConfigurationProperty(component_arn=component.attr_arn)],
+            block_device_mappings=[
+                imagebuilder.CfnImageRecipe.InstanceBlockDeviceMappingProperty(
+                    device_name="/dev/xvda",
+                    ebs=imagebuilder.CfnImageRecipe.EbsInstanceBlockDeviceSpecificationProperty(
+                        volume_size=30,
+                        volume_type="gp3",
+                        delete_on_termination=True,
+                    ),
+                )
+            ],
+        )
+
+        infrastructure_configuration = imagebuilder.CfnInfrastructureConfiguration(
+            self,
+            "ClearMLServerImageInfrastructure",
+            name=f"{Stack.of(self).stack_name}-clearml-server-image",
+            instance_profile_name=instance_profile.ref,
+            instance_types=["t4g.medium" if arm64 else "t3.medium"],
+            subnet_id=subnet_id,
+            security_group_ids=[security_group.security_group_id],
+            terminate_instance_on_failure=True,
+        )
+
+        self.image_pipeline = imagebuilder.CfnImagePipeline(
+            self,
+            "ClearMLServerImagePipeline",
+            name=f"{Stack.of(self).stack_name}-clearml-server",
+            image_recipe_arn=recipe.attr_arn,
+            infrastructure_configuration_arn=infrastructure_configuration.attr_arn,
+        )
+
+        # building the image as part of the deployment means the instance can boot from it right away
+        self.image = imagebuilder.CfnImage(
+            self,
+            "ClearMLServerImage",
+            image_recipe_arn=recipe.attr_arn,
+            infrastructure_configuration_arn=infrastructure_configuration.attr_arn,
+        )
+
+        self.machine_image = ec2.MachineImage.generic_linux({Stack.of(self).region: self.image.attr_image_id})
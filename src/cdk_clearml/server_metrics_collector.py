@@ -0,0 +1,249 @@
+"""
+Metrics of the ClearML server's containers and data stores, sent to the CloudWatch agent as EMF.
+
+The CloudWatch agent on the server publishes the host metrics (memory, disk, connections), but
+it cannot see into the containers. This collector samples, once a minute:
+
+- the CPU and memory of every container, from ``docker stats``;
+- the Elasticsearch JVM heap usage and old-generation GCs, from ``_nodes/_local/stats/jvm``;
+- the Mongo read, write, and command latencies, from ``serverStatus().opLatencies``;
+- the Redis memory usage against its ``maxmemory``, and its evicted keys, from ``INFO``.
+
+The data stores are only reachable on the docker-compose network, so they are queried with
+``docker exec`` through their own CLIs. Each sample is sent as an EMF document to the UDP
+listener of the agent, which publishes it in the ``ClearML/Server`` namespace.
+
+It runs on the host as the ``clearml-metrics-collector`` systemd unit and only depends on the
+standard library:
+
+    python3 server_metrics_collector.py --interval 60 --log-group-name /clearml/<stack name>/server-metrics
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import time
+import urllib.request
+from argparse import ArgumentParser
+from typing import Dict, List, Optional, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+SERVER_METRICS_NAMESPACE = "ClearML/Server"
+
+# the EMF listener of the CloudWatch agent ("logs.metrics_collected.emf" in its configuration)
+AGENT_EMF_ADDRESS = ("127.0.0.1", 25888)
+
+ELASTICSEARCH_CONTAINER = "clearml-elastic"
+MONGO_CONTAINER = "clearml-mongo"
+REDIS_CONTAINER = "clearml-redis"
+
+# cumulative latencies (microseconds) and operation counts, as plain numbers rather than NumberLongs
+MONGO_OP_LATENCIES_SCRIPT = (
+    "var l = db.serverStatus().opLatencies;"
+    "print(JSON.stringify({"
+    "reads: [Number(l.reads.latency), Number(l.reads.ops)],"
+    "writes: [Number(l.writes.latency), Number(l.writes.ops)],"
+    "commands: [Number(l.commands.latency), Number(l.commands.ops)]"
+    "}))"
+)
+
+# (name, value, unit)
+Metric = Tuple[str, float, str]
+
+
+def parse_percent(text: str) -> float:
+    return float(text.strip().rstrip("%") or 0)
+
+
+def container_metrics(docker_stats_lines: List[str], vcpus: int) -> Dict[str, List[Metric]]:
+    """
+    Metrics of every container, by container name, from ``docker stats --format '{{json .}}'``.
+
+    ``docker stats`` counts 100% per vCPU; the CPU utilization here is of the whole instance.
+    The containers have no memory limits, so their memory utilization is of the instance's memory.
+    """
+    metrics = {}
+    for line in docker_stats_lines:
+        if not line.strip():
+            continue
+        stats = json.loads(line)
+        metrics[stats["Name"]] = [
+            ("ContainerCpuUtilization", parse_percent(stats["CPUPerc"]) / vcpus, "Percent"),
+            ("ContainerMemoryUtilization", parse_percent(stats["MemPerc"]), "Percent"),
+        ]
+    return metrics
+
+
+def parse_redis_info(info: str) -> Dict[str, str]:
+    return dict(line.split(":", 1) for line in info.splitlines() if ":" in line and not line.startswith("#"))
+
+
+class ServerMetricsCollector:
+    """
+    Samples the metrics of the containers and data stores.
+
+    Elasticsearch, Mongo, and Redis report cumulative counters; the collector keeps the previous
+    sample to turn them into values per interval, so the first sample has none of them.
+    """
+
+    def __init__(self, vcpus: int):
+        self.vcpus = vcpus
+        self.previous: Dict[str, float] = {}
+
+    def delta(self, key: str, value: float) -> Optional[float]:
+        """How much the counter ``key`` grew since the last sample; ``None`` on the first one."""
+        previous = self.previous.get(key)
+        self.previous[key] = value
+        if previous is None:
+            return None
+        # the counters start over when the container restarts
+        return value - previous if value >= previous else value
+
+    def elasticsearch_metrics(self, node_stats: dict) -> List[Metric]:
+        (node,) = node_stats["nodes"].values()
+        jvm = node["jvm"]
+        old_gc = jvm["gc"]["collectors"]["old"]
+        metrics = [("ElasticsearchJvmHeapUsedPercent", jvm["mem"]["heap_used_percent"], "Percent")]
+        gc_count = self.delta("es_old_gc_count", old_gc["collection_count"])
+        gc_time_ms = self.delta("es_old_gc_time_ms", old_gc["collection_time_in_millis"])
+        if gc_count is not None and gc_time_ms is not None:
+            metrics += [
+                ("ElasticsearchOldGcCount", gc_count, "Count"),
+                ("ElasticsearchOldGcTimeMs", gc_time_ms, "Milliseconds"),
+            ]
+        return metrics
+
+    def mongo_metrics(self, op_latencies: Dict[str, List[float]]) -> List[Metric]:
+        metrics = []
+        for operation, metric_name in (
+            ("reads", "MongoReadLatencyMs"),
+            ("writes", "MongoWriteLatencyMs"),
+            ("commands", "MongoCommandLatencyMs"),
+        ):
+            latency_us, ops = op_latencies[operation]
+            latency_delta = self.delta(f"mongo_{operation}_latency_us", latency_us)
+            ops_delta = self.delta(f"mongo_{operation}_ops", ops)
+            if latency_delta is not None and ops_delta:
+                metrics.append((metric_name, latency_delta / ops_delta / 1000, "Milliseconds"))
+        return metrics
+
+    def redis_metrics(self, info: Dict[str, str]) -> List[Metric]:
+        metrics = []
+        maxmemory = int(info.get("maxmemory", 0))
+        if maxmemory:
+            metrics.append(("RedisMemoryUsedPercent", 100 * int(info["used_memory"]) / maxmemory, "Percent"))
+        evicted_keys = self.delta("redis_evicted_keys", int(info.get("evicted_keys", 0)))
+        if evicted_keys is not None:
+            metrics.append(("RedisEvictedKeys", evicted_keys, "Count"))
+        return metrics
+
+    def collect(self) -> List[Tuple[Dict[str, str], List[Metric]]]:
+        """Every metric of a sample, with its dimensions; a failing source is logged and skipped."""
+        samples: List[Tuple[Dict[str, str], List[Metric]]] = []
+        try:
+            for container, metrics in container_metrics(docker_stats(), self.vcpus).items():
+                samples.append(({"Container": container}, metrics))
+        except Exception:
+            LOGGER.warning("Failed to collect the container metrics", exc_info=True)
+
+        data_store_metrics: List[Metric] = []
+        for data_store, sample in (
+            ("Elasticsearch", lambda: self.elasticsearch_metrics(elasticsearch_stats())),
+            ("Mongo", lambda: self.mongo_metrics(mongo_op_latencies())),
+            ("Redis", lambda: self.redis_metrics(redis_info())),
+        ):
+            try:
+                data_store_metrics += sample()
+            except Exception:
+                LOGGER.warning("Failed to collect the %s metrics", data_store, exc_info=True)
+        if data_store_metrics:
+            samples.append(({}, data_store_metrics))
+        return samples
+
+
+def run(command: List[str]) -> str:
+    return subprocess.run(command, capture_output=True, text=True, timeout=30, check=True).stdout
+
+
+def docker_stats() -> List[str]:
+    return run(["docker", "stats", "--no-stream", "--format", "{{json .}}"]).splitlines()
+
+
+def elasticsearch_stats() -> dict:
+    stats = run(
+        ["docker", "exec", ELASTICSEARCH_CONTAINER, "curl", "-s", "localhost:9200/_nodes/_local/stats/jvm"]
+    )
+    return json.loads(stats)
+
+
+def mongo_op_latencies() -> Dict[str, List[float]]:
+    op_latencies = run(["docker", "exec", MONGO_CONTAINER, "mongo", "--quiet", "--eval", MONGO_OP_LATENCIES_SCRIPT])
+    return json.loads(op_latencies)
+
+
+def redis_info() -> Dict[str, str]:
+    return parse_redis_info(run(["docker", "exec", REDIS_CONTAINER, "redis-cli", "INFO"]))
+
+
+def emf_document(
+    metrics: List[Metric], dimensions: Dict[str, str], timestamp_ms: int, log_group_name: str
+) -> dict:
+    return {
+        "_aws": {
+            "Timestamp": timestamp_ms,
+            "LogGroupName": log_group_name,
+            "CloudWatchMetrics": [
+                {
+                    "Namespace": SERVER_METRICS_NAMESPACE,
+                    "Dimensions": [sorted(dimensions)],
+                    "Metrics": [{"Name": name, "Unit": unit} for name, _, unit in metrics],
+                }
+            ],
+        },
+        **dimensions,
+        **{name: value for name, value, _ in metrics},
+    }
+
+
+def ec2_instance_id() -> str:
+    """The instance ID from the instance metadata service (IMDSv2)."""
+    token_request = urllib.request.Request(
+        "http://169.254.169.254/latest/api/token",
+        method="PUT",
+        headers={"X-aws-ec2-metadata-token-ttl-seconds": "300"},
+    )
+    with urllib.request.urlopen(token_request, timeout=5) as response:
+        token = response.read().decode("utf-8")
+    instance_id_request = urllib.request.Request(
+        "http://169.254.169.254/latest/meta-data/instance-id", headers={"X-aws-ec2-metadata-token": token}
+    )
+    with urllib.request.urlopen(instance_id_request, timeout=5) as response:
+        return response.read().decode("utf-8")
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between samples")
+    parser.add_argument("--log-group-name", required=True, help="Log group the agent writes the EMF documents to")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    instance_id = ec2_instance_id()
+    collector = ServerMetricsCollector(vcpus=os.cpu_count() or 1)
+    agent = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    while True:
+        started_at = time.monotonic()
+        timestamp_ms = int(time.time() * 1000)
+        for dimensions, metrics in collector.collect():
+            document = emf_document(
+                metrics, {"InstanceId": instance_id, **dimensions}, timestamp_ms, args.log_group_name
+            )
+            agent.sendto(json.dumps(document).encode("utf-8"), AGENT_EMF_ADDRESS)
+        time.sleep(max(0.0, args.interval - (time.monotonic() - started_at)))
+
+
+if __name__ == "__main__":
+    main()
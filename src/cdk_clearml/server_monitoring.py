@@ -0,0 +1,312 @@
+"""
+CloudWatch agent configuration, metrics, and alarms of the ClearML server.
+
+The server publishes its metrics in the ``ClearML/Server`` namespace, with an ``InstanceId`` dimension:
+
+- the CloudWatch agent (``render_cloudwatch_agent_config``) publishes the host's memory, the disk
+  usage of the root and data volumes, the CPU I/O wait, and the established TCP connections;
+- ``server_metrics_collector.py`` sends the CPU and memory of every container, the Elasticsearch
+  JVM heap and GCs, the Mongo operation latencies, and the Redis memory to the agent as EMF;
+- the user data publishes how long the bootstrap took.
+
+The alarms are rows of ``server_alarm_specs``, whose thresholds follow the capacity profile where
+it matters. ``ClearMLServerMonitoring`` creates them, along with a composite alarm that goes off as
+soon as any capacity alarm does: a sign that the server needs a larger capacity profile before the
+UI slows down.
+"""
+
+import json
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+from aws_cdk import aws_cloudwatch as cloudwatch
+from aws_cdk import aws_logs as logs
+from constructs import Construct
+from pydantic import BaseModel, validator
+
+from cdk_clearml.capacity import CapacityProfile
+from cdk_clearml.server_metrics_collector import SERVER_METRICS_NAMESPACE
+
+# where the server's cfn-init places the agent configuration and the collector
+CLOUDWATCH_AGENT_CONFIG_FPATH = "/etc/clearml/cloudwatch-agent.json"
+METRICS_COLLECTOR_FPATH = "/usr/local/bin/clearml-metrics-collector.py"
+METRICS_COLLECTOR_UNIT_FPATH = "/etc/systemd/system/clearml-metrics-collector.service"
+
+COMPARISON_OPERATORS: Dict[str, cloudwatch.ComparisonOperator] = {
+    ">": cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+    ">=": cloudwatch.ComparisonOperator.GREATER_THAN_OR_EQUAL_TO_THRESHOLD,
+    "<": cloudwatch.ComparisonOperator.LESS_THAN_THRESHOLD,
+    "<=": cloudwatch.ComparisonOperator.LESS_THAN_OR_EQUAL_TO_THRESHOLD,
+}
+
+# containers of docker-compose.yml whose CPU is alarmed on
+CPU_BOUND_CONTAINERS: Dict[str, str] = {
+    "Apiserver": "clearml-apiserver",
+    "Elasticsearch": "clearml-elastic",
+}
+
+
+class AlarmSpec(BaseModel):
+    """
+    One alarm over a metric of the ClearML server.
+
+    ``ClearMLServerMonitoring`` adds the ``InstanceId`` dimension. Alarms with ``capacity=True``
+    are part of the composite capacity alarm.
+    """
+
+    alarm_id: str
+    description: str
+    metric_name: str
+    namespace: str = SERVER_METRICS_NAMESPACE
+    dimensions: Dict[str, str] = {}
+    statistic: str = "Average"
+    period_min: int = 5
+    comparison: str = ">"
+    threshold: float
+    evaluation_periods: int = 3
+    datapoints_to_alarm: Optional[int] = None
+    capacity: bool = True
+
+    @validator("comparison")
+    def comparison_must_be_known(cls, comparison: str) -> str:  # noqa: N805
+        if comparison not in COMPARISON_OPERATORS:
+            raise ValueError(f"comparison must be one of {sorted(COMPARISON_OPERATORS)}, got '{comparison}'")
+        return comparison
+
+
+def server_alarm_specs(capacity_profile: CapacityProfile, disk_paths: List[str]) -> List[AlarmSpec]:
+    """The alarms of a server of ``capacity_profile`` whose volumes are mounted at ``disk_paths``."""
+    specs = [
+        AlarmSpec(
+            alarm_id="StatusCheckAlarm",
+            description="The ClearML server instance failed its EC2 status checks",
+            namespace="AWS/EC2",
+            metric_name="StatusCheckFailed",
+            statistic="Maximum",
+            period_min=1,
+            comparison=">=",
+            threshold=1,
+            evaluation_periods=2,
+            capacity=False,
+        ),
+        AlarmSpec(
+            alarm_id="CpuAlarm",
+            description="The CPU of the ClearML server was above 80% for 15 minutes",
+            namespace="AWS/EC2",
+            metric_name="CPUUtilization",
+            threshold=80,
+        ),
+        AlarmSpec(
+            alarm_id="CpuIoWaitAlarm",
+            description="The ClearML server waited on its EBS volumes for over 20% of its CPU time for 15 minutes",
+            metric_name="CpuIoWait",
+            # the agent publishes the "totalcpu" measurements of the CPU plugin under cpu=cpu-total
+            dimensions={"cpu": "cpu-total"},
+            threshold=20,
+        ),
+        AlarmSpec(
+            alarm_id="MemoryAlarm",
+            description="The memory usage of the ClearML server was above 90% for 15 minutes",
+            metric_name="MemoryUtilization",
+            threshold=90,
+        ),
+        AlarmSpec(
+            alarm_id="OpenConnectionsAlarm",
+            description="The ClearML server had more established TCP connections than its vCPUs can serve",
+            metric_name="OpenConnections",
+            statistic="Maximum",
+            threshold=250 * capacity_profile.vcpus,
+        ),
+        AlarmSpec(
+            alarm_id="ElasticsearchHeapAlarm",
+            # the heap saws up and down with every GC; its low point is what is still in use
+            description="The Elasticsearch JVM heap stayed above 75% between GCs for 15 minutes",
+            metric_name="ElasticsearchJvmHeapUsedPercent",
+            statistic="Minimum",
+            threshold=75,
+        ),
+        AlarmSpec(
+            alarm_id="ElasticsearchGcAlarm",
+            description="Elasticsearch spent over 10% of its time in old-generation GCs for 10 minutes",
+            metric_name="ElasticsearchOldGcTimeMs",
+            statistic="Sum",
+            threshold=0.1 * 5 * 60 * 1000,
+            evaluation_periods=2,
+        ),
+        AlarmSpec(
+            alarm_id="MongoReadLatencyAlarm",
+            description="Mongo reads took over 50 ms on average for 15 minutes",
+            metric_name="MongoReadLatencyMs",
+            threshold=50,
+        ),
+        AlarmSpec(
+            alarm_id="MongoWriteLatencyAlarm",
+            description="Mongo writes took over 50 ms on average for 15 minutes",
+            metric_name="MongoWriteLatencyMs",
+            threshold=50,
+        ),
+        AlarmSpec(
+            alarm_id="MongoCommandLatencyAlarm",
+            description="Mongo commands took over 100 ms on average for 15 minutes",
+            metric_name="MongoCommandLatencyMs",
+            threshold=100,
+        ),
+        AlarmSpec(
+            alarm_id="RedisMemoryAlarm",
+            description="Redis used over 90% of its maxmemory for 15 minutes; keys without a TTL cannot be evicted",
+            metric_name="RedisMemoryUsedPercent",
+            statistic="Maximum",
+            threshold=90,
+        ),
+    ]
+    for name, container in CPU_BOUND_CONTAINERS.items():
+        specs.append(
+            AlarmSpec(
+                alarm_id=f"{name}CpuAlarm",
+                description=f"{container} used over 70% of the ClearML server's CPU for 15 minutes",
+                metric_name="ContainerCpuUtilization",
+                dimensions={"Container": container},
+                threshold=70,
+            )
+        )
+    for disk_path in disk_paths:
+        name = "Root" if disk_path == "/" else disk_path.rstrip("/").split("/")[-1].title().replace("_", "")
+        specs.append(
+            AlarmSpec(
+                alarm_id=f"{name}DiskAlarm",
+                description=f"The volume mounted at {disk_path} on the ClearML server is over 80% full",
+                metric_name="DiskSpaceUtilization",
+                dimensions={"path": disk_path},
+                statistic="Maximum",
+                threshold=80,
+                evaluation_periods=1,
+            )
+        )
+    if capacity_profile.instance_type.startswith("t"):
+        specs.append(
+            AlarmSpec(
+                alarm_id="CpuCreditAlarm",
+                # a credit is one vCPU at 100% for one minute; once they run out the CPU is throttled
+                description="The burstable ClearML server is about to run out of CPU credits",
+                namespace="AWS/EC2",
+                metric_name="CPUCreditBalance",
+                statistic="Minimum",
+                comparison="<",
+                threshold=30,
+            )
+        )
+    return specs
+
+
+def render_cloudwatch_agent_config(disk_paths: List[str]) -> str:
+    """
+    Configuration of the CloudWatch agent on the server.
+
+    The disk metrics are also aggregated by ``InstanceId`` and ``path`` alone, which is what the
+    disk alarms use, and the agent listens for the EMF documents of ``server_metrics_collector.py``.
+    """
+    config = {
+        "agent": {"metrics_collection_interval": 60},
+        "metrics": {
+            "namespace": SERVER_METRICS_NAMESPACE,
+            "append_dimensions": {"InstanceId": "${aws:InstanceId}"},
+            "aggregation_dimensions": [["InstanceId", "path"]],
+            "metrics_collected": {
+                "mem": {"measurement": [{"name": "mem_used_percent", "rename": "MemoryUtilization"}]},
+                "disk": {
+                    "measurement": [{"name": "used_percent", "rename": "DiskSpaceUtilization"}],
+                    "resources": disk_paths,
+                    "drop_device": True,
+                },
+                "cpu": {"measurement": [{"name": "usage_iowait", "rename": "CpuIoWait"}], "totalcpu": True},
+                "netstat": {"measurement": [{"name": "tcp_established", "rename": "OpenConnections"}]},
+            },
+        },
+        "logs": {"metrics_collected": {"emf": {}}},
+    }
+    return json.dumps(config, indent=2)
+
+
+def render_metrics_collector_unit(log_group_name: str) -> str:
+    """systemd unit running ``server_metrics_collector.py``, as placed on disk by ``ClearMLServerEC2Instance``."""
+    return f"""[Unit]
+Description=Metrics of the ClearML containers and data stores, sent to the CloudWatch agent
+After=docker.service amazon-cloudwatch-agent.service
+Requires=docker.service
+
+[Service]
+ExecStart=/usr/bin/python3 {METRICS_COLLECTOR_FPATH} --interval 60 --log-group-name {log_group_name}
+Restart=always
+RestartSec=30
+
+[Install]
+WantedBy=multi-user.target
+"""
+
+
+class ClearMLServerMonitoring(Construct):
+    """
+    The alarms of ``server_alarm_specs`` for one server instance, a composite capacity alarm, and
+    the log group of the EMF documents of ``server_metrics_collector.py``.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param instance_id: The ID of the ClearML server instance.
+    :param alarm_specs: The alarms to create, usually ``server_alarm_specs(...)``.
+    :param metrics_log_group_name: The log group the CloudWatch agent writes the EMF documents to.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        instance_id: str,
+        alarm_specs: List[AlarmSpec],
+        metrics_log_group_name: str,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+
+        # created here rather than by the agent, so that the documents do not pile up forever
+        self.metrics_log_group = logs.LogGroup(
+            self,
+            "MetricsLogGroup",
+            log_group_name=metrics_log_group_name,
+            retention=logs.RetentionDays.TWO_WEEKS,
+            removal_policy=cdk.RemovalPolicy.DESTROY,
+        )
+
+        self.alarms: Dict[str, cloudwatch.Alarm] = {}
+        for spec in alarm_specs:
+            if spec.alarm_id in self.alarms:
+                raise ValueError(f"Two alarm specs have the ID '{spec.alarm_id}'")
+            self.alarms[spec.alarm_id] = cloudwatch.Alarm(
+                self,
+                spec.alarm_id,
+                alarm_description=spec.description,
+                metric=cloudwatch.Metric(
+                    namespace=spec.namespace,
+                    metric_name=spec.metric_name,
+                    dimensions_map={"InstanceId": instance_id, **spec.dimensions},
+                    statistic=spec.statistic,
+                    period=cdk.Duration.minutes(spec.period_min),
+                ),
+                comparison_operator=COMPARISON_OPERATORS[spec.comparison],
+                threshold=spec.threshold,
+                evaluation_periods=spec.evaluation_periods,
+                datapoints_to_alarm=spec.datapoints_to_alarm,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING,
+            )
+
+        capacity_alarms = [self.alarms[spec.alarm_id] for spec in alarm_specs if spec.capacity]
+        self.capacity_alarm: Optional[cloudwatch.CompositeAlarm] = None
+        if capacity_alarms:
+            self.capacity_alarm = cloudwatch.CompositeAlarm(
+                self,
+                "CapacityAlarm",
+                alarm_description=(
+                    "The ClearML server is running out of capacity (see the alarms in its rule); "
+                    "consider a larger capacity profile"
+                ),
+                alarm_rule=cloudwatch.AlarmRule.any_of(*capacity_alarms),
+            )
@@ -1,7 +1,7 @@
 """Boilerplate stack to make sure the CDK is set up correctly."""
 
 
-from typing import Optional
+from typing import Dict, List, Optional, Union
 
 import aws_cdk as cdk
 from aws_cdk import Stack
@@ -15,12 +15,54 @@ from aws_cdk import aws_s3 as s3
 from aws_cdk import aws_ssm as ssm
 from constructs import Construct
 
+from cdk_clearml.artifact_storage import (
+    ArtifactBucketLifecycleConfig,
+    ArtifactStorageConfig,
+    render_agent_clearml_conf,
+)
+from cdk_clearml.autoscaler_service import AutoscalerServiceConfig, ClearMLAutoscalerService
+from cdk_clearml.backups import BackupsConfig
+from cdk_clearml.capacity import CapacityProfile, resolve_capacity_profile
+from cdk_clearml.dashboard import ClearMLDashboard
+from cdk_clearml.data_volumes import DataVolumesConfig
 from cdk_clearml.ec2_autoscaled_instance import AutoscaledEc2InstanceProfile
-from cdk_clearml.ec2_instance import ClearMLServerEC2Instance
+from cdk_clearml.ec2_instance import MONITORED_DISK_PATHS, ClearMLServerEC2Instance
+from cdk_clearml.elasticsearch_tuning import ElasticsearchTuningConfig
+from cdk_clearml.imported_resources import ImportedResources
+from cdk_clearml.managed_data_stores import ClearMLManagedDataStores, ManagedDataStoresConfig
+from cdk_clearml.server_image import ClearMLServerImagePipeline
+from cdk_clearml.stateless_services import (
+    DATA_STORE_PORTS,
+    HEALTH_CHECKS,
+    ClearMLStatelessServices,
+    StatelessServicesConfig,
+    local_data_store_endpoints,
+)
+from cdk_clearml.worker_cache import WorkerCache, WorkerCacheConfig
 
 
 class ClearMLStack(Stack):
-    """Everything needed to run the ClearML Server on AWS."""
+    """
+    Everything needed to run the ClearML Server on AWS.
+
+    :param artifact_storage: If given, autoscaled agents upload artifacts, models, and debug
+        images straight to the artifact bucket rather than through the ClearML fileserver, and the
+        server deletes the objects of deleted tasks and models from the bucket in batches.
+    :param artifact_bucket_lifecycle: Tiering and expiration rules of the artifact bucket.
+    :param worker_cache: If given, autoscaled workers pull docker images through ECR and pip
+        packages through CodeArtifact, and keep them on their cache volume.
+    :param autoscaler_service: If given, the autoscaler runs as a Fargate service of the stack
+        rather than by hand or on the ``services`` queue of the server.
+    :param stateless_services: If given, the apiserver, webserver, and fileserver run as Fargate
+        services scaling on request count and CPU behind the ALB, and the server instance only runs
+        the data stores. Otherwise, every component runs on the server instance.
+    :param managed_data_stores: If given, Elasticsearch, Mongo, and/or Redis run on OpenSearch
+        Service, DocumentDB, and ElastiCache rather than on the server instance.
+    :param elasticsearch_tuning: Shards, refresh interval, and compression of the event indices, and
+        how long their events are kept, when Elasticsearch runs on the server instance.
+    :param backups: If given, the data volumes are snapshotted on a schedule, and the Mongo and
+        Elasticsearch of the server instance are backed up to S3 and restored on a new server.
+    """
 
     def __init__(
         self,
@@ -28,30 +70,90 @@ class ClearMLStack(Stack):
         construct_id: str,
         top_level_domain_name: str,
         vpc_name: Optional[str] = None,
+        use_prebaked_server_image: bool = False,
+        capacity_profile: Union[str, CapacityProfile] = "small",
+        data_volumes: Optional[DataVolumesConfig] = None,
+        artifact_storage: Optional[ArtifactStorageConfig] = None,
+        artifact_bucket_lifecycle: Optional[ArtifactBucketLifecycleConfig] = None,
+        worker_cache: Optional[WorkerCacheConfig] = None,
+        autoscaler_service: Optional[AutoscalerServiceConfig] = None,
+        stateless_services: Optional[StatelessServicesConfig] = None,
+        managed_data_stores: Optional[ManagedDataStoresConfig] = None,
+        elasticsearch_tuning: Optional[ElasticsearchTuningConfig] = None,
+        backups: Optional[BackupsConfig] = None,
         **kwargs,
     ) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        vpc = ec2.Vpc.from_lookup(self, "VPC", vpc_name=vpc_name)
-        clearml_instance = ClearMLServerEC2Instance(self, "ClearMLServerEC2Instance", vpc=vpc)
+        server_capacity_profile: CapacityProfile = resolve_capacity_profile(capacity_profile)
+
+        self.imported_resources = ImportedResources.of(self)
+        vpc = self.imported_resources.vpc(vpc_name=vpc_name)
 
+        # baking the dependencies into an AMI cuts the time for a replacement instance to come up
+        prebaked_machine_image: Optional[ec2.IMachineImage] = None
+        if use_prebaked_server_image:
+            server_image_pipeline = ClearMLServerImagePipeline(
+                self,
+                "ClearMLServerImagePipeline",
+                vpc=vpc,
+                arm64=server_capacity_profile.is_graviton,
+            )
+            prebaked_machine_image = server_image_pipeline.machine_image
+
+        artifact_bucket_lifecycle = artifact_bucket_lifecycle or ArtifactBucketLifecycleConfig()
         artifact_bucket = s3.Bucket(
             self,
             "clearml-artifact-storage",
             versioned=False,
             encryption=s3.BucketEncryption.S3_MANAGED,
+            lifecycle_rules=artifact_bucket_lifecycle_rules(artifact_bucket_lifecycle),
             # Change to retain for production.
             removal_policy=cdk.RemovalPolicy.DESTROY,
         )
 
+        self.managed_data_stores: Optional[ClearMLManagedDataStores] = None
+        if managed_data_stores:
+            self.managed_data_stores = ClearMLManagedDataStores(
+                self, "ManagedDataStores", vpc=vpc, config=managed_data_stores
+            )
+        managed_endpoints = self.managed_data_stores.endpoints if self.managed_data_stores else {}
+
+        clearml_instance = ClearMLServerEC2Instance(
+            self,
+            "ClearMLServerEC2Instance",
+            vpc=vpc,
+            prebaked_machine_image=prebaked_machine_image,
+            capacity_profile=server_capacity_profile,
+            data_volumes=data_volumes,
+            s3_batch_delete_bucket_name=artifact_bucket.bucket_name if artifact_storage else None,
+            stores_only=stateless_services is not None,
+            files_host=f"https://files.clearml.{top_level_domain_name}",
+            external_data_stores=managed_endpoints,
+            elasticsearch_tuning=elasticsearch_tuning,
+            backups=backups,
+        )
+
         artifact_bucket.grant_read_write(clearml_instance.ec2_instance.role)
 
         self.autoscaled_instance_profile = AutoscaledEc2InstanceProfile(
             self,
             construct_id="AutoscaledInstanceProfile",
             artifacts_bucket=artifact_bucket,
+            agent_clearml_conf=render_agent_clearml_conf(
+                bucket_name=artifact_bucket.bucket_name,
+                aws_region=self.region,
+                config=artifact_storage,
+            )
+            if artifact_storage
+            else None,
         )
 
+        self.worker_cache: Optional[WorkerCache] = None
+        if worker_cache:
+            self.worker_cache = WorkerCache(self, "WorkerCache", vpc=vpc, config=worker_cache)
+            self.worker_cache.grant_use(self.autoscaled_instance_profile.role)
+
         alb = elbv2.ApplicationLoadBalancer(
             self,
             "ClearMLServerALB",
@@ -60,11 +162,44 @@ class ClearMLStack(Stack):
             security_group=clearml_instance.security_group,
         )
 
-        hosted_zone = route53.HostedZone.from_lookup(
-            self,
-            "hosted-zone",
-            domain_name=top_level_domain_name,
-        )
+        # what the ALB forwards app.clearml, files.clearml, and api.clearml to
+        self.stateless_services: Optional[ClearMLStatelessServices] = None
+        if stateless_services:
+            self.stateless_services = ClearMLStatelessServices(
+                self,
+                "StatelessServices",
+                vpc=vpc,
+                config=stateless_services,
+                data_stores={
+                    **local_data_store_endpoints(
+                        host=clearml_instance.ec2_instance.instance_private_ip,
+                        security_group=clearml_instance.security_group,
+                        data_stores=[
+                            data_store for data_store in DATA_STORE_PORTS if data_store not in managed_endpoints
+                        ],
+                    ),
+                    **managed_endpoints,
+                },
+                api_host=f"https://api.clearml.{top_level_domain_name}",
+                files_host=f"https://files.clearml.{top_level_domain_name}",
+            )
+            # the apiserver initializes the databases, which must be up by then
+            self.stateless_services.node.add_dependency(clearml_instance.server_ready_wait_condition)
+            targets = self.stateless_services.targets
+            health_checks = HEALTH_CHECKS
+        else:
+            instance_target = elbv2_targets.InstanceTarget(clearml_instance.ec2_instance)
+            targets = {"app": instance_target, "files": instance_target, "api": instance_target}
+            # every target group checks the web server
+            webserver_health_check = elbv2.HealthCheck(
+                enabled=True,
+                port=str(8080),
+                path="/",
+                protocol=elbv2.Protocol.HTTP,
+            )
+            health_checks = {name: webserver_health_check for name in targets}
+
+        hosted_zone = self.imported_resources.hosted_zone(domain_name=top_level_domain_name)
 
         dns_validated_cert = acm.Certificate(
             self,
@@ -88,6 +223,7 @@ class ClearMLStack(Stack):
         # https://app.clearml -> ec2:8080
         # https://files.clearml -> ec2:8081
         # https://api.clearml -> ec2:8008
+        # or, with stateless_services, to the webserver, fileserver, and apiserver Fargate services
 
         https_listener = alb.add_listener(
             "listener",
@@ -102,46 +238,94 @@ class ClearMLStack(Stack):
             ),
         )
 
-        map_subdomain_to_alb_to_ec2(
-            scope=self,
-            alb=alb,
-            top_level_domain_name=top_level_domain_name,
-            subdomain="app.clearml",
-            port=8080,
-            https_listener=https_listener,
-            ec2_vpc=vpc,
-            ec2_instance=clearml_instance.ec2_instance,
-            priority=1,
-        )
-        map_subdomain_to_alb_to_ec2(
-            scope=self,
-            alb=alb,
-            top_level_domain_name=top_level_domain_name,
-            subdomain="files.clearml",
-            port=8081,
-            https_listener=https_listener,
-            ec2_vpc=vpc,
-            ec2_instance=clearml_instance.ec2_instance,
-            priority=2,
-        )
-        map_subdomain_to_alb_to_ec2(
-            scope=self,
-            alb=alb,
-            top_level_domain_name=top_level_domain_name,
-            subdomain="api.clearml",
-            port=8008,
-            https_listener=https_listener,
-            ec2_vpc=vpc,
-            ec2_instance=clearml_instance.ec2_instance,
-            priority=3,
+        target_groups: Dict[str, elbv2.ApplicationTargetGroup] = {}
+        for priority, (name, port) in enumerate((("app", 8080), ("files", 8081), ("api", 8008)), start=1):
+            target_groups[name] = map_subdomain_to_alb(
+                scope=self,
+                alb=alb,
+                top_level_domain_name=top_level_domain_name,
+                hosted_zone=hosted_zone,
+                subdomain=f"{name}.clearml",
+                port=port,
+                https_listener=https_listener,
+                vpc=vpc,
+                target=targets[name],
+                health_check=health_checks[name],
+                priority=priority,
+            )
+        if self.stateless_services:
+            self.stateless_services.scale_on_request_count(target_groups)
+
+        server_monitoring = clearml_instance.monitoring
+        self.dashboard = ClearMLDashboard(
+            self,
+            "ClearMLDashboard",
+            load_balancer=alb,
+            target_groups=target_groups,
+            instance_id=clearml_instance.ec2_instance.instance_id,
+            disk_paths=MONITORED_DISK_PATHS,
+            data_volumes=clearml_instance.data_volumes.volumes,
+            alarms=[
+                *server_monitoring.alarms.values(),
+                *([server_monitoring.capacity_alarm] if server_monitoring.capacity_alarm else []),
+            ],
         )
 
+        self.autoscaler_service: Optional[ClearMLAutoscalerService] = None
+        if autoscaler_service:
+            agent_parameters = {}
+            agent_clearml_conf_parameter = self.autoscaled_instance_profile.agent_clearml_conf_parameter
+            if agent_clearml_conf_parameter:
+                agent_parameters["--agent-clearml-conf-parameter"] = agent_clearml_conf_parameter
+            if self.worker_cache:
+                agent_parameters["--agent-vm-bash-script-parameter"] = self.worker_cache.vm_bash_script_parameter
+            self.autoscaler_service = ClearMLAutoscalerService(
+                self,
+                "AutoscalerService",
+                vpc=vpc,
+                config=autoscaler_service,
+                api_host=f"https://api.clearml.{top_level_domain_name}",
+                web_host=f"https://app.clearml.{top_level_domain_name}",
+                files_host=f"https://files.clearml.{top_level_domain_name}",
+                worker_role=self.autoscaled_instance_profile.role,
+                worker_instance_profile=self.autoscaled_instance_profile.instance_profile,
+                agent_parameters=agent_parameters,
+            )
+            cdk.CfnOutput(
+                self,
+                id="AutoscalerConfigParameterName",
+                value=self.autoscaler_service.config_parameter.parameter_name,
+                description="Configuration of the autoscaler service; redeploy the stack to change it",
+            )
+
         cdk.CfnOutput(
             self,
             id="AutoscaledInstanceProfileARN",
             value=self.autoscaled_instance_profile.instance_profile.attr_arn,
         )
 
+        if self.autoscaled_instance_profile.agent_clearml_conf_parameter:
+            cdk.CfnOutput(
+                self,
+                id="AgentClearMLConfParameterName",
+                value=self.autoscaled_instance_profile.agent_clearml_conf_parameter.parameter_name,
+                description="Pass to aws_autoscaler.py with --agent-clearml-conf-parameter",
+            )
+
+        if self.worker_cache:
+            cdk.CfnOutput(
+                self,
+                id="AgentVmBashScriptParameterName",
+                value=self.worker_cache.vm_bash_script_parameter.parameter_name,
+                description="Pass to aws_autoscaler.py with --agent-vm-bash-script-parameter",
+            )
+            cdk.CfnOutput(
+                self,
+                id="WorkerCacheRegistry",
+                value=self.worker_cache.registry_host,
+                description="Prefix default_docker_image with <registry>/<pull-through cache prefix>/",
+            )
+
         # cdk.CfnOutput(
         #     self,
         #     "SubnetIds",
@@ -161,31 +345,67 @@ class ClearMLStack(Stack):
         )
 
 
-def map_subdomain_to_alb_to_ec2(
+def artifact_bucket_lifecycle_rules(config: ArtifactBucketLifecycleConfig) -> List[s3.LifecycleRule]:
+    """Translate the lifecycle config of the artifact bucket into S3 lifecycle rules."""
+    lifecycle_rules = [
+        s3.LifecycleRule(
+            id="abort-incomplete-multipart-uploads",
+            abort_incomplete_multipart_upload_after=cdk.Duration.days(
+                config.abort_incomplete_multipart_uploads_after_days
+            ),
+        )
+    ]
+
+    if config.intelligent_tiering_after_days is not None:
+        lifecycle_rules.append(
+            s3.LifecycleRule(
+                id="intelligent-tiering",
+                transitions=[
+                    s3.Transition(
+                        storage_class=s3.StorageClass.INTELLIGENT_TIERING,
+                        transition_after=cdk.Duration.days(config.intelligent_tiering_after_days),
+                    )
+                ],
+            )
+        )
+
+    for prefix, days in config.expire_after_days_by_prefix.items():
+        lifecycle_rules.append(
+            s3.LifecycleRule(
+                id=f"expire-{prefix.strip('/').replace('/', '-')}",
+                prefix=prefix,
+                expiration=cdk.Duration.days(days),
+            )
+        )
+
+    return lifecycle_rules
+
+
+def map_subdomain_to_alb(
     scope: Construct,
     alb: elbv2.ApplicationLoadBalancer,
     top_level_domain_name: str,
-    ec2_instance: ec2.Instance,
-    ec2_vpc: str,
+    hosted_zone: route53.IHostedZone,
+    target: elbv2.IApplicationLoadBalancerTarget,
+    health_check: elbv2.HealthCheck,
+    vpc: ec2.IVpc,
     subdomain: str,
     port: int,
     https_listener: elbv2.ApplicationListener,
     priority: int,
-) -> None:
+) -> elbv2.ApplicationTargetGroup:
     """
     Map a subdomain to an Application Load Balancer.
 
-    `<subdomain>.<top-level-domain> -> ALB -> <ec2-instance>:<port>`
+    `<subdomain>.<top-level-domain> -> ALB -> <target>:<port>`
+
+    :param target: The server instance, or the Fargate service of ``ClearMLStatelessServices``;
+        a Fargate service is registered on the port of its container rather than ``port``.
+    :return: The target group the subdomain is forwarded to.
     """
     subdomain_id_string = subdomain.replace(".", "-")
     fully_qualified_subdomain = f"{subdomain}.{top_level_domain_name}"
 
-    hosted_zone = route53.HostedZone.from_lookup(
-        scope,
-        f"{subdomain_id_string}-hosted-zone",
-        domain_name=top_level_domain_name,
-    )
-
     # map the subdomain to the ALB
     route53.ARecord(
         scope,
@@ -199,15 +419,10 @@ def map_subdomain_to_alb_to_ec2(
         scope,
         f"{subdomain_id_string}-target-group",
         port=port,
-        targets=[elbv2_targets.InstanceTarget(ec2_instance)],
+        targets=[target],
         protocol=elbv2.ApplicationProtocol.HTTP,
-        vpc=ec2_vpc,
-        health_check=elbv2.HealthCheck(
-            enabled=True,
-            port=str(8080),
-            path="/",
-            protocol=elbv2.Protocol.HTTP,
-        ),
+        vpc=vpc,
+        health_check=health_check,
     )
 
     # route to this target group if the host begins with the subdomain
@@ -223,3 +438,5 @@ def map_subdomain_to_alb_to_ec2(
             target_groups=[target_group],
         ),
     )
+
+    return target_group
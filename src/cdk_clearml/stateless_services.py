@@ -0,0 +1,384 @@
+"""
+The apiserver, webserver, and fileserver as autoscaled Fargate services behind the ALB.
+
+By default ``ClearMLServerEC2Instance`` runs every service of ``docker-compose.yml`` on one
+instance, and the apiserver saturates it when many agents report at once. In the split topology
+(``ClearMLStack(stateless_services=...)``):
+
+- the server instance only runs Elasticsearch, Mongo, Redis, and the jobs next to them, from the
+  docker-compose file rendered by ``render_stores_docker_compose``, with the ports of the data
+  stores published to the VPC;
+- the apiserver, webserver, and fileserver each run as a Fargate service, registered in the ALB
+  target groups of ``api.clearml``, ``app.clearml``, and ``files.clearml``, and scale on the
+  request count per task and on CPU;
+- the fileserver keeps its files on an EFS file system shared by its tasks.
+
+Only the apiserver reaches the data stores; agents and browsers go through the ALB as before.
+The ``agent-services`` container is not run in this topology; run the autoscaler with
+``ClearMLStack(autoscaler_service=...)`` instead.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import aws_cdk as cdk
+import yaml
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecs as ecs
+from aws_cdk import aws_efs as efs
+from aws_cdk import aws_elasticloadbalancingv2 as elbv2
+from aws_cdk import aws_logs as logs
+from constructs import Construct
+from pydantic import BaseModel, root_validator
+
+from cdk_clearml.autoscaler_service import check_fargate_size
+from cdk_clearml.capacity import APISERVER_MIB_PER_WORKER, MAX_APISERVER_WORKERS
+from cdk_clearml.managed_data_stores import (
+    DATA_STORE_ENVIRONMENT_PREFIXES,
+    MONGO_CA_BUNDLE_FPATH,
+    MONGO_CA_BUNDLE_URL,
+    DataStoreEndpoint,
+    elasticsearch_tls_environment,
+    mongo_uri_environment,
+)
+
+THIS_DIR = Path(__file__).parent
+DOCKER_COMPOSE_FPATH = THIS_DIR / "resources/docker-compose.yml"
+
+# the docker-compose.yml services that move to Fargate, and the ones needing them
+STATELESS_SERVICES = ["apiserver", "webserver", "fileserver"]
+APISERVER_CLIENT_SERVICES = ["agent-services"]
+
+# the ALB target group (by subdomain, as in ClearMLStack) of every service
+SUBDOMAIN_SERVICES: Dict[str, str] = {
+    "app": "webserver",
+    "files": "fileserver",
+    "api": "apiserver",
+}
+
+# health checks of the ALB target groups; the fileserver has no health endpoint, but answers GET /
+# with a 405 once it is up
+HEALTH_CHECKS: Dict[str, elbv2.HealthCheck] = {
+    "app": elbv2.HealthCheck(path="/"),
+    "files": elbv2.HealthCheck(path="/", healthy_http_codes="200-499"),
+    "api": elbv2.HealthCheck(path="/debug.ping"),
+}
+
+# ports of the data stores, published on the server instance for the apiserver tasks
+DATA_STORE_PORTS: Dict[str, int] = {
+    "elasticsearch": 9200,
+    "mongo": 27017,
+    "redis": 6379,
+}
+
+FILESERVER_DATA_PATH = "/mnt/fileserver"
+
+# the entrypoint of the allegroai/clearml image, which takes the service to run
+CLEARML_IMAGE_ENTRYPOINT = "/opt/clearml/wrapper.sh"
+
+
+class StatelessServiceConfig(BaseModel):
+    """
+    Task size and scaling of one Fargate service.
+
+    :param cpu: CPU units of a task.
+    :param memory_mib: Memory of a task.
+    :param min_tasks: Tasks running at all times; two or more keep the service up during deployments.
+    :param max_tasks: Upper bound of the scaling.
+    :param target_cpu_utilization_percent: Average CPU utilization the scaling aims for.
+    :param target_requests_per_task_per_minute: ALB requests per task and minute the scaling aims for.
+    """
+
+    cpu: int = 1024
+    memory_mib: int = 2048
+    min_tasks: int = 2
+    max_tasks: int = 8
+    target_cpu_utilization_percent: int = 60
+    target_requests_per_task_per_minute: int = 3000
+
+    @root_validator(skip_on_failure=True)
+    def must_be_a_valid_fargate_service(cls, values: dict) -> dict:  # noqa: N805
+        check_fargate_size(values["cpu"], values["memory_mib"])
+        if not 1 <= values["min_tasks"] <= values["max_tasks"]:
+            raise ValueError(
+                f"Expected 1 <= min_tasks <= max_tasks, got {values['min_tasks']} and {values['max_tasks']}"
+            )
+        if not 10 <= values["target_cpu_utilization_percent"] <= 90:
+            raise ValueError("target_cpu_utilization_percent must be between 10 and 90")
+        return values
+
+
+class StatelessServicesConfig(BaseModel):
+    """The apiserver does the heavy lifting; the webserver only serves static files and proxies."""
+
+    apiserver: StatelessServiceConfig = StatelessServiceConfig(cpu=1024, memory_mib=2048, min_tasks=2, max_tasks=10)
+    webserver: StatelessServiceConfig = StatelessServiceConfig(cpu=256, memory_mib=512, min_tasks=2, max_tasks=4)
+    fileserver: StatelessServiceConfig = StatelessServiceConfig(cpu=512, memory_mib=1024, min_tasks=2, max_tasks=6)
+
+
+def apiserver_workers(config: StatelessServiceConfig) -> int:
+    """Gunicorn workers of an apiserver task, two per vCPU as on the server instance."""
+    return max(1, min(2 * config.cpu // 1024, config.memory_mib // APISERVER_MIB_PER_WORKER, MAX_APISERVER_WORKERS))
+
+
+def render_stores_docker_compose(docker_compose_yaml: str) -> str:
+    """
+    Render the docker-compose file of a server instance that only runs the data stores.
+
+    The stateless services and the services talking to the apiserver are removed, the ports of
+    the data stores are published, and the async delete job deletes files through
+    ``CLEARML_FILES_HOST`` (set in the ``.env`` file) instead of the local fileserver.
+    """
+    docker_compose = yaml.safe_load(docker_compose_yaml)
+    services: dict = docker_compose["services"]
+    removed_services = STATELESS_SERVICES + APISERVER_CLIENT_SERVICES
+    for service_name in removed_services:
+        services.pop(service_name, None)
+
+    for service in services.values():
+        if "depends_on" in service:
+            service["depends_on"] = [name for name in service["depends_on"] if name not in removed_services]
+    for service_name, port in DATA_STORE_PORTS.items():
+        services[service_name]["ports"] = [f"{port}:{port}"]
+
+    async_delete_entrypoint: List[str] = services["async_delete"]["entrypoint"]
+    fileserver_host_index = async_delete_entrypoint.index("--fileserver-host") + 1
+    async_delete_entrypoint[fileserver_host_index] = "${CLEARML_FILES_HOST}"
+
+    return (
+        "# rendered by cdk_clearml.stateless_services from docker-compose.yml: the data stores only\n"
+        + yaml.safe_dump(docker_compose, sort_keys=False)
+    )
+
+
+def local_data_store_endpoints(
+    host: str, security_group: ec2.ISecurityGroup, data_stores: List[str]
+) -> Dict[str, DataStoreEndpoint]:
+    """The endpoints of ``data_stores`` running on the server instance, on their published ports."""
+    return {
+        data_store: DataStoreEndpoint(
+            host=host,
+            port=str(DATA_STORE_PORTS[data_store]),
+            connections=ec2.Connections(
+                security_groups=[security_group], default_port=ec2.Port.tcp(DATA_STORE_PORTS[data_store])
+            ),
+        )
+        for data_store in data_stores
+    }
+
+
+def docker_compose_service(service_name: str) -> dict:
+    """A service of ``docker-compose.yml``, so that the Fargate tasks run the same image and command."""
+    return yaml.safe_load(DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8"))["services"][service_name]
+
+
+class ClearMLStatelessServices(Construct):
+    """
+    Fargate services running the apiserver, webserver, and fileserver of ClearML.
+
+    Register ``targets`` in the ALB target groups, then call ``scale_on_request_count`` with them.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param vpc: The VPC of the server instance and the ALB.
+    :param config: Task sizes and scaling of the services.
+    :param data_stores: Where the apiserver finds Elasticsearch, Mongo, and Redis: on the server
+        instance (``local_data_store_endpoints``) or managed (``ClearMLManagedDataStores``). The
+        apiserver tasks are let in.
+    :param api_host: URL of the API server behind the ALB, for the webserver.
+    :param files_host: URL of the fileserver behind the ALB, for the webserver.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        config: StatelessServicesConfig,
+        data_stores: Dict[str, DataStoreEndpoint],
+        api_host: str,
+        files_host: str,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        self.config = config
+        self.task_counts: Dict[str, ecs.ScalableTaskCount] = {}
+        self.cluster = ecs.Cluster(self, "Cluster", vpc=vpc, container_insights=True)
+
+        apiserver_environment = {
+            "CLEARML_SERVER_DEPLOYMENT_TYPE": "linux",
+            # every task would pre-populate the database with the example projects
+            "CLEARML__apiserver__pre_populate__enabled": "false",
+            "CLEARML__services__async_urls_delete__enabled": "true",
+            "CLEARML_USE_GUNICORN": "1",
+            "CLEARML_GUNICORN_WORKERS": str(apiserver_workers(config.apiserver)),
+        }
+        for data_store, endpoint in data_stores.items():
+            prefix = DATA_STORE_ENVIRONMENT_PREFIXES[data_store]
+            apiserver_environment[f"{prefix}_HOST"] = endpoint.host
+            apiserver_environment[f"{prefix}_PORT"] = endpoint.port
+            if data_store == "elasticsearch" and endpoint.tls:
+                apiserver_environment.update(elasticsearch_tls_environment())
+
+        # ECS cannot put a secret into the middle of a variable, so the shell puts the Mongo password
+        # into its connection URIs
+        apiserver_secrets: Dict[str, ecs.Secret] = {}
+        apiserver_entry_point: Optional[List[str]] = None
+        apiserver_command: Optional[List[str]] = None
+        mongo_endpoint = data_stores["mongo"]
+        mongo_credentials = mongo_endpoint.credentials
+        if mongo_credentials:
+            apiserver_secrets = {
+                "CLEARML_MONGODB_USERNAME": ecs.Secret.from_secrets_manager(mongo_credentials, "username"),
+                "CLEARML_MONGODB_PASSWORD": ecs.Secret.from_secrets_manager(mongo_credentials, "password"),
+            }
+            mongo_uris = mongo_uri_environment(
+                "$CLEARML_MONGODB_USERNAME",
+                "$CLEARML_MONGODB_PASSWORD",
+                mongo_endpoint.host,
+                mongo_endpoint.port,
+                tls=mongo_endpoint.tls,
+            )
+            exports = " ".join(f'{name}="{uri}"' for name, uri in mongo_uris.items())
+            # the image has no CA bundle of DocumentDB, so the task downloads it before the apiserver starts
+            download_ca_bundle = (
+                'python3 -c "import urllib.request; '
+                f"urllib.request.urlretrieve('{MONGO_CA_BUNDLE_URL}', '{MONGO_CA_BUNDLE_FPATH}')\" && "
+                if mongo_endpoint.tls
+                else ""
+            )
+            apiserver_entry_point = ["/bin/sh", "-c"]
+            apiserver_command = [f"{download_ca_bundle}export {exports} && exec {CLEARML_IMAGE_ENTRYPOINT} apiserver"]
+
+        self.apiserver = self.add_service(
+            "apiserver",
+            config=config.apiserver,
+            container_port=8008,
+            environment=apiserver_environment,
+            secrets=apiserver_secrets,
+            entry_point=apiserver_entry_point,
+            command=apiserver_command,
+        )
+        for endpoint in data_stores.values():
+            endpoint.connections.allow_default_port_from(self.apiserver)
+
+        self.webserver = self.add_service(
+            "webserver",
+            config=config.webserver,
+            container_port=80,
+            environment={"NGINX_APISERVER_ADDRESS": api_host, "NGINX_FILESERVER_ADDRESS": files_host},
+        )
+
+        # the tasks of the fileserver share their files
+        self.fileserver_file_system = efs.FileSystem(
+            self,
+            "FileserverData",
+            vpc=vpc,
+            encrypted=True,
+            performance_mode=efs.PerformanceMode.GENERAL_PURPOSE,
+            removal_policy=cdk.RemovalPolicy.RETAIN,
+        )
+        self.fileserver = self.add_service(
+            "fileserver",
+            config=config.fileserver,
+            container_port=8081,
+            environment={"CLEARML__fileserver__delete__allow_batch": "true"},
+            file_system=self.fileserver_file_system,
+            mount_path=FILESERVER_DATA_PATH,
+        )
+        self.fileserver_file_system.connections.allow_default_port_from(self.fileserver)
+
+        services: Dict[str, ecs.FargateService] = {
+            "apiserver": self.apiserver,
+            "webserver": self.webserver,
+            "fileserver": self.fileserver,
+        }
+        self.targets: Dict[str, elbv2.IApplicationLoadBalancerTarget] = {
+            subdomain: services[service_name].load_balancer_target(
+                container_name=service_name,
+                container_port=services[service_name].task_definition.default_container.container_port,
+            )
+            for subdomain, service_name in SUBDOMAIN_SERVICES.items()
+        }
+
+    def add_service(
+        self,
+        service_name: str,
+        config: StatelessServiceConfig,
+        container_port: int,
+        environment: Dict[str, str],
+        secrets: Optional[Dict[str, ecs.Secret]] = None,
+        entry_point: Optional[List[str]] = None,
+        command: Optional[List[str]] = None,
+        file_system: Optional[efs.IFileSystem] = None,
+        mount_path: Optional[str] = None,
+    ) -> ecs.FargateService:
+        """
+        A Fargate service running ``service_name`` of ``docker-compose.yml``, scaling on CPU.
+
+        :param command: Overrides the command of the docker-compose service, e.g. along with ``entry_point``.
+        """
+        compose_service = docker_compose_service(service_name)
+        task_definition = ecs.FargateTaskDefinition(
+            self, f"{service_name}-task-definition", cpu=config.cpu, memory_limit_mib=config.memory_mib
+        )
+        container = task_definition.add_container(
+            service_name,
+            image=ecs.ContainerImage.from_registry(compose_service["image"]),
+            entry_point=entry_point,
+            command=command or compose_service["command"],
+            environment=environment,
+            secrets=secrets,
+            port_mappings=[ecs.PortMapping(container_port=container_port)],
+            logging=ecs.LogDrivers.aws_logs(stream_prefix=service_name, log_retention=logs.RetentionDays.ONE_MONTH),
+        )
+        if file_system:
+            task_definition.add_volume(
+                name=f"{service_name}-data",
+                efs_volume_configuration=ecs.EfsVolumeConfiguration(
+                    file_system_id=file_system.file_system_id, transit_encryption="ENABLED"
+                ),
+            )
+            container.add_mount_points(
+                ecs.MountPoint(container_path=mount_path, source_volume=f"{service_name}-data", read_only=False)
+            )
+
+        service = ecs.FargateService(
+            self,
+            f"{service_name}-service",
+            cluster=self.cluster,
+            task_definition=task_definition,
+            desired_count=config.min_tasks,
+            # start the new tasks before stopping the old ones
+            min_healthy_percent=100,
+            max_healthy_percent=200,
+            circuit_breaker=ecs.DeploymentCircuitBreaker(rollback=True),
+            vpc_subnets=ec2.SubnetSelection(subnet_type=ec2.SubnetType.PRIVATE_WITH_EGRESS),
+        )
+        task_count = service.auto_scale_task_count(min_capacity=config.min_tasks, max_capacity=config.max_tasks)
+        task_count.scale_on_cpu_utilization(
+            "CpuScaling",
+            target_utilization_percent=config.target_cpu_utilization_percent,
+            scale_out_cooldown=cdk.Duration.minutes(1),
+            scale_in_cooldown=cdk.Duration.minutes(5),
+        )
+        self.task_counts[service_name] = task_count
+        return service
+
+    def scale_on_request_count(self, target_groups: Dict[str, elbv2.ApplicationTargetGroup]) -> None:
+        """
+        Scale every service on the requests per task of its target group.
+
+        :param target_groups: The ALB target groups of ``targets``, by subdomain; they must be
+            attached to a listener already.
+        """
+        for subdomain, target_group in target_groups.items():
+            service_name = SUBDOMAIN_SERVICES[subdomain]
+            config: StatelessServiceConfig = getattr(self.config, service_name)
+            self.task_counts[service_name].scale_on_request_count(
+                "RequestCountScaling",
+                requests_per_target=config.target_requests_per_task_per_minute,
+                target_group=target_group,
+                scale_out_cooldown=cdk.Duration.minutes(1),
+                scale_in_cooldown=cdk.Duration.minutes(5),
+            )
@@ -0,0 +1,85 @@
+"""
+Rendering of the ClearML server user data script.
+
+This module deliberately does not import ``aws_cdk`` so that the script can be rendered
+on its own, e.g. to run the bootstrap in a local container:
+
+    python -m cdk_clearml.user_data > user-data.sh
+"""
+
+from pathlib import Path
+from string import Template
+
+THIS_DIR = Path(__file__).parent
+USER_DATA_TEMPLATE_FPATH = THIS_DIR / "resources/user-data.template.sh"
+
+API_READINESS_CHECK_URL = "http://localhost:8008/debug.ping"
+DATA_STORES_READINESS_CHECK_URL = "http://localhost:9200/_cluster/health?wait_for_status=yellow&timeout=1s"
+
+
+def render_user_data_script(
+    aws_account_id: str,
+    aws_region: str,
+    stack_name: str,
+    logical_ec2_instance_resource_id: str,
+    install_dependencies: bool = True,
+    stores_only: bool = False,
+    local_elasticsearch: bool = True,
+    backups: bool = False,
+    restore_from_most_recent_backup: bool = False,
+):
+    """
+    Render the user data script using a templated string.
+
+    The user data only runs on the first boot of an instance, so it deliberately holds nothing
+    that changes with the server's configuration: the docker-compose file, the .env file, and the
+    URL of the wait condition handle are placed on disk by cfn-init, and cfn-hup applies their
+    changes in place (see ``update-clearml-server.sh``).
+
+    :param logical_ec2_instance_resource_id: Logical ID of the instance, whose metadata cfn-hup watches.
+    :param install_dependencies: False if the instance boots from the pre-baked server AMI,
+        which already contains the packages and docker images.
+    :param stores_only: True if the docker-compose file only runs the data stores; the bootstrap
+        then waits for Elasticsearch rather than the API server, and starts no agent.
+    :param local_elasticsearch: False if Elasticsearch is managed; an instance that only runs
+        the remaining data stores then has nothing to wait for.
+    :param backups: The ``backup`` docker-compose service runs on a schedule, see ``backups.py``.
+    :param restore_from_most_recent_backup: Restore Mongo and Elasticsearch from their most recent
+        backups in S3 when the data volumes are new.
+    """
+    if not stores_only:
+        readiness_check_url = API_READINESS_CHECK_URL
+    elif local_elasticsearch:
+        readiness_check_url = DATA_STORES_READINESS_CHECK_URL
+    else:
+        readiness_check_url = ""
+
+    user_data_template = USER_DATA_TEMPLATE_FPATH.read_text(encoding="utf-8")
+
+    template = Template(user_data_template)
+    return template.substitute(
+        {
+            "AWS_ACCOUNT_ID": aws_account_id,
+            "AWS_REGION": aws_region,
+            "STACK_NAME": stack_name,
+            "LOGICAL_EC2_INSTANCE_RESOURCE_ID": logical_ec2_instance_resource_id,
+            "BACKUPS": "true" if backups else "false",
+            "RESTORE_FROM_MOST_RECENT_BACKUP": "true" if restore_from_most_recent_backup else "false",
+            "INSTALL_CLEARML_SERVER_DEPENDENCIES": "true" if install_dependencies else "false",
+            "SERVER_IMAGE_TYPE": "stock" if install_dependencies else "prebaked",
+            "READINESS_CHECK_URL": readiness_check_url,
+            "START_DEFAULT_QUEUE_AGENT": "false" if stores_only else "true",
+            "TUNE_ELASTICSEARCH": "true" if local_elasticsearch else "false",
+        }
+    )
+
+
+if __name__ == "__main__":
+    print(
+        render_user_data_script(
+            aws_account_id="000000000000",
+            aws_region="us-west-2",
+            stack_name="local-test",
+            logical_ec2_instance_resource_id="LocalTestInstance",
+        )
+    )
@@ -1,18 +1,20 @@
 """Metadata about the account."""
 
 import os
-from typing import Optional
+from typing import Optional, Tuple
 
-try:
-    import boto3
-except ImportError as err:
-    raise ImportError(
-        f"Error: boto3 not installed, install extra 'pip install boto3 to read AWS account attributes. \n{str(err)}"
-    ) from err
+from cdk_clearml.utils.synth_cache import AWS_ACCOUNT_ID_KEY_PREFIX, SynthCache
 
 
 def get_aws_account_id() -> str:
     """Get AWS account ID."""
+    try:
+        import boto3
+    except ImportError as err:
+        raise ImportError(
+            f"Error: boto3 not installed, install extra 'pip install boto3 to read AWS account attributes. \n{str(err)}"
+        ) from err
+
     aws_profile: Optional[str] = os.getenv("AWS_PROFILE")
 
     if aws_profile:
@@ -24,3 +26,34 @@ def get_aws_account_id() -> str:
 
     session = boto3.Session(profile_name=aws_profile)
     return session.client("sts").get_caller_identity()["Account"]
+
+
+def resolve_aws_account_id(cache: SynthCache, offline: bool = False) -> Tuple[str, str]:
+    """
+    Get the AWS account ID, only calling STS if it is not known yet.
+
+    Resolution order: ``AWS_ACCOUNT_ID``, ``CDK_DEFAULT_ACCOUNT`` (set by the CDK CLI),
+    the synth cache, and finally an STS call whose result is written to the cache.
+
+    :param cache: Synth cache to read from and write to.
+    :param offline: If True, raise rather than call STS.
+    :return: The account ID and a short description of where it came from.
+    """
+    for env_var in ("AWS_ACCOUNT_ID", "CDK_DEFAULT_ACCOUNT"):
+        if os.getenv(env_var):
+            return os.environ[env_var], f"env:{env_var}"
+
+    cache_key = f"{AWS_ACCOUNT_ID_KEY_PREFIX}profile={os.getenv('AWS_PROFILE', 'default')}"
+    cached_account_id: Optional[str] = cache.get(cache_key, allow_expired=offline)
+    if cached_account_id:
+        return cached_account_id, "synth-cache"
+
+    if offline:
+        raise RuntimeError(
+            f"Offline synth requested, but the AWS account ID is not cached under '{cache_key}' in {cache.fpath}. "
+            "Set AWS_ACCOUNT_ID or run one online synth to populate the cache."
+        )
+
+    account_id = get_aws_account_id()
+    cache.set(cache_key, account_id)
+    return account_id, "sts"
@@ -0,0 +1,211 @@
+"""
+Versioned, local cache of the AWS lookups needed to synthesize the stack.
+
+``cdk synth`` needs the AWS account ID and the results of several context lookups
+(VPC, hosted zone, availability zones). Normally the account ID comes from an STS call
+and the lookups are resolved by the CDK CLI, which means network round-trips on every
+synth. This cache persists those values next to ``cdk.context.json`` so that:
+
+1. the account ID is resolved at most once per TTL window, and
+2. synthesis can run fully offline (``CDK_CLEARML_OFFLINE_SYNTH=true``) by injecting
+   the cached lookup results into the ``App`` context.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+SYNTH_CACHE_VERSION = 1
+SYNTH_CACHE_FNAME = "cdk.synth-cache.json"
+DEFAULT_SYNTH_CACHE_TTL_HOURS = 24 * 7
+
+# prefixes of the context keys written by the CDK context providers, e.g. "vpc-provider:account=...:region=..."
+CONTEXT_LOOKUP_KEY_PREFIXES = (
+    "vpc-provider:",
+    "hosted-zone:",
+    "availability-zones:",
+    "ami:",
+    "security-group:",
+    "load-balancer:",
+    "load-balancer-listener:",
+    "ssm:",
+    "key-provider:",
+    "endpoint-service-availability-zones:",
+)
+
+AWS_ACCOUNT_ID_KEY_PREFIX = "aws-account-id:"
+
+
+def is_offline_synth() -> bool:
+    """Return True if synthesis must not make any calls to AWS."""
+    return os.getenv("CDK_CLEARML_OFFLINE_SYNTH", "false").lower() == "true"
+
+
+def get_synth_cache_ttl_seconds() -> float:
+    """Read the cache TTL from the environment."""
+    return float(os.getenv("CDK_CLEARML_SYNTH_CACHE_TTL_HOURS", DEFAULT_SYNTH_CACHE_TTL_HOURS)) * 60 * 60
+
+
+def is_context_lookup_key(key: str) -> bool:
+    """Return True if ``key`` was written to ``cdk.context.json`` by a CDK context provider."""
+    return key.startswith(CONTEXT_LOOKUP_KEY_PREFIXES)
+
+
+class SynthCache:
+    """
+    JSON file of cached values, each stamped with the time it was cached.
+
+    The file is discarded as a whole if it was written by a different ``SYNTH_CACHE_VERSION``.
+
+    :param fpath: Path to the cache file, usually next to ``cdk.context.json``.
+    :param ttl_seconds: Entries older than this are considered expired.
+    :param entries: Cached entries, keyed by lookup key.
+    """
+
+    def __init__(self, fpath: Path, ttl_seconds: float, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.fpath = fpath
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[str, Dict[str, Any]] = entries or {}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, fpath: Path, ttl_seconds: Optional[float] = None) -> "SynthCache":
+        """Load the cache from disk; a missing, corrupt, or outdated file yields an empty cache."""
+        ttl_seconds = get_synth_cache_ttl_seconds() if ttl_seconds is None else ttl_seconds
+        if not fpath.exists():
+            return cls(fpath=fpath, ttl_seconds=ttl_seconds)
+
+        try:
+            contents = json.loads(fpath.read_text(encoding="utf-8"))
+        except json.JSONDecodeError:
+            print(f"Warning: synth cache at {fpath} is not valid JSON. Ignoring it.", file=sys.stderr)
+            return cls(fpath=fpath, ttl_seconds=ttl_seconds)
+
+        if contents.get("version") != SYNTH_CACHE_VERSION:
+            print(f"Synth cache at {fpath} was written by an older version. Ignoring it.", file=sys.stderr)
+            return cls(fpath=fpath, ttl_seconds=ttl_seconds)
+
+        return cls(fpath=fpath, ttl_seconds=ttl_seconds, entries=contents.get("entries", {}))
+
+    def save(self) -> None:
+        """Write the cache to disk."""
+        contents = {"version": SYNTH_CACHE_VERSION, "entries": self.entries}
+        self.fpath.write_text(json.dumps(contents, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    def is_expired(self, key: str) -> bool:
+        """Return True if the entry for ``key`` is older than the TTL."""
+        return time.time() - self.entries[key]["cached_at"] > self.ttl_seconds
+
+    def get(self, key: str, allow_expired: bool = False) -> Optional[Any]:
+        """Return the cached value for ``key``, or None if it is missing or expired."""
+        if key not in self.entries or (self.is_expired(key) and not allow_expired):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self.entries[key]["value"]
+
+    def set(self, key: str, value: Any) -> None:
+        """Cache ``value`` as of now, which also revalidates an expired entry holding the same value."""
+        self.entries[key] = {"value": value, "cached_at": time.time()}
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop the entry for ``key``, or every entry if no key is given."""
+        if key is None:
+            self.entries = {}
+        else:
+            self.entries.pop(key, None)
+
+    def expired_keys(self) -> List[str]:
+        """Keys of the entries that are older than the TTL."""
+        return [key for key in self.entries if self.is_expired(key)]
+
+    def context_lookups(self, allow_expired: bool = False) -> Dict[str, Any]:
+        """Cached context lookup results, in the shape expected by ``App(context=...)``."""
+        return {
+            key: entry["value"]
+            for key, entry in self.entries.items()
+            if is_context_lookup_key(key) and (allow_expired or not self.is_expired(key))
+        }
+
+    def harvest_context_file(self, cdk_context_fpath: Path) -> int:
+        """
+        Copy the context lookup results that the CDK CLI wrote to ``cdk.context.json`` into the cache.
+
+        :return: The number of lookup results found in the context file.
+        """
+        if not cdk_context_fpath.exists():
+            return 0
+
+        cdk_context = json.loads(cdk_context_fpath.read_text(encoding="utf-8"))
+        lookups = {key: value for key, value in cdk_context.items() if is_context_lookup_key(key)}
+        for key, value in lookups.items():
+            self.set(key, value)
+        return len(lookups)
+
+
+class SynthReport:
+    """Collects phase timings and lookup statistics for a single run of ``app.py``."""
+
+    def __init__(self):
+        self.phase_durations: Dict[str, float] = {}
+        self.account_id_source: str = "unknown"
+        self.context_lookups_performed = 0
+        self.context_lookups_from_cache = 0
+        self.missing_context_keys: List[str] = []
+        self.expired_keys: List[str] = []
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the code run inside the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_durations[name] = time.perf_counter() - start
+
+    def record_missing_context(self, cloud_assembly) -> None:
+        """Record the context lookups that CDK could not resolve without calling AWS."""
+        # read from the file: recent versions of aws-cdk-lib fail to deserialize ``cloud_assembly.manifest``
+        manifest = json.loads((Path(cloud_assembly.directory) / "manifest.json").read_text(encoding="utf-8"))
+        self.missing_context_keys = [missing_context["key"] for missing_context in manifest.get("missing", [])]
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Summarize the run."""
+        return {
+            "phase_durations_seconds": {name: round(seconds, 3) for name, seconds in self.phase_durations.items()},
+            "aws_account_id_source": self.account_id_source,
+            "context_lookups_performed": self.context_lookups_performed,
+            "context_lookups_injected_from_synth_cache": self.context_lookups_from_cache,
+            "context_lookups_requiring_aws": len(self.missing_context_keys),
+            "missing_context_keys": self.missing_context_keys,
+            "expired_cache_keys": self.expired_keys,
+        }
+
+
+def main() -> None:
+    """Inspect or clear the synth cache: ``python -m cdk_clearml.utils.synth_cache [--clear] [fpath]``."""
+    args = sys.argv[1:]
+    clear = "--clear" in args
+    positional_args = [arg for arg in args if arg != "--clear"]
+    fpath = Path(positional_args[0]) if positional_args else Path(SYNTH_CACHE_FNAME)
+
+    cache = SynthCache.load(fpath)
+    if clear:
+        cache.invalidate()
+        cache.save()
+        print(f"Cleared synth cache at {fpath}")
+        return
+
+    for key in sorted(cache.entries):
+        age_hours = (time.time() - cache.entries[key]["cached_at"]) / 60 / 60
+        status = "expired" if cache.is_expired(key) else "fresh"
+        print(f"{status:8} {age_hours:8.1f}h  {key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Caches for the docker images, pip packages, and datasets of the autoscaled workers.
+
+Without them, every worker starts empty and downloads the task's docker image, its requirements,
+and its datasets from the internet again. ``WorkerCache`` provisions:
+
+- ECR pull-through cache rules, so images are pulled from the upstream registry once per region
+  and then from ECR, e.g. ``<account>.dkr.ecr.<region>.amazonaws.com/ecr-public/docker/library/python:3.9``;
+- a CodeArtifact repository proxying PyPI, which pip uses as its index inside the task containers;
+- optionally, VPC endpoints so that both are reached without leaving the VPC;
+- the ``extra_vm_bash_script`` section (``worker-cache.template.sh``) that mounts the cache volume
+  of the worker (see ``autoscaler/cache_volume.py``), moves docker onto it, keeps the registry
+  and PyPI credentials fresh, and points the agent's pip, apt, VCS, and dataset caches at it.
+
+The section is stored in an SSM parameter that ``aws_autoscaler.py`` merges into
+``extra_vm_bash_script`` (``--agent-vm-bash-script-parameter``).
+"""
+
+import re
+from pathlib import Path
+from string import Template
+from typing import Dict, Optional
+
+from aws_cdk import Stack
+from aws_cdk import aws_codeartifact as codeartifact
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_ecr as ecr
+from aws_cdk import aws_iam as iam
+from aws_cdk import aws_ssm as ssm
+from constructs import Construct
+from pydantic import BaseModel, validator
+
+from cdk_clearml.autoscaler.cache_volume import CACHE_DEVICE_NAME, CACHE_MOUNT_POINT
+
+THIS_DIR = Path(__file__).parent
+WORKER_CACHE_TEMPLATE_FPATH = THIS_DIR / "resources/worker-cache.template.sh"
+
+ECR_REPOSITORY_PREFIX_PATTERN = re.compile(r"^[a-z0-9]+(?:[._-][a-z0-9]+)*$")
+
+
+class WorkerCacheConfig(BaseModel):
+    """
+    What ``WorkerCache`` provisions.
+
+    :param pull_through_cache_upstreams: ECR repository prefix -> upstream registry, for the
+        registries that need no credentials.
+    :param docker_hub_credentials_secret_arn: Secrets Manager secret (named
+        ``ecr-pullthroughcache/...``) with a Docker Hub ``username`` and ``accessToken``; ECR only
+        caches Docker Hub with credentials. Images are then cached under ``docker-hub/``.
+    :param pypi_proxy: Whether to create the CodeArtifact repository proxying PyPI.
+    :param vpc_endpoints: Whether to create interface endpoints for ECR and CodeArtifact, and a
+        gateway endpoint for S3 (where ECR keeps the layers). Each interface endpoint is billed per
+        hour and availability zone, and the S3 endpoint conflicts with one the VPC may already have.
+    :param credentials_refresh_hours: How often workers renew their ECR and CodeArtifact tokens,
+        which expire after 12 hours.
+    """
+
+    pull_through_cache_upstreams: Dict[str, str] = {"ecr-public": "public.ecr.aws", "quay": "quay.io"}
+    docker_hub_credentials_secret_arn: Optional[str] = None
+    pypi_proxy: bool = True
+    vpc_endpoints: bool = False
+    credentials_refresh_hours: int = 6
+
+    @validator("pull_through_cache_upstreams")
+    def prefixes_must_be_ecr_repository_prefixes(cls, upstreams: Dict[str, str]) -> Dict[str, str]:  # noqa: N805
+        for prefix in upstreams:
+            if not 2 <= len(prefix) <= 30 or not ECR_REPOSITORY_PREFIX_PATTERN.match(prefix):
+                raise ValueError(f"'{prefix}' is not a valid ECR repository prefix (2-30 lowercase characters)")
+        return upstreams
+
+    @validator("credentials_refresh_hours")
+    def refresh_must_happen_before_tokens_expire(cls, credentials_refresh_hours: int) -> int:  # noqa: N805
+        if not 1 <= credentials_refresh_hours < 12:
+            raise ValueError(f"Tokens expire after 12 hours, got a refresh every {credentials_refresh_hours} hours")
+        return credentials_refresh_hours
+
+
+class WorkerCache(Construct):
+    """
+    ECR pull-through cache rules, a CodeArtifact PyPI proxy, and the bootstrap section that uses them.
+
+    :param scope: The scope of the stack.
+    :param construct_id: The ID of the construct.
+    :param vpc: The VPC of the autoscaled workers, for the VPC endpoints.
+    :param config: What to provision.
+    """
+
+    def __init__(
+        self,
+        scope: Construct,
+        construct_id: str,
+        vpc: ec2.IVpc,
+        config: WorkerCacheConfig,
+        **kwargs,
+    ) -> None:
+        super().__init__(scope, construct_id, **kwargs)
+        stack = Stack.of(self)
+        self.config = config
+        self.registry_host = f"{stack.account}.dkr.ecr.{stack.region}.{stack.url_suffix}"
+
+        upstreams = dict(config.pull_through_cache_upstreams)
+        if config.docker_hub_credentials_secret_arn:
+            upstreams["docker-hub"] = "registry-1.docker.io"
+        for prefix, upstream_registry_url in upstreams.items():
+            ecr.CfnPullThroughCacheRule(
+                self,
+                f"{prefix}-pull-through-cache-rule",
+                ecr_repository_prefix=prefix,
+                upstream_registry_url=upstream_registry_url,
+                credential_arn=config.docker_hub_credentials_secret_arn if prefix == "docker-hub" else None,
+            )
+
+        self.codeartifact_domain: Optional[codeartifact.CfnDomain] = None
+        self.pypi_repository: Optional[codeartifact.CfnRepository] = None
+        if config.pypi_proxy:
+            # domain names are unique per account and region, and lowercase
+            self.codeartifact_domain = codeartifact.CfnDomain(
+                self,
+                "domain",
+                domain_name=re.sub(r"[^a-z0-9-]", "-", f"{stack.stack_name.lower()}-clearml")[:50],
+            )
+            self.pypi_repository = codeartifact.CfnRepository(
+                self,
+                "pypi-repository",
+                domain_name=self.codeartifact_domain.attr_name,
+                repository_name="pypi",
+                external_connections=["public:pypi"],
+                description="PyPI proxy for the ClearML autoscaled workers",
+            )
+
+        if config.vpc_endpoints:
+            for endpoint_id, service in (
+                ("ecr-api", ec2.InterfaceVpcEndpointAwsService.ECR),
+                ("ecr-docker", ec2.InterfaceVpcEndpointAwsService.ECR_DOCKER),
+                ("codeartifact-api", ec2.InterfaceVpcEndpointAwsService.CODEARTIFACT_API),
+                ("codeartifact-repositories", ec2.InterfaceVpcEndpointAwsService.CODEARTIFACT_REPOSITORIES),
+            ):
+                ec2.InterfaceVpcEndpoint(self, f"{endpoint_id}-endpoint", vpc=vpc, service=service)
+            ec2.GatewayVpcEndpoint(self, "s3-endpoint", vpc=vpc, service=ec2.GatewayVpcEndpointAwsService.S3)
+
+        self.vm_bash_script_parameter = ssm.StringParameter(
+            self,
+            "AgentVmBashScript",
+            parameter_name=f"/clearml/{stack.stack_name}/agent_vm_bash_script",
+            string_value=self.render_vm_bash_script(),
+            description="extra_vm_bash_script section merged in by the autoscaler",
+        )
+
+    def render_vm_bash_script(self) -> str:
+        """Render ``worker-cache.template.sh`` for this stack."""
+        stack = Stack.of(self)
+        codeartifact_args = ""
+        if self.codeartifact_domain is not None:
+            codeartifact_args = " ".join(
+                [self.codeartifact_domain.attr_name, stack.account, self.pypi_repository.attr_name]
+            )
+        return Template(WORKER_CACHE_TEMPLATE_FPATH.read_text(encoding="utf-8")).substitute(
+            {
+                "AWS_REGION": stack.region,
+                "REGISTRY_HOST": self.registry_host,
+                "CODEARTIFACT_ARGS": codeartifact_args,
+                "CACHE_MOUNT_POINT": CACHE_MOUNT_POINT,
+                "CACHE_DEVICE_NAME": CACHE_DEVICE_NAME,
+                "CREDENTIALS_REFRESH_SECONDS": str(self.config.credentials_refresh_hours * 3600),
+            }
+        )
+
+    def grant_use(self, role: iam.IRole) -> None:
+        """Allow the workers to pull through the cache, read from the PyPI proxy, and find their cache volume."""
+        stack = Stack.of(self)
+        role.add_to_principal_policy(iam.PolicyStatement(actions=["ecr:GetAuthorizationToken"], resources=["*"]))
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                # the first pull of an image creates its repository and imports it from upstream
+                actions=[
+                    "ecr:BatchCheckLayerAvailability",
+                    "ecr:BatchGetImage",
+                    "ecr:GetDownloadUrlForLayer",
+                    "ecr:BatchImportUpstreamImage",
+                    "ecr:CreateRepository",
+                ],
+                resources=[
+                    stack.format_arn(service="ecr", resource="repository", resource_name=f"{prefix}/*")
+                    for prefix in [*self.config.pull_through_cache_upstreams, "docker-hub"]
+                ],
+            )
+        )
+        role.add_to_principal_policy(iam.PolicyStatement(actions=["ec2:DescribeInstances"], resources=["*"]))
+
+        if self.codeartifact_domain is None:
+            return
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["codeartifact:GetAuthorizationToken"],
+                resources=[self.codeartifact_domain.attr_arn],
+            )
+        )
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["codeartifact:GetRepositoryEndpoint", "codeartifact:ReadFromRepository"],
+                resources=[self.pypi_repository.attr_arn],
+            )
+        )
+        role.add_to_principal_policy(
+            iam.PolicyStatement(
+                actions=["sts:GetServiceBearerToken"],
+                resources=["*"],
+                conditions={"StringEquals": {"sts:AWSServiceName": "codeartifact.amazonaws.com"}},
+            )
+        )
@@ -0,0 +1,76 @@
+"""Synth and inspection helpers shared by the construct tests."""
+
+from typing import List, Optional, Tuple, Type, TypeVar
+
+import yaml
+from aws_cdk import App, Environment
+from aws_cdk.assertions import Template
+
+from cdk_clearml.managed_data_stores import (
+    ManagedDataStoresConfig,
+    ManagedElasticsearchConfig,
+    ManagedMongoConfig,
+    ManagedRedisConfig,
+)
+from cdk_clearml.stack import ClearMLStack
+
+ENV = Environment(account="123456789012", region="us-west-2")
+
+Driver = TypeVar("Driver")
+
+
+def synth_stack(stack_name: str, **kwargs) -> Template:
+    """Synthesize a ``ClearMLStack`` in the test account; ``kwargs`` are passed on to the stack."""
+    stack = ClearMLStack(App(), stack_name, top_level_domain_name="example.com", env=ENV, **kwargs)
+    return Template.from_stack(stack)
+
+
+def managed_data_stores_config(managed: Tuple[str, ...]) -> ManagedDataStoresConfig:
+    """Manage the data stores named in ``managed`` with their default settings."""
+    return ManagedDataStoresConfig(
+        elasticsearch=ManagedElasticsearchConfig() if "elasticsearch" in managed else None,
+        mongo=ManagedMongoConfig() if "mongo" in managed else None,
+        redis=ManagedRedisConfig() if "redis" in managed else None,
+    )
+
+
+def logical_ids(template: Template, resource_type: str) -> List[str]:
+    """The sorted logical IDs of the resources of a type."""
+    return sorted(template.find_resources(resource_type))
+
+
+def ssm_parameter_name(template: Template, ref: dict) -> str:
+    """The name of the SSM parameter behind a ``Ref`` to a template parameter, e.g. of an AMI ID."""
+    return template.to_json()["Parameters"][ref["Ref"]]["Default"]
+
+
+def instance_files(template: Template) -> dict:
+    """The files that cfn-init puts on the server instance, by path."""
+    (instance,) = template.find_resources("AWS::EC2::Instance").values()
+    return instance["Metadata"]["AWS::CloudFormation::Init"]["config"]["files"]
+
+
+def instance_docker_compose(template: Template) -> dict:
+    """The docker-compose file that cfn-init puts on the server instance."""
+    return yaml.safe_load(instance_files(template)["/clearml/docker-compose.clear-ml.yml"]["content"])
+
+
+def autoscaler_driver(driver_class: Type[Driver], scaler: Optional[object] = None) -> Driver:
+    """An ``AWSDriver`` of the autoscaler that needs neither a ClearML server nor its settings."""
+    driver = driver_class(
+        git_user="",
+        git_pass="",
+        extra_clearml_conf="",
+        api_server="",
+        web_server="",
+        files_server="",
+        access_key="",
+        secret_key="",
+        auth_token="",
+        extra_vm_bash_script="",
+        docker_image="",
+        # the driver would otherwise open a session with the ClearML server
+        session=object(),
+    )
+    driver.set_scaler(scaler)
+    return driver
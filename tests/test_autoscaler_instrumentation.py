@@ -0,0 +1,72 @@
+"""Tests of the metrics that ``InstrumentedDriver`` records for the spin downs of the autoscaler."""
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from cdk_clearml.autoscaler.instrumentation import InstrumentedDriver
+from cdk_clearml.autoscaler.metrics import MetricsRegistry, metric_key
+from tests.helpers import autoscaler_driver
+
+pytest.importorskip("clearml")
+
+from cdk_clearml.autoscaler.binpacking_driver import BinPackingAWSDriver  # noqa: E402
+from cdk_clearml.autoscaler.warm_pool import WarmPoolAWSDriver  # noqa: E402
+
+INSTANCE_ID = "i-0123456789abcdef0"
+
+
+class FakeScaler:  # noqa: D101
+    def __init__(self, workers):
+        self.logger = logging.getLogger("FakeScaler")
+        self.workers = workers
+
+    def get_workers(self):  # noqa: D102
+        return self.workers
+
+
+def make_driver(workers) -> BinPackingAWSDriver:
+    """A ``BinPackingAWSDriver`` whose scaler reports ``workers``."""
+    driver = autoscaler_driver(BinPackingAWSDriver, scaler=FakeScaler(workers))
+    driver.terminated_instance_ids = []
+    return driver
+
+
+@pytest.fixture(autouse=True)
+def no_aws(monkeypatch: pytest.MonkeyPatch):  # noqa: D103
+    def terminate(self, instance_id):
+        self.terminated_instance_ids.append(instance_id)
+        return True
+
+    monkeypatch.setattr(WarmPoolAWSDriver, "spin_down_worker", terminate)
+
+
+def spin_down_count(metrics: MetricsRegistry, reason: str) -> float:  # noqa: D103
+    return metrics.snapshot().counters.get(metric_key("spin_downs", {"Reason": reason}), 0)
+
+
+def test_an_instance_with_busy_agents_is_not_counted_as_spun_down():  # noqa: D103
+    busy_worker = SimpleNamespace(id=f"clearml:4xgpu:{INSTANCE_ID}-gpu2", task={"id": "task-1"})
+    idle_worker = SimpleNamespace(id=f"clearml:4xgpu:{INSTANCE_ID}", task=None)
+    driver = make_driver([busy_worker, idle_worker])
+    metrics = MetricsRegistry()
+    instrumented_driver = InstrumentedDriver(driver, metrics)
+
+    assert instrumented_driver.spin_down_worker(INSTANCE_ID) is False
+    assert driver.terminated_instance_ids == []
+    assert instrumented_driver.spun_down == set()
+    assert spin_down_count(metrics, "idle") == 0
+
+
+def test_an_idle_instance_is_counted_once_as_spun_down():  # noqa: D103
+    driver = make_driver([SimpleNamespace(id=f"clearml:4xgpu:{INSTANCE_ID}", task=None)])
+    metrics = MetricsRegistry()
+    instrumented_driver = InstrumentedDriver(driver, metrics)
+
+    # every idle agent daemon of the instance asks for it to be spun down
+    assert instrumented_driver.spin_down_worker(INSTANCE_ID) is True
+    assert instrumented_driver.spin_down_worker(f"{INSTANCE_ID}-gpu2") is False
+    assert driver.terminated_instance_ids == [INSTANCE_ID]
+    assert instrumented_driver.spun_down == {INSTANCE_ID}
+    assert spin_down_count(metrics, "idle") == 1
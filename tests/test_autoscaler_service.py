@@ -0,0 +1,122 @@
+"""Construct-level tests of the autoscaler Fargate service."""
+
+from pathlib import Path
+
+import pytest
+from aws_cdk import App, Environment, Stack
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_iam as iam
+from aws_cdk.assertions import Match, Template
+
+from cdk_clearml.autoscaler_service import AutoscalerServiceConfig, ClearMLAutoscalerService
+
+EXAMPLE_CONFIG_FPATH = Path(__file__).parents[1] / "example_aws_autoscaler.yaml"
+
+
+@pytest.fixture(scope="module")
+def template() -> Template:  # noqa: D103
+    stack = Stack(App(), "autoscaler-service-test", env=Environment(account="123456789012", region="us-west-2"))
+    worker_role = iam.Role(stack, "WorkerRole", assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"))
+    ClearMLAutoscalerService(
+        stack,
+        "AutoscalerService",
+        vpc=ec2.Vpc(stack, "Vpc"),
+        config=AutoscalerServiceConfig(config_fpath=EXAMPLE_CONFIG_FPATH),
+        api_host="https://api.clearml.example.com",
+        web_host="https://app.clearml.example.com",
+        files_host="https://files.clearml.example.com",
+        worker_role=worker_role,
+        worker_instance_profile=iam.CfnInstanceProfile(stack, "WorkerProfile", roles=[worker_role.role_name]),
+    )
+    return Template.from_stack(stack)
+
+
+def test_task_definition_runs_the_autoscaler_service(template: Template):  # noqa: D103
+    template.has_resource_properties(
+        "AWS::ECS::TaskDefinition",
+        {
+            "Cpu": "256",
+            "Memory": "512",
+            "RequiresCompatibilities": ["FARGATE"],
+            "ContainerDefinitions": [
+                Match.object_like(
+                    {
+                        "Command": Match.array_with(["--service", "--config-ssm-parameter"]),
+                        "HealthCheck": Match.object_like({"Command": Match.array_with(["CMD-SHELL"])}),
+                        "Secrets": Match.array_with(
+                            [Match.object_like({"Name": "CLEARML_API_ACCESS_KEY"})],
+                        ),
+                    }
+                )
+            ],
+        },
+    )
+
+
+def test_service_never_runs_two_autoscalers(template: Template):  # noqa: D103
+    template.has_resource_properties(
+        "AWS::ECS::Service",
+        {
+            "DesiredCount": 1,
+            "DeploymentConfiguration": Match.object_like({"MaximumPercent": 100, "MinimumHealthyPercent": 0}),
+        },
+    )
+
+
+def test_task_role_launches_workers_with_their_role(template: Template):  # noqa: D103
+    template.has_resource_properties(
+        "AWS::IAM::Policy",
+        {
+            "PolicyDocument": {
+                "Statement": Match.array_with(
+                    [
+                        Match.object_like(
+                            {"Action": Match.array_with(["ec2:RunInstances", "ec2:TerminateInstances"])}
+                        ),
+                        Match.object_like(
+                            {
+                                "Action": "iam:PassRole",
+                                "Condition": {"StringEquals": {"iam:PassedToService": "ec2.amazonaws.com"}},
+                            }
+                        ),
+                    ]
+                ),
+            },
+        },
+    )
+
+
+def test_config_is_stored_without_static_keys(template: Template):  # noqa: D103
+    parameters = template.find_resources("AWS::SSM::Parameter")
+    (config_parameter,) = parameters.values()
+    assert config_parameter["Properties"]["Name"] == "/clearml/autoscaler-service-test/autoscaler_config"
+    value = str(config_parameter["Properties"]["Value"])
+    assert "use_credentials_chain: true" in value
+    assert "cloud_credentials_key: ''" in value
+
+
+def test_autoscaler_metrics_have_a_dashboard_and_alarms(template: Template):  # noqa: D103
+    template.resource_count_is("AWS::CloudWatch::Dashboard", 1)
+    # the metric has a label, so the alarm lists it under Metrics
+    template.has_resource_properties(
+        "AWS::CloudWatch::Alarm",
+        {
+            "Metrics": [
+                Match.object_like(
+                    {
+                        "MetricStat": Match.object_like(
+                            {
+                                "Metric": {
+                                    "Namespace": "ClearML/Autoscaler",
+                                    "MetricName": "launch_failures",
+                                    "Dimensions": [{"Name": "Autoscaler", "Value": "dynamic_worker"}],
+                                }
+                            }
+                        )
+                    }
+                )
+            ]
+        },
+    )
+    value = str(template.find_resources("AWS::SSM::Parameter").popitem()[1]["Properties"]["Value"])
+    assert "metrics_emf: true" in value
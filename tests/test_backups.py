@@ -0,0 +1,116 @@
+"""Tests of the snapshots, backups, and restore paths of ``cdk_clearml.backups``."""
+
+import re
+import subprocess
+from pathlib import Path
+
+import pytest
+from aws_cdk.assertions import Match, Template
+
+from cdk_clearml.backups import BACKUP_TAG_KEY, BACKUP_TIMER_FPATH, BackupsConfig
+from cdk_clearml.server_backup import latest_key, snapshots_to_delete
+from cdk_clearml.user_data import render_user_data_script
+from tests.helpers import instance_files, synth_stack
+
+MONGO_SNAPSHOT_ID = "snap-0123456789abcdef0"
+
+
+@pytest.fixture(scope="module")
+def backed_up() -> Template:  # noqa: D103
+    return synth_stack(
+        "backups-test", backups=BackupsConfig(restore_volumes_from_snapshots={"mongo": MONGO_SNAPSHOT_ID})
+    )
+
+
+def test_snapshots_the_data_volumes_with_fast_restore(backed_up: Template):  # noqa: D103
+    backed_up.has_resource_properties(
+        "AWS::DLM::LifecyclePolicy",
+        {
+            "PolicyDetails": Match.object_like(
+                {
+                    "TargetTags": [{"Key": BACKUP_TAG_KEY, "Value": "backups-test"}],
+                    "Schedules": [
+                        Match.object_like(
+                            {
+                                "CreateRule": {"Interval": 24, "IntervalUnit": "HOURS"},
+                                "RetainRule": {"Count": 7},
+                                "FastRestoreRule": Match.object_like({"Count": 1}),
+                            }
+                        )
+                    ],
+                }
+            )
+        },
+    )
+    for volume in backed_up.find_resources("AWS::EC2::Volume").values():
+        assert {"Key": BACKUP_TAG_KEY, "Value": "backups-test"} in volume["Properties"]["Tags"]
+
+
+def test_restores_volumes_from_snapshots(backed_up: Template):  # noqa: D103
+    backed_up.resource_properties_count_is("AWS::EC2::Volume", {"SnapshotId": MONGO_SNAPSHOT_ID}, 1)
+
+
+def test_schedules_the_backup_service(backed_up: Template):  # noqa: D103
+    assert BACKUP_TIMER_FPATH in instance_files(backed_up)
+    backed_up.has_resource_properties(
+        "AWS::S3::Bucket",
+        {"LifecycleConfiguration": {"Rules": Match.array_with([Match.object_like({"Prefix": "mongo/"})])}},
+    )
+
+
+def test_restores_the_most_recent_backups():  # noqa: D103
+    listing = (
+        "2024-05-01 10:00:00   1024 20240501T100000Z.archive.gz\n"
+        "2024-05-01 11:00:00   1024 20240501T110000Z.archive.gz\n"
+    )
+    assert latest_key(listing) == "20240501T110000Z.archive.gz"
+    assert latest_key("") is None
+    snapshots = [f"snapshot-2024050{day}T000000Z" for day in range(1, 6)]
+    assert snapshots_to_delete(snapshots, keep=3) == snapshots[:2]
+    assert snapshots_to_delete(snapshots, keep=10) == []
+
+
+def run_restore_from_backup(work_dir: Path, data_stores: str) -> subprocess.CompletedProcess:
+    """Run ``restore_from_backup`` of the bootstrap in ``work_dir``, with docker-compose only echoing its arguments."""
+    user_data = render_user_data_script(
+        aws_account_id="123456789012",
+        aws_region="us-west-2",
+        stack_name="backups-test",
+        logical_ec2_instance_resource_id="ServerInstance",
+        backups=True,
+        restore_from_most_recent_backup=True,
+    )
+    (function,) = re.findall(r"^function restore_from_backup\(\) \{$.*?^\}$", user_data, re.MULTILINE | re.DOTALL)
+    (work_dir / ".env").write_text(f"CLEARML_BACKUP_DATA_STORES={data_stores}\n", encoding="utf-8")
+    script = f"""
+        systemctl() {{ :; }}
+        docker-compose() {{ echo "docker-compose $*"; }}
+        WORKDIR={work_dir}
+        DOCKER_COMPOSE_FPATH={work_dir}/docker-compose.yml
+        {function}
+        restore_from_backup
+    """
+    return subprocess.run(["bash", "-c", script], capture_output=True, text=True)
+
+
+def test_restore_from_backup_only_restores_empty_data_stores(tmp_path: Path):  # noqa: D103
+    mongo_data_dir = tmp_path / "opt/clearml/data/mongo_4/db"
+    mongo_data_dir.mkdir(parents=True)
+    (mongo_data_dir / "collection-0.wt").touch()
+
+    result = run_restore_from_backup(tmp_path, "mongo elasticsearch")
+    assert result.returncode == 0, result.stderr
+    assert "not restoring mongo" in result.stdout
+    assert "run --rm backup restore --data-stores elasticsearch\n" in result.stdout
+
+    (tmp_path / "opt/clearml/data/elastic_7").mkdir(parents=True)
+    (tmp_path / "opt/clearml/data/elastic_7/nodes").mkdir()
+    result = run_restore_from_backup(tmp_path, "mongo elasticsearch")
+    assert result.returncode == 0, result.stderr
+    assert "docker-compose" not in result.stdout
+
+
+def test_restore_from_backup_fails_on_unknown_data_stores(tmp_path: Path):  # noqa: D103
+    result = run_restore_from_backup(tmp_path, "mongo redis")
+    assert result.returncode != 0
+    assert "Unknown data store in CLEARML_BACKUP_DATA_STORES: redis" in result.stdout
@@ -0,0 +1,91 @@
+"""Tests of the bin-packing of queued tasks onto GPU instances."""
+
+import pytest
+
+from cdk_clearml.autoscaler.binpacking import InstanceOption, ResourceRequest, plan_instances
+
+pytest.importorskip("clearml")
+
+from cdk_clearml.autoscaler.binpacking_driver import render_pinned_agents  # noqa: E402
+
+ONE_GPU = InstanceOption("aws1gpu", gpus=1, memory_gib=16, hourly_price=1.0, max_instances=4)
+FOUR_GPUS = InstanceOption("aws4gpu", gpus=4, memory_gib=64, hourly_price=3.0, max_instances=2)
+CPU_ONLY = InstanceOption("aws_cpu", gpus=0, memory_gib=16, hourly_price=0.2, max_instances=4)
+USER_DATA = """#!/bin/bash
+python -m pip install clearml-agent
+python -m clearml_agent --config-file ~/clearml.conf daemon --queue 'aws4gpu' --docker
+shutdown
+"""
+
+
+def planned_tasks(planned) -> list:  # noqa: D103
+    return [(instance.option.resource_name, [task_id for task_id, _ in instance.tasks]) for instance in planned]
+
+
+def test_requests_share_an_instance_when_it_is_cheaper_per_gpu():  # noqa: D103
+    requests = [
+        ("one-gpu", ResourceRequest(gpus=1)),
+        ("two-gpus", ResourceRequest(gpus=2)),
+        ("one-gpu-48gib", ResourceRequest(gpus=1, memory_gib=48)),
+    ]
+    planned, unplaced = plan_instances(requests, [ONE_GPU, FOUR_GPUS])
+
+    # largest first: the 2-GPU task opens the instance, and the 1-GPU tasks fill it up
+    assert planned_tasks(planned) == [("aws4gpu", ["two-gpus", "one-gpu-48gib", "one-gpu"])]
+    assert unplaced == []
+    (instance,) = planned
+    assert instance.free_gpus == 0
+    assert instance.agent_gpus() == [(0, 1), (2,), (3,)]
+
+
+def test_small_requests_get_small_instances_when_they_are_cheaper():  # noqa: D103
+    requests = [("first", ResourceRequest(gpus=1)), ("second", ResourceRequest(gpus=1))]
+    planned, unplaced = plan_instances(requests, [ONE_GPU, FOUR_GPUS])
+
+    # 2 of the 4 GPUs of aws4gpu would cost 1.5 per GPU, aws1gpu costs 1.0
+    assert planned_tasks(planned) == [("aws1gpu", ["first"]), ("aws1gpu", ["second"])]
+    assert unplaced == []
+
+
+def test_a_request_without_gpus_goes_to_the_cheapest_instance_with_its_memory():  # noqa: D103
+    planned, unplaced = plan_instances([("preprocess", ResourceRequest(gpus=0, memory_gib=8))], [ONE_GPU, CPU_ONLY])
+
+    assert planned_tasks(planned) == [("aws_cpu", ["preprocess"])]
+    assert unplaced == []
+
+
+def test_a_request_that_fits_no_instance_type_is_not_placed():  # noqa: D103
+    requests = [("eight-gpus", ResourceRequest(gpus=8)), ("too-much-memory", ResourceRequest(gpus=1, memory_gib=128))]
+    planned, unplaced = plan_instances(requests + [("one-gpu", ResourceRequest(gpus=1))], [ONE_GPU, FOUR_GPUS])
+
+    assert planned_tasks(planned) == [("aws1gpu", ["one-gpu"])]
+    assert unplaced == ["eight-gpus", "too-much-memory"]
+
+
+def test_a_request_is_not_placed_once_its_instance_types_are_at_max_instances():  # noqa: D103
+    planned, unplaced = plan_instances(
+        [("two-gpus", ResourceRequest(gpus=2))], [ONE_GPU, FOUR_GPUS], running_instances={"aws4gpu": 2}
+    )
+
+    assert planned == []
+    assert unplaced == ["two-gpus"]
+
+
+def test_render_pinned_agents_runs_one_daemon_per_agent():  # noqa: D103
+    user_data = render_pinned_agents(USER_DATA, "aws4gpu", [(0, 1), (2,), (3,)])
+
+    command = "python -m clearml_agent --config-file ~/clearml.conf daemon"
+    assert user_data.splitlines() == [
+        "#!/bin/bash",
+        "python -m pip install clearml-agent",
+        f"CLEARML_WORKER_ID=$CLEARML_WORKER_ID-gpu2 {command} --gpus 2 --queue 'aws4gpu-1gpu' --docker &",
+        f"CLEARML_WORKER_ID=$CLEARML_WORKER_ID-gpu3 {command} --gpus 3 --queue 'aws4gpu-1gpu' --docker &",
+        # the daemon with the worker ID the autoscaler waits for runs in the foreground, before "shutdown"
+        f"{command} --gpus 0,1 --queue 'aws4gpu-2gpu' --docker",
+        "shutdown",
+    ]
+
+
+def test_render_pinned_agents_needs_the_daemon_of_the_queue():  # noqa: D103
+    with pytest.raises(ValueError, match="other-queue"):
+        render_pinned_agents(USER_DATA, "other-queue", [(0,), (1,)])
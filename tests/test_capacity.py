@@ -0,0 +1,80 @@
+"""Tests of the sizing of the server components in ``capacity.py``."""
+
+import re
+from pathlib import Path
+
+import pytest
+
+from cdk_clearml.capacity import (
+    APISERVER_MIB_PER_WORKER,
+    CAPACITY_PROFILE_PRESETS,
+    CapacityProfile,
+    compute_server_tuning,
+    render_docker_compose_env,
+)
+
+DOCKER_COMPOSE_FPATH = Path(__file__).parents[1] / "src/cdk_clearml/resources/docker-compose.yml"
+SIZING_VARIABLES = [
+    "CLEARML_ES_JAVA_OPTS",
+    "CLEARML_MONGO_WIREDTIGER_CACHE_GB",
+    "CLEARML_REDIS_MAXMEMORY_MB",
+    "CLEARML_GUNICORN_WORKERS",
+]
+
+
+def parse_env(env_contents: str) -> dict:  # noqa: D103
+    lines = [line for line in env_contents.splitlines() if line and not line.startswith("#")]
+    return dict(line.split("=", 1) for line in lines)
+
+
+@pytest.mark.parametrize("preset", sorted(CAPACITY_PROFILE_PRESETS))
+@pytest.mark.parametrize("stores_only", [False, True])
+def test_every_preset_fits_its_instance(preset: str, stores_only: bool):  # noqa: D103
+    profile = CapacityProfile.preset(preset)
+    tuning = compute_server_tuning(profile, stores_only=stores_only)
+    assert tuning.elasticsearch_heap_mib > 0
+    assert tuning.mongo_wiredtiger_cache_mib > 0
+    assert tuning.redis_maxmemory_mib > 0
+    assert (
+        tuning.os_reserved_mib
+        + tuning.small_services_reserved_mib
+        + tuning.apiserver_workers * APISERVER_MIB_PER_WORKER
+        + tuning.elasticsearch_heap_mib
+        + tuning.mongo_wiredtiger_cache_mib
+        + tuning.redis_maxmemory_mib
+        <= profile.memory_mib
+    )
+
+
+def test_stores_only_gives_the_apiserver_memory_to_the_data_stores():  # noqa: D103
+    profile = CapacityProfile.preset("medium")
+    full = compute_server_tuning(profile)
+    stores_only = compute_server_tuning(profile, stores_only=True)
+    assert full.apiserver_workers > 0
+    assert stores_only.apiserver_workers == 0
+    assert stores_only.elasticsearch_heap_mib > full.elasticsearch_heap_mib
+    assert stores_only.mongo_wiredtiger_cache_mib > full.mongo_wiredtiger_cache_mib
+    assert stores_only.redis_maxmemory_mib >= full.redis_maxmemory_mib
+
+
+def test_too_small_an_instance_raises():  # noqa: D103
+    with pytest.raises(ValueError, match="at least"):
+        compute_server_tuning(CapacityProfile(instance_type="t3.small", memory_mib=2048, vcpus=2))
+
+
+def test_env_sets_the_variables_that_docker_compose_reads():  # noqa: D103
+    docker_compose_yaml = DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8")
+    env = parse_env(render_docker_compose_env(CapacityProfile.preset("medium")))
+    assert sorted(env) == sorted(SIZING_VARIABLES)
+    for name in SIZING_VARIABLES:
+        assert re.search(r"\$\{" + name + r"(:-[^}]*)?\}", docker_compose_yaml), name
+
+    tuning = compute_server_tuning(CapacityProfile.preset("medium"))
+    assert f"-Xmx{tuning.elasticsearch_heap_mib}m" in env["CLEARML_ES_JAVA_OPTS"]
+    assert env["CLEARML_REDIS_MAXMEMORY_MB"] == str(tuning.redis_maxmemory_mib)
+    assert env["CLEARML_GUNICORN_WORKERS"] == str(tuning.apiserver_workers)
+
+
+def test_stores_only_env_leaves_the_apiserver_default():  # noqa: D103
+    env = parse_env(render_docker_compose_env(CapacityProfile.preset("medium"), stores_only=True))
+    assert "CLEARML_GUNICORN_WORKERS" not in env
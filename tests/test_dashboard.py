@@ -0,0 +1,92 @@
+"""
+Snapshot test of the synthesized ClearML dashboard.
+
+The snapshot is the dashboard body with its CloudFormation references written as ``${LogicalId}``.
+Run with ``UPDATE_SNAPSHOTS=1`` to rewrite it after an intended change, and review the diff.
+"""
+
+import json
+import os
+from pathlib import Path
+
+import pytest
+from aws_cdk import App, Environment, Stack
+from aws_cdk import aws_ec2 as ec2
+from aws_cdk import aws_elasticloadbalancingv2 as elbv2
+from aws_cdk.assertions import Template
+
+from cdk_clearml.dashboard import ClearMLDashboard
+
+SNAPSHOT_FPATH = Path(__file__).parent / "snapshots" / "clearml_dashboard.json"
+
+
+def render_fragment(fragment) -> str:
+    """A piece of an ``Fn::Join`` as text: strings as they are, references as ``${...}``."""
+    if isinstance(fragment, str):
+        return fragment
+    if "Ref" in fragment:
+        return "${" + fragment["Ref"] + "}"
+    if "Fn::GetAtt" in fragment:
+        return "${" + ".".join(fragment["Fn::GetAtt"]) + "}"
+    return "${" + json.dumps(fragment, sort_keys=True) + "}"
+
+
+@pytest.fixture(scope="module")
+def dashboard_body() -> dict:  # noqa: D103
+    stack = Stack(App(), "dashboard-test", env=Environment(account="123456789012", region="us-west-2"))
+    vpc = ec2.Vpc(stack, "Vpc")
+    alb = elbv2.ApplicationLoadBalancer(stack, "Alb", vpc=vpc)
+    target_groups = {
+        name: elbv2.ApplicationTargetGroup(
+            stack, f"{name}-target-group", vpc=vpc, port=port, protocol=elbv2.ApplicationProtocol.HTTP
+        )
+        for name, port in (("app", 8080), ("files", 8081), ("api", 8008))
+    }
+    ClearMLDashboard(
+        stack,
+        "ClearMLDashboard",
+        load_balancer=alb,
+        target_groups=target_groups,
+        instance_id="i-0123456789abcdef0",
+        disk_paths=["/", "/clearml/opt/clearml/data/elastic_7"],
+        data_volumes={
+            "elasticsearch": ec2.Volume.from_volume_attributes(
+                stack, "EsVolume", volume_id="vol-0123456789abcdef0", availability_zone="us-west-2a"
+            ),
+        },
+    )
+    (dashboard,) = Template.from_stack(stack).find_resources("AWS::CloudWatch::Dashboard").values()
+    body = dashboard["Properties"]["DashboardBody"]
+    if isinstance(body, dict):
+        separator, fragments = body["Fn::Join"]
+        body = separator.join(render_fragment(fragment) for fragment in fragments)
+    return json.loads(body)
+
+
+def test_dashboard_matches_snapshot(dashboard_body: dict):  # noqa: D103
+    rendered = json.dumps(dashboard_body, indent=2, sort_keys=True) + "\n"
+    if os.environ.get("UPDATE_SNAPSHOTS") == "1":
+        SNAPSHOT_FPATH.parent.mkdir(exist_ok=True)
+        SNAPSHOT_FPATH.write_text(rendered, encoding="utf-8")
+    assert SNAPSHOT_FPATH.exists(), f"No snapshot at {SNAPSHOT_FPATH}; run with UPDATE_SNAPSHOTS=1 to write it"
+    assert rendered == SNAPSHOT_FPATH.read_text(encoding="utf-8")
+
+
+def test_response_time_has_percentiles_per_target_group(dashboard_body: dict):  # noqa: D103
+    response_time_widgets = [
+        widget for widget in dashboard_body["widgets"] if widget["properties"]["title"].endswith("response time (s)")
+    ]
+    assert [widget["properties"]["title"] for widget in response_time_widgets] == [
+        "app response time (s)",
+        "files response time (s)",
+        "api response time (s)",
+    ]
+    for widget in response_time_widgets:
+        statistics = [metric[-1]["stat"] for metric in widget["properties"]["metrics"]]
+        assert statistics == ["p50", "p90", "p99"]
+
+
+def test_io_wait_is_graphed_with_the_dimensions_the_agent_publishes(dashboard_body: dict):  # noqa: D103
+    widgets = {widget["properties"].get("title"): widget for widget in dashboard_body["widgets"]}
+    (io_wait,) = [metric for metric in widgets["Instance CPU (%)"]["properties"]["metrics"] if "CpuIoWait" in metric]
+    assert io_wait[2:6] == ["InstanceId", "i-0123456789abcdef0", "cpu", "cpu-total"]
@@ -0,0 +1,32 @@
+"""Tests of the event index settings and retention of ``cdk_clearml.elasticsearch_tuning``."""
+
+import pytest
+
+from cdk_clearml.elasticsearch_index_maintenance import expiry_query, index_template, parse_older_than
+from cdk_clearml.elasticsearch_tuning import INDEX_MAINTENANCE_FPATH, ElasticsearchTuningConfig
+from tests.helpers import instance_files, managed_data_stores_config, synth_stack
+
+
+def test_index_template_overrides_the_apiserver_settings():  # noqa: D103
+    template = index_template(number_of_shards=1, refresh_interval="5s", best_compression=True)
+    assert template["index_patterns"] == ["events-*"]
+    assert template["order"] > 0
+    assert template["settings"]["index.number_of_replicas"] == 0
+    assert template["settings"]["index.codec"] == "best_compression"
+    assert "index.codec" not in index_template(1, "5s", best_compression=False)["settings"]
+
+
+def test_expiry_matches_old_events_by_type():  # noqa: D103
+    assert parse_older_than(["log=90", "plot=365"]) == {"log": 90, "plot": 365}
+    assert expiry_query(90)["query"]["range"]["timestamp"] == {"lt": "now-90d"}
+    with pytest.raises(ValueError):
+        parse_older_than(["scalars=90"])
+    with pytest.raises(ValueError):
+        ElasticsearchTuningConfig(retention_days={"log": 0})
+
+
+def test_instance_maintains_only_a_local_elasticsearch():  # noqa: D103
+    local = synth_stack("tuning-test")
+    managed = synth_stack("tuning-test", managed_data_stores=managed_data_stores_config(("elasticsearch",)))
+    assert INDEX_MAINTENANCE_FPATH in instance_files(local)
+    assert INDEX_MAINTENANCE_FPATH not in instance_files(managed)
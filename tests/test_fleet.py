@@ -0,0 +1,138 @@
+"""Tests of the spot-first EC2 Fleet launches of the autoscaler."""
+
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from cdk_clearml.autoscaler.fleet import (
+    INTERRUPTION_WATCHER_FPATH,
+    FleetCapacityError,
+    create_fleet_request,
+    is_capacity_error,
+    render_interruption_watcher,
+)
+from tests.helpers import autoscaler_driver
+
+pytest.importorskip("clearml")
+
+from cdk_clearml.autoscaler.fleet_driver import FleetAWSDriver  # noqa: E402
+
+LAUNCH_TEMPLATE_ID = "lt-0123456789abcdef0"
+LAUNCH_TEMPLATE_VERSION = "3"
+WORKER_PREFIX = "clearml:aws4gpu_spot"
+RESOURCE_CONF = {
+    "instance_type": "g4dn.4xlarge",
+    "instance_types": ["g4dn.4xlarge", "g5.4xlarge"],
+    "subnet_ids": ["subnet-aaa", "subnet-bbb"],
+    "tags": "Team=ml",
+}
+USER_DATA = """#!/bin/bash
+python -m pip install clearml-agent
+python -m clearml_agent --config-file ~/clearml.conf daemon --queue 'aws4gpu' --docker
+shutdown
+"""
+
+
+def fleet_response(instance_id: str = "", error_code: str = "") -> dict:
+    """A response of an instant ``CreateFleet`` that launched ``instance_id``, or failed with ``error_code``."""
+    response = {"FleetId": "fleet-0123456789abcdef0", "Instances": [], "Errors": []}
+    if instance_id:
+        response["Instances"].append({"InstanceIds": [instance_id], "InstanceType": "g5.4xlarge"})
+    if error_code:
+        response["Errors"].append({"ErrorCode": error_code, "ErrorMessage": f"{error_code} in us-west-2a"})
+    return response
+
+
+def expect_create_fleet(stubber: Stubber, capacity_type: str, response: dict, resource_conf: dict = RESOURCE_CONF):
+    """Expect a ``CreateFleet`` call for ``capacity_type``, in the order of the calls to this function."""
+    request = create_fleet_request(
+        resource_conf, LAUNCH_TEMPLATE_ID, LAUNCH_TEMPLATE_VERSION, capacity_type, tags=[("Team", "ml")]
+    )
+    stubber.add_response("create_fleet", response, expected_params=request)
+
+
+@pytest.fixture()
+def ec2():  # noqa: D103
+    return boto3.client("ec2", region_name="us-west-2", aws_access_key_id="test", aws_secret_access_key="test")
+
+
+def create_fleet_instance(ec2, resource_conf: dict = RESOURCE_CONF) -> str:  # noqa: D103
+    driver = autoscaler_driver(FleetAWSDriver)
+    return driver.create_fleet_instance(ec2, resource_conf, WORKER_PREFIX, LAUNCH_TEMPLATE_ID, LAUNCH_TEMPLATE_VERSION)
+
+
+def test_spot_first_falls_back_to_on_demand_without_spot_capacity(ec2):  # noqa: D103
+    with Stubber(ec2) as stubber:
+        expect_create_fleet(stubber, "spot", fleet_response(error_code="InsufficientInstanceCapacity"))
+        expect_create_fleet(stubber, "on-demand", fleet_response(instance_id="i-0000000000000000d"))
+        assert create_fleet_instance(ec2) == "i-0000000000000000d"
+        stubber.assert_no_pending_responses()
+
+
+def test_spot_first_launches_spot_when_there_is_capacity(ec2):  # noqa: D103
+    with Stubber(ec2) as stubber:
+        expect_create_fleet(stubber, "spot", fleet_response(instance_id="i-0000000000000000a"))
+        assert create_fleet_instance(ec2) == "i-0000000000000000a"
+        stubber.assert_no_pending_responses()
+
+
+def test_spot_only_fails_without_spot_capacity(ec2):  # noqa: D103
+    resource_conf = {**RESOURCE_CONF, "capacity_type": "spot"}
+    with Stubber(ec2) as stubber:
+        expect_create_fleet(stubber, "spot", fleet_response(error_code="UnfulfillableCapacity"), resource_conf)
+        with pytest.raises(FleetCapacityError):
+            create_fleet_instance(ec2, resource_conf)
+        stubber.assert_no_pending_responses()
+
+
+def test_an_invalid_request_is_not_retried_on_demand(ec2):  # noqa: D103
+    with Stubber(ec2) as stubber:
+        expect_create_fleet(stubber, "spot", fleet_response(error_code="InvalidLaunchTemplateId.NotFound"))
+        with pytest.raises(RuntimeError, match="InvalidLaunchTemplateId.NotFound"):
+            create_fleet_instance(ec2)
+        stubber.assert_no_pending_responses()
+
+
+def test_create_fleet_request_prefers_the_instance_types_then_the_subnets_in_order():  # noqa: D103
+    request = create_fleet_request(RESOURCE_CONF, LAUNCH_TEMPLATE_ID, LAUNCH_TEMPLATE_VERSION, "spot")
+    (launch_template_config,) = request["LaunchTemplateConfigs"]
+    assert launch_template_config["Overrides"] == [
+        {"InstanceType": "g4dn.4xlarge", "SubnetId": "subnet-aaa", "Priority": 0.0},
+        {"InstanceType": "g4dn.4xlarge", "SubnetId": "subnet-bbb", "Priority": 1.0},
+        {"InstanceType": "g5.4xlarge", "SubnetId": "subnet-aaa", "Priority": 2.0},
+        {"InstanceType": "g5.4xlarge", "SubnetId": "subnet-bbb", "Priority": 3.0},
+    ]
+    assert request["TargetCapacitySpecification"] == {"TotalTargetCapacity": 1, "DefaultTargetCapacityType": "spot"}
+    assert request["SpotOptions"]["AllocationStrategy"] == "capacity-optimized-prioritized"
+    assert "TagSpecifications" not in request
+
+
+@pytest.mark.parametrize(
+    "errors, expected",
+    [
+        ([("InsufficientInstanceCapacity", "")], True),
+        ([("InvalidParameterValue", ""), ("SpotMaxPriceTooLow", "")], True),
+        ([("InvalidParameterValue", "")], False),
+        ([], False),
+    ],
+)
+def test_is_capacity_error(errors, expected):  # noqa: D103
+    assert is_capacity_error(errors) is expected
+
+
+def test_render_interruption_watcher_starts_the_watcher_before_the_agent():  # noqa: D103
+    user_data = render_interruption_watcher(USER_DATA, "print('watching')\n", action="requeue", grace_seconds=30)
+    lines = user_data.splitlines()
+    watcher_index = lines.index(
+        f"nohup python3 {INTERRUPTION_WATCHER_FPATH} --action requeue --grace-seconds 30 "
+        ">> /var/log/clearml-spot-interruption.log 2>&1 &"
+    )
+    daemon_index = next(index for index, line in enumerate(lines) if line.startswith("python -m clearml_agent "))
+    assert watcher_index == daemon_index - 1
+    assert "print('watching')" in lines
+    assert lines[-1] == "shutdown"
+
+
+def test_render_interruption_watcher_rejects_an_unknown_action():  # noqa: D103
+    with pytest.raises(ValueError, match="interruption_action"):
+        render_interruption_watcher(USER_DATA, "", action="hibernate")
@@ -0,0 +1,80 @@
+"""Tests of the forecast of queue arrivals and of the workers launched ahead of them."""
+
+import pytest
+
+from cdk_clearml.autoscaler.forecast import DAY, HOUR, WEEK, ArrivalRecord, PreScalePolicy, SeasonalArrivalModel
+
+MINUTE = 60.0
+# a week of history up to midnight: every day, 4 tasks of 30 minutes are enqueued between 23:00 and 24:00
+NOW = 7 * DAY
+ARRIVALS = [
+    ArrivalRecord(f"task-{day}-{index}", "aws4gpu", day * DAY + 23 * HOUR + index * 15 * MINUTE, 30 * MINUTE)
+    for day in range(7)
+    for index in range(4)
+]
+
+
+def fitted_model() -> SeasonalArrivalModel:
+    """A daily model of ``ARRIVALS`` in which every day of the week weighs (almost) the same."""
+    return SeasonalArrivalModel(half_life_days=1e9).fit(ARRIVALS, now=NOW)
+
+
+def test_slots_roll_over_at_the_end_of_the_period():  # noqa: D103
+    assert SeasonalArrivalModel().slot(NOW - 1) == 23
+    assert SeasonalArrivalModel().slot(NOW) == 0
+    assert SeasonalArrivalModel(period_seconds=WEEK).slot(NOW + DAY + HOUR) == 25
+    assert SeasonalArrivalModel(period_seconds=WEEK).slot(NOW + WEEK - 1) == 167
+
+
+def test_the_model_predicts_the_observed_arrivals():  # noqa: D103
+    model = fitted_model()
+
+    assert model.observed_seconds == NOW - 23 * HOUR
+    assert model.arrivals_per_hour[23] == pytest.approx(4)
+    assert sum(model.arrivals_per_hour[:23]) == 0
+    assert model.mean_duration_seconds[23] == pytest.approx(30 * MINUTE)
+    # the next day: the hour of the burst, and a window across midnight half of which is in it
+    assert model.expected_arrivals(NOW + 23 * HOUR, NOW + DAY) == pytest.approx(4)
+    assert model.expected_arrivals(NOW + 23.5 * HOUR, NOW + 24.5 * HOUR) == pytest.approx(2)
+    assert model.expected_arrivals(NOW + 12 * HOUR, NOW + 13 * HOUR) == 0
+    # 20 minutes into the burst, the tasks enqueued over the last 20 of their 30 minutes still run
+    assert model.expected_busy_workers(NOW + 23 * HOUR + 20 * MINUTE) == pytest.approx(4 / 3)
+
+
+def test_the_model_without_arrivals_predicts_nothing():  # noqa: D103
+    model = SeasonalArrivalModel().fit([], now=NOW)
+
+    assert model.observed_seconds == 0
+    assert model.expected_arrivals(NOW, NOW + DAY) == 0
+
+
+def test_workers_are_prelaunched_once_the_predicted_load_crosses_the_threshold():  # noqa: D103
+    policy = PreScalePolicy(fitted_model(), lead_time_min=10, min_busy_workers=0.5)
+    burst_start = NOW + 23 * HOUR
+
+    # 10 minutes ahead, 5 (then 10) minutes of arrivals at 4 per hour are expected to still run
+    assert policy.desired_workers(burst_start - 5 * MINUTE, max_workers=8) == 0
+    assert policy.desired_workers(burst_start, max_workers=8) == 1
+    assert policy.desired_workers(burst_start + 10 * MINUTE, max_workers=8) == 2
+    assert policy.desired_workers(burst_start + 10 * MINUTE, max_workers=1) == 1
+
+
+def test_workers_are_prelaunched_once_per_forecast_hour():  # noqa: D103
+    policy = PreScalePolicy(fitted_model(), lead_time_min=10)
+    burst_start = NOW + 23 * HOUR
+
+    assert policy.workers_to_prelaunch(burst_start + 10 * MINUTE, running_workers=0, max_workers=8) == 2
+    # the prelaunched workers were spun down before the tasks arrived; they are not launched again this hour
+    assert policy.workers_to_prelaunch(burst_start + 15 * MINUTE, running_workers=0, max_workers=8) == 0
+    # the forecast hour rolls over into the next day, whose first minutes still see the tail of the burst
+    assert policy.workers_to_prelaunch(burst_start + 55 * MINUTE, running_workers=1, max_workers=8) == 1
+
+
+def test_idle_workers_are_kept_for_less_time_while_no_burst_is_expected():  # noqa: D103
+    policy = PreScalePolicy(fitted_model(), burst_arrivals_per_hour=2, quiet_max_idle_time_min=2)
+
+    assert policy.max_idle_time_min(NOW + 12 * HOUR, configured_max_idle_time_min=15) == 2
+    assert policy.max_idle_time_min(NOW + 22.75 * HOUR, configured_max_idle_time_min=15) == 15
+    # with less than a day of history, an hour without arrivals may just not have been observed yet
+    recent_policy = PreScalePolicy(SeasonalArrivalModel().fit(ARRIVALS[-4:], now=NOW))
+    assert recent_policy.max_idle_time_min(NOW + 12 * HOUR, configured_max_idle_time_min=15) == 15
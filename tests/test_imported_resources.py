@@ -0,0 +1,51 @@
+"""Tests of the deduplication of imported resources by ``ImportedResources``."""
+
+from aws_cdk import App, Stack
+from aws_cdk import aws_iam as iam
+from aws_cdk.assertions import Template
+from constructs import Construct
+
+from cdk_clearml.ec2_instance import grant_ecr_pull_access
+from cdk_clearml.imported_resources import ImportedResources
+from cdk_clearml.utils.synth_cache import SynthReport
+from tests.helpers import ENV
+
+ECR_REPO_ARN = "arn:aws:ecr:us-west-2:123456789012:repository/clearml-backup"
+
+
+def make_role(scope: Construct, construct_id: str) -> iam.Role:  # noqa: D103
+    return iam.Role(Construct(scope, construct_id), "Role", assumed_by=iam.ServicePrincipal("ec2.amazonaws.com"))
+
+
+def test_a_repository_imported_by_two_constructs_is_imported_once():  # noqa: D103
+    stack = Stack(App(), "imported-resources-test", env=ENV)
+    first_role, second_role = make_role(stack, "First"), make_role(stack, "Second")
+    grant_ecr_pull_access(ECR_REPO_ARN, role=first_role)
+    grant_ecr_pull_access(ECR_REPO_ARN, role=second_role)
+
+    repo = ImportedResources.of(first_role).ecr_repository(ECR_REPO_ARN)
+    assert ImportedResources.of(second_role).ecr_repository(ECR_REPO_ARN) is repo
+    imported_repos = [child for child in stack.node.children if child.node.id.startswith("ImportedEcrRepo")]
+    assert [imported_repo.node.path for imported_repo in imported_repos] == [repo.node.path]
+
+    # both roles are granted access to the same repository
+    policies = Template.from_stack(stack).find_resources("AWS::IAM::Policy")
+    assert len(policies) == 2
+    for policy in policies.values():
+        resources = [statement.get("Resource") for statement in policy["Properties"]["PolicyDocument"]["Statement"]]
+        assert ECR_REPO_ARN in resources
+
+
+def test_a_hosted_zone_looked_up_by_two_constructs_is_looked_up_once():  # noqa: D103
+    app = App()
+    stack = Stack(app, "imported-resources-test", env=ENV)
+    first = ImportedResources.of(Construct(stack, "First")).hosted_zone("example.com")
+    second = ImportedResources.of(Construct(stack, "Second")).hosted_zone("example.com")
+
+    assert first is second
+    assert ImportedResources.of(stack).context_lookup_count == 1
+    report = SynthReport()
+    report.record_missing_context(app.synth())
+    assert [key for key in report.missing_context_keys if key.startswith("hosted-zone:")] == [
+        "hosted-zone:account=123456789012:domainName=example.com:region=us-west-2"
+    ]
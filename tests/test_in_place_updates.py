@@ -0,0 +1,61 @@
+"""Tests of the in-place configuration updates of ``ClearMLServerEC2Instance``."""
+
+from typing import Optional
+
+import pytest
+from aws_cdk.assertions import Template
+
+from cdk_clearml.ec2_instance import WAIT_CONDITION_HANDLE_INSTANCE_FPATH
+from cdk_clearml.elasticsearch_tuning import ElasticsearchTuningConfig
+from cdk_clearml.user_data import render_user_data_script
+from tests.helpers import instance_files, logical_ids, ssm_parameter_name, synth_stack
+
+
+def synth(elasticsearch_tuning: Optional[ElasticsearchTuningConfig] = None) -> Template:  # noqa: D103
+    return synth_stack("updates-test", elasticsearch_tuning=elasticsearch_tuning)
+
+
+@pytest.fixture(scope="module")
+def default() -> Template:  # noqa: D103
+    return synth()
+
+
+def test_configuration_changes_keep_the_instance(default: Template):  # noqa: D103
+    changed = synth(ElasticsearchTuningConfig(retention_days={"log": 30}))
+    assert logical_ids(changed, "AWS::EC2::Instance") == logical_ids(default, "AWS::EC2::Instance")
+    assert logical_ids(changed, "AWS::EC2::Volume") == logical_ids(default, "AWS::EC2::Volume")
+    # the deployment still waits for the server to apply the change
+    for resource_type in ["AWS::CloudFormation::WaitCondition", "AWS::CloudFormation::WaitConditionHandle"]:
+        assert logical_ids(changed, resource_type) != logical_ids(default, resource_type)
+
+
+def test_instance_runs_amazon_linux_2(default: Template):  # noqa: D103
+    (instance,) = default.find_resources("AWS::EC2::Instance").values()
+    image_parameter = ssm_parameter_name(default, instance["Properties"]["ImageId"])
+    assert image_parameter == "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2"
+
+
+def test_wait_condition_waits_on_the_handle_of_its_configuration(default: Template):  # noqa: D103
+    changed = synth(ElasticsearchTuningConfig(retention_days={"log": 30}))
+    for template in [default, changed]:
+        (handle_id,) = logical_ids(template, "AWS::CloudFormation::WaitConditionHandle")
+        (condition,) = template.find_resources("AWS::CloudFormation::WaitCondition").values()
+        assert condition["Properties"]["Handle"] == {"Ref": handle_id}
+
+
+def test_cfn_init_places_the_update_script_and_the_wait_condition_handle(default: Template):  # noqa: D103
+    files = instance_files(default)
+    (handle_id,) = logical_ids(default, "AWS::CloudFormation::WaitConditionHandle")
+    assert files[WAIT_CONDITION_HANDLE_INSTANCE_FPATH]["content"] == {"Ref": handle_id}
+    assert files["/usr/local/bin/update-clearml-server.sh"]["mode"] == "000755"
+
+
+def test_user_data_holds_no_configuration():  # noqa: D103
+    user_data = render_user_data_script(
+        aws_account_id="123456789012",
+        aws_region="us-west-2",
+        stack_name="updates-test",
+        logical_ec2_instance_resource_id="ServerInstance",
+    )
+    assert "apiserver:" not in user_data
+    assert "path=Resources.ServerInstance.Metadata.AWS::CloudFormation::Init" in user_data
@@ -0,0 +1,120 @@
+"""Synth tests of ``ClearMLStack`` with every combination of managed data stores."""
+
+import itertools
+from typing import Tuple
+
+import pytest
+from aws_cdk.assertions import Template
+
+from cdk_clearml.managed_data_stores import (
+    DATA_STORE_ENVIRONMENT_PREFIXES,
+    MONGO_CA_BUNDLE_FPATH,
+    MONGO_CA_BUNDLE_URL,
+    ManagedDataStoresConfig,
+    ManagedMongoConfig,
+)
+from cdk_clearml.stateless_services import StatelessServicesConfig
+from tests.helpers import instance_docker_compose, instance_files, managed_data_stores_config, synth_stack
+
+MANAGED_RESOURCE_TYPES = {
+    "elasticsearch": "AWS::OpenSearchService::Domain",
+    "mongo": "AWS::DocDB::DBCluster",
+    "redis": "AWS::ElastiCache::ReplicationGroup",
+}
+COMBINATIONS = [
+    tuple(data_store for data_store, managed in zip(MANAGED_RESOURCE_TYPES, flags) if managed)
+    for flags in itertools.product([False, True], repeat=len(MANAGED_RESOURCE_TYPES))
+]
+
+
+def synth(managed: Tuple[str, ...], stateless_services=None) -> Template:  # noqa: D103
+    return synth_stack(
+        "managed-data-stores-test",
+        stateless_services=stateless_services,
+        managed_data_stores=managed_data_stores_config(managed),
+    )
+
+
+@pytest.fixture(scope="module", params=COMBINATIONS, ids=lambda managed: "+".join(managed) or "none")
+def combination(request) -> Tuple[Tuple[str, ...], Template]:  # noqa: D103
+    return request.param, synth(request.param)
+
+
+def test_provisions_only_the_managed_data_stores(combination):  # noqa: D103
+    managed, template = combination
+    for data_store, resource_type in MANAGED_RESOURCE_TYPES.items():
+        template.resource_count_is(resource_type, 1 if data_store in managed else 0)
+
+
+def test_instance_drops_the_managed_containers(combination):  # noqa: D103
+    managed, template = combination
+    services = instance_docker_compose(template)["services"]
+    for data_store in MANAGED_RESOURCE_TYPES:
+        assert (data_store in services) == (data_store not in managed)
+
+    apiserver_environment = services["apiserver"]["environment"]
+    for data_store in managed:
+        prefix = DATA_STORE_ENVIRONMENT_PREFIXES[data_store]
+        assert apiserver_environment[f"{prefix}_HOST"] == f"${{{prefix}_HOST}}"
+        assert data_store not in services["apiserver"].get("depends_on", [])
+    if "mongo" in managed:
+        assert "${CLEARML_MONGODB_PASSWORD}" in apiserver_environment["CLEARML__hosts__mongo__backend__host"]
+
+
+def test_instance_keeps_volumes_of_local_data_stores_only(combination):  # noqa: D103
+    managed, template = combination
+    # one volume per local data store, and one for the fileserver
+    template.resource_count_is("AWS::EC2::Volume", len(MANAGED_RESOURCE_TYPES) - len(managed) + 1)
+
+
+def test_split_apiserver_reads_the_mongo_password_from_the_secret():  # noqa: D103
+    template = synth(tuple(MANAGED_RESOURCE_TYPES), stateless_services=StatelessServicesConfig())
+    (apiserver,) = [
+        container
+        for task_definition in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for container in task_definition["Properties"]["ContainerDefinitions"]
+        if container["Name"] == "apiserver"
+    ]
+    assert {secret["Name"] for secret in apiserver["Secrets"]} == {
+        "CLEARML_MONGODB_USERNAME",
+        "CLEARML_MONGODB_PASSWORD",
+    }
+    assert apiserver["EntryPoint"] == ["/bin/sh", "-c"]
+    # every data store is managed, so the instance runs nothing but the async delete job by default; the
+    # S3 batch delete and backup services only run with their compose profiles
+    services = instance_docker_compose(template)["services"]
+    assert {name for name, service in services.items() if "profiles" not in service} == {"async_delete"}
+
+
+def test_mongo_connections_use_tls():  # noqa: D103
+    template = synth(("mongo",), stateless_services=StatelessServicesConfig())
+    template.has_resource_properties("AWS::DocDB::DBClusterParameterGroup", {"Parameters": {"tls": "enabled"}})
+
+    # the instance downloads the CA bundle and mounts it into the containers connecting to DocumentDB
+    assert instance_files(template)["/clearml/rds-global-bundle.pem"]["source"] == MONGO_CA_BUNDLE_URL
+    services = instance_docker_compose(template)["services"]
+    for service_name in ["async_delete", "s3_batch_delete"]:
+        assert f"./rds-global-bundle.pem:{MONGO_CA_BUNDLE_FPATH}:ro" in services[service_name]["volumes"]
+    tls_options = f"tls=true&tlsCAFile={MONGO_CA_BUNDLE_FPATH}"
+    assert tls_options in services["async_delete"]["environment"]["CLEARML__hosts__mongo__backend__host"]
+    assert tls_options in " ".join(services["s3_batch_delete"]["entrypoint"])
+
+    # so do the apiserver tasks, before the apiserver starts
+    (apiserver_command,) = [
+        container["Command"][0]
+        for task_definition in template.find_resources("AWS::ECS::TaskDefinition").values()
+        for container in task_definition["Properties"]["ContainerDefinitions"]
+        if container["Name"] == "apiserver"
+    ]
+    assert MONGO_CA_BUNDLE_URL in str(apiserver_command)
+    assert tls_options in str(apiserver_command)
+
+
+def test_mongo_tls_can_be_turned_off():  # noqa: D103
+    template = synth_stack(
+        "managed-data-stores-test", managed_data_stores=ManagedDataStoresConfig(mongo=ManagedMongoConfig(tls=False))
+    )
+    template.has_resource_properties("AWS::DocDB::DBClusterParameterGroup", {"Parameters": {"tls": "disabled"}})
+    assert "/clearml/rds-global-bundle.pem" not in instance_files(template)
+    apiserver_environment = instance_docker_compose(template)["services"]["apiserver"]["environment"]
+    assert "tls=true" not in apiserver_environment["CLEARML__hosts__mongo__backend__host"]
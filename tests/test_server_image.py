@@ -0,0 +1,19 @@
+"""Tests of the Image Builder pipeline of the pre-baked server AMI."""
+
+import pytest
+
+from tests.helpers import ssm_parameter_name, synth_stack
+
+
+@pytest.mark.parametrize(
+    "capacity_profile, parent_image_parameter",
+    [
+        ("medium", "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-x86_64-gp2"),
+        ("medium-graviton", "/aws/service/ami-amazon-linux-latest/amzn2-ami-hvm-arm64-gp2"),
+    ],
+)
+def test_parent_image_is_amazon_linux_2(capacity_profile: str, parent_image_parameter: str):  # noqa: D103
+    # the install script and the bootstrap are written for the packages of Amazon Linux 2
+    template = synth_stack("image-test", capacity_profile=capacity_profile, use_prebaked_server_image=True)
+    (recipe,) = template.find_resources("AWS::ImageBuilder::ImageRecipe").values()
+    assert ssm_parameter_name(template, recipe["Properties"]["ParentImage"]) == parent_image_parameter
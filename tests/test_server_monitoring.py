@@ -0,0 +1,19 @@
+"""Tests of the alarms of the ClearML server."""
+
+import json
+
+from cdk_clearml.capacity import CapacityProfile
+from cdk_clearml.server_monitoring import render_cloudwatch_agent_config, server_alarm_specs
+
+DISK_PATHS = ["/", "/clearml/opt/clearml/data/elastic_7"]
+
+
+def test_io_wait_alarm_queries_the_total_cpu_the_agent_publishes():  # noqa: D103
+    agent_config = json.loads(render_cloudwatch_agent_config(DISK_PATHS))
+    cpu = agent_config["metrics"]["metrics_collected"]["cpu"]
+    assert cpu["totalcpu"] is True
+    assert ["InstanceId"] not in agent_config["metrics"]["aggregation_dimensions"]
+
+    specs = {spec.alarm_id: spec for spec in server_alarm_specs(CapacityProfile.preset("medium"), DISK_PATHS)}
+    assert specs["CpuIoWaitAlarm"].metric_name == cpu["measurement"][0]["rename"]
+    assert specs["CpuIoWaitAlarm"].dimensions == {"cpu": "cpu-total"}
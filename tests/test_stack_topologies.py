@@ -0,0 +1,89 @@
+"""Construct-level tests of the single-instance and the split topology of ``ClearMLStack``."""
+
+from pathlib import Path
+
+import pytest
+import yaml
+from aws_cdk.assertions import Match, Template
+
+from cdk_clearml.stateless_services import (
+    DATA_STORE_PORTS,
+    STATELESS_SERVICES,
+    StatelessServicesConfig,
+    render_stores_docker_compose,
+)
+
+from tests.helpers import instance_docker_compose, synth_stack
+
+DOCKER_COMPOSE_FPATH = Path(__file__).parents[1] / "src/cdk_clearml/resources/docker-compose.yml"
+
+
+def synth(stateless_services=None) -> Template:  # noqa: D103
+    return synth_stack("topology-test", stateless_services=stateless_services)
+
+
+@pytest.fixture(scope="module")
+def single_instance() -> Template:  # noqa: D103
+    return synth()
+
+
+@pytest.fixture(scope="module")
+def split() -> Template:  # noqa: D103
+    return synth(stateless_services=StatelessServicesConfig())
+
+
+def test_single_instance_serves_every_subdomain(single_instance: Template):  # noqa: D103
+    single_instance.resource_count_is("AWS::ECS::Service", 0)
+    single_instance.resource_count_is("AWS::ElasticLoadBalancingV2::TargetGroup", 3)
+    single_instance.all_resources_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup",
+        {"Targets": [Match.object_like({"Id": Match.any_value()})], "HealthCheckPort": "8080"},
+    )
+    assert set(STATELESS_SERVICES) <= set(instance_docker_compose(single_instance)["services"])
+
+
+def test_split_runs_the_stateless_services_on_fargate(split: Template):  # noqa: D103
+    split.resource_count_is("AWS::ECS::Service", 3)
+    split.resource_count_is("AWS::ElasticLoadBalancingV2::TargetGroup", 3)
+    split.all_resources_properties("AWS::ElasticLoadBalancingV2::TargetGroup", {"TargetType": "ip"})
+    split.has_resource_properties(
+        "AWS::ElasticLoadBalancingV2::TargetGroup", {"HealthCheckPath": "/debug.ping", "TargetType": "ip"}
+    )
+    split.resource_count_is("AWS::EFS::FileSystem", 1)
+
+
+def test_split_scales_on_requests_and_cpu(split: Template):  # noqa: D103
+    for metric_type in ("ALBRequestCountPerTarget", "ECSServiceAverageCPUUtilization"):
+        policies = split.find_resources(
+            "AWS::ApplicationAutoScaling::ScalingPolicy",
+            {
+                "Properties": {
+                    "TargetTrackingScalingPolicyConfiguration": Match.object_like(
+                        {"PredefinedMetricSpecification": Match.object_like({"PredefinedMetricType": metric_type})}
+                    )
+                }
+            },
+        )
+        assert len(policies) == 3, metric_type
+    split.has_resource_properties(
+        "AWS::ApplicationAutoScaling::ScalableTarget", {"MinCapacity": 2, "MaxCapacity": 10}
+    )
+
+
+def test_split_instance_only_runs_the_data_stores(split: Template):  # noqa: D103
+    services = instance_docker_compose(split)["services"]
+    assert not set(STATELESS_SERVICES) & set(services)
+    for service_name, port in DATA_STORE_PORTS.items():
+        assert services[service_name]["ports"] == [f"{port}:{port}"]
+        split.has_resource_properties(
+            "AWS::EC2::SecurityGroupIngress", {"IpProtocol": "tcp", "FromPort": port, "ToPort": port}
+        )
+
+
+def test_stores_docker_compose_drops_dependencies_on_removed_services():  # noqa: D103
+    services = yaml.safe_load(render_stores_docker_compose(DOCKER_COMPOSE_FPATH.read_text(encoding="utf-8")))[
+        "services"
+    ]
+    assert services["async_delete"]["depends_on"] == ["redis", "mongo", "elasticsearch"]
+    assert "${CLEARML_FILES_HOST}" in services["async_delete"]["entrypoint"]
+    assert "agent-services" not in services
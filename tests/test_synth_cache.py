@@ -0,0 +1,42 @@
+"""Tests of the synth cache."""
+
+import json
+import time
+from pathlib import Path
+
+from cdk_clearml.utils.synth_cache import SynthCache
+
+VPC_KEY = "vpc-provider:account=123456789012:filter.isDefault=true:region=us-west-2"
+
+
+def test_set_revalidates_an_expired_entry(tmp_path: Path):  # noqa: D103
+    cache = SynthCache(fpath=tmp_path / "cdk.synth-cache.json", ttl_seconds=0.01)
+    cache.set(VPC_KEY, {"vpcId": "vpc-1"})
+    time.sleep(0.05)
+    assert cache.is_expired(VPC_KEY)
+    assert cache.get(VPC_KEY) is None
+
+    # the lookup returned the same value again
+    cache.set(VPC_KEY, {"vpcId": "vpc-1"})
+    assert not cache.is_expired(VPC_KEY)
+    assert cache.get(VPC_KEY) == {"vpcId": "vpc-1"}
+
+
+def test_harvest_revalidates_unchanged_lookups(tmp_path: Path):  # noqa: D103
+    cdk_context_fpath = tmp_path / "cdk.context.json"
+    cdk_context_fpath.write_text(json.dumps({VPC_KEY: {"vpcId": "vpc-1"}, "some-flag": True}), encoding="utf-8")
+    cache = SynthCache(fpath=tmp_path / "cdk.synth-cache.json", ttl_seconds=0.01)
+    assert cache.harvest_context_file(cdk_context_fpath) == 1
+    time.sleep(0.05)
+    assert cache.context_lookups() == {}
+
+    cache.harvest_context_file(cdk_context_fpath)
+    assert cache.context_lookups() == {VPC_KEY: {"vpcId": "vpc-1"}}
+
+
+def test_save_and_load_round_trip(tmp_path: Path):  # noqa: D103
+    fpath = tmp_path / "cdk.synth-cache.json"
+    cache = SynthCache(fpath=fpath, ttl_seconds=60)
+    cache.set(VPC_KEY, {"vpcId": "vpc-1"})
+    cache.save()
+    assert SynthCache.load(fpath, ttl_seconds=60).get(VPC_KEY) == {"vpcId": "vpc-1"}